@@ -15,10 +15,11 @@
 """
 import numpy as np
 from scipy.interpolate import interp1d
-from pencil.math import dot, dot2, natural_sort, helmholtz_fft, cpu_optimal
+from pencil.math import dot, dot2, natural_sort, helmholtz_fft
 from pencil.math.derivatives import curl, div, curl2, grad
 from pencil.calc import fluid_reynolds, magnetic_reynolds
 from pencil.io import open_h5, group_h5, dataset_h5
+from pencil.io import chunk_counts, chunk_blocks, chunked_map
 from fileinput import input
 from sys import stdout
 import subprocess as sub
@@ -53,6 +54,7 @@ def kernel_smooth(
     nmin=32,
     typ='piecewise',
     mode=list(),
+    n_proc=1,
 ):
 
     if comm:
@@ -76,50 +78,28 @@ def kernel_smooth(
     )
     # extend gost zones to include up to 1.5 * kernel length)
     dx = max(src['grid/dx'][()],src['grid/dy'][()],src['grid/dz'][()])
-    nkernel = np.int(2.5*kernel/dx)
+    nkernel = int(2.5*kernel/dx)
     sigma = kernel / dx
     if not quiet:
         print('sigma {:.2f}, kernel {:.2f}, dx {:.4f}'.format(sigma,kernel,dx))
     # split data into manageable memory chunks
-    dstchunksize = 8 * nx * ny * nz / 1024 * 1024
-    if dstchunksize > chunksize:
-        nchunks = cpu_optimal(
-            nx,
-            ny,
-            nz,
-            quiet=quiet,
-            mvar=src["settings/mvar"][0],
-            maux=src["settings/maux"][0],
-            MBmin=chunksize,
-            nmin=nmin,
-            size=size,
-        )[1]
-    else:
-        nchunks = [1, 1, 1]
+    nchunks = chunk_counts(
+        nx,
+        ny,
+        nz,
+        mvar=src["settings/mvar"][0],
+        maux=src["settings/maux"][0],
+        chunksize=chunksize,
+        nmin=nmin,
+        size=size,
+        quiet=quiet,
+    )
     print("nchunks {}".format(nchunks))
-    # for mpi split chunks across processes
-    if size > 1:
-        locindx = np.array_split(np.arange(nx) + nghost, nchunks[0])
-        locindy = np.array_split(np.arange(ny) + nghost, nchunks[1])
-        locindz = np.array_split(np.arange(nz) + nghost, nchunks[2])
-        indx = [
-            locindx[
-                np.mod(
-                    rank + int(rank / nchunks[2]) + int(rank / nchunks[1]), nchunks[0]
-                )
-            ]
-        ]
-        indy = [locindy[np.mod(rank + int(rank / nchunks[2]), nchunks[1])]]
-        indz = [locindz[np.mod(rank, nchunks[2])]]
-        allchunks = 1
-    else:
-        locindx = np.array_split(np.arange(nx) + nghost, nchunks[0])
-        locindy = np.array_split(np.arange(ny) + nghost, nchunks[1])
-        locindz = np.array_split(np.arange(nz) + nghost, nchunks[2])
-        indx = np.array_split(np.arange(nx) + nghost, nchunks[0])
-        indy = np.array_split(np.arange(ny) + nghost, nchunks[1])
-        indz = np.array_split(np.arange(nz) + nghost, nchunks[2])
-        allchunks = nchunks[0] * nchunks[1] * nchunks[2]
+    # extend split directions by the kernel, periodic across the boundaries
+    halo = [nkernel + nghost if nc > 1 else nghost for nc in nchunks]
+    blocks = chunk_blocks(
+        [mz, my, mx], nchunks, nghost=nghost, halo=halo, periodic=True
+    )
     if 1 in nchunks:
         mode = ["reflect","reflect","reflect"]
         for ich in range(3):
@@ -185,125 +165,48 @@ def kernel_smooth(
                 dtype=dtype,
             )
             print("writing " + key + " shape {}".format([mz, my, mx]))
-        for ichunk in range(allchunks):
-            for iz in [indz[np.mod(ichunk, nchunks[2])]]:
-                if nchunks[2] == 1:
-                    zextra = nghost
-                else:
-                    zextra = nkernel + nghost
-                n1, n2 = iz[0] - zextra, iz[-1] + zextra + 1
-                lindz = np.arange(n1,n2)
-                n1out = n1 + zextra
-                n2out = n2 - zextra
-                varn1 = zextra
-                varn2 = -zextra
-                if iz[0] == locindz[0][0]:
-                    n1out = 0
-                    varn1 = zextra - nghost
-                if iz[-1] == locindz[-1][-1]:
-                    n2out = n2 - zextra + nghost
-                    varn2 = n2 - n1 - zextra + nghost
-                if n1 < 0:
-                    lindz[np.where(lindz<nghost)[0]] += nz
-                if n2 > mz-1:
-                    lindz[np.where(lindz>mz-1-nghost)[0]] -= nz
-                if not quiet:
-                    print('n1out {},n2out {},varn1 {},varn2 {},zextra {}'.format(n1out,n2out,varn1,varn2,zextra))
-                for iy in [indy[np.mod(ichunk + int(ichunk / nchunks[2]), nchunks[1])]]:
-                    if nchunks[1] == 1:
-                        yextra = nghost
-                    else:
-                        yextra = nkernel + nghost
-                    m1, m2 = iy[0] - yextra, iy[-1] + yextra + 1
-                    lindy = np.arange(m1,m2)
-                    m1out = m1 + yextra
-                    m2out = m2  - yextra
-                    varm1 = yextra
-                    varm2 = -yextra
-                    if iy[0] == locindy[0][0]:
-                        m1out = 0
-                        varm1 = yextra - nghost
-                    if iy[-1] == locindy[-1][-1]:
-                        m2out = m2 - yextra + nghost
-                        varm2 = m2 - m1 - yextra + nghost
-                    if m1 < 0:
-                        lindy[np.where(lindy<0)[0]] += ny
-                    if m2 > my-1:
-                        lindy[np.where(lindy>my-1-nghost)[0]] -= ny
-                    if not quiet:
-                        print('m1out {},m2out {},varm1 {},varm2 {},yextra {}'.format(m1out,m2out,varm1,varm2,yextra))
-                    for ix in [
-                        indx[
-                            np.mod(
-                                ichunk
-                                + int(ichunk / nchunks[2])
-                                + int(ichunk / nchunks[1]),
-                                nchunks[0],
-                            )
-                        ]
-                    ]:
-                        if nchunks[1] == 1:
-                            xextra = nghost
-                        else:
-                            xextra = nkernel + nghost
-                        l1, l2 = ix[0] - xextra,  ix[-1] + xextra + 1
-                        lindx = np.arange(l1,l2)
-                        l1out = l1 + xextra
-                        l2out = l2 - xextra
-                        varl1 = xextra
-                        varl2 = -xextra
-                        if ix[0] == locindx[0][0]:
-                            l1out = 0
-                            varl1 = xextra - nghost
-                        if ix[-1] == locindx[-1][-1]:
-                            l2out = l2 - xextra + nghost
-                            varl2 = l2 - l1 - xextra + nghost
-                        if l1 < 0:
-                            lindx[np.where(lindx<0)[0]] += nx
-                        if l2 > mx-1:
-                            lindx[np.where(lindx>mx-1-nghost)[0]] -= nx
-                        if not quiet:
-                            print('l1out {},l2out {},varl1 {},varl2 {},xextra {}'.format(l1out,l2out,varl1,varl2,xextra))
-                        if not quiet:
-                            print("remeshing " + key + " chunk {}".format([iz, iy, ix]))
-                            print('sending ichunk {} with index ranges {}'.format(ichunk, [n1, n2, m1, m2, l1, l2]))
-                        var = smoothed_data(
-                            src["data"],
-                            dst["data"],
-                            key,
-                            par,
-                            gd,
-                            lindx,
-                            lindy,
-                            lindz,
-                            nghost,
-                            sigma,
-                            typ,
-                            quiet,
-                            mode
-                        )
-                        if not quiet:
-                            print('ichunk {}, var min {:.1e}, var max {:.1e}'.format(ichunk, var.min(), var.max()))
-                        # print('var shape {}'.format(var.shape))
-                        # if not quiet:
-                        #    print('writing '+key+
-                        #                   ' shape {} chunk {}'.format(
-                        #                         var.shape, [iz,iy,ix]))
-                        if not quiet:
-                            print('ichunk: out indices {}'.format([n1out, n2out, m1out, m2out, l1out, l2out]))
-                        if is_vector(key):
-                            dst["data"][key+str(nkernel)][
-                                :, n1out:n2out, m1out:m2out, l1out:l2out
-                            ] = dtype(var[:, varn1:varn2, varm1:varm2, varl1:varl2])
-                        else:
-                            dst["data"][key+str(nkernel)][
-                                n1out:n2out, m1out:m2out, l1out:l2out
-                            ] = dtype(var[varn1:varn2, varm1:varm2, varl1:varl2])
+        for block, var in chunked_map(
+            _smooth_block,
+            blocks,
+            [src["data"], dst["data"]],
+            args=(key, par, gd, nghost, sigma, typ, quiet, mode),
+            periodic=True,
+            nghost=nghost,
+            skip=[key + str(nkernel)],
+            n_proc=n_proc,
+            rank=rank,
+            size=size,
+        ):
+            if not quiet:
+                print("smoothing " + key + " chunk {}".format(block))
+                print("var min {:.1e}, var max {:.1e}".format(var.min(), var.max()))
+            dst["data"][key + str(nkernel)][block.out] = dtype(var[block.inner])
+
+
+def _smooth_block(windows, block, key, par, gd, nghost, sigma, typ, quiet, mode):
+    """Kernel of kernel_smooth on the windows of src["data"] and dst["data"]."""
+    lindz, lindy, lindx = [np.arange(b1, b2) for b1, b2 in block.box]
+    return smoothed_data(
+        windows[0],
+        windows[1],
+        key,
+        par,
+        gd,
+        lindx,
+        lindy,
+        lindz,
+        nghost,
+        sigma,
+        typ,
+        quiet,
+        mode,
+    )
+
 
 # ======================================================================
 def load_dataset(src, key, lindx, lindy, lindz, nghost):
 
-    if is_vector(key):
+    if len(src[key].shape) == 4:
         var = np.empty([3,lindz.size,lindy.size,lindx.size])
     else:
         var = np.empty([lindz.size,lindy.size,lindx.size])
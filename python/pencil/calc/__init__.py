@@ -10,6 +10,7 @@ from .fill_gaps_in_grid import *
 from .accuracy import *
 from .draglift import *
 from .tensors import *
+from .derived import DerivedFields, derived_quantities, register_derived
 from .Reynolds import *
 from .shocktube import sod
 from .Gaussian_averages import kernel_smooth, gauss_3Dsmooth 
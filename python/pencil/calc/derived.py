@@ -0,0 +1,536 @@
+# derived.py
+#
+# Registry of the derived ('magic') quantities.
+"""
+Registry of derived quantities like bb, jj, vort, tt or pp.
+
+Every quantity is registered with one or more recipes, each declaring the
+quantities it depends on. A DerivedFields object evaluates the quantities
+from a set of base fields (e.g. the variables of a snapshot) by walking
+these dependencies. Intermediates like the velocity gradient tensor uij
+are evaluated once, kept for the other quantities needing them and freed
+again, least recently used first, when the kept arrays exceed a memory
+budget.
+"""
+
+import warnings
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+
+# Bytes of intermediate results kept by a DerivedFields object by default.
+MEMORY_BUDGET = 2 ** 30
+
+Recipe = namedtuple("Recipe", ["depends", "function", "when", "derivatives"])
+
+_registry = {}
+
+
+def register_derived(name, depends, when=None, derivatives=False):
+    """
+    register_derived(name, depends, when=None, derivatives=False)
+
+    Decorator registering function(fields, *depends) as a recipe for the
+    derived quantity name. Recipes of the same quantity are tried in the
+    order they are registered.
+
+    Parameters
+    ----------
+    name : string
+        Name of the derived quantity, e.g. 'bb'.
+
+    depends : tuple of strings
+        Quantities passed to the function, base fields or derived.
+
+    when : function
+        when(fields) returns False if the recipe cannot be used for the
+        geometry of the DerivedFields object fields.
+
+    derivatives : bool
+        The recipe takes derivatives, so it needs the ghost zones.
+    """
+
+    def decorator(function):
+        _registry.setdefault(name, []).append(
+            Recipe(tuple(depends), function, when, derivatives)
+        )
+        return function
+
+    return decorator
+
+
+def derived_quantities():
+    """
+    derived_quantities()
+
+    Return the names of the registered derived quantities.
+    """
+
+    return sorted(_registry)
+
+
+def needs_derivatives(names):
+    """
+    needs_derivatives(names)
+
+    Return True if any of the quantities names may need derivatives, and
+    with them the ghost zones of the base fields.
+
+    Parameters
+    ----------
+    names : list of strings
+        Names of derived quantities.
+    """
+
+    def walk(name, visiting):
+        if name in visiting:
+            return False
+        for recipe in _registry.get(name, []):
+            if recipe.derivatives or any(
+                walk(dep, visiting | {name}) for dep in recipe.depends
+            ):
+                return True
+        return False
+
+    return any(walk(name, frozenset()) for name in names)
+
+
+class DerivedFields(object):
+    """
+    DerivedFields -- Evaluates derived quantities from base fields.
+    """
+
+    def __init__(
+        self,
+        fields,
+        param=None,
+        grid=None,
+        dx=None,
+        dy=None,
+        dz=None,
+        x=None,
+        y=None,
+        coordinate_system="cartesian",
+        run2D=False,
+        memory=None,
+        workers=None,
+    ):
+        """
+        Prepare the evaluation of derived quantities.
+
+        Parameters
+        ----------
+        fields : dict
+            Base fields with their ghost zones, vectors like uu of shape
+            (3, mz, my, mx). Values may be functions returning the field,
+            which are called on first use.
+
+        param : pencil.read.params.Param
+            Parameters needed by the thermodynamic quantities.
+
+        grid : pencil.read.grids.Grid
+            Grid for the derivatives.
+
+        dx, dy, dz, x, y : floats and ndarrays
+            Grid spacings and coordinates used if grid is None.
+
+        coordinate_system : string
+            'cartesian', 'cylindrical' or 'spherical'.
+
+        run2D : bool
+            The fields are two dimensional.
+
+        memory : int
+            Bytes of intermediate results to keep. Defaults to MEMORY_BUDGET.
+
+        workers : int
+            Number of threads evaluating the derivatives.
+        """
+
+        self.fields = fields
+        self.param = param
+        self.grid = grid
+        self.dx = dx
+        self.dy = dy
+        self.dz = dz
+        self.x = x
+        self.y = y
+        self.coordinate_system = coordinate_system
+        self.run2D = run2D
+        self.memory = MEMORY_BUDGET if memory is None else memory
+        self.workers = workers
+        self.shared = set()
+        self._cache = OrderedDict()
+        self._cached_bytes = 0
+
+    def __contains__(self, name):
+        return self.available(name)
+
+    def __getitem__(self, name):
+        if name in self.fields:
+            value = self.fields[name]
+            if callable(value):
+                value = value()
+                self.fields[name] = value
+            return value
+        if name in self._cache:
+            self._cache.move_to_end(name)
+            return self._cache[name]
+        recipe = self.__choose(name)
+        if recipe is None:
+            raise ValueError(
+                "cannot derive {0}, it needs one of {1}.".format(
+                    name,
+                    " or ".join(
+                        ", ".join(recipe.depends)
+                        for recipe in _registry.get(name, [])
+                    ),
+                )
+            )
+        value = recipe.function(self, *[self[dep] for dep in recipe.depends])
+        self.__keep(name, value)
+        return value
+
+    def operator_kwargs(self):
+        """
+        Return the geometry arguments of div, grad, curl, curl2 and del2.
+        """
+
+        return dict(
+            dx=self.dx,
+            dy=self.dy,
+            dz=self.dz,
+            x=self.x,
+            y=self.y,
+            coordinate_system=self.coordinate_system,
+            grid=self.grid,
+            workers=self.workers,
+        )
+
+    def spacing(self, shape):
+        """
+        Return the inverse grid spacings and the dx_tilde arrays in
+        (z, y, x) order for fields of shape (mz, my, mx).
+        """
+
+        if self.grid is not None:
+            return (
+                (self.grid.dz_1, self.grid.dy_1, self.grid.dx_1),
+                (self.grid.dz_tilde, self.grid.dy_tilde, self.grid.dx_tilde),
+            )
+        warnings.warn(
+            "Assuming equidistant grid. To silence this warning, please pass a Pencil grid object instead of specifying dx,dy,..."
+        )
+        return (
+            tuple(np.ones(m) / d for m, d in zip(shape, (self.dz, self.dy, self.dx))),
+            tuple(np.zeros(m) for m in shape),
+        )
+
+    def available(self, name, visiting=frozenset()):
+        """
+        Return True if name is a base field or can be derived from them.
+        """
+
+        if name in self.fields or name in self._cache:
+            return True
+        if name in visiting:
+            return False
+        return any(
+            self.__usable(recipe, visiting | {name})
+            for recipe in _registry.get(name, [])
+        )
+
+    def sources(self, names):
+        """
+        Return the base fields needed to derive the quantities names.
+        """
+
+        sources = set()
+        for name in names:
+            if name in self.fields:
+                sources.add(name)
+                continue
+            recipe = self.__choose(name)
+            if recipe is not None:
+                sources |= self.sources(recipe.depends)
+
+        return sources
+
+    def require(self, names):
+        """
+        Announce the quantities to be evaluated, so that intermediates
+        needed by several of them are evaluated once and shared.
+        """
+
+        count = {}
+        for name in names:
+            depends = set()
+            for recipe in _registry.get(name, []):
+                if self.__usable(recipe, frozenset([name])):
+                    depends |= set(recipe.depends)
+            for dep in depends:
+                if dep in _registry and dep not in self.fields:
+                    count[dep] = count.get(dep, 0) + 1
+        self.shared = set(dep for dep in count if count[dep] > 1)
+
+    def free(self):
+        """
+        Free all intermediate results.
+        """
+
+        self._cache.clear()
+        self._cached_bytes = 0
+
+    def __usable(self, recipe, visiting):
+        if recipe.when is not None and not recipe.when(self):
+            return False
+        return all(self.available(dep, visiting) for dep in recipe.depends)
+
+    def __choose(self, name):
+        """
+        Pick the recipe for name: one using shared or already evaluated
+        intermediates, else the first one that works.
+        """
+
+        recipes = [
+            recipe
+            for recipe in _registry.get(name, [])
+            if self.__usable(recipe, frozenset([name]))
+        ]
+        if not recipes:
+            return None
+        for recipe in recipes:
+            if any(
+                dep in self.shared or dep in self._cache for dep in recipe.depends
+            ):
+                return recipe
+        return recipes[0]
+
+    def __keep(self, name, value):
+        """
+        Keep a result, freeing the least recently used ones over budget.
+        """
+
+        if value.nbytes > self.memory:
+            return
+        self._cache[name] = value
+        self._cached_bytes += value.nbytes
+        while self._cached_bytes > self.memory:
+            _, old = self._cache.popitem(last=False)
+            self._cached_bytes -= old.nbytes
+
+
+def _cartesian_3d(fields):
+    return fields.coordinate_system == "cartesian" and not fields.run2D
+
+
+def _thermodynamics(param):
+    cp = param.cp
+    gamma = param.gamma
+    cs20 = param.cs0 ** 2
+    lnrho0 = np.log(param.rho0)
+    lnTT0 = np.log(cs20 / (cp * (gamma - 1.0)))
+    return cp, gamma, cs20, lnrho0, lnTT0
+
+
+@register_derived("rho", ("lnrho",))
+def _rho(fields, lnrho):
+    return np.exp(lnrho)
+
+
+@register_derived("lnrho", ("rho",))
+def _lnrho(fields, rho):
+    return np.log(rho)
+
+
+@register_derived("tt", ("lnTT",))
+def _tt_lnTT(fields, lnTT):
+    return np.exp(lnTT)
+
+
+@register_derived("tt", ("ss", "lnrho"))
+def _tt_ss(fields, ss, lnrho):
+    cp, gamma, cs20, lnrho0, lnTT0 = _thermodynamics(fields.param)
+    return np.exp(lnTT0 + gamma / cp * ss + (gamma - 1.0) * (lnrho - lnrho0))
+
+
+@register_derived("ss", ("lnTT", "lnrho"))
+def _ss_lnTT(fields, lnTT, lnrho):
+    cp, gamma, cs20, lnrho0, lnTT0 = _thermodynamics(fields.param)
+    return cp / gamma * (lnTT - lnTT0 - (gamma - 1.0) * (lnrho - lnrho0))
+
+
+@register_derived("ss", ("tt", "lnrho"))
+def _ss_tt(fields, tt, lnrho):
+    return _ss_lnTT(fields, np.log(tt), lnrho)
+
+
+@register_derived("pp", ("ss", "lnrho"))
+def _pp_ss(fields, ss, lnrho):
+    cp, gamma, cs20, lnrho0, lnTT0 = _thermodynamics(fields.param)
+    return (fields.param.rho0 * cs20 / gamma) * np.exp(gamma * (ss + lnrho - lnrho0))
+
+
+@register_derived("pp", ("lnTT", "lnrho"))
+def _pp_lnTT(fields, lnTT, lnrho):
+    cp = fields.param.cp
+    return (cp - cp / fields.param.gamma) * np.exp(lnTT + lnrho)
+
+
+@register_derived("pp", ("tt", "lnrho"))
+def _pp_tt(fields, tt, lnrho):
+    cp = fields.param.cp
+    return (cp - cp / fields.param.gamma) * tt * np.exp(lnrho)
+
+
+def _gradient_tensor(fields, f):
+    """
+    Return the tensor f_i,j with shape (3, 3, mz, my, mx).
+    """
+
+    from pencil.math.derivatives.stencil import apply_stencil
+
+    dx_1, _ = fields.spacing(f.shape[1:])
+    fij = np.empty((3, 3) + f.shape[1:])
+    for i in range(3):
+        for j in range(3):
+            apply_stencil(
+                fij[i, j], [(f[i], 2 - j, 1, 1, None, None)], dx_1, workers=fields.workers
+            )
+
+    return fij
+
+
+def _curl_of_tensor(fij):
+    return np.array(
+        [fij[2, 1] - fij[1, 2], fij[0, 2] - fij[2, 0], fij[1, 0] - fij[0, 1]]
+    )
+
+
+def _curl2_of_tensor(fields, f, fij):
+    """
+    curl(curl(f)) = grad(div(f)) - del2(f) with the diagonal of fij.
+    """
+
+    from pencil.math.derivatives.stencil import apply_stencil
+
+    dx_1, dx_tilde = fields.spacing(f.shape[1:])
+    out = np.empty(f.shape)
+    for i in range(3):
+        others = [j for j in range(3) if j != i]
+        mixed = fij[others[0], others[0]] + fij[others[1], others[1]]
+        terms = [(mixed, 2 - i, 1, 1, None, None)]
+        terms += [(f[i], 2 - j, 2, -1, None, None) for j in others]
+        apply_stencil(out[i], terms, dx_1, dx_tilde, workers=fields.workers)
+
+    return out
+
+
+@register_derived("uij", ("uu",), when=_cartesian_3d, derivatives=True)
+def _uij(fields, uu):
+    return _gradient_tensor(fields, uu)
+
+
+@register_derived("aij", ("aa",), when=_cartesian_3d, derivatives=True)
+def _aij(fields, aa):
+    return _gradient_tensor(fields, aa)
+
+
+@register_derived("divu", ("uu",), derivatives=True)
+def _divu(fields, uu):
+    from pencil.math.derivatives import div
+
+    return div(uu, **fields.operator_kwargs())
+
+
+@register_derived("divu", ("uij",))
+def _divu_uij(fields, uij):
+    return uij[0, 0] + uij[1, 1] + uij[2, 2]
+
+
+@register_derived("vort", ("uu",), derivatives=True)
+def _vort(fields, uu):
+    from pencil.math.derivatives import curl
+
+    return curl(uu, run2D=fields.run2D, **fields.operator_kwargs())
+
+
+@register_derived("vort", ("uij",))
+def _vort_uij(fields, uij):
+    return _curl_of_tensor(uij)
+
+
+@register_derived("bb", ("aa",), derivatives=True)
+def _bb(fields, aa):
+    from pencil.math.derivatives import curl
+
+    return curl(aa, run2D=fields.run2D, **fields.operator_kwargs())
+
+
+@register_derived("bb", ("aij",))
+def _bb_aij(fields, aij):
+    return _curl_of_tensor(aij)
+
+
+@register_derived("jj", ("aa",), derivatives=True)
+def _jj(fields, aa):
+    from pencil.math.derivatives import curl2
+
+    return curl2(aa, **fields.operator_kwargs())
+
+
+@register_derived("jj", ("aa", "aij"), derivatives=True)
+def _jj_aij(fields, aa, aij):
+    return _curl2_of_tensor(fields, aa, aij)
+
+
+@register_derived("u2", ("uu",))
+def _u2(fields, uu):
+    from pencil.math import dot2
+
+    return dot2(uu)
+
+
+@register_derived("b2", ("bb",))
+def _b2(fields, bb):
+    from pencil.math import dot2
+
+    return dot2(bb)
+
+
+@register_derived("b_mag", ("b2",))
+def _b_mag(fields, b2):
+    return np.sqrt(b2)
+
+
+@register_derived("j_mag", ("jj",))
+def _j_mag(fields, jj):
+    from pencil.math import dot2
+
+    return np.sqrt(dot2(jj))
+
+
+@register_derived("pb", ("b2",))
+def _pb(fields, b2):
+    return 0.5 * b2 / fields.param.mu0
+
+
+@register_derived("ou", ("uu", "vort"))
+def _ou(fields, uu, vort):
+    from pencil.math import dot
+
+    return dot(uu, vort)
+
+
+@register_derived("ab", ("aa", "bb"))
+def _ab(fields, aa, bb):
+    from pencil.math import dot
+
+    return dot(aa, bb)
+
+
+@register_derived("jb", ("jj", "bb"))
+def _jb(fields, jj, bb):
+    from pencil.math import dot
+
+    return dot(jj, bb)
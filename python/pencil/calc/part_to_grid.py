@@ -7,9 +7,14 @@ def part_to_grid(
     sim=False,
     extent=False,
     fill_gaps=False,
+    kernel="ngp",
+    periodic=False,
+    chunk_size=2 ** 20,
+    n_proc=1,
 ):
     """Bins quantity based on position data xp and yp to 1024^2 bins like a histrogram.
-    This method is not using TSC.
+    The particles are assigned to the grid with the nearest grid point (NGP),
+    cloud in cell (CIC) or triangular shaped cloud (TSC) scheme.
 
     Args:
         - xp, yp:       array of x and y positions
@@ -20,9 +25,13 @@ def part_to_grid(
         - extent:       [[xmin, xmax],[ymin, ymax]] or set false and instead give a sim
                         set extent manually e.g. if you want to include ghost zones
         - fill_gaps     interpolate empty grid cells
+        - kernel:       'ngp', 'cic' or 'tsc', see deposit
+        - periodic:     wrap the kernels around the extent, see deposit
+        - chunk_size:   number of particles deposited at once
+        - n_proc:       number of processes for the deposition
 
     Returns: arr, xgrid, ygrid
-        - arr:          2d array with binned values
+        - arr:          2d array with binned values, weighted mean of quantity per cell
         - x-/ygrid:     linspace of used x/y grid
         - zgrid:        if zp != False
 
@@ -34,74 +43,328 @@ def part_to_grid(
     from pencil import get_sim
     from pencil.calc import fill_gaps_in_grid
 
-    if not xp.shape == yp.shape and yp.shape == xp.shape and yp.shape == zp.shape:
+    if zp is False:
+        positions = [np.asarray(xp), np.asarray(yp)]
+    else:
+        positions = [np.asarray(xp), np.asarray(yp), np.asarray(zp)]
+    if any(pos.shape != positions[0].shape for pos in positions):
         print("! ERROR: Shape of xp, yp, zp and quantity needs to be equal!")
 
-    if extent == False and sim == False:
+    if extent is False and sim is False:
         sim = get_sim()
 
-    if quantity == False:
-        quantity = xp / xp
+    if quantity is False:
+        quantity = np.ones_like(positions[0], dtype=float)
 
-    if extent == False:
+    if extent is False:
         grid = sim.grid
-        if type(zp) == type(False) and zp == False:
-            extent = [
-                [grid.x[0] - grid.dx / 2, grid.x[-1] + grid.dx / 2],
-                [grid.y[0] - grid.dy / 2, grid.y[-1] + grid.dy / 2],
-            ]
-        else:
-            extent = [
-                [grid.x[0] - grid.dx / 2, grid.x[-1] + grid.dx / 2],
-                [grid.y[0] - grid.dy / 2, grid.y[-1] + grid.dy / 2],
-                [grid.z[0] - grid.dz / 2, grid.z[-1] + grid.dz / 2],
-            ]
-
-    if type(zp) == type(False) and zp == False:
-        arr = np.zeros((2, Nbins[0], Nbins[1]))
+        extent = [
+            [grid.x[0] - grid.dx / 2, grid.x[-1] + grid.dx / 2],
+            [grid.y[0] - grid.dy / 2, grid.y[-1] + grid.dy / 2],
+        ]
+        if not zp is False:
+            extent.append([grid.z[0] - grid.dz / 2, grid.z[-1] + grid.dz / 2])
+
+    # Deposit the quantity and the particle number together and take the ratio.
+    ndim = len(positions)
+    weights = np.array([np.ravel(quantity), np.ones(positions[0].size)])
+    arr = deposit(
+        positions,
+        extent[:ndim],
+        Nbins[:ndim],
+        weights=weights,
+        kernel=kernel,
+        periodic=periodic,
+        chunk_size=chunk_size,
+        n_proc=n_proc,
+    )
+    with np.errstate(divide="ignore", invalid="ignore"):
+        arr = arr[0] / arr[1]
+
+    grids = []
+    for i in range(ndim):
+        edges = np.linspace(extent[i][0], extent[i][1], num=Nbins[i] + 1)
+        grids.append((edges[:-1] + edges[1:]) / 2)
+
+    if fill_gaps == True:
+        arr = fill_gaps_in_grid(arr, key=np.nan)
+
+    return (arr,) + tuple(grids)
+
+
+def deposit(
+    positions,
+    extent,
+    Nbins,
+    weights=None,
+    kernel="ngp",
+    periodic=False,
+    chunk_size=2 ** 20,
+    n_proc=1,
+):
+    """Deposits particle weights onto a regular grid of cells.
+    Cell indices are computed arithmetically from the positions and summed
+    with np.bincount over chunks of particles, so memory stays bounded.
+
+    Args:
+        - positions:    list of arrays [xp, yp(, zp)], or array of shape (ndim, npar)
+        - extent:       [[xmin, xmax], ...] outer edges of the grid in each direction
+        - Nbins:        number of cells in each direction
+        - weights:      array of shape (npar,) or (nq, npar) with the quantities
+                        to deposit, None to count particles
+        - kernel:       assignment scheme as in the Fortran particle modules:
+                        'ngp' nearest grid point, 'cic' cloud in cell,
+                        'tsc' triangular shaped cloud
+        - periodic:     True, False or one bool per direction. Periodic directions
+                        wrap the kernels around the extent, otherwise contributions
+                        outside of the grid are added to the boundary cells.
+        - chunk_size:   number of particles deposited at once
+        - n_proc:       number of processes depositing chunks of the particles
+
+    Returns:
+        - arr:          array of shape Nbins, or (nq,) + Nbins for 2d weights,
+                        with the deposited weights summed per cell
+
+    Example:
+        rhop = deposit([pvar.xp, pvar.yp, pvar.zp], extent, [64, 64, 64], kernel='tsc')
+    """
+
+    import numpy as np
+
+    positions = np.array([np.ravel(pos) for pos in positions], dtype=float)
+    ndim, npar = positions.shape
+    Nbins = tuple(int(n) for n in Nbins[:ndim])
+    extent = np.array(extent, dtype=float)[:ndim]
+    kernel = kernel.lower()
+    if kernel not in ["ngp", "cic", "tsc"]:
+        raise ValueError("kernel must be 'ngp', 'cic' or 'tsc'.")
+    if np.isscalar(periodic):
+        periodic = [periodic] * ndim
+    mode = tuple("wrap" if peri else "clip" for peri in periodic[:ndim])
+    if weights is None:
+        single = True
+        weights = np.ones((1, npar))
     else:
-        arr = np.zeros((3, Nbins[0], Nbins[1], Nbins[2]))
-
-    arr[:] = np.NAN
-    xgrid = (
-        np.linspace(extent[0][0], extent[0][1], num=Nbins[0] + 1)[:-1]
-        + np.linspace(extent[0][0], extent[0][1], num=Nbins[0] + 1)[1:]
-    ) / 2
-    ygrid = (
-        np.linspace(extent[1][0], extent[1][1], num=Nbins[1] + 1)[:-1]
-        + np.linspace(extent[1][0], extent[1][1], num=Nbins[1] + 1)[1:]
-    ) / 2
-    if type(zp) == type(False) and zp == False:
-        for x, y, q in zip(xp, yp, quantity):
-            idx = np.argmin(np.abs(x - xgrid))
-            idy = np.argmin(np.abs(y - ygrid))
-            if np.isnan(arr[0, idx, idy]):
-                arr[0, idx, idy] = 0
-                arr[1, idx, idy] = 0
-            arr[0, idx, idy] += q
-            arr[1, idx, idy] += 1
+        weights = np.asarray(weights, dtype=float)
+        single = weights.ndim == 1
+        weights = weights.reshape(-1, npar)
+    lower = extent[:, 0]
+    delta = (extent[:, 1] - extent[:, 0]) / np.array(Nbins)
+    chunk_size = max(1, int(chunk_size))
+
+    if n_proc > 1 and npar > chunk_size:
+        import multiprocessing as mp
+        from pencil.util import SharedArray, run_processes
 
+        # The workers take chunks of particles and add them to the one
+        # shared grid, one at a time.
+        shared = {}
+        try:
+            shared["positions"] = SharedArray(positions.shape)
+            shared["positions"].array[...] = positions
+            shared["weights"] = SharedArray(weights.shape)
+            shared["weights"].array[...] = weights
+            shared["arr"] = SharedArray((weights.shape[0], np.prod(Nbins)), fill=0)
+            run_processes(
+                _deposit_worker,
+                (
+                    shared,
+                    mp.Value("l", 0),
+                    mp.Lock(),
+                    lower,
+                    delta,
+                    Nbins,
+                    kernel,
+                    mode,
+                    chunk_size,
+                ),
+                n_proc,
+            )
+            arr = shared["arr"].array.copy()
+        finally:
+            for shared_array in shared.values():
+                shared_array.unlink()
     else:
-        zgrid = (
-            np.linspace(extent[2][0], extent[2][1], num=Nbins[2] + 1)[:-1]
-            + np.linspace(extent[2][0], extent[2][1], num=Nbins[2] + 1)[1:]
-        ) / 2
-        for x, y, z, q in zip(xp, yp, zp, quantity):
-            idx = np.argmin(np.abs(x - xgrid))
-            idy = np.argmin(np.abs(y - ygrid))
-            idz = np.argmin(np.abs(z - zgrid))
-            if np.isnan(arr[0, idx, idy, idz]):
-                arr[0, idx, idy, idz] = 0
-                arr[1, idx, idy, idz] = 0
-            arr[0, idx, idy, idz] += q
-            arr[1, idx, idy, idz] += 1
-
-    arr = arr[0] / arr[1]
+        arr = np.zeros((weights.shape[0], np.prod(Nbins)))
+        for start in range(0, npar, chunk_size):
+            arr += _deposit_chunk(
+                positions[:, start : start + chunk_size],
+                weights[:, start : start + chunk_size],
+                lower,
+                delta,
+                Nbins,
+                kernel,
+                mode,
+            )
+
+    arr = arr.reshape((weights.shape[0],) + Nbins)
+    if single:
+        return arr[0]
+    return arr
+
+
+def grid_to_part(
+    field,
+    xp,
+    yp,
+    zp,
+    x,
+    y,
+    z,
+    kernel="tsc",
+    periodic=False,
+    chunk_size=2 ** 20,
+):
+    """Gathers a field at the particle positions with the NGP, CIC or TSC
+    scheme, the inverse of deposit. Grid indices are computed arithmetically,
+    all particles of a chunk are treated at once.
+
+    Args:
+        - field:        array of shape (..., nz, ny, nx) on the grid x, y, z,
+                        e.g. var.uu with ghost zones
+        - xp, yp, zp:   arrays of particle positions
+        - x, y, z:      equidistant grid coordinates of the field. Directions
+                        with a single point are ignored.
+        - kernel:       'ngp', 'cic' or 'tsc' as in the Fortran particle modules
+        - periodic:     True, False or one bool per direction (x, y, z). Periodic
+                        directions wrap the stencil around, otherwise it is
+                        clipped to the boundary points.
+        - chunk_size:   number of particles gathered at once
+
+    Returns:
+        - arr:          array of shape (..., npar) with the field at the particles
+
+    Example:
+        ux, uy, uz = grid_to_part(var.uu, pvar.xp, pvar.yp, pvar.zp,
+                                  var.x, var.y, var.z, kernel='cic')
+    """
+
+    import numpy as np
+
+    field = np.asarray(field)
+    kernel = kernel.lower()
+    if kernel not in ["ngp", "cic", "tsc"]:
+        raise ValueError("kernel must be 'ngp', 'cic' or 'tsc'.")
+    if np.isscalar(periodic):
+        periodic = [periodic] * 3
+
+    # Work in the (z, y, x) order of the field.
+    coords = [np.atleast_1d(z), np.atleast_1d(y), np.atleast_1d(x)]
+    positions = np.array([np.ravel(zp), np.ravel(yp), np.ravel(xp)], dtype=float)
+    shape = field.shape[-3:]
+    if tuple(len(c) for c in coords) != shape:
+        raise ValueError("Shape of field does not match the grid x, y, z!")
+    lower = np.array([c[0] for c in coords], dtype=float)
+    delta = np.array([c[1] - c[0] if len(c) > 1 else 1.0 for c in coords])
+    mode = tuple("wrap" if peri else "clip" for peri in periodic[::-1])
+    flat = field.reshape(field.shape[:-3] + (-1,))
+    chunk_size = max(1, int(chunk_size))
+
+    npar = positions.shape[1]
+    arr = np.zeros(field.shape[:-3] + (npar,))
+    for start in range(0, npar, chunk_size):
+        chunk = slice(start, start + chunk_size)
+        s = (positions[:, chunk] - lower[:, np.newaxis]) / delta[:, np.newaxis]
+        # Single grid points take the full weight.
+        s[np.array(shape) == 1] = 0
+        for index, w in _stencil_points(s, kernel, shape, mode):
+            arr[..., chunk] += w * flat[..., index]
+    return arr
 
-    if fill_gaps == True:
-        arr = fill_gaps_in_grid(arr, key=np.NAN)
 
-    if type(zp) == type(False) and zp == False:
-        return arr, xgrid, ygrid
+def _deposit_worker(
+    shared, next_start, lock, lower, delta, Nbins, kernel, mode, chunk_size
+):
+    """
+    Worker for deposit, which deposits chunks of particles until all are
+    done and adds them to the shared grid.
+    """
+
+    positions = shared["positions"].array
+    weights = shared["weights"].array
+    npar = positions.shape[1]
+    while True:
+        with next_start.get_lock():
+            start = next_start.value
+            next_start.value += chunk_size
+        if start >= npar:
+            break
+        arr = _deposit_chunk(
+            positions[:, start : start + chunk_size],
+            weights[:, start : start + chunk_size],
+            lower,
+            delta,
+            Nbins,
+            kernel,
+            mode,
+        )
+        with lock:
+            shared["arr"].array += arr
+
+
+def _deposit_chunk(positions, weights, lower, delta, Nbins, kernel, mode):
+    """
+    Deposit one chunk of particles and return the flattened grids.
+    """
+
+    import numpy as np
+
+    # Position in units of the cell size with the cell centers at integers.
+    s = (positions - lower[:, np.newaxis]) / delta[:, np.newaxis] - 0.5
+
+    # Flattened cell index and weight of every particle for every stencil point.
+    index = []
+    stencil_weights = []
+    for point_index, point_weights in _stencil_points(s, kernel, Nbins, mode):
+        index.append(point_index)
+        stencil_weights.append(point_weights)
+    n_points = len(index)
+    index = np.concatenate(index)
+    stencil_weights = np.concatenate(stencil_weights)
+
+    ncells = int(np.prod(Nbins))
+    arr = np.zeros((weights.shape[0], ncells))
+    for iq in range(weights.shape[0]):
+        arr[iq] = np.bincount(
+            index,
+            weights=stencil_weights * np.tile(weights[iq], n_points),
+            minlength=ncells,
+        )
+    return arr
+
+
+def _stencil_points(s, kernel, shape, mode):
+    """
+    Yield the flattened grid index and the weight of every point of the
+    NGP, CIC or TSC stencil for the positions s of shape (ndim, npar),
+    in units of the grid spacing with the grid points at integers.
+    """
+
+    import itertools
+    import numpy as np
+
+    if kernel == "ngp":
+        i0 = np.floor(s + 0.5)
+        offsets = [0]
+        kernel_weights = [np.ones_like(s)]
+    elif kernel == "cic":
+        i0 = np.floor(s)
+        d = s - i0
+        offsets = [0, 1]
+        kernel_weights = [1 - d, d]
     else:
-        return arr, xgrid, ygrid, zgrid
+        i0 = np.floor(s + 0.5)
+        d = s - i0
+        offsets = [-1, 0, 1]
+        kernel_weights = [0.5 * (0.5 - d) ** 2, 0.75 - d ** 2, 0.5 * (0.5 + d) ** 2]
+    i0 = i0.astype(np.intp)
+
+    ndim = s.shape[0]
+    for point in itertools.product(range(len(offsets)), repeat=ndim):
+        index = np.ravel_multi_index(
+            [i0[i] + offsets[point[i]] for i in range(ndim)], shape, mode=mode
+        )
+        w = kernel_weights[point[0]][0]
+        for i in range(1, ndim):
+            w = w * kernel_weights[point[i]][i]
+        yield index, w
@@ -267,3 +267,257 @@ class Stream(object):
                 field_z.ev(xx[2], xx[1], xx[0]),
             ]
         )[:, 0]
+
+
+class Streams(object):
+    """
+    Contains the methods and results for the streamline tracing of many seeds
+    at once for a field on a grid.
+    """
+
+    def __init__(
+        self,
+        field,
+        params,
+        xx=((0, 0, 0),),
+        time=(0, 1),
+        metric=None,
+        splines=None,
+        method=None,
+    ):
+        """
+        Trace a field starting from all the points xx in lockstep in any
+        rectilinear coordinate system with constant dx, dy and dz and with
+        a given metric. The field is interpolated at all active points in
+        each stage, so there is no Python call per seed and step.
+
+        call signature:
+
+          Streams(field, params, xx=[[0, 0, 0]], time=[0, 1], metric=None,
+                  splines=None, method=None):
+
+        Keyword arguments:
+
+        *field*:
+          Vector field which is integrated over with shape [n_vars, nz, ny, nx].
+          Its elements are the components of the field using unnormed
+          unit-coordinate vectors.
+
+        *params*:
+          Simulation and tracer parameters.
+
+        *xx*:
+          Starting points of the field line integration with shape [n_seeds, 3].
+
+        *time*:
+            Time array for which the tracers are computed, either common to
+            all seeds or with shape [n_seeds, n_times].
+
+        *metric*:
+            Metric function that takes a point [x, y, z] and an array
+            of shape [3, 3] that has the comkponents g_ij.
+            Use 'None' for Cartesian metric.
+
+        *splines*:
+            Spline interpolation functions for the three vector components
+            to use instead of params.interpolation.
+
+        *method*:
+            'RK4' for one classical Runge-Kutta step per time interval or
+            'RK45' for adaptive Dormand-Prince steps of each seed within
+            params.rtol and params.atol. By default 'RK4' if params.method
+            is 'RK4' and 'RK45' otherwise.
+        """
+
+        import numpy as np
+        from pencil.math.interpolation import vec_int_batch
+
+        if method is None:
+            method = "RK4" if params.method == "RK4" else "RK45"
+        if method not in ("RK4", "RK45"):
+            raise ValueError("Unknown method '{0}'.".format(method))
+
+        dxyz = np.array([params.dx, params.dy, params.dz])
+        oxyz = np.array([params.Ox, params.Oy, params.Oz])
+        nxyz = np.array([params.nx, params.ny, params.nz])
+        lxyz = np.array([params.Lx, params.Ly, params.Lz])
+        periodic = np.array([params.periodic_x, params.periodic_y, params.periodic_z])
+
+        def rhs(points):
+            if splines is not None:
+                # Like trilinear_func, vanish outside the box.
+                values = np.zeros_like(points)
+                inside = np.all((points >= oxyz) & (points <= oxyz + lxyz), axis=1)
+                p = points[inside]
+                values[inside] = np.stack(
+                    [np.ravel(s.ev(p[:, 2], p[:, 1], p[:, 0])) for s in splines], axis=1
+                )
+                return values
+            return vec_int_batch(
+                points,
+                field,
+                dxyz,
+                oxyz,
+                nxyz,
+                interpolation=params.interpolation,
+                periodic=periodic,
+            )
+
+        def outside(points):
+            return np.any(
+                ((points > oxyz + lxyz) | (points < oxyz)) & ~periodic, axis=1
+            )
+
+        xx = np.atleast_2d(np.asarray(xx, dtype=float))
+        n_seeds = xx.shape[0]
+        time = np.asarray(time, dtype=float)
+        time = np.broadcast_to(time, (n_seeds, time.shape[-1]))
+        n_times = time.shape[1]
+
+        # Advance the seeds that are still inside the domain.
+        self.tracers = np.full([n_seeds, n_times, 3], np.nan)
+        self.tracers[:, 0, :] = xx
+        active = np.ones(n_seeds, dtype=bool)
+        h_step = time[:, -1] - time[:, 0]
+        for it in range(1, n_times):
+            idx = np.flatnonzero(active)
+            if idx.size == 0:
+                break
+            y = self.tracers[idx, it - 1, :]
+            dt = (time[idx, it] - time[idx, it - 1])[:, np.newaxis]
+            if method == "RK4":
+                k1 = rhs(y)
+                k2 = rhs(y + dt / 2 * k1)
+                k3 = rhs(y + dt / 2 * k2)
+                k4 = rhs(y + dt * k3)
+                y = y + dt / 6 * (k1 + 2 * k2 + 2 * k3 + k4)
+            else:
+                y, h_step[idx] = self.__dormand_prince(
+                    rhs, y, dt[:, 0], h_step[idx], params.rtol, params.atol
+                )
+            self.tracers[idx, it, :] = y
+            active[idx] = ~outside(y)
+
+        # Remove points that lie outside the domain and interpolation on the boundary.
+        self.n_points = np.full(n_seeds, n_times)
+        cut_mask = np.zeros([n_seeds, n_times], dtype=bool)
+        cut_mask[:, 1:] = outside(self.tracers[:, 1:, :].reshape(-1, 3)).reshape(
+            n_seeds, n_times - 1
+        )
+        cut = np.flatnonzero(cut_mask.any(axis=1))
+        if cut.size > 0:
+            # Find the first point that lies outside.
+            idx_outside = np.argmax(cut_mask[cut], axis=1)
+            p0 = self.tracers[cut, idx_outside - 1, :]
+            p1 = self.tracers[cut, idx_outside, :]
+            with np.errstate(divide="ignore", invalid="ignore"):
+                lam = np.concatenate(
+                    [
+                        ((oxyz + lxyz) - p0) / (p1 - p0),
+                        (oxyz - p0) / (p1 - p0),
+                    ],
+                    axis=1,
+                )
+            lam[np.tile(p0 == p1, 2)] = np.inf
+            lam[lam < 0] = np.inf
+            lam_min = np.min(lam, axis=1)
+            lam_min[np.isinf(lam_min)] = 0
+            self.tracers[cut, idx_outside, :] = p0 + lam_min[:, np.newaxis] * (p1 - p0)
+            self.n_points[cut] = idx_outside + 1
+            # Remove outside points.
+            self.tracers[np.arange(n_times) >= self.n_points[:, np.newaxis]] = np.nan
+
+        self.params = params
+        self.xx = xx
+        self.time = time
+
+        # Compute the length of the line segments.
+        diff_vectors = np.nan_to_num(self.tracers[:, 1:, :] - self.tracers[:, :-1, :])
+        if metric is None:
+            self.section_l = np.sqrt(np.sum(diff_vectors ** 2, axis=2))
+        else:
+            middle_points = (self.tracers[:, 1:, :] + self.tracers[:, :-1, :]) / 2
+            valid = np.isfinite(middle_points[..., 0])
+            g = np.array([metric(point) for point in middle_points[valid]])
+            self.section_l = np.zeros(diff_vectors.shape[:2])
+            self.section_l[valid] = np.sqrt(
+                np.einsum(
+                    "ni,nij,nj->n", diff_vectors[valid], g, diff_vectors[valid]
+                )
+            )
+        self.total_l = np.sum(self.section_l, axis=1)
+
+        self.iterations = n_times
+        self.section_dh = time[:, 1:] - time[:, :-1]
+        self.total_h = time[:, -1] - time[:, 0]
+
+    def line(self, i):
+        """
+        Return the traced points of seed i inside the domain, like the
+        tracers of Stream.
+
+        call signature:
+
+        line(i)
+        """
+
+        return self.tracers[i, : self.n_points[i], :]
+
+    def __dormand_prince(self, rhs, y, dt, h, rtol, atol):
+        """
+        Advance the points y by the intervals dt with adaptive embedded
+        Runge-Kutta 5(4) steps, starting from the step sizes h.
+        Return the new points and the step sizes to start the next interval.
+        """
+
+        import numpy as np
+
+        a = [
+            [],
+            [1 / 5],
+            [3 / 40, 9 / 40],
+            [44 / 45, -56 / 15, 32 / 9],
+            [19372 / 6561, -25360 / 2187, 64448 / 6561, -212 / 729],
+            [9017 / 3168, -355 / 33, 46732 / 5247, 49 / 176, -5103 / 18656],
+            [35 / 384, 0, 500 / 1113, 125 / 192, -2187 / 6784, 11 / 84],
+        ]
+        # Difference of the 5th and 4th order weights.
+        e = np.array(
+            [
+                71 / 57600,
+                0,
+                -71 / 16695,
+                71 / 1920,
+                -17253 / 339200,
+                22 / 525,
+                -1 / 40,
+            ]
+        )
+
+        y = y.copy()
+        remaining = dt.copy()
+        h = np.where((h != 0) & np.isfinite(h), np.abs(h), np.abs(dt)) * np.sign(dt)
+        todo = np.flatnonzero(np.abs(remaining) > 1e-12 * np.abs(dt))
+        while todo.size > 0:
+            step = np.where(
+                np.abs(h[todo]) < np.abs(remaining[todo]), h[todo], remaining[todo]
+            )[:, np.newaxis]
+            y0 = y[todo]
+            k = [rhs(y0)]
+            for stage in range(1, 7):
+                k.append(
+                    rhs(y0 + step * sum(c * kk for c, kk in zip(a[stage], k) if c != 0))
+                )
+            y1 = y0 + step * sum(c * kk for c, kk in zip(a[6], k) if c != 0)
+            error = step * sum(c * kk for c, kk in zip(e, k) if c != 0)
+            scale = atol + rtol * np.maximum(np.abs(y0), np.abs(y1))
+            error = np.sqrt(np.mean((error / scale) ** 2, axis=1))
+            accept = ~(error > 1)
+            y[todo[accept]] = y1[accept]
+            remaining[todo[accept]] -= step[accept, 0]
+            # Step size control, growing at most fivefold.
+            with np.errstate(divide="ignore"):
+                factor = np.clip(0.9 * error ** -0.2, 0.2, 5)
+            h[todo] = step[:, 0] * factor
+            todo = todo[np.abs(remaining[todo]) > 1e-12 * np.abs(dt[todo])]
+        return y, h
@@ -73,8 +73,8 @@ class FixedPoint(object):
         from pencil import read
         from pencil import math
         from pencil.diag.tracers import Tracers
-        from pencil.calc.streamlines import Stream
-        from pencil.math.interpolation import vec_int
+        from pencil.math.interpolation import vec_int_batch
+        from pencil.util import SharedArray, run_processes
 
         if self.params.int_q == "curly_A":
             self.curly_A = []
@@ -85,7 +85,6 @@ class FixedPoint(object):
         if not (np.isscalar(self.params.n_proc)) or (self.params.n_proc % 1 != 0):
             print("Error: invalid processor number")
             return -1
-        queue = mp.Queue()
 
         # Make sure to read the var files with the correct magic.
         magic = []
@@ -183,41 +182,53 @@ class FixedPoint(object):
                 field = getattr(var, trace_field)
                 self.t[tidx] = var.t
 
-            proc = []
-            sub_data = []
-            fixed = []
-            fixed_sign = []
-            fixed_tracers = []
-            for i_proc in range(self.params.n_proc):
-                proc.append(
-                    mp.Process(
-                        target=self.__sub_fixed,
-                        args=(queue, ix0, iy0, field, self.tracers, tidx, var, i_proc),
-                    )
+            # Share the field, the tracer mapping and the results per grid cell
+            # with the workers without copies.
+            n_cells = (len(ix0), len(iy0))
+            shared = {}
+            try:
+                shared["field"] = SharedArray(field.shape)
+                shared["field"].array[...] = field
+                shared["maps"] = SharedArray((4,) + self.tracers.x0.shape[:2])
+                for i_map, name in enumerate(["x0", "y0", "x1", "y1"]):
+                    shared["maps"].array[i_map] = getattr(self.tracers, name)[
+                        :, :, tidx
+                    ]
+                shared["poincare"] = SharedArray(self.poincare.shape[:2], fill=0)
+                shared["fixed"] = SharedArray(n_cells + (2,), fill=np.nan)
+                shared["sign"] = SharedArray(n_cells, fill=0)
+
+                # The workers take chunks of rows of cells until all are done.
+                next_row = mp.Value("i", 0)
+                chunk = max(1, n_cells[0] // (4 * self.params.n_proc))
+                run_processes(
+                    _sub_fixed,
+                    (self.params, shared, next_row, chunk),
+                    self.params.n_proc,
                 )
-            for i_proc in range(self.params.n_proc):
-                proc[i_proc].start()
-            for i_proc in range(self.params.n_proc):
-                sub_data.append(queue.get())
-            for i_proc in range(self.params.n_proc):
-                proc[i_proc].join()
-            for i_proc in range(self.params.n_proc):
-                # Extract the data from the single cores. Mind the order.
-                sub_proc = sub_data[i_proc][0]
-                fixed.extend(sub_data[i_proc][1])
-                fixed_tracers.extend(sub_data[i_proc][2])
-                fixed_sign.extend(sub_data[i_proc][3])
-                self.fixed_index[tidx] += sub_data[i_proc][4]
-                self.poincare[sub_proc :: self.params.n_proc, :, tidx] = sub_data[
-                    i_proc
-                ][5]
-            for i_proc in range(self.params.n_proc):
-                proc[i_proc].terminate()
+
+                self.poincare[:, :, tidx] = shared["poincare"].array
+                found = shared["sign"].array != 0
+                fixed = shared["fixed"].array[found]
+                fixed_sign = shared["sign"].array[found]
+            finally:
+                for shared_array in shared.values():
+                    shared_array.unlink()
+            self.fixed_index[tidx] = np.sum(fixed_sign)
 
             # Discard fixed points which lie too close to each other.
-            fixed, fixed_tracers, fixed_sign = self.__discard_close_fixed_points(
-                np.array(fixed), np.array(fixed_sign), np.array(fixed_tracers), var
+            fixed, fixed_sign = self.__discard_close_fixed_points(
+                fixed, fixed_sign, var
             )
+
+            # Find the streamlines at the fixed points.
+            fixed_tracers = []
+            if len(fixed) > 0:
+                xx = np.zeros([len(fixed), 3])
+                xx[:, :2] = fixed
+                xx[:, 2] = self.params.Oz
+                streams = _trace(self.params, field, xx)
+                fixed_tracers = [streams.line(i) for i in range(len(fixed))]
             if self.fixed_points is None:
                 self.fixed_points = []
                 self.fixed_sign = []
@@ -233,380 +244,42 @@ class FixedPoint(object):
                     self.curly_A.append([])
                 if self.params.int_q == "ee":
                     self.ee.append([])
-                for fixed in self.fixed_points[t_idx]:
-                    # Trace the stream line.
-                    xx = np.array([fixed[0], fixed[1], self.params.Oz])
-                    #                    time = np.linspace(0, self.params.Lz/np.max(abs(field[2])), 10)
-                    field_strength_z0 = vec_int(
-                        xx,
-                        field,
-                        [var.dx, var.dy, var.dz],
-                        [var.x[0], var.y[0], var.z[0]],
-                        [len(var.x), len(var.y), len(var.z)],
-                        interpolation=self.params.interpolation,
-                    )
-                    field_strength_z0 = np.sqrt(np.sum(field_strength_z0 ** 2))
-                    time = np.linspace(0, 4 * self.params.Lz / field_strength_z0, 500)
-                    stream = Stream(field, self.params, xx=xx, time=time)
-                    # Do the field line integration.
-                    if self.params.int_q == "curly_A":
-                        curly_A = 0
-                        for l in range(stream.iterations - 1):
-                            aaInt = vec_int(
-                                (stream.tracers[l + 1] + stream.tracers[l]) / 2,
-                                var.aa,
-                                [var.dx, var.dy, var.dz],
-                                [var.x[0], var.y[0], var.z[0]],
-                                [len(var.x), len(var.y), len(var.z)],
-                                interpolation=self.params.interpolation,
-                            )
-                            curly_A += np.dot(
-                                aaInt, (stream.tracers[l + 1] - stream.tracers[l])
-                            )
-                        self.curly_A[-1].append(curly_A)
-                    if self.params.int_q == "ee":
-                        ee_p = 0
-                        for l in range(stream.iterations - 1):
-                            eeInt = vec_int(
-                                (stream.tracers[l + 1] + stream.tracers[l]) / 2,
-                                ee,
-                                [var.dx, var.dy, var.dz],
-                                [var.x[0], var.y[0], var.z[0]],
-                                [len(var.x), len(var.y), len(var.z)],
-                                interpolation=self.params.interpolation,
-                            )
-                            ee_p += np.dot(
-                                eeInt, (stream.tracers[l + 1] - stream.tracers[l])
-                            )
-                        self.ee[-1].append(ee_p)
+                if len(self.fixed_points[t_idx]) == 0:
+                    continue
+                # Trace the stream lines.
+                xx = np.zeros([len(self.fixed_points[t_idx]), 3])
+                xx[:, :2] = np.array(self.fixed_points[t_idx])[:, :2]
+                xx[:, 2] = self.params.Oz
+                streams = _trace(self.params, field, xx)
+                # Do the field line integration.
+                middle_points = (streams.tracers[:, 1:] + streams.tracers[:, :-1]) / 2
+                diff_vectors = np.nan_to_num(
+                    streams.tracers[:, 1:] - streams.tracers[:, :-1]
+                )
+                valid = np.isfinite(middle_points[..., 0])
                 if self.params.int_q == "curly_A":
-                    self.curly_A[-1] = np.array(self.curly_A[-1])
+                    q_field = var.aa
                 if self.params.int_q == "ee":
-                    self.ee[-1] = np.array(self.ee[-1])
-
-        return 0
-
-    # Return the fixed points for a subset of the domain.
-    def __sub_fixed(self, queue, ix0, iy0, field, tracers, tidx, var, i_proc):
-        import numpy as np
-        from pencil.calc.streamlines import Stream
-        from pencil.math.interpolation import vec_int
-
-        diff = np.zeros((4, 2))
-        fixed = []
-        fixed_sign = []
-        fixed_tracers = []
-        fixed_index = 0
-        poincare_array = np.zeros(
-            (tracers.x0[i_proc :: self.params.n_proc].shape[0], tracers.x0.shape[1])
-        )
-
-        for ix in ix0[i_proc :: self.params.n_proc]:
-            for iy in iy0:
-                # Compute Poincare index around this cell (!= 0 for potential fixed point).
-                diff[0, :] = np.array(
-                    [
-                        tracers.x1[ix, iy, tidx] - tracers.x0[ix, iy, tidx],
-                        tracers.y1[ix, iy, tidx] - tracers.y0[ix, iy, tidx],
-                    ]
-                )
-                diff[1, :] = np.array(
-                    [
-                        tracers.x1[ix + 1, iy, tidx] - tracers.x0[ix + 1, iy, tidx],
-                        tracers.y1[ix + 1, iy, tidx] - tracers.y0[ix + 1, iy, tidx],
-                    ]
-                )
-                diff[2, :] = np.array(
-                    [
-                        tracers.x1[ix + 1, iy + 1, tidx]
-                        - tracers.x0[ix + 1, iy + 1, tidx],
-                        tracers.y1[ix + 1, iy + 1, tidx]
-                        - tracers.y0[ix + 1, iy + 1, tidx],
-                    ]
-                )
-                diff[3, :] = np.array(
-                    [
-                        tracers.x1[ix, iy + 1, tidx] - tracers.x0[ix, iy + 1, tidx],
-                        tracers.y1[ix, iy + 1, tidx] - tracers.y0[ix, iy + 1, tidx],
-                    ]
-                )
-                if sum(np.sum(diff ** 2, axis=1) != 0):
-                    diff = np.swapaxes(
-                        np.swapaxes(diff, 0, 1) / np.sqrt(np.sum(diff ** 2, axis=1)),
-                        0,
-                        1,
-                    )
-                poincare = self.__poincare_index(
-                    field,
-                    tracers.x0[ix : ix + 2, iy, tidx],
-                    tracers.y0[ix, iy : iy + 2, tidx],
-                    diff,
-                )
-                poincare_array[ix // self.params.n_proc, iy] = poincare
-
-                if (
-                    abs(poincare) > 5
-                ):  # Use 5 instead of 2*pi to account for rounding errors.
-                    # Subsample to get starting point for iteration.
-                    nt = 2
-                    xmin = tracers.x0[ix, iy, tidx]
-                    ymin = tracers.y0[ix, iy, tidx]
-                    xmax = tracers.x0[ix + 1, iy, tidx]
-                    ymax = tracers.y0[ix, iy + 1, tidx]
-                    xx = np.zeros((nt ** 2, 3))
-                    tracers_part = np.zeros((nt ** 2, 5))
-                    i1 = 0
-                    for j1 in range(nt):
-                        for k1 in range(nt):
-                            xx[i1, 0] = xmin + j1 / (nt - 1.0) * (xmax - xmin)
-                            xx[i1, 1] = ymin + k1 / (nt - 1.0) * (ymax - ymin)
-                            xx[i1, 2] = self.params.Oz
-                            i1 += 1
-                    for it1 in range(nt ** 2):
-                        #                        time = np.linspace(0, self.params.Lz/np.max(abs(field[2])), 10)
-                        field_strength_z0 = vec_int(
-                            xx[it1, :],
-                            field,
-                            [var.dx, var.dy, var.dz],
-                            [var.x[0], var.y[0], var.z[0]],
-                            [len(var.x), len(var.y), len(var.z)],
-                            interpolation=self.params.interpolation,
-                        )
-                        field_strength_z0 = np.sqrt(np.sum(field_strength_z0 ** 2))
-                        time = np.linspace(
-                            0, 4 * self.params.Lz / field_strength_z0, 500
-                        )
-                        stream = Stream(field, self.params, xx=xx[it1, :], time=time)
-                        tracers_part[it1, 0:2] = xx[it1, 0:2]
-                        tracers_part[it1, 2:] = stream.tracers[-1, :]
-                    min2 = 1e6
-                    minx = xmin
-                    miny = ymin
-                    i1 = 0
-                    for j1 in range(nt):
-                        for k1 in range(nt):
-                            diff2 = (
-                                tracers_part[i1 + k1 * nt, 2]
-                                - tracers_part[i1 + k1 * nt, 0]
-                            ) ** 2 + (
-                                tracers_part[i1 + k1 * nt, 3]
-                                - tracers_part[i1 + k1 * nt, 1]
-                            ) ** 2
-                            if diff2 < min2:
-                                min2 = diff2
-                                minx = xmin + j1 / (nt - 1.0) * (xmax - xmin)
-                                miny = ymin + k1 / (nt - 1.0) * (ymax - ymin)
-
-                    # Get fixed point from this starting position using Newton's method.
-                    point = np.array([minx, miny])
-                    fixed_point = self.__null_point(point, var, field)
-
-                    # Check if fixed point lies outside the cell.
-                    if (
-                        (fixed_point[0] < tracers.x0[ix, iy, tidx])
-                        or (fixed_point[0] > tracers.x0[ix + 1, iy, tidx])
-                        or (fixed_point[1] < tracers.y0[ix, iy, tidx])
-                        or (fixed_point[1] > tracers.y0[ix, iy + 1, tidx])
-                    ):
-                        fixed_point[0] = minx
-                        fixed_point[1] = miny
-                    #                    else:
-                    fixed.append(fixed_point)
-                    fixed_sign.append(np.sign(poincare))
-                    fixed_index += np.sign(poincare)
-
-                    # Find the streamline at the fixed point.
-                    #                    time = np.linspace(0, self.params.Lz/np.max(abs(field[2])), 100)
-                    field_strength_z0 = vec_int(
-                        np.array([fixed_point[0], fixed_point[1], self.params.Oz]),
-                        field,
-                        [var.dx, var.dy, var.dz],
-                        [var.x[0], var.y[0], var.z[0]],
-                        [len(var.x), len(var.y), len(var.z)],
-                        interpolation=self.params.interpolation,
-                    )
-                    field_strength_z0 = np.sqrt(np.sum(field_strength_z0 ** 2))
-                    time = np.linspace(0, 4 * self.params.Lz / field_strength_z0, 500)
-                    stream = Stream(
-                        field,
-                        self.params,
-                        xx=np.array([fixed_point[0], fixed_point[1], self.params.Oz]),
-                        time=time,
-                    )
-                    fixed_tracers.append(stream.tracers)
-
-        queue.put(
-            (i_proc, fixed, fixed_tracers, fixed_sign, fixed_index, poincare_array)
-        )
-
-    # Find the Poincare index of this grid cell.
-    def __poincare_index(self, field, sx, sy, diff):
-        poincare = 0
-        poincare += self.__edge(
-            field, [sx[0], sx[1]], [sy[0], sy[0]], diff[0, :], diff[1, :], 0
-        )
-        poincare += self.__edge(
-            field, [sx[1], sx[1]], [sy[0], sy[1]], diff[1, :], diff[2, :], 0
-        )
-        poincare += self.__edge(
-            field, [sx[1], sx[0]], [sy[1], sy[1]], diff[2, :], diff[3, :], 0
-        )
-        poincare += self.__edge(
-            field, [sx[0], sx[0]], [sy[1], sy[0]], diff[3, :], diff[0, :], 0
-        )
-        return poincare
-
-    # Compute rotation along one edge.
-    def __edge(self, field, sx, sy, diff1, diff2, rec):
-        import numpy as np
-        from pencil.calc.streamlines import Stream
-        from pencil.math.interpolation import vec_int
-
-        phi_min = np.pi / 8.0
-        dtot = np.arctan2(
-            diff1[0] * diff2[1] - diff2[0] * diff1[1],
-            diff1[0] * diff2[0] + diff1[1] * diff2[1],
-        )
-        if (abs(dtot) > phi_min) and (rec < 4):
-            xm = 0.5 * (sx[0] + sx[1])
-            ym = 0.5 * (sy[0] + sy[1])
-
-            # Trace the intermediate field line.
-            #            time = np.linspace(0, self.params.Lz/np.max(abs(field[2])), 100)
-            field_strength_z0 = vec_int(
-                np.array([xm, ym, self.params.Oz]),
-                field,
-                [self.params.dx, self.params.dy, self.params.dz],
-                [self.params.Ox, self.params.Oy, self.params.Oz],
-                [self.params.nx, self.params.ny, self.params.nz],
-                interpolation=self.params.interpolation,
-            )
-            field_strength_z0 = np.sqrt(np.sum(field_strength_z0 ** 2))
-            time = np.linspace(0, 4 * self.params.Lz / field_strength_z0, 500)
-            stream = Stream(
-                field, self.params, xx=np.array([xm, ym, self.params.Oz]), time=time
-            )
-            stream_x0 = stream.tracers[0, 0]
-            stream_y0 = stream.tracers[0, 1]
-            stream_x1 = stream.tracers[-1, 0]
-            stream_y1 = stream.tracers[-1, 1]
-
-            diffm = np.array([stream_x1 - stream_x0, stream_y1 - stream_y0])
-            if sum(diffm ** 2) != 0:
-                diffm = diffm / np.sqrt(sum(diffm ** 2))
-            dtot = self.__edge(
-                field, [sx[0], xm], [sy[0], ym], diff1, diffm, rec + 1
-            ) + self.__edge(field, [xm, sx[1]], [ym, sy[1]], diffm, diff2, rec + 1)
-        return dtot
-
-    # Finds the null point of the mapping, i.e. fixed point, using Newton's method.
-    def __null_point(self, point, var, field):
-        import numpy as np
-        from pencil.calc.streamlines import Stream
-        from pencil.math.interpolation import vec_int
-
-        dl = np.min([var.dx, var.dy]) / 30.0
-        it = 0
-        # Tracers used to find the fixed point.
-        tracers_null = np.zeros((5, 4))
-        while True:
-            # Trace field lines at original point and for Jacobian.
-            # (second order seems to be enough)
-            xx = np.zeros((5, 3))
-            xx[0, :] = np.array([point[0], point[1], self.params.Oz])
-            xx[1, :] = np.array([point[0] - dl, point[1], self.params.Oz])
-            xx[2, :] = np.array([point[0] + dl, point[1], self.params.Oz])
-            xx[3, :] = np.array([point[0], point[1] - dl, self.params.Oz])
-            xx[4, :] = np.array([point[0], point[1] + dl, self.params.Oz])
-            for it1 in range(5):
-                #                time = time = np.linspace(0, self.params.Lz/np.max(abs(field[2])), 10)
-                field_strength_z0 = vec_int(
-                    xx[it1, :],
-                    field,
+                    q_field = ee
+                q_int = np.zeros(diff_vectors.shape)
+                q_int[valid] = vec_int_batch(
+                    middle_points[valid],
+                    q_field,
                     [var.dx, var.dy, var.dz],
                     [var.x[0], var.y[0], var.z[0]],
                     [len(var.x), len(var.y), len(var.z)],
                     interpolation=self.params.interpolation,
                 )
-                field_strength_z0 = np.sqrt(np.sum(field_strength_z0 ** 2))
-                time = np.linspace(0, 4 * self.params.Lz / field_strength_z0, 500)
-                stream = Stream(field, self.params, xx=xx[it1, :], time=time)
-                tracers_null[it1, :2] = xx[it1, :2]
-                tracers_null[it1, 2:] = stream.tracers[-1, 0:2]
-
-            # Check function convergence.
-            ff = np.zeros(2)
-            ff[0] = tracers_null[0, 2] - tracers_null[0, 0]
-            ff[1] = tracers_null[0, 3] - tracers_null[0, 1]
-            if sum(abs(ff)) <= 1e-3 * np.min([self.params.dx, self.params.dy]):
-                fixed_point = np.array([point[0], point[1]])
-                break
-
-            # Compute the Jacobian.
-            fjac = np.zeros((2, 2))
-            fjac[0, 0] = (
-                (
-                    (tracers_null[2, 2] - tracers_null[2, 0])
-                    - (tracers_null[1, 2] - tracers_null[1, 0])
-                )
-                / 2.0
-                / dl
-            )
-            fjac[0, 1] = (
-                (
-                    (tracers_null[4, 2] - tracers_null[4, 0])
-                    - (tracers_null[3, 2] - tracers_null[3, 0])
-                )
-                / 2.0
-                / dl
-            )
-            fjac[1, 0] = (
-                (
-                    (tracers_null[2, 3] - tracers_null[2, 1])
-                    - (tracers_null[1, 3] - tracers_null[1, 1])
-                )
-                / 2.0
-                / dl
-            )
-            fjac[1, 1] = (
-                (
-                    (tracers_null[4, 3] - tracers_null[4, 1])
-                    - (tracers_null[3, 3] - tracers_null[3, 1])
-                )
-                / 2.0
-                / dl
-            )
+                if self.params.int_q == "curly_A":
+                    self.curly_A[-1].extend(np.sum(q_int * diff_vectors, axis=(1, 2)))
+                if self.params.int_q == "ee":
+                    self.ee[-1].extend(np.sum(q_int * diff_vectors, axis=(1, 2)))
+                if self.params.int_q == "curly_A":
+                    self.curly_A[-1] = np.array(self.curly_A[-1])
+                if self.params.int_q == "ee":
+                    self.ee[-1] = np.array(self.ee[-1])
 
-            # Invert the Jacobian.
-            fjin = np.zeros((2, 2))
-            det = fjac[0, 0] * fjac[1, 1] - fjac[0, 1] * fjac[1, 0]
-            if abs(det) < dl:
-                fixed_point = point
-                break
-            fjin[0, 0] = fjac[1, 1]
-            fjin[1, 1] = fjac[0, 0]
-            fjin[0, 1] = -fjac[0, 1]
-            fjin[1, 0] = -fjac[1, 0]
-            fjin = fjin / det
-            dpoint = np.zeros(2)
-            dpoint[0] = -fjin[0, 0] * ff[0] - fjin[0, 1] * ff[1]
-            dpoint[1] = -fjin[1, 0] * ff[0] - fjin[1, 1] * ff[1]
-            point += dpoint
-
-            # Check root convergence.
-            if sum(abs(dpoint)) < 1e-3 * np.min([self.params.dx, self.params.dy]):
-                fixed_point = point
-                print("Root finding converged.")
-                break
-
-            if it > 20:
-                fixed_point = point
-                print("Root finding did not converge.")
-                break
-
-            it += 1
-
-        return fixed_point
+        return 0
 
     # Find the fixed point using Newton's method, starting at previous fixed point.
     def __sub_fixed_series(self, queue, t_idx, field, var, i_proc):
@@ -615,7 +288,7 @@ class FixedPoint(object):
         for i, point in enumerate(
             self.fixed_points[t_idx - 1][i_proc :: self.params.n_proc]
         ):
-            fixed_tentative = self.__null_point(point, var, field)
+            fixed_tentative = _null_point(self.params, point, field)
             # Check if the fixed point lies outside the domain.
             if (
                 fixed_tentative[0] >= self.params.Ox
@@ -630,16 +303,14 @@ class FixedPoint(object):
         queue.put((i_proc, fixed, fixed_sign))
 
     # Discard fixed points which are too close to each other.
-    def __discard_close_fixed_points(self, fixed, fixed_sign, fixed_tracers, var):
+    def __discard_close_fixed_points(self, fixed, fixed_sign, var):
         import numpy as np
 
         fixed_new = []
         fixed_sign_new = []
-        fixed_tracers_new = []
         if len(fixed) > 0:
             fixed_new.append(fixed[0])
             fixed_sign_new.append(fixed_sign[0])
-            fixed_tracers_new.append(fixed_tracers[0])
 
             dx = fixed[:, 0] - np.reshape(fixed[:, 0], (fixed.shape[0], 1))
             dy = fixed[:, 1] - np.reshape(fixed[:, 1], (fixed.shape[0], 1))
@@ -649,13 +320,8 @@ class FixedPoint(object):
                 if all(mask[idx, :idx]):
                     fixed_new.append(fixed[idx])
                     fixed_sign_new.append(fixed_sign[idx])
-                    fixed_tracers_new.append(fixed_tracers[idx])
 
-        return (
-            np.array(fixed_new),
-            np.array(fixed_tracers_new),
-            np.array(fixed_sign_new),
-        )
+        return np.array(fixed_new), np.array(fixed_sign_new)
 
     def write(self, datadir="data", destination="fixed_points.hdf5"):
         """
@@ -836,3 +502,251 @@ class FixedPoint(object):
                 pass
             else:
                 print("Warning: no tracer file found.")
+
+
+def _sub_fixed(params, shared, next_row, chunk):
+    """
+    Worker for FixedPoint.find_fixed, which takes chunks of rows of grid cells
+    until all are done and writes the Poincare index and fixed point per cell into
+    the shared arrays.
+    """
+
+    while True:
+        with next_row.get_lock():
+            row = next_row.value
+            next_row.value += chunk
+        if row >= shared["fixed"].shape[0]:
+            break
+        rows = range(row, min(row + chunk, shared["fixed"].shape[0]))
+        _fixed_rows(params, shared, rows)
+
+
+# Find the Poincare index and fixed point for the cells in the rows ix0.
+def _fixed_rows(params, shared, ix0):
+    import numpy as np
+
+    field = shared["field"].array
+    x0, y0, x1, y1 = shared["maps"].array
+    poincare_array = shared["poincare"].array
+    fixed = shared["fixed"].array
+    fixed_sign = shared["sign"].array
+
+    diff = np.zeros((4, 2))
+    for ix in ix0:
+        for iy in range(fixed.shape[1]):
+            # Compute Poincare index around this cell (!= 0 for potential fixed point).
+            corners = ([ix, ix + 1, ix + 1, ix], [iy, iy, iy + 1, iy + 1])
+            diff[:, 0] = x1[corners] - x0[corners]
+            diff[:, 1] = y1[corners] - y0[corners]
+            norm = np.sqrt(np.sum(diff ** 2, axis=1))
+            if np.any(norm != 0):
+                diff = diff / norm[:, np.newaxis]
+            poincare = _poincare_index(
+                params, field, x0[ix : ix + 2, iy], y0[ix, iy : iy + 2], diff
+            )
+            poincare_array[ix, iy] = poincare
+
+            # Use 5 instead of 2*pi to account for rounding errors.
+            if abs(poincare) > 5:
+                # Subsample to get starting point for iteration.
+                nt = 2
+                xmin = x0[ix, iy]
+                ymin = y0[ix, iy]
+                xmax = x0[ix + 1, iy]
+                ymax = y0[ix, iy + 1]
+                sub_x, sub_y = np.meshgrid(
+                    np.linspace(xmin, xmax, nt),
+                    np.linspace(ymin, ymax, nt),
+                    indexing="ij",
+                )
+                xx = np.zeros((nt ** 2, 3))
+                xx[:, 0] = sub_x.ravel()
+                xx[:, 1] = sub_y.ravel()
+                xx[:, 2] = params.Oz
+                end_points = _end_points(_trace(params, field, xx))
+                diff2 = np.sum((end_points[:, :2] - xx[:, :2]) ** 2, axis=1)
+                minx, miny = xx[np.argmin(diff2), :2]
+
+                # Get fixed point from this starting position using Newton's method.
+                point = np.array([minx, miny])
+                fixed_point = _null_point(params, point, field)
+
+                # Check if fixed point lies outside the cell.
+                if (
+                    (fixed_point[0] < x0[ix, iy])
+                    or (fixed_point[0] > x0[ix + 1, iy])
+                    or (fixed_point[1] < y0[ix, iy])
+                    or (fixed_point[1] > y0[ix, iy + 1])
+                ):
+                    fixed_point[0] = minx
+                    fixed_point[1] = miny
+                fixed[ix, iy] = fixed_point
+                fixed_sign[ix, iy] = np.sign(poincare)
+
+
+# Trace the streamlines starting at the points xx all at once.
+def _trace(params, field, xx):
+    import numpy as np
+    from pencil.calc.streamlines import Streams
+    from pencil.math.interpolation import vec_int_batch
+
+    xx = np.atleast_2d(xx)
+    field_strength_z0 = vec_int_batch(
+        xx,
+        field,
+        [params.dx, params.dy, params.dz],
+        [params.Ox, params.Oy, params.Oz],
+        [params.nx, params.ny, params.nz],
+        interpolation=params.interpolation,
+    )
+    field_strength_z0 = np.sqrt(np.sum(field_strength_z0 ** 2, axis=1))
+    time = np.linspace(0, 4 * params.Lz / field_strength_z0, 500).T
+    return Streams(field, params, xx=xx, time=time)
+
+
+# Return the last points of the traced streamlines.
+def _end_points(streams):
+    import numpy as np
+
+    return streams.tracers[np.arange(streams.xx.shape[0]), streams.n_points - 1]
+
+
+# Find the Poincare index of this grid cell.
+def _poincare_index(params, field, sx, sy, diff):
+    poincare = 0
+    poincare += _edge(
+        params, field, [sx[0], sx[1]], [sy[0], sy[0]], diff[0, :], diff[1, :], 0
+    )
+    poincare += _edge(
+        params, field, [sx[1], sx[1]], [sy[0], sy[1]], diff[1, :], diff[2, :], 0
+    )
+    poincare += _edge(
+        params, field, [sx[1], sx[0]], [sy[1], sy[1]], diff[2, :], diff[3, :], 0
+    )
+    poincare += _edge(
+        params, field, [sx[0], sx[0]], [sy[1], sy[0]], diff[3, :], diff[0, :], 0
+    )
+    return poincare
+
+
+# Compute rotation along one edge.
+def _edge(params, field, sx, sy, diff1, diff2, rec):
+    import numpy as np
+
+    phi_min = np.pi / 8.0
+    dtot = np.arctan2(
+        diff1[0] * diff2[1] - diff2[0] * diff1[1],
+        diff1[0] * diff2[0] + diff1[1] * diff2[1],
+    )
+    if (abs(dtot) > phi_min) and (rec < 4):
+        xm = 0.5 * (sx[0] + sx[1])
+        ym = 0.5 * (sy[0] + sy[1])
+
+        # Trace the intermediate field line.
+        stream_x1, stream_y1 = _end_points(
+            _trace(params, field, [xm, ym, params.Oz])
+        )[0, :2]
+        stream_x0, stream_y0 = xm, ym
+
+        diffm = np.array([stream_x1 - stream_x0, stream_y1 - stream_y0])
+        if sum(diffm ** 2) != 0:
+            diffm = diffm / np.sqrt(sum(diffm ** 2))
+        dtot = _edge(
+            params, field, [sx[0], xm], [sy[0], ym], diff1, diffm, rec + 1
+        ) + _edge(params, field, [xm, sx[1]], [ym, sy[1]], diffm, diff2, rec + 1)
+    return dtot
+
+
+# Finds the null point of the mapping, i.e. fixed point, using Newton's method.
+def _null_point(params, point, field):
+    import numpy as np
+
+    dl = np.min([params.dx, params.dy]) / 30.0
+    it = 0
+    # Tracers used to find the fixed point.
+    tracers_null = np.zeros((5, 4))
+    while True:
+        # Trace field lines at original point and for Jacobian.
+        # (second order seems to be enough)
+        xx = np.zeros((5, 3))
+        xx[0, :] = np.array([point[0], point[1], params.Oz])
+        xx[1, :] = np.array([point[0] - dl, point[1], params.Oz])
+        xx[2, :] = np.array([point[0] + dl, point[1], params.Oz])
+        xx[3, :] = np.array([point[0], point[1] - dl, params.Oz])
+        xx[4, :] = np.array([point[0], point[1] + dl, params.Oz])
+        tracers_null[:, :2] = xx[:, :2]
+        tracers_null[:, 2:] = _end_points(_trace(params, field, xx))[:, :2]
+
+        # Check function convergence.
+        ff = np.zeros(2)
+        ff[0] = tracers_null[0, 2] - tracers_null[0, 0]
+        ff[1] = tracers_null[0, 3] - tracers_null[0, 1]
+        if sum(abs(ff)) <= 1e-3 * np.min([params.dx, params.dy]):
+            fixed_point = np.array([point[0], point[1]])
+            break
+
+        # Compute the Jacobian.
+        fjac = np.zeros((2, 2))
+        fjac[0, 0] = (
+            (
+                (tracers_null[2, 2] - tracers_null[2, 0])
+                - (tracers_null[1, 2] - tracers_null[1, 0])
+            )
+            / 2.0
+            / dl
+        )
+        fjac[0, 1] = (
+            (
+                (tracers_null[4, 2] - tracers_null[4, 0])
+                - (tracers_null[3, 2] - tracers_null[3, 0])
+            )
+            / 2.0
+            / dl
+        )
+        fjac[1, 0] = (
+            (
+                (tracers_null[2, 3] - tracers_null[2, 1])
+                - (tracers_null[1, 3] - tracers_null[1, 1])
+            )
+            / 2.0
+            / dl
+        )
+        fjac[1, 1] = (
+            (
+                (tracers_null[4, 3] - tracers_null[4, 1])
+                - (tracers_null[3, 3] - tracers_null[3, 1])
+            )
+            / 2.0
+            / dl
+        )
+
+        # Invert the Jacobian.
+        fjin = np.zeros((2, 2))
+        det = fjac[0, 0] * fjac[1, 1] - fjac[0, 1] * fjac[1, 0]
+        if abs(det) < dl:
+            fixed_point = point
+            break
+        fjin[0, 0] = fjac[1, 1]
+        fjin[1, 1] = fjac[0, 0]
+        fjin[0, 1] = -fjac[0, 1]
+        fjin[1, 0] = -fjac[1, 0]
+        fjin = fjin / det
+        dpoint = np.zeros(2)
+        dpoint[0] = -fjin[0, 0] * ff[0] - fjin[0, 1] * ff[1]
+        dpoint[1] = -fjin[1, 0] * ff[0] - fjin[1, 1] * ff[1]
+        point += dpoint
+
+        # Check root convergence.
+        if sum(abs(dpoint)) < 1e-3 * np.min([params.dx, params.dy]):
+            fixed_point = point
+            print("Root finding converged.")
+            break
+
+        if it > 20:
+            fixed_point = point
+            print("Root finding did not converge.")
+            break
+
+        it += 1
+
+    return fixed_point
@@ -18,7 +18,8 @@ def gas_velo_at_particle_pos(
     from pencil import get_sim
     from pencil import read
     from pencil import diag
-    from pencil.io import mkdir
+    from pencil.io import mkdir, pkl_exists, pkl_save
+    from pencil.calc.part_to_grid import grid_to_part
     from os import listdir
     from os.path import exists, join, dirname
     import numpy as np
@@ -106,13 +107,21 @@ def gas_velo_at_particle_pos(
         varlist = SIM.get_varlist(pos=varfiles, particle=False)
         pvarlist = SIM.get_varlist(pos=varfiles, particle=True)
 
+        ## read only the velocity from the snapshots
+        if read.param(datadir=SIM.datadir, quiet=True).io_strategy == "HDF5":
+            select = {"variables": ["uu"]}
+        else:
+            select = {"lazy": True}
+
         for f, p in zip(varlist, pvarlist):
             save_filename = GAS_VELO_TAG + "_" + scheme + "_" + f[3:]
-            if not OVERWRITE and exists(save_filename, folder=save_destination):
+            if not OVERWRITE and pkl_exists(save_filename, folder=save_destination):
                 continue
 
             print("## Reading " + f + " ...")
-            ff = read.var(datadir=SIM.datadir, varfile=f, quiet=True, trimall=False)
+            ff = read.var(
+                datadir=SIM.datadir, var_file=f, quiet=True, trimall=False, **select
+            )
             pp = read.pvar(datadir=SIM.datadir, varfile=p)
 
             ## remove ghost zones from grid, call the reduced grid the "real grid"
@@ -131,186 +140,52 @@ def gas_velo_at_particle_pos(
             l_vx = pp.vpx
             l_vy = pp.vpy
             l_vz = pp.vpz  # particle velocity KNOWN
-            l_rix = []
-            l_riy = []
-            l_riz = (
-                []
-            )  # particle untrimmed realgrid index (grid index = l/m/n + readgrid index ???)
-            l_ix = []
-            l_iy = []
-            l_iz = []  # particle grid index (in untrimmed grid)
-            l_ux = []
-            l_uy = []
-            l_uz = []  # underlying gas velocity at position of particle
 
-            ## get index of realgrid cell for each particle
-            for i in range(len(l_ipars)):
-                l_rix.append(np.abs(realgridx - l_px[i]).argmin())
-                l_riy.append(np.abs(realgridy - l_py[i]).argmin())
-                l_riz.append(np.abs(realgridz - l_pz[i]).argmin())
+            ## get index of the nearest realgrid point for each particle
+            l_ri = []
+            for l_p, realgrid, d in zip(
+                [l_px, l_py, l_pz],
+                [realgridx, realgridy, realgridz],
+                [ff.dx, ff.dy, ff.dz],
+            ):
+                if len(realgrid) > 1:
+                    ri = np.rint((l_p - realgrid[0]) / d).astype(int)
+                    l_ri.append(np.clip(ri, 0, len(realgrid) - 1))
+                else:
+                    l_ri.append(np.zeros(len(l_p), dtype=int))
+            l_rix, l_riy, l_riz = l_ri
 
             ## convert into untrimmed grid
-            l_ix = np.array(l_rix) + ff.l1
-            l_iy = np.array(l_riy) + ff.m1
-            l_iz = np.array(l_riz) + ff.n1
-
-            ## NGP
-            if scheme == "ngp" or scheme == "NGP":
-                print("## Calculating gas velocities via " + scheme)
-                l_ux = ff.ux[l_iz, l_iy, l_ix]
-                l_uy = ff.uy[l_iz, l_iy, l_ix]
-                l_uz = ff.uz[l_iz, l_iy, l_ix]
-
-            ## CIC
-            if scheme == "cic" or scheme == "CIC":
-                print("## Calculating gas velocities via " + scheme)
-                for ix0, iy0, iz0, px, py, pz in zip(
-                    l_ix, l_iy, l_iz, l_px, l_py, l_pz
-                ):  # for each particle
-                    if ff.x[ix0] > px:
-                        ix0 = ix0 - 1  # ix0 must be left to particle
-                    if ff.y[iy0] > py:
-                        iy0 = iy0 - 1  # iy0 must be below the particle
-                    if ff.z[iz0] > pz:
-                        iz0 = iz0 - 1  # iz0 must be under particle
-
-                    ix1 = ix0
-                    iy1 = iy0
-                    iz1 = iz0  # if a dim. is zero, this is default, else:
-                    if nx > 1:
-                        ix1 = ix0 + 1
-                        dx_1 = (
-                            1.0 / ff.dx
-                        )  # if a dim is non-zero, ajust ix1 to right cell
-                    if ny > 1:
-                        iy1 = iy0 + 1
-                        dy_1 = (
-                            1.0 / ff.dy
-                        )  # if a dim is non-zero, ajust iy1 to above cell
-                    if nz > 1:
-                        iz1 = iz0 + 1
-                        dz_1 = (
-                            1.0 / ff.dz
-                        )  # if a dim is non-zero, ajust iz1 to above cell
-
-                    ux = 0.0
-                    uy = 0.0
-                    uz = 0.0
-                    for ix in [ix0, ix1]:
-                        for iy in [iy0, iy1]:
-                            for iz in [iz0, iz1]:
-                                weight = 1.0
-                                if nx > 1:
-                                    weight = weight * (1.0 - abs(px - ff.x[ix]) * dx_1)
-                                if ny > 1:
-                                    weight = weight * (1.0 - abs(py - ff.y[iy]) * dy_1)
-                                if nz > 1:
-                                    weight = weight * (1.0 - abs(pz - ff.z[iz]) * dz_1)
-
-                                ux = ux + weight * ff.ux[iz, iy, ix]
-                                uy = uy + weight * ff.uy[iz, iy, ix]
-                                uz = uz + weight * ff.uz[iz, iy, ix]
-
-                                if iz0 == iz1:
-                                    break  # beware of degeneracy:
-                            if iy0 == iy1:
-                                break  # beware of degeneracy:
-                        if ix0 == ix1:
-                            break  # beware of degeneracy:
-
-                    l_ux.append(ux)
-                    l_uy.append(uy)
-                    l_uz.append(uz)
-
-            ## TSC
-            if scheme == "tsc" or scheme == "TSC":
-                for ix0, iy0, iz0, px, py, pz in zip(
-                    l_ix, l_iy, l_iz, l_px, l_py, l_pz
-                ):  # for each particle
-                    ixx0 = ix0
-                    ixx1 = ix0  # beware of degeneracy
-                    iyy0 = iy0
-                    iyy1 = iy0
-                    izz0 = iz0
-                    izz1 = iz0
-
-                    if nx > 1:
-                        ixx0 = ix0 - 1
-                        ixx1 = ix0 + 1
-                        dx_1 = 1.0 / ff.dx
-                        dx_2 = 1.0 / ff.dx ** 2
-                    if ny > 1:
-                        iyy0 = iy0 - 1
-                        iyy1 = iy0 + 1
-                        dy_1 = 1.0 / ff.dy
-                        dy_2 = 1.0 / ff.dy ** 2
-                    if nz > 1:
-                        izz0 = iz0 - 1
-                        izz1 = iz0 + 1
-                        dz_1 = 1.0 / ff.dz
-                        dz_2 = 1.0 / ff.dz ** 2
-
-                    ux = 0.0
-                    uy = 0.0
-                    uz = 0.0
-                    for ix in [ix0, ixx0, ixx1]:
-                        weight_x = 0.0
-                        if ix - ix0 == -1 or ix - ix0 == 1:
-                            weight_x = (
-                                1.125
-                                - 1.5 * abs(px - ff.x[ix]) * dx_1
-                                + 0.5 * abs(px - ff.x[ix]) ** 2 * dx_2
-                            )
-                        elif nx != 1:
-                            weight_x = 0.75 - (px - ff.x[ix]) ** 2 * dx_2
-
-                        for iy in [iy0, iyy0, iyy1]:
-                            weight_y = 0.0
-                            if iy - iy0 == -1 or iy - iy0 == 1:
-                                weight_y = (
-                                    1.125
-                                    - 1.5 * abs(py - ff.y[iy]) * dy_1
-                                    + 0.5 * abs(py - ff.y[iy]) ** 2 * dy_2
-                                )
-                            elif ny != 1:
-                                weight_y = 0.75 - (py - ff.y[iy]) ** 2 * dy_2
-
-                            for iz in [iz0, izz0, izz1]:
-                                weight_z = 0.0
-                                if iz - iz0 == -1 or iz - iz0 == 1:
-                                    weight_z = (
-                                        1.125
-                                        - 1.5 * abs(pz - ff.z[iz]) * dz_1
-                                        + 0.5 * abs(pz - ff.z[iz]) ** 2 * dz_2
-                                    )
-                                elif nz != 1:
-                                    weight_z = 0.75 - (pz - ff.z[iz]) ** 2 * dz_2
-
-                                weight = 1.0
-                                if nx > 1:
-                                    weight = weight * weight_x
-                                if ny > 1:
-                                    weight = weight * weight_y
-                                if nz > 1:
-                                    weight = weight * weight_z
-
-                                ux = ux + weight * ff.ux[iz, iy, ix]
-                                uy = uy + weight * ff.uy[iz, iy, ix]
-                                uz = uz + weight * ff.uz[iz, iy, ix]
-
-                                if izz0 == izz1:
-                                    break  # beware of degeneracy:
-                            if iyy0 == iyy1:
-                                break  # beware of degeneracy:
-                        if ixx0 == ixx1:
-                            break  # beware of degeneracy:
-
-                    l_ux.append(ux)
-                    l_uy.append(uy)
-                    l_uz.append(uz)
+            l_ix = l_rix + ff.l1
+            l_iy = l_riy + ff.m1
+            l_iz = l_riz + ff.n1
+
+            ## gather the gas velocity at all particles at once, the stencils
+            ## reach into the ghost zones in directions with more than one point
+            print("## Calculating gas velocities via " + scheme)
+            xyz = []
+            box = []
+            for coord, n, i1 in zip(
+                [ff.z, ff.y, ff.x], [nz, ny, nx], [ff.n1, ff.m1, ff.l1]
+            ):
+                if n > 1:
+                    box.append(slice(None))
+                else:
+                    box.append(slice(i1, i1 + 1))
+                xyz.append(coord[box[-1]])
+            l_ux, l_uy, l_uz = grid_to_part(
+                ff.uu[(slice(None),) + tuple(box)],
+                l_px,
+                l_py,
+                l_pz,
+                xyz[2],
+                xyz[1],
+                xyz[0],
+                kernel=scheme,
+            )
 
             ## Convert all information into a single record array
-            data_set = np.core.records.fromarrays(
+            data_set = np.rec.fromarrays(
                 [
                     l_ipars.astype("int"),
                     l_px,
@@ -20,6 +20,7 @@ class Tracers(object):
         """
 
         self.params = TracersParameterClass()
+        self.n_times = 1000
         self.x0 = None
         self.y0 = None
         self.x1 = None
@@ -68,6 +69,7 @@ class Tracers(object):
         import multiprocessing as mp
         from pencil import read
         from pencil import math
+        from pencil.util import SharedArray, run_processes
 
         # Write the tracing parameters.
         self.params.trace_field = trace_field
@@ -77,7 +79,6 @@ class Tracers(object):
         if not (np.isscalar(self.params.n_proc)) or (self.params.n_proc % 1 != 0):
             print("Error: invalid processor number")
             return -1
-        queue = mp.Queue()
 
         # Read the data.
         magic = []
@@ -196,10 +197,11 @@ class Tracers(object):
 
             # Extract the requested vector trace_field.
             field = getattr(var, trace_field)
+            q_field = None
             if self.params.int_q == "curly_A":
-                self.aa = var.aa
+                q_field = var.aa
             if self.params.int_q == "ee":
-                self.ee = var.jj * param2.eta - math.cross(var.uu, var.bb)
+                q_field = var.jj * param2.eta - math.cross(var.uu, var.bb)
 
             # Get the simulation parameters.
             self.params.dx = var.dx
@@ -228,44 +230,52 @@ class Tracers(object):
                     self.y1[ix, iy, t_idx] = self.y0[ix, iy, t_idx].copy()
                     self.z1[ix, iy, t_idx] = grid.z[0]
 
-            proc = []
-            sub_data = []
-            for i_proc in range(self.params.n_proc):
-                proc.append(
-                    mp.Process(
-                        target=self.__sub_tracers,
-                        args=(queue, field, t_idx, i_proc, self.params.n_proc),
-                    )
+            # Share the fields and the results with the workers without copies.
+            n_seeds = self.x0.shape[:2]
+            shared = {}
+            try:
+                shared["field"] = SharedArray(field.shape)
+                shared["field"].array[...] = field
+                shared["seeds"] = SharedArray(n_seeds + (3,))
+                shared["seeds"].array[...] = np.stack(
+                    [self.x0[:, :, t_idx], self.y0[:, :, t_idx], self.z1[:, :, t_idx]],
+                    axis=-1,
                 )
-            for i_proc in range(self.params.n_proc):
-                proc[i_proc].start()
-            for i_proc in range(self.params.n_proc):
-                sub_data.append(queue.get())
-            for i_proc in range(self.params.n_proc):
-                proc[i_proc].join()
-            for i_proc in range(self.params.n_proc):
-                # Extract the data from the single cores. Mind the order.
-                sub_proc = sub_data[i_proc][0]
-                self.x1[sub_proc :: self.params.n_proc, :, t_idx] = sub_data[i_proc][1]
-                self.y1[sub_proc :: self.params.n_proc, :, t_idx] = sub_data[i_proc][2]
-                self.z1[sub_proc :: self.params.n_proc, :, t_idx] = sub_data[i_proc][3]
-                self.l[sub_proc :: self.params.n_proc, :, t_idx] = sub_data[i_proc][4]
-                self.mapping[sub_proc :: self.params.n_proc, :, t_idx, :] = sub_data[
-                    i_proc
-                ][5]
-                self.tracers[sub_proc :: self.params.n_proc, :, t_idx] = sub_data[
-                    i_proc
-                ][6]
+                if q_field is not None:
+                    shared["q_field"] = SharedArray(q_field.shape)
+                    shared["q_field"].array[...] = q_field
+                for name in ["x1", "y1", "z1", "l", "q"]:
+                    shared[name] = SharedArray(n_seeds, fill=0)
+                shared["mapping"] = SharedArray(n_seeds + (3,), fill=0)
+                shared["lines"] = SharedArray(n_seeds + (self.n_times, 3))
+                shared["n_points"] = SharedArray(n_seeds, dtype=int, fill=0)
+
+                # The workers take chunks of rows of seeds until all are traced.
+                next_row = mp.Value("i", 0)
+                chunk = max(1, n_seeds[0] // (4 * self.params.n_proc))
+                run_processes(
+                    _sub_tracers,
+                    (self.params, shared, next_row, chunk),
+                    self.params.n_proc,
+                )
+
+                self.x1[:, :, t_idx] = shared["x1"].array
+                self.y1[:, :, t_idx] = shared["y1"].array
+                self.z1[:, :, t_idx] = shared["z1"].array
+                self.l[:, :, t_idx] = shared["l"].array
+                self.mapping[:, :, t_idx, :] = shared["mapping"].array
+                for ix, iy in np.ndindex(n_seeds):
+                    self.tracers[ix, iy, t_idx] = shared["lines"].array[
+                        ix, iy, : shared["n_points"].array[ix, iy]
+                    ].copy()
                 if self.params.int_q == "curly_A":
-                    self.curly_A[sub_proc :: self.params.n_proc, :, t_idx] = sub_data[
-                        i_proc
-                    ][7]
+                    self.aa = var.aa
+                    self.curly_A[:, :, t_idx] = shared["q"].array
                 if self.params.int_q == "ee":
-                    self.ee[sub_proc :: self.params.n_proc, :, t_idx] = sub_data[
-                        i_proc
-                    ][8]
-            for i_proc in range(self.params.n_proc):
-                proc[i_proc].terminate()
+                    self.ee[:, :, t_idx] = shared["q"].array
+            finally:
+                for shared_array in shared.values():
+                    shared_array.unlink()
             print("find_tracers: self.tracers.shape = {0}".format(self.tracers.shape))
             print(
                 "find_tracers: self.tracers[0, 0, 0].shape = {0}".format(
@@ -279,120 +289,6 @@ class Tracers(object):
             )
             return 0
 
-    # Return the tracers for the specified starting locations.
-    def __sub_tracers(self, queue, field, t_idx, i_proc, n_proc):
-        import numpy as np
-        from pencil.calc.streamlines import Stream
-        from pencil.math.interpolation import vec_int
-
-        # Prepare the splines for the tricubis interpolation.
-        if self.params.interpolation == "tricubic":
-            try:
-                from eqtools.trispline import Spline
-
-                x = np.linspace(
-                    self.params.Ox, self.params.Ox + self.params.Lx, self.params.nx
-                )
-                y = np.linspace(
-                    self.params.Oy, self.params.Oy + self.params.Ly, self.params.ny
-                )
-                z = np.linspace(
-                    self.params.Oz, self.params.Oz + self.params.Lz, self.params.nz
-                )
-                field_x = Spline(z, y, x, field[0, ...])
-                field_y = Spline(z, y, x, field[1, ...])
-                field_z = Spline(z, y, x, field[2, ...])
-                splines = np.array([field_x, field_y, field_z])
-            except:
-                splines = None
-        else:
-            splines = None
-
-        xx = np.zeros(
-            [(self.x0.shape[0] + n_proc - 1 - i_proc) // n_proc, self.x0.shape[1], 3]
-        )
-        xx[:, :, 0] = self.x0[i_proc : self.x0.shape[0] : n_proc, :, t_idx].copy()
-        xx[:, :, 1] = self.y0[i_proc : self.x0.shape[0] : n_proc, :, t_idx].copy()
-        xx[:, :, 2] = self.z1[i_proc : self.x0.shape[0] : n_proc, :, t_idx].copy()
-
-        # Initialize the local arrays for this core.
-        sub_x1 = np.zeros(xx[:, :, 0].shape)
-        sub_y1 = np.zeros(xx[:, :, 0].shape)
-        sub_z1 = np.zeros(xx[:, :, 0].shape)
-        sub_l = np.zeros(xx[:, :, 0].shape)
-        sub_tracers = np.zeros(xx[:, :, 0].shape, dtype=np.ndarray)
-        sub_curly_A = np.zeros(xx[:, :, 0].shape)
-        sub_ee = np.zeros(xx[:, :, 0].shape)
-        sub_mapping = np.zeros([xx[:, :, 0].shape[0], xx[:, :, 0].shape[1], 3])
-        for ix in range(i_proc, self.x0.shape[0], n_proc):
-            for iy in range(self.x0.shape[1]):
-                time = np.linspace(0, 20 * self.params.Lz / field[2, 0, iy, ix], 1000)
-                stream = Stream(
-                    field,
-                    self.params,
-                    xx=xx[int(ix / n_proc), iy, :],
-                    time=time,
-                    splines=splines,
-                )
-                sub_x1[int(ix / n_proc), iy] = stream.tracers[-1, 0]
-                sub_y1[int(ix / n_proc), iy] = stream.tracers[-1, 1]
-                sub_z1[int(ix / n_proc), iy] = stream.tracers[-1, 2]
-                sub_l[int(ix / n_proc), iy] = stream.total_l
-                sub_tracers[int(ix / n_proc), iy] = stream.tracers
-                if self.params.int_q == "curly_A":
-                    for l in range(stream.total_l):
-                        aaInt = vec_int(
-                            (stream.tracers[l + 1] + stream.tracers[l]) / 2,
-                            self.aa,
-                            [self.params.dx, self.params.dy, self.params.dz],
-                            [self.params.Ox, self.params.Oy, self.params.Oz],
-                            [self.params.nx, self.params.ny, self.params.nz],
-                            interpolation=self.params.interpolation,
-                        )
-                        sub_curly_A[int(ix / n_proc), iy] += np.dot(
-                            aaInt, (stream.tracers[l + 1] - stream.tracers[l])
-                        )
-                if self.params.int_q == "ee":
-                    for l in range(stream.total_l):
-                        eeInt = vec_int(
-                            (stream.tracers[l + 1] + stream.tracers[l]) / 2,
-                            self.ee,
-                            [self.params.dx, self.params.dy, self.params.dz],
-                            [self.params.Ox, self.params.Oy, self.params.Oz],
-                            [self.params.nx, self.params.ny, self.params.nz],
-                            interpolation=self.params.interpolation,
-                        )
-                        sub_ee[int(ix / n_proc), iy] += np.dot(
-                            eeInt, (stream.tracers[l + 1] - stream.tracers[l])
-                        )
-
-                # Create the color mapping.
-                #                if (sub_z1[int(ix/n_proc), iy] > self.params.Oz+self.params.Lz-self.params.dz*12):
-                if (self.x0[ix, iy, t_idx] - sub_x1[int(ix / n_proc), iy]) > 0:
-                    if (self.y0[ix, iy, t_idx] - sub_y1[int(ix / n_proc), iy]) > 0:
-                        sub_mapping[int(ix / n_proc), iy, :] = [0, 1, 0]
-                    else:
-                        sub_mapping[int(ix / n_proc), iy, :] = [1, 1, 0]
-                else:
-                    if (self.y0[ix, iy, t_idx] - sub_y1[int(ix / n_proc), iy]) > 0:
-                        sub_mapping[int(ix / n_proc), iy, :] = [0, 0, 1]
-                    else:
-                        sub_mapping[int(ix / n_proc), iy, :] = [1, 0, 0]
-
-        queue.put(
-            (
-                i_proc,
-                sub_x1,
-                sub_y1,
-                sub_z1,
-                sub_l,
-                sub_mapping,
-                sub_tracers,
-                sub_curly_A,
-                sub_ee,
-            )
-        )
-
     def write(self, datadir="data", destination="tracers.hdf5"):
         """
         Write the tracers into a file.
@@ -534,6 +430,74 @@ class Tracers(object):
         f.close()
 
 
+# Trace chunks of rows of starting locations until none are left.
+def _sub_tracers(params, shared, next_row, chunk):
+    while True:
+        with next_row.get_lock():
+            row = next_row.value
+            next_row.value += chunk
+        if row >= shared["seeds"].shape[0]:
+            break
+        _trace_rows(params, shared, slice(row, row + chunk))
+
+
+# Trace the streamlines for the specified rows of starting locations.
+def _trace_rows(params, shared, rows):
+    import numpy as np
+    from pencil.calc.streamlines import Streams
+    from pencil.math.interpolation import vec_int_batch
+
+    field = shared["field"].array
+    xx = shared["seeds"].array[rows]
+    shape = xx.shape[:2]
+    n_times = shared["lines"].shape[2]
+
+    # Trace all streamlines of these rows at once.
+    seeds = xx.reshape(-1, 3)
+    ix = np.arange(shared["seeds"].shape[0])[rows]
+    iy = np.arange(shape[1])
+    field_z0 = field[2, 0, iy[np.newaxis, :], ix[:, np.newaxis]]
+    time = np.linspace(0, 20 * params.Lz / field_z0, n_times)
+    streams = Streams(field, params, xx=seeds, time=time.reshape(n_times, -1).T)
+    ends = streams.tracers[np.arange(seeds.shape[0]), streams.n_points - 1, :]
+    x1 = ends[:, 0].reshape(shape)
+    y1 = ends[:, 1].reshape(shape)
+    shared["x1"].array[rows] = x1
+    shared["y1"].array[rows] = y1
+    shared["z1"].array[rows] = ends[:, 2].reshape(shape)
+    shared["l"].array[rows] = streams.total_l.reshape(shape)
+    shared["lines"].array[rows] = streams.tracers.reshape(
+        shape + streams.tracers.shape[1:]
+    )
+    shared["n_points"].array[rows] = streams.n_points.reshape(shape)
+
+    # Integrate curly_A or ee along all line segments at their middle points.
+    if "q_field" in shared:
+        middle_points = (streams.tracers[:, 1:] + streams.tracers[:, :-1]) / 2
+        diff_vectors = np.nan_to_num(streams.tracers[:, 1:] - streams.tracers[:, :-1])
+        valid = np.isfinite(middle_points[..., 0])
+        q_int = np.zeros(diff_vectors.shape)
+        q_int[valid] = vec_int_batch(
+            middle_points[valid],
+            shared["q_field"].array,
+            [params.dx, params.dy, params.dz],
+            [params.Ox, params.Oy, params.Oz],
+            [params.nx, params.ny, params.nz],
+            interpolation=params.interpolation,
+        )
+        shared["q"].array[rows] = np.sum(q_int * diff_vectors, axis=(1, 2)).reshape(
+            shape
+        )
+
+    # Create the color mapping.
+    x0 = xx[..., 0]
+    y0 = xx[..., 1]
+    colors = np.array([[[1, 0, 0], [0, 0, 1]], [[1, 1, 0], [0, 1, 0]]])
+    shared["mapping"].array[rows] = colors[
+        (x0 - x1 > 0).astype(int), (y0 - y1 > 0).astype(int)
+    ]
+
+
 # Class containing simulation and tracing parameters.
 class TracersParameterClass(object):
     """
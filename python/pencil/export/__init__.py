@@ -6,4 +6,4 @@ from .arrays2d_to_vtk import arrays2d_to_vtk
 from .arrays3d_to_vtk import arrays3d_to_vtk
 from .particles_to_vtk import particles_to_vtk, ParticlesVtk
 from .create_h5 import create_aver_sph, fvars
-from .pc2vtk import var2vtk, slices2vtk  # , aver2vtk, power2vtk
+from .pc2vtk import var2vtk, var2vtk_xml, slices2vtk  # , aver2vtk, power2vtk
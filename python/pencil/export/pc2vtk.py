@@ -67,7 +67,7 @@ def var2vtk(
     import numpy as np
     import sys
     from pencil import read
-    from pencil import math
+    from pencil.calc.derived import DerivedFields
 
     # Determine of we want an animation.
     if ti < 0 or tf < 0:
@@ -75,51 +75,7 @@ def var2vtk(
     else:
         animation = True
 
-    # If no variables specified collect all by default
-    if not variables:
-        variables = []
-        indx = read.index()
-        for key in indx.__dict__.keys():
-            if "keys" not in key:
-                variables.append(key)
-        if "uu" in variables:
-            magic.append("vort")
-            variables.append("vort")
-        if "rho" in variables or "lnrho" in variables:
-            if "ss" in variables:
-                magic.append("tt")
-                variables.append("tt")
-                magic.append("pp")
-                variables.append("pp")
-        if "aa" in variables:
-            magic.append("bb")
-            variables.append("bb")
-            magic.append("jj")
-            variables.append("jj")
-            variables.append("ab")
-            variables.append("b_mag")
-            variables.append("j_mag")
-    else:
-        # Convert single variable string into length 1 list of arrays.
-        if len(variables) > 0:
-            if len(variables[0]) == 1:
-                variables = [variables]
-        if "tt" in variables:
-            magic.append("tt")
-        if "pp" in variables:
-            magic.append("pp")
-        if "bb" in variables:
-            magic.append("bb")
-        if "jj" in variables:
-            magic.append("jj")
-        if "vort" in variables:
-            magic.append("vort")
-        if "b_mag" in variables and not "bb" in magic:
-            magic.append("bb")
-        if "j_mag" in variables and not "jj" in magic:
-            magic.append("jj")
-        if "ab" in variables and not "bb" in magic:
-            magic.append("bb")
+    variables, magic = _vtk_variables(variables, magic, datadir)
 
     for t_idx in range(ti, tf + 1):
         if animation:
@@ -146,6 +102,16 @@ def var2vtk(
             var.bb[1, ...] += B_ext[1]
             var.bb[2, ...] += B_ext[2]
 
+        # Quantities like ab or b_mag are derived from the fields of var,
+        # including B_ext.
+        derived = DerivedFields(
+            dict(
+                (name, getattr(var, name))
+                for name in set(variables) | {"aa", "bb", "jj"}
+                if hasattr(var, name)
+            )
+        )
+
         dimx = len(grid.x)
         dimy = len(grid.y)
         dimz = len(grid.z)
@@ -180,14 +146,7 @@ def var2vtk(
         for v in variables:
             print("Writing {0}.".format(v))
             # Prepare the data to the correct format.
-            if v == "ab":
-                data = math.dot(var.aa, var.bb)
-            elif v == "b_mag":
-                data = np.sqrt(math.dot2(var.bb))
-            elif v == "j_mag":
-                data = np.sqrt(math.dot2(var.jj))
-            else:
-                data = getattr(var, v)
+            data = derived[v]
             if sys.byteorder == "little":
                 data = data.astype(np.float32).byteswap()
             else:
@@ -206,6 +165,376 @@ def var2vtk(
         fd.close()
 
 
+def var2vtk_xml(
+    var_file="var.dat",
+    datadir="data",
+    proc=-1,
+    variables=None,
+    b_ext=False,
+    magic=[],
+    destination="work",
+    quiet=True,
+    ti=-1,
+    tf=-1,
+    grid_type=None,
+    chunk_size=2 ** 22,
+    n_proc=1,
+):
+    """
+    Convert data from PencilCode format to VTK XML files.
+
+    call signature::
+
+      var2vtk_xml(var_file='var.dat', datadir='data', proc=-1,
+                  variables=None, b_ext=False, destination='work',
+                  quiet=True, ti=-1, tf=-1, grid_type=None,
+                  chunk_size=2**22, n_proc=1)
+
+    Read *var_file* and write its content as VTK XML ImageData (.vti) or
+    RectilinearGrid (.vtr) with the data appended as raw little endian
+    binary. The ghost zones are always trimmed. For animations the
+    snapshots are converted by *n_proc* processes and a ParaView collection
+    *destination*.pvd lists the files with their times.
+
+    Keyword arguments:
+
+      *var_file*:
+        The original var_file.
+
+      *datadir*:
+        Directory where the data is stored.
+
+      *proc*:
+        Processor which should be read. Set to -1 for all processors.
+
+      *variables*:
+        List of variables which should be written. If None all.
+
+      *b_ext*:
+        Add the external magnetic field.
+
+      *destination*:
+        Destination file without extension.
+
+      *quiet*:
+        Keep quiet when reading the var files.
+
+      *ti, tf*:
+        Start and end index for animation. Leave negative for no animation.
+        Overwrites variable var_file.
+
+      *grid_type*:
+        'image' for equidistant or 'rectilinear' for general grids.
+        If None the grid decides.
+
+      *chunk_size*:
+        Number of values converted and written at a time. Fields of the
+        'dist' io_strategy are read in slabs of this size.
+
+      *n_proc*:
+        Number of processes converting the snapshots of an animation.
+    """
+
+    import os
+    import numpy as np
+    from concurrent.futures import ProcessPoolExecutor
+    from pencil import read
+
+    variables, magic = _vtk_variables(variables, magic, datadir)
+    grid = read.grid(datadir=datadir, proc=proc, trim=True, quiet=True)
+    if grid_type is None:
+        grid_type = "image"
+        for x in (grid.x, grid.y, grid.z):
+            if len(x) > 2 and not np.allclose(np.diff(x), x[1] - x[0]):
+                grid_type = "rectilinear"
+    if grid_type not in ("image", "rectilinear"):
+        raise ValueError("var2vtk_xml: grid_type must be 'image' or 'rectilinear'.")
+    if b_ext:
+        b_ext = np.array(read.param(datadir=datadir, quiet=True).b_ext)
+    else:
+        b_ext = None
+
+    settings = dict(
+        datadir=datadir,
+        proc=proc,
+        variables=variables,
+        magic=magic,
+        b_ext=b_ext,
+        quiet=quiet,
+        grid=grid,
+        grid_type=grid_type,
+        chunk_size=chunk_size,
+    )
+    extension = {"image": ".vti", "rectilinear": ".vtr"}[grid_type]
+    if ti < 0 or tf < 0:
+        _var2vtk_xml_snapshot(var_file, destination + extension, settings)
+        return
+
+    var_files = ["VAR" + str(t_idx) for t_idx in range(ti, tf + 1)]
+    file_names = [destination + str(t_idx) + extension for t_idx in range(ti, tf + 1)]
+    if n_proc > 1:
+        with ProcessPoolExecutor(max_workers=n_proc) as executor:
+            times = list(
+                executor.map(
+                    _var2vtk_xml_snapshot,
+                    var_files,
+                    file_names,
+                    [settings] * len(var_files),
+                )
+            )
+    else:
+        times = [
+            _var2vtk_xml_snapshot(var_file, file_name, settings)
+            for var_file, file_name in zip(var_files, file_names)
+        ]
+
+    # Collection of the time series for ParaView.
+    with open(destination + ".pvd", "w") as fd:
+        fd.write('<?xml version="1.0"?>\n')
+        fd.write(
+            '<VTKFile type="Collection" version="0.1" byte_order="LittleEndian">\n'
+        )
+        fd.write("  <Collection>\n")
+        for t, file_name in zip(times, file_names):
+            fd.write(
+                '    <DataSet timestep="{0:.17g}" part="0" file="{1}"/>\n'.format(
+                    t, os.path.basename(file_name)
+                )
+            )
+        fd.write("  </Collection>\n")
+        fd.write("</VTKFile>\n")
+
+
+def _var2vtk_xml_snapshot(var_file, file_name, settings):
+    """
+    Write one snapshot as VTK XML file and return its time.
+    Module level function, so that it can run in worker processes.
+    """
+
+    import numpy as np
+    from pencil import read
+    from pencil.calc.derived import DerivedFields
+    from pencil.read.lazyvar import LazyVarArray
+
+    var = read.var(
+        var_file=var_file,
+        datadir=settings["datadir"],
+        proc=settings["proc"],
+        magic=settings["magic"],
+        trimall=True,
+        quiet=settings["quiet"],
+        lazy=True,
+    )
+    grid = settings["grid"]
+    shape = (len(grid.z), len(grid.y), len(grid.x))
+
+    # Add external magnetic field.
+    if settings["b_ext"] is not None:
+        for i in range(3):
+            var.bb[i, ...] += settings["b_ext"][i]
+
+    # Fields of var are evaluated on first use. Base fields of a lazily
+    # mapped snapshot are read in slabs directly from the data cube.
+    lazy_fields = dict(var.__dict__.get("_lazy_fields", {}))
+    if not isinstance(var.f, LazyVarArray):
+        lazy_fields = {}
+    known = set(var.__dict__) | set(var.__dict__.get("_derived_fields", {}))
+    derived = DerivedFields(
+        dict(
+            (name, lambda name=name: getattr(var, name))
+            for name in set(settings["variables"]) | {"aa", "bb", "jj"}
+            if name in known or name in lazy_fields
+        )
+    )
+
+    arrays = []
+    for v in settings["variables"]:
+        if v in lazy_fields:
+            index = lazy_fields[v]
+            if isinstance(index, slice):
+                n_comp = len(range(*index.indices(var.f.shape[0])))
+            else:
+                n_comp = 1
+            arrays.append((v, n_comp, lambda zslice, index=index: var.f[index, zslice]))
+        else:
+            # Evaluate derived quantities only when they are written.
+            def field(zslice, v=v):
+                return np.reshape(derived[v], (-1,) + shape)[:, zslice]
+
+            arrays.append((v, None, field))
+
+    _write_vtk_xml(
+        file_name, grid, settings["grid_type"], shape, arrays, settings["chunk_size"]
+    )
+    if not settings["quiet"]:
+        print("Wrote {0}.".format(file_name))
+
+    return float(var.t)
+
+
+def _write_vtk_xml(file_name, grid, grid_type, shape, arrays, chunk_size):
+    """
+    Write VTK XML ImageData or RectilinearGrid with appended raw data.
+
+    arrays holds tuples (name, number of components or None, function
+    returning the field for a slice of z). The data of every array is
+    written in slabs of whole z-planes, converted to little endian float32.
+    """
+
+    import numpy as np
+
+    nz, ny, nx = shape
+    n_points = nx * ny * nz
+    extent = "0 {0} 0 {1} 0 {2}".format(nx - 1, ny - 1, nz - 1)
+    coordinates = []
+    if grid_type == "rectilinear":
+        coordinates = [np.asarray(x, dtype="<f8") for x in (grid.x, grid.y, grid.z)]
+
+    def header(offsets, n_comps):
+        offsets = list(offsets)
+        if grid_type == "image":
+            lines = [
+                '  <ImageData WholeExtent="{0}" Origin="{1:.17g} {2:.17g} '
+                '{3:.17g}" Spacing="{4:.17g} {5:.17g} {6:.17g}">'.format(
+                    extent,
+                    grid.x[0],
+                    grid.y[0],
+                    grid.z[0],
+                    grid.dx,
+                    grid.dy,
+                    grid.dz,
+                )
+            ]
+            dataset = "ImageData"
+        else:
+            lines = ['  <RectilinearGrid WholeExtent="{0}">'.format(extent)]
+            dataset = "RectilinearGrid"
+        lines.append('    <Piece Extent="{0}">'.format(extent))
+        if grid_type == "rectilinear":
+            lines.append("      <Coordinates>")
+            for axis in "xyz":
+                lines.append(
+                    '        <DataArray type="Float64" Name="{0}" format="appended"'
+                    ' offset="{1}"/>'.format(axis, offsets.pop(0))
+                )
+            lines.append("      </Coordinates>")
+        lines.append("      <PointData>")
+        for (name, _, _), n_comp, offset in zip(arrays, n_comps, offsets):
+            lines.append(
+                '        <DataArray type="Float32" Name="{0}" NumberOfComponents='
+                '"{1}" format="appended" offset="{2}"/>'.format(name, n_comp, offset)
+            )
+        lines.append("      </PointData>")
+        lines.append("    </Piece>")
+        lines.append("  </{0}>".format(dataset))
+
+        return (
+            '<?xml version="1.0"?>\n<VTKFile type="{0}" version="1.0" '
+            'byte_order="LittleEndian" header_type="UInt64">\n'.format(dataset)
+            + "\n".join(lines)
+            + "\n"
+        )
+
+    # The offsets and numbers of components are known after writing the
+    # data, so space for the longest possible header is reserved, which is
+    # padded with white space.
+    appended = '  <AppendedData encoding="raw">\n   _'
+    n_arrays = len(coordinates) + len(arrays)
+    header_size = len(header([10 ** 19] * n_arrays, [99] * len(arrays)))
+    offsets = []
+    n_comps = []
+    with open(file_name, "wb") as fd:
+        fd.seek(header_size + len(appended))
+        position = 0
+        for x in coordinates:
+            offsets.append(position)
+            fd.write(np.uint64(x.nbytes).astype("<u8").tobytes())
+            fd.write(x.tobytes())
+            position += 8 + x.nbytes
+        for name, n_comp, field in arrays:
+            offsets.append(position)
+            start = fd.tell()
+            fd.write(np.zeros(1, dtype="<u8").tobytes())
+            nbytes = 0
+            n_planes = max(1, chunk_size // max(1, nx * ny * (n_comp or 3)))
+            for iz in range(0, nz, n_planes):
+                data = np.asarray(field(slice(iz, iz + n_planes)))
+                data = data.reshape((-1,) + data.shape[-3:])
+                # Components are interleaved, x varies fastest.
+                data = np.moveaxis(data, 0, -1).astype("<f4")
+                fd.write(data.tobytes())
+                nbytes += data.nbytes
+            n_comps.append(nbytes // (4 * n_points))
+            end = fd.tell()
+            fd.seek(start)
+            fd.write(np.uint64(nbytes).astype("<u8").tobytes())
+            fd.seek(end)
+            position += 8 + nbytes
+        fd.write(b"\n  </AppendedData>\n</VTKFile>\n")
+        fd.seek(0)
+        fd.write(header(offsets, n_comps).ljust(header_size).encode("utf-8"))
+        fd.write(appended.encode("utf-8"))
+
+
+def _vtk_variables(variables, magic, datadir):
+    """
+    Return the list of variables to be written and the magic quantities
+    read.var needs for them. By default all variables and a few derived
+    quantities are written.
+    """
+
+    from pencil import read
+
+    magic = list(magic)
+    # If no variables specified collect all by default
+    if not variables:
+        variables = []
+        indx = read.index(datadir=datadir)
+        for key in indx.__dict__.keys():
+            if "keys" not in key:
+                variables.append(key)
+        if "uu" in variables:
+            magic.append("vort")
+            variables.append("vort")
+        if "rho" in variables or "lnrho" in variables:
+            if "ss" in variables:
+                magic.append("tt")
+                variables.append("tt")
+                magic.append("pp")
+                variables.append("pp")
+        if "aa" in variables:
+            magic.append("bb")
+            variables.append("bb")
+            magic.append("jj")
+            variables.append("jj")
+            variables.append("ab")
+            variables.append("b_mag")
+            variables.append("j_mag")
+    else:
+        # Convert single variable string into length 1 list of arrays.
+        if len(variables) > 0:
+            if len(variables[0]) == 1:
+                variables = [variables]
+        if "tt" in variables:
+            magic.append("tt")
+        if "pp" in variables:
+            magic.append("pp")
+        if "bb" in variables:
+            magic.append("bb")
+        if "jj" in variables:
+            magic.append("jj")
+        if "vort" in variables:
+            magic.append("vort")
+        if "b_mag" in variables and not "bb" in magic:
+            magic.append("bb")
+        if "j_mag" in variables and not "jj" in magic:
+            magic.append("jj")
+        if "ab" in variables and not "bb" in magic:
+            magic.append("bb")
+
+    return variables, magic
+
+
 def slices2vtk(field="", extension="", datadir="data", destination="slices", proc=-1):
     """
     Convert slices from PencilCode format to vtk.
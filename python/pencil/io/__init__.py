@@ -8,6 +8,7 @@ from .debug_breakpoint import debug_breakpoint
 from .timestamp import timestamp
 from .pc_hdf5 import *
 from .snapshot import *
+from .chunked import chunk_counts, chunk_blocks, chunked_map
 
 try:
     from .fort2h5 import *
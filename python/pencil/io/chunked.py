@@ -0,0 +1,501 @@
+# chunked.py
+#
+# Chunked execution of post-processing kernels on hdf5 snapshots.
+#
+"""
+Decompose the [mz,my,mx] domain of an h5 snapshot into halo padded blocks
+that fit a memory budget, and evaluate a kernel on each block.
+
+The hyperslabs required by a block are read into an in-memory window of the
+h5 groups, which serves h5py slicing with global indices inside the box of
+the block. Kernels that index the h5 datasets with the global ranges of the
+block, such as those of pencil.ism_dyn, therefore run unchanged on the
+windows, in worker processes or on MPI ranks. The datasets the kernel used
+for one block are read for the next while the current one is computed.
+
+Example:
+blocks = chunk_blocks([mz, my, mx], nchunks, nghost=3)
+for block, var in chunked_map(kernel, blocks, [src["data"]], args=(key,)):
+    dst["data"][key][block.out] = var[block.inner]
+"""
+import numpy as np
+
+
+# ==============================================================================
+def chunk_counts(
+    nx, ny, nz, mvar=8, maux=0, chunksize=1000.0, nmin=32, size=1, quiet=True
+):
+    """Number of chunks [x,y,z] to split the domain into, so that each fits
+    into chunksize MB, see pencil.math.cpu_optimal.
+
+    Keyword arguments:
+        nx, ny, nz: size of the domain without ghost zones.
+        mvar, maux: number of variables in the snapshot.
+        chunksize:  memory budget in MB.
+        nmin:       minimum number of points per chunk in each direction.
+        size:       number of MPI ranks.
+    """
+    from pencil.math import cpu_optimal
+
+    dstchunksize = 8 * nx * ny * nz / 1024 * 1024
+    if dstchunksize > chunksize:
+        nchunks = cpu_optimal(
+            nx,
+            ny,
+            nz,
+            quiet=quiet,
+            mvar=mvar,
+            maux=maux,
+            MBmin=chunksize,
+            nmin=nmin,
+            size=size,
+        )[1]
+    else:
+        nchunks = [1, 1, 1]
+    return list(nchunks)
+
+
+# ==============================================================================
+class Block(object):
+    """One chunk of the domain.
+
+    Attributes:
+        index: position [iz,iy,ix] of the chunk.
+        shape: [mz,my,mx] of the domain.
+        box:   global index ranges [[n1,n2],[m1,m2],[l1,l2]] of the halo
+               padded block the kernel computes. With periodic boundaries
+               these may extend beyond the domain.
+        out:   index of the destination dataset the block writes to.
+        inner: index of the kernel result matching out.
+    """
+
+    def __init__(self, index, shape, box, out, inner):
+        self.index = tuple(index)
+        self.shape = tuple(int(m) for m in shape)
+        self.box = [tuple(int(i) for i in limits) for limits in box]
+        self.out = (Ellipsis,) + tuple(out)
+        self.inner = (Ellipsis,) + tuple(inner)
+
+    @property
+    def limits(self):
+        """Box limits in the order l1, l2, m1, m2, n1, n2 of the kernels."""
+        (n1, n2), (m1, m2), (l1, l2) = self.box
+        return l1, l2, m1, m2, n1, n2
+
+    @property
+    def out_limits(self):
+        """Limits of out in the order l1, l2, m1, m2, n1, n2 of the kernels.
+        Kernels taking derivatives compute these and read the halo."""
+        zs, ys, xs = self.out[1:]
+        return xs.start, xs.stop, ys.start, ys.stop, zs.start, zs.stop
+
+    def __repr__(self):
+        return "Block({}, box={})".format(list(self.index), self.box)
+
+
+def chunk_blocks(shape, nchunks, nghost=3, halo=None, periodic=False):
+    """Split a domain with ghost zones into halo padded blocks.
+
+    The interior of the domain is split into nchunks with np.array_split. The
+    blocks at the domain boundaries also write the nghost ghost zones, as far
+    as they are covered by the halo.
+
+    Keyword arguments:
+        shape:    [mz,my,mx] of the domain including ghost zones.
+        nchunks:  number of chunks [x,y,z] as returned by chunk_counts.
+        nghost:   number of ghost zones.
+        halo:     points added on each side of a chunk, scalar or [x,y,z].
+                  Default nghost.
+        periodic: wrap halos beyond the domain around, scalar or [x,y,z].
+                  Otherwise the box is clipped to the domain.
+    """
+    if halo is None:
+        halo = nghost
+    halo = np.broadcast_to(halo, 3)[::-1]
+    periodic = np.broadcast_to(periodic, 3)[::-1]
+    nchunks = np.broadcast_to(nchunks, 3)[::-1]
+    axes = list()
+    for m, nc, h, per in zip(shape[-3:], nchunks, halo, periodic):
+        chunks = list()
+        splits = np.array_split(np.arange(m - 2 * nghost) + nghost, nc)
+        for i, ind in enumerate(splits):
+            b1, b2 = ind[0] - h, ind[-1] + h + 1
+            if not per:
+                b1, b2 = max(b1, 0), min(b2, m)
+            o1, o2 = ind[0], ind[-1] + 1
+            if i == 0:
+                o1 = max(o1 - nghost, b1)
+            if i == len(splits) - 1:
+                o2 = min(o2 + nghost, b2)
+            chunks.append(((b1, b2), slice(o1, o2), slice(o1 - b1, o2 - b1)))
+        axes.append(chunks)
+    blocks = list()
+    for iz, zchunk in enumerate(axes[0]):
+        for iy, ychunk in enumerate(axes[1]):
+            for ix, xchunk in enumerate(axes[2]):
+                chunk = zchunk, ychunk, xchunk
+                blocks.append(
+                    Block(
+                        [iz, iy, ix],
+                        shape[-3:],
+                        [c[0] for c in chunk],
+                        [c[1] for c in chunk],
+                        [c[2] for c in chunk],
+                    )
+                )
+    return blocks
+
+
+# ==============================================================================
+class Slab(object):
+    """Part of an h5 dataset held in memory, sliced with global indices.
+
+    The last three dimensions of data cover the index ranges of box, all
+    others are complete. As with h5py, negative indices count from the end
+    of the dataset and slice stops beyond it are clipped. Open slice ends
+    stop at the box, [()] returns all of data. Requests beyond the box raise
+    an IndexError.
+
+    Periodic images read beyond the end of the domain are addressed by their
+    indices >= m. Those before its start are addressed through images, where
+    negative indices are the points left of index 0, e.g. images[..., -2:0].
+    """
+
+    def __init__(self, data, box, shape):
+        self.data = data
+        self.box = box
+        self.shape = tuple(shape)
+        self.dtype = data.dtype
+        self.ndim = len(self.shape)
+
+    @property
+    def images(self):
+        """Indexer of the slab with negative indices as periodic images."""
+        return _Images(self)
+
+    def __getitem__(self, index):
+        return self._take(index, wrap=True)
+
+    def _take(self, index, wrap):
+        if not isinstance(index, tuple):
+            index = (index,)
+        if index == () or index == (Ellipsis,):
+            return self.data
+        if Ellipsis in index:
+            i = index.index(Ellipsis)
+            fill = (slice(None),) * (self.ndim - len(index) + 1)
+            index = index[:i] + fill + index[i + 1 :]
+        index = index + (slice(None),) * (self.ndim - len(index))
+        lead = self.ndim - 3
+        local = list(index[:lead])
+        for item, (b1, b2), m in zip(index[lead:], self.box, self.shape[lead:]):
+            if isinstance(item, slice):
+                start, stop, step = item.start, item.stop, item.step
+                if wrap and start is not None and start < 0:
+                    start += m
+                if wrap and stop is not None and stop < 0:
+                    stop += m
+                start = b1 if start is None else start
+                stop = b2 if stop is None else min(stop, max(m, b2))
+                if start < b1 or stop > b2:
+                    raise IndexError(
+                        "indices [{}:{}] outside of the chunk [{}:{}], "
+                        "increase the halo".format(start, stop, b1, b2)
+                    )
+                local.append(slice(start - b1, stop - b1, step))
+            else:
+                if wrap and item < 0:
+                    item += m
+                if not b1 <= item < b2:
+                    raise IndexError(
+                        "index {} outside of the chunk [{}:{}], "
+                        "increase the halo".format(item, b1, b2)
+                    )
+                local.append(item - b1)
+        return self.data[tuple(local)]
+
+
+class _Images(object):
+    """Slab indexer without wrapping of negative indices, see Slab.images."""
+
+    def __init__(self, slab):
+        self.slab = slab
+
+    def __getitem__(self, index):
+        return self.slab._take(index, wrap=False)
+
+
+class _NotRead(Exception):
+    """A dataset was accessed that was not read into a pickled window."""
+
+
+class Window(object):
+    """Hyperslab of a block in an h5 group, read on demand.
+
+    Datasets with the spatial shape [mz,my,mx] in their last dimensions are
+    read as Slab over the box of the block, widened by margin points, when
+    they are first accessed. Other datasets are read completely. Subgroups
+    are windows themselves. Names accessed are collected in used, so that
+    they can be read ahead for the next block.
+
+    A pickled window, e.g. in a worker process, carries the datasets read so
+    far and opens the file read-only for the others. If that fails, e.g. as
+    the file is locked for writing, accessing them raises _NotRead.
+
+    Keyword arguments:
+        group:    h5py group or file.
+        block:    Block to read.
+        margin:   extra points read around the box for derivatives.
+        periodic: wrap index ranges beyond the domain around, scalar or [x,y,z].
+        nghost:   number of ghost zones, for the periodic images.
+        skip:     names of datasets not to read, e.g. the output.
+        select:   names of the only datasets to read, default all.
+        read:     paths of datasets read right away, e.g. 'data/bb'.
+    """
+
+    def __init__(
+        self,
+        group,
+        block,
+        margin=0,
+        periodic=False,
+        nghost=3,
+        skip=(),
+        select=None,
+        read=(),
+        prefix="",
+        used=None,
+    ):
+        import h5py
+
+        self.group = group
+        self.file = None
+        self.source = (group.file.filename, group.name)
+        self.block = block
+        self.margin = margin
+        self.periodic = periodic
+        self.nghost = nghost
+        self.prefix = prefix
+        self.used = set() if used is None else used
+        self.items = dict()
+        self.names = list()
+        for name, item in group.items():
+            if isinstance(item, h5py.Group):
+                self.items[name] = Window(
+                    item,
+                    block,
+                    margin,
+                    periodic,
+                    nghost,
+                    skip,
+                    select,
+                    read,
+                    prefix + name + "/",
+                    self.used,
+                )
+            elif name in skip or (select is not None and name not in select):
+                continue
+            elif prefix + name in read:
+                self.items[name] = self._read(item)
+            self.names.append(name)
+
+    def _read(self, item):
+        if item.shape[-3:] == self.block.shape:
+            return _read_slab(
+                item, self.block, self.margin, self.periodic, self.nghost
+            )
+        return item[()]
+
+    def _item(self, name):
+        if name not in self.names:
+            raise KeyError(name)
+        self.used.add(self.prefix + name)
+        if name not in self.items:
+            if self.group is None:
+                self._open(name)
+            self.items[name] = self._read(self.group[name])
+        return self.items[name]
+
+    def _open(self, name):
+        """Open the group read-only in a pickled window."""
+        import h5py
+
+        filename, path = self.source
+        try:
+            self.file = h5py.File(filename, "r")
+            self.group = self.file[path]
+        except (OSError, KeyError):
+            self.file = None
+            raise _NotRead(self.prefix + name)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["group"] = None
+        state["file"] = None
+        return state
+
+    def keys(self):
+        return list(self.names)
+
+    def __contains__(self, name):
+        item = self
+        parts = name.strip("/").split("/")
+        for part in parts[:-1]:
+            item = item.items.get(part)
+            if not isinstance(item, Window):
+                return False
+        return parts[-1] in item.names
+
+    def __getitem__(self, name):
+        item = self
+        for part in name.strip("/").split("/"):
+            item = item._item(part)
+        return item
+
+
+def _read_slab(dataset, block, margin, periodic, nghost):
+    """Read the box of the block widened by margin from dataset into a Slab."""
+    from itertools import product
+
+    ranges = list()
+    pieces = list()
+    periodic = np.broadcast_to(periodic, 3)[::-1]
+    for (b1, b2), m, per in zip(block.box, block.shape, periodic):
+        if per:
+            b1, b2 = b1 - margin, b2 + margin
+            index = np.arange(b1, b2)
+            index[index < 0] += m - 2 * nghost
+            index[index >= m] -= m - 2 * nghost
+        else:
+            b1, b2 = max(b1 - margin, 0), min(b2 + margin, m)
+            index = np.arange(b1, b2)
+        ranges.append((b1, b2))
+        # read each contiguous part of the index range as one hyperslab
+        axis = list()
+        for part in np.split(index, np.where(np.diff(index) != 1)[0] + 1):
+            local = axis[-1][0].stop if axis else 0
+            axis.append(
+                (slice(local, local + part.size), slice(part[0], part[-1] + 1))
+            )
+        pieces.append(axis)
+    data = np.empty(
+        dataset.shape[:-3] + tuple(b2 - b1 for b1, b2 in ranges), dtype=dataset.dtype
+    )
+    for (zl, zs), (yl, ys), (xl, xs) in product(*pieces):
+        data[..., zl, yl, xl] = dataset[..., zs, ys, xs]
+    return Slab(data, ranges, dataset.shape)
+
+
+# ==============================================================================
+def _run_block(kernel, windows, block, args, kwargs):
+    """Evaluate the kernel on one block, in the pool or in this process."""
+    return kernel(windows, block, *args, **kwargs)
+
+
+def chunked_map(
+    kernel,
+    blocks,
+    groups,
+    args=(),
+    kwargs=None,
+    margin=0,
+    periodic=False,
+    nghost=3,
+    skip=(),
+    select=None,
+    n_proc=1,
+    rank=0,
+    size=1,
+):
+    """Evaluate kernel(windows, block, *args, **kwargs) on all blocks.
+
+    Generator yielding (block, result) for the blocks of this rank in order.
+    The first block is computed in this process, reading the datasets as
+    the kernel accesses them. The datasets it used are then read for the
+    next blocks while the previous ones are computed, so that reading the h5
+    file overlaps with the computation. Results are returned to the caller
+    to be written back or reduced.
+
+    Keyword arguments:
+        kernel:   module level function, pickled for n_proc > 1.
+        blocks:   list of Block, see chunk_blocks.
+        groups:   list of h5py groups, or None, windowed for the kernel.
+        margin:   points read beyond the box of a block.
+        periodic: wrap reads beyond the domain around, scalar or [x,y,z].
+        nghost:   number of ghost zones.
+        skip:     names of datasets not read, e.g. those being written.
+        select:   names of the only datasets read, default all.
+        n_proc:   number of worker processes.
+        rank:     processor rank, blocks are split across the MPI ranks.
+        size:     number of MPI ranks.
+    """
+    from collections import deque
+    from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+    if kwargs is None:
+        kwargs = dict()
+    blocks = blocks[rank::size]
+    # paths of the datasets used by the kernel so far, for each group
+    used = [set() for group in groups]
+
+    def read(block, names):
+        return [
+            None
+            if group is None
+            else Window(group, block, margin, periodic, nghost, skip, select, read)
+            for group, read in zip(groups, names)
+        ]
+
+    def known():
+        return [set(names) for names in used]
+
+    def run(block, windows=None):
+        if windows is None:
+            windows = read(block, known())
+        result = _run_block(kernel, windows, block, args, kwargs)
+        for names, window in zip(used, windows):
+            if window is not None:
+                names.update(window.used)
+        return result
+
+    if not blocks:
+        return
+    yield blocks[0], run(blocks[0])
+    if n_proc > 1 and len(blocks) > 2:
+        pending = deque()
+        with ProcessPoolExecutor(max_workers=n_proc) as pool:
+            for block in blocks[1:]:
+                if len(pending) > n_proc:
+                    yield _collect(pending.popleft(), run)
+                future = pool.submit(
+                    _run_block, kernel, read(block, known()), block, args, kwargs
+                )
+                pending.append((block, future))
+            while pending:
+                yield _collect(pending.popleft(), run)
+    else:
+        with ThreadPoolExecutor(max_workers=1) as reader:
+            if len(blocks) > 1:
+                ahead = reader.submit(read, blocks[1], known())
+            for i, block in enumerate(blocks[1:], 2):
+                windows = ahead.result()
+                if i < len(blocks):
+                    ahead = reader.submit(read, blocks[i], known())
+                yield block, run(block, windows)
+
+
+def _collect(pending, run):
+    """Result of a block computed in the pool. If the kernel accessed a
+    dataset that was not read ahead and the worker could not open the file,
+    the block is computed again in this process."""
+    import warnings
+
+    block, future = pending
+    try:
+        return block, future.result()
+    except _NotRead as error:
+        warnings.warn(
+            "chunked_map: the worker could not read {0}, computing the block {1} "
+            "in the main process.".format(error, block.index)
+        )
+        return block, run(block)
@@ -143,6 +143,10 @@ def dataset_h5(
     rank=0,
     size=1,
     comm=None,
+    chunks=None,
+    compression=None,
+    compression_opts=None,
+    shuffle=False,
 ):
     """This function adds/removes hdf5 dataset objects.
 
@@ -157,6 +161,11 @@ def dataset_h5(
         overwrite: flag to replace existing group from h5 object.
         rank:      processor rank with root = 0.
         comm:      only present for parallel version of h5py.
+        chunks:    chunk shape tuple, True for h5py's choice or None for a
+                   contiguous dataset.
+        compression: filter 'gzip', 'lzf' or None.
+        compression_opts: gzip level 0-9.
+        shuffle:   flag to apply the byte shuffle filter before compression.
     """
     try:
         ldata = len(data) > 0
@@ -166,6 +175,16 @@ def dataset_h5(
         lshape = len(shape) > 0
     except:
         lshape = shape is not None
+    # Chunking and filters only apply to arrays.
+    layout = dict()
+    if chunks is not None or compression or shuffle:
+        if (ldata and np.ndim(data) > 0) or (not ldata and lshape):
+            layout = dict(
+                chunks=chunks if chunks is not None else True,
+                compression=compression,
+                compression_opts=compression_opts,
+                shuffle=shuffle,
+            )
     # if both overwrite and delete, delete is False
     if delete:
         delete = not overwrite
@@ -183,12 +202,12 @@ def dataset_h5(
                     if np.mod(rank, size) == 0:
                         print("dataset_h5: data not present, provide dtype")
                 else:
-                    h5obj.create_dataset(dataname, shape, dtype=dtype)
+                    h5obj.create_dataset(dataname, shape, dtype=dtype, **layout)
             else:
                 if not dtype:
-                    h5obj.create_dataset(dataname, data=data)
+                    h5obj.create_dataset(dataname, data=data, **layout)
                 else:
-                    h5obj.create_dataset(dataname, data=data, dtype=dtype)
+                    h5obj.create_dataset(dataname, data=data, dtype=dtype, **layout)
     else:
         if not status == "r" and (delete or overwrite):
             try:
@@ -207,12 +226,88 @@ def dataset_h5(
                         if np.mod(rank, size) == 0:
                             print("dataset_h5: data not present, provide dtype")
                     else:
-                        h5obj.create_dataset(dataname, shape, dtype=dtype)
+                        h5obj.create_dataset(dataname, shape, dtype=dtype, **layout)
                 else:
                     if not dtype:
-                        h5obj.create_dataset(dataname, data=data)
+                        h5obj.create_dataset(dataname, data=data, **layout)
                     else:
-                        h5obj.create_dataset(dataname, data=data, dtype=dtype)
+                        h5obj.create_dataset(
+                            dataname, data=data, dtype=dtype, **layout
+                        )
             else:
                 return False
     return h5obj[dataname]
+
+
+# ==============================================================================
+def chunk_shape(
+    shape,
+    access="block",
+    itemsize=8,
+    procdim=None,
+    chunk_bytes=2 ** 20,
+):
+    """This function returns the chunk shape of a 3D dataset [mz, my, mx]
+    suited to the expected access pattern.
+
+    Keyword arguments:
+        shape:     dataset shape tuple (mz, my, mx).
+        access:    expected access pattern or chunk shape tuple:
+                   'full':   whole fields, chunks of complete xy planes,
+                   'plane':  single z planes or xy slices, one plane per chunk,
+                   'pencil': x pencils, chunks of complete x rows,
+                   'block':  sub-volumes, near cubic chunks,
+                   'proc':   processor sub-domains, chunks of the size of
+                             the sub-domains along the processor directions,
+                   'auto':   'proc' if procdim is given, else 'block'.
+        itemsize:  bytes per value, e.g. 4 for single precision.
+        procdim:   processor Dim object, required for access='proc'.
+        chunk_bytes: target size of the chunks in bytes, ~1MB by default
+                   as the h5py chunk cache.
+    """
+    shape = tuple(int(n) for n in shape)
+    if not isinstance(access, str):
+        return tuple(max(1, min(int(c), n)) for c, n in zip(access, shape))
+    nvalues = max(1, chunk_bytes // itemsize)
+    if access == "auto":
+        access = "proc" if procdim else "block"
+    mz, my, mx = shape
+    if access == "full":
+        chunks = (nvalues // (my * mx), my, mx)
+    elif access == "plane":
+        chunks = (1, nvalues // mx, mx) if my * mx > 4 * nvalues else (1, my, mx)
+    elif access == "pencil":
+        chunks = (1, nvalues // mx, mx)
+    elif access == "block":
+        edge = int(round(nvalues ** (1.0 / 3)))
+        chunks = (edge, edge, edge)
+    elif access == "proc":
+        if not procdim:
+            print("chunk_shape: procdim required for access='proc', using 'block'")
+            return chunk_shape(shape, "block", itemsize, None, chunk_bytes)
+        # A processor direction gets chunks of the sub-domain size n, or
+        # of a divisor of n if the sub-domains exceed chunk_bytes. Each
+        # processor then writes to at most two chunks along that axis, the
+        # sub-domains being offset by nghost. The directions not split by
+        # processors fill the chunks, x first.
+        chunks = list()
+        for m, n, nghost in (
+            (mz, procdim.nz, procdim.nghostz),
+            (my, procdim.ny, procdim.nghosty),
+            (mx, procdim.nx, procdim.nghostx),
+        ):
+            chunks.append(n if n + 2 * nghost < m else None)
+        split = [i for i in range(3) if chunks[i] is not None]
+        while np.prod([chunks[i] for i in split]) > nvalues:
+            i = max(split, key=lambda i: chunks[i])
+            if chunks[i] == 1:
+                break
+            chunks[i] //= min(k for k in range(2, chunks[i] + 1) if chunks[i] % k == 0)
+        for i in (2, 1, 0):
+            if chunks[i] is None:
+                filled = int(np.prod([c for c in chunks if c is not None]))
+                chunks[i] = max(1, min(shape[i], nvalues // filled))
+    else:
+        raise ValueError("chunk_shape: unknown access pattern {0}".format(access))
+
+    return tuple(max(1, min(c, n)) for c, n in zip(chunks, shape))
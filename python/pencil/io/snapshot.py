@@ -228,6 +228,10 @@ def write_h5_snapshot(
     overwrite=False,
     rank=0,
     size=1,
+    chunks=None,
+    compression=None,
+    compression_opts=None,
+    shuffle=False,
 ):
     """
     Write a snapshot given as numpy array.
@@ -243,7 +247,9 @@ def write_h5_snapshot(
                    precision='d', nghost=3, persist=None, settings=None,
                    param=None, grid=None, lghosts=False, indx=None,
                    unit=None, t=None, x=None, y=None, z=None, procdim=None,
-                   quiet=True, lshear=False, driver=None, comm=None)
+                   quiet=True, lshear=False, driver=None, comm=None,
+                   chunks=None, compression=None, compression_opts=None,
+                   shuffle=False)
 
     Keyword arguments:
 
@@ -310,13 +316,31 @@ def write_h5_snapshot(
 
     *rank*
       rank of process with root=0.
+
+    *chunks*
+      Chunk shape of the fields, either a tuple (mz, my, mx) or the
+      expected access pattern 'full', 'plane', 'pencil', 'block', 'proc'
+      or 'auto' from which io.chunk_shape derives it. 'auto' is 'proc' if
+      procdim is given, else 'block'. If None the fields are stored
+      contiguously. The access pattern and the chunk shape are stored in the
+      attributes 'layout' and 'chunks' of the data group.
+
+    *compression*
+      Compression filter 'gzip' or 'lzf' of the fields, implies chunks.
+      Filters with driver='mpio' require parallel HDF5 >= 1.10.2.
+
+    *compression_opts*
+      Compression level 0-9 for 'gzip'.
+
+    *shuffle*
+      Apply the byte shuffle filter, improves the compression of floats.
     """
 
     import numpy as np
     from os.path import join
 
     from pencil import read
-    from pencil.io import open_h5, group_h5, dataset_h5
+    from pencil.io import open_h5, group_h5, dataset_h5, chunk_shape
     from pencil import is_sim_dir
 
     # test if simulation directory
@@ -483,6 +507,22 @@ def write_h5_snapshot(
     if t is None:
         t = data_type(0.0)
 
+    # Chunk layout of the fields.
+    layout = dict(
+        compression=compression, compression_opts=compression_opts, shuffle=shuffle
+    )
+    if chunks is None and (compression or shuffle):
+        chunks = "auto"
+    if chunks == "auto" or (chunks == "proc" and not procdim):
+        chunks = "proc" if procdim else "block"
+    if chunks is not None:
+        layout["chunks"] = chunk_shape(
+            (settings["mz"], settings["my"], settings["mx"]),
+            chunks,
+            itemsize=np.dtype(data_type).itemsize,
+            procdim=procdim,
+        )
+
     # making use of pc_hdf5 functionality:
     if not proc == None:
         state = "a"
@@ -508,6 +548,15 @@ def write_h5_snapshot(
             rank=rank,
             size=size,
         )
+        # Record the layout, so that readers can choose their access.
+        if "chunks" in layout:
+            data_grp.attrs["layout"] = np.bytes_(
+                chunks if isinstance(chunks, str) else "explicit"
+            )
+            data_grp.attrs["chunks"] = np.array(layout["chunks"], dtype=np.int64)
+        else:
+            data_grp.attrs["layout"] = np.bytes_("contiguous")
+        data_grp.attrs["compression"] = np.bytes_(str(compression or "none"))
         if not procdim:
             for key in indx.__dict__.keys():
                 if key in ["uu", "keys", "aa", "KR_Frad", "uun", "gg", "bb"]:
@@ -534,6 +583,7 @@ def write_h5_snapshot(
                         rank=rank,
                         comm=comm,
                         size=size,
+                        **layout
                     )
                 else:
                     dataset_h5(
@@ -546,6 +596,7 @@ def write_h5_snapshot(
                         rank=rank,
                         comm=comm,
                         size=size,
+                        **layout
                     )
         else:
             for key in indx.__dict__.keys():
@@ -560,6 +611,7 @@ def write_h5_snapshot(
                     rank=rank,
                     comm=comm,
                     size=size,
+                    **layout
                 )
             # adjust indices to include ghost zones at boundaries
             l1, m1, n1 = procdim.l1, procdim.m1, procdim.n1
@@ -7,10 +7,10 @@
       store "time" of snapshot
 """
 import numpy as np
-from pencil.math import dot, dot2, helmholtz_fft, cpu_optimal
-from pencil.math.derivatives import curl, curl2
+from pencil.math import dot, dot2, helmholtz_fft
 from pencil.calc import fluid_reynolds, magnetic_reynolds
-from pencil.io import group_h5, dataset_h5
+from pencil.calc.derived import DerivedFields
+from pencil.io import group_h5, dataset_h5, chunk_counts, chunk_blocks, chunked_map
 from pencil import read
 from scipy.ndimage import gaussian_filter as gf
 import os
@@ -63,6 +63,28 @@ def under_limits(n1, m1, l1, n1shift, m1shift, l1shift, nghost):
     return n1r, m1r, l1r
 
 
+def derive_chunk(src, key, gd, l1, l2, m1, m2, n1, n2, nghost):
+    """Compute the derived quantity key, see pencil.calc.derived, on the
+    chunk [n1:n2, m1:m2, l1:l2] of src, using nghost more points on each
+    side for the derivatives."""
+    n1shift, n2shift, m1shift, m2shift, l1shift, l2shift = der_limits(
+        n1, n2, m1, m2, l1, l2, nghost
+    )
+    fields = {}
+    for vector in ("uu", "aa"):
+        components = [vector[0] + x for x in "xyz"]
+        if all(component in src.keys() for component in components):
+            fields[vector] = lambda components=components: np.array(
+                [
+                    src[component][n1shift:n2shift, m1shift:m2shift, l1shift:l2shift]
+                    for component in components
+                ]
+            )
+    var = DerivedFields(fields, dx=gd.dx, dy=gd.dy, dz=gd.dz)[key]
+    n1r, m1r, l1r = under_limits(n1, m1, l1, n1shift, m1shift, l1shift, nghost)
+    return var[..., n1r : n2 - n1 + n1r, m1r : m2 - m1 + m1r, l1r : l2 - l1 + l1r]
+
+
 def derive_data(
     sim_path,
     src,
@@ -83,6 +105,7 @@ def derive_data(
     nmin=32,
     Reynolds_shock=False,
     lmix=False,
+    n_proc=1,
 ):
 
     if comm:
@@ -105,45 +128,19 @@ def derive_data(
         src["settings"]["mz"][0],
     )
     # split data into manageable memory chunks
-    dstchunksize = 8 * nx * ny * nz / 1024 * 1024
-    if dstchunksize > chunksize:
-        nchunks = cpu_optimal(
-            nx,
-            ny,
-            nz,
-            quiet=quiet,
-            mvar=src["settings/mvar"][0],
-            maux=src["settings/maux"][0],
-            MBmin=chunksize,
-            nmin=nmin,
-            size=size,
-        )[1]
-    else:
-        nchunks = [1, 1, 1]
+    nchunks = chunk_counts(
+        nx,
+        ny,
+        nz,
+        mvar=src["settings/mvar"][0],
+        maux=src["settings/maux"][0],
+        chunksize=chunksize,
+        nmin=nmin,
+        size=size,
+        quiet=quiet,
+    )
     print("nchunks {}".format(nchunks))
-    # for mpi split chunks across processes
-    if size > 1:
-        locindx = np.array_split(np.arange(nx) + nghost, nchunks[0])
-        locindy = np.array_split(np.arange(ny) + nghost, nchunks[1])
-        locindz = np.array_split(np.arange(nz) + nghost, nchunks[2])
-        indx = [
-            locindx[
-                np.mod(
-                    rank + int(rank / nchunks[2]) + int(rank / nchunks[1]), nchunks[0]
-                )
-            ]
-        ]
-        indy = [locindy[np.mod(rank + int(rank / nchunks[2]), nchunks[1])]]
-        indz = [locindz[np.mod(rank, nchunks[2])]]
-        allchunks = 1
-    else:
-        locindx = np.array_split(np.arange(nx) + nghost, nchunks[0])
-        locindy = np.array_split(np.arange(ny) + nghost, nchunks[1])
-        locindz = np.array_split(np.arange(nz) + nghost, nchunks[2])
-        indx = np.array_split(np.arange(nx) + nghost, nchunks[0])
-        indy = np.array_split(np.arange(ny) + nghost, nchunks[1])
-        indz = np.array_split(np.arange(nz) + nghost, nchunks[2])
-        allchunks = nchunks[0] * nchunks[1] * nchunks[2]
+    blocks = chunk_blocks([mz, my, mx], nchunks, nghost=nghost)
     # save time
     dataset_h5(
         dst,
@@ -198,82 +195,36 @@ def derive_data(
                 dtype=dtype,
             )
             print("writing " + key + " shape {}".format([mz, my, mx]))
-        for ichunk in range(allchunks):
-            for iz in [indz[np.mod(ichunk, nchunks[2])]]:
-                n1, n2 = iz[0] - nghost, iz[-1] + nghost + 1
-                n1out = n1 + nghost
-                n2out = n2 - nghost
-                varn1 = nghost
-                varn2 = -nghost
-                if iz[0] == locindz[0][0]:
-                    n1out = 0
-                    varn1 = 0
-                if iz[-1] == locindz[-1][-1]:
-                    n2out = n2
-                    varn2 = n2
-                if not quiet:
-                    print("remeshing " + key + "z chunk {}".format([iz]))
-                for iy in [indy[np.mod(ichunk + int(ichunk / nchunks[2]), nchunks[1])]]:
-                    m1, m2 = iy[0] - nghost, iy[-1] + nghost + 1
-                    m1out = m1 + nghost
-                    m2out = m2 - nghost
-                    varm1 = nghost
-                    varm2 = -nghost
-                    if iy[0] == locindy[0][0]:
-                        m1out = 0
-                        varm1 = 0
-                    if iy[-1] == locindy[-1][-1]:
-                        m2out = m2
-                        varm2 = m2
-                    if not quiet:
-                        print("remeshing " + key + "y chunk {}".format([iy]))
-                    for ix in [
-                        indx[
-                            np.mod(
-                                ichunk
-                                + int(ichunk / nchunks[2])
-                                + int(ichunk / nchunks[1]),
-                                nchunks[0],
-                            )
-                        ]
-                    ]:
-                        l1, l2 = ix[0] - nghost, ix[-1] + nghost + 1
-                        l1out = l1 + nghost
-                        l2out = l2 - nghost
-                        varl1 = nghost
-                        varl2 = -nghost
-                        if ix[0] == locindx[0][0]:
-                            l1out = 0
-                            varl1 = 0
-                        if ix[-1] == locindx[-1][-1]:
-                            l2out = l2
-                            varl2 = l2
-                        if not quiet:
-                            print("remeshing " + key + "x chunk {}".format([ix]))
-                        var = calc_derived_data(
-                            src["data"],
-                            dst["data"],
-                            key,
-                            par,
-                            gd,
-                            l1,
-                            l2,
-                            m1,
-                            m2,
-                            n1,
-                            n2,
-                            nghost=nghost,
-                            Reynolds_shock=Reynolds_shock,
-                            lmix=lmix,
-                        )
-                        if is_vector(key):
-                            dst["data"][key][
-                                :, n1out:n2out, m1out:m2out, l1out:l2out
-                            ] = dtype(var[:, varn1:varn2, varm1:varm2, varl1:varl2])
-                        else:
-                            dst["data"][key][
-                                n1out:n2out, m1out:m2out, l1out:l2out
-                            ] = dtype(var[varn1:varn2, varm1:varm2, varl1:varl2])
+        for block, var in chunked_map(
+            _derive_block,
+            blocks,
+            [src["data"], dst["data"]],
+            args=(key, par, gd, nghost, Reynolds_shock, lmix),
+            skip=[key],
+            n_proc=n_proc,
+            rank=rank,
+            size=size,
+        ):
+            if not quiet:
+                print("deriving " + key + " chunk {}".format(block))
+            dst["data"][key][block.out] = dtype(var)
+
+
+def _derive_block(windows, block, key, par, gd, nghost, Reynolds_shock, lmix):
+    """Kernel of derive_data on the windows of src["data"] and dst["data"].
+    The output range of the block is computed, its halo covers the
+    derivatives."""
+    return calc_derived_data(
+        windows[0],
+        windows[1],
+        key,
+        par,
+        gd,
+        *block.out_limits,
+        nghost=nghost,
+        Reynolds_shock=Reynolds_shock,
+        lmix=lmix,
+    )
 
 
 # ==============================================================================
@@ -553,53 +504,17 @@ def calc_derived_data(
     # ======================================================================
     def vorticity(src, dst, key, par, gd, l1, l2, m1, m2, n1, n2, nghost):
         if key == "vort":
-            n1shift, n2shift, m1shift, m2shift, l1shift, l2shift = der_limits(
-                n1, n2, m1, m2, l1, l2, nghost
-            )
-            uu = np.array(
-                [
-                    src["ux"][n1shift:n2shift, m1shift:m2shift, l1shift:l2shift],
-                    src["uy"][n1shift:n2shift, m1shift:m2shift, l1shift:l2shift],
-                    src["uz"][n1shift:n2shift, m1shift:m2shift, l1shift:l2shift],
-                ]
-            )
-            var = curl(uu, gd.dx, gd.dy, gd.dz)
-            n1r, m1r, l1r = under_limits(n1, m1, l1, n1shift, m1shift, l1shift, nghost)
-            return var[:, n1r : n2 - n1 + n1r, m1r : m2 - m1 + m1r, l1r : l2 - l1 + l1r]
+            return derive_chunk(src, key, gd, l1, l2, m1, m2, n1, n2, nghost)
 
     # ======================================================================
     def bfield(src, dst, key, par, gd, l1, l2, m1, m2, n1, n2, nghost):
         if key == "bb":
-            n1shift, n2shift, m1shift, m2shift, l1shift, l2shift = der_limits(
-                n1, n2, m1, m2, l1, l2, nghost
-            )
-            aa = np.array(
-                [
-                    src["ax"][n1shift:n2shift, m1shift:m2shift, l1shift:l2shift],
-                    src["ay"][n1shift:n2shift, m1shift:m2shift, l1shift:l2shift],
-                    src["az"][n1shift:n2shift, m1shift:m2shift, l1shift:l2shift],
-                ]
-            )
-            var = curl(aa, gd.dx, gd.dy, gd.dz)
-            n1r, m1r, l1r = under_limits(n1, m1, l1, n1shift, m1shift, l1shift, nghost)
-            return var[:, n1r : n2 - n1 + n1r, m1r : m2 - m1 + m1r, l1r : l2 - l1 + l1r]
+            return derive_chunk(src, key, gd, l1, l2, m1, m2, n1, n2, nghost)
 
     # ======================================================================
     def current(src, dst, key, par, gd, l1, l2, m1, m2, n1, n2, nghost):
         if key == "jj":
-            n1shift, n2shift, m1shift, m2shift, l1shift, l2shift = der_limits(
-                n1, n2, m1, m2, l1, l2, nghost
-            )
-            aa = np.array(
-                [
-                    src["ax"][n1shift:n2shift, m1shift:m2shift, l1shift:l2shift],
-                    src["ay"][n1shift:n2shift, m1shift:m2shift, l1shift:l2shift],
-                    src["az"][n1shift:n2shift, m1shift:m2shift, l1shift:l2shift],
-                ]
-            )
-            var = curl2(aa, gd.dx, gd.dy, gd.dz)
-            n1r, m1r, l1r = under_limits(n1, m1, l1, n1shift, m1shift, l1shift, nghost)
-            return var[:, n1r : n2 - n1 + n1r, m1r : m2 - m1 + m1r, l1r : l2 - l1 + l1r]
+            return derive_chunk(src, key, gd, l1, l2, m1, m2, n1, n2, nghost)
 
     # ======================================================================
     def kin_helicity(src, dst, key, par, gd, l1, l2, m1, m2, n1, n2, nghost):
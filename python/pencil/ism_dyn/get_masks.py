@@ -14,8 +14,8 @@
       compute 'structure' functions as required
 """
 import numpy as np
-from pencil.math import cpu_optimal
 from pencil.io import open_h5, group_h5, dataset_h5
+from pencil.io import chunk_counts, chunk_blocks, chunked_map
 from pencil import read
 import os
 
@@ -73,6 +73,7 @@ def derive_masks(
         "hot",
     ],
     unit_key="unit_entropy",
+    n_proc=1,
 ):
     if comm:
         overwrite = False
@@ -91,46 +92,19 @@ def derive_masks(
         src["settings"]["mz"][0],
     )
     # split data into manageable memory chunks
-    dstchunksize = 8 * nx * ny * nz / 1024 * 1024
-    if dstchunksize > chunksize:
-        nchunks = cpu_optimal(
-            nx,
-            ny,
-            nz,
-            quiet=quiet,
-            mvar=src["settings/mvar"][0],
-            maux=src["settings/maux"][0],
-            MBmin=chunksize,
-            nmin=nmin,
-            size=size,
-        )[1]
-    else:
-        nchunks = [1, 1, 1]
+    nchunks = chunk_counts(
+        nx,
+        ny,
+        nz,
+        mvar=src["settings/mvar"][0],
+        maux=src["settings/maux"][0],
+        chunksize=chunksize,
+        nmin=nmin,
+        size=size,
+        quiet=quiet,
+    )
     print("nchunks {}".format(nchunks))
-    # for mpi split chunks across processes
-    # for mpi split chunks across processes
-    if size > 1:
-        locindx = np.array_split(np.arange(nx) + nghost, nchunks[0])
-        locindy = np.array_split(np.arange(ny) + nghost, nchunks[1])
-        locindz = np.array_split(np.arange(nz) + nghost, nchunks[2])
-        indx = [
-            locindx[
-                np.mod(
-                    rank + int(rank / nchunks[2]) + int(rank / nchunks[1]), nchunks[0]
-                )
-            ]
-        ]
-        indy = [locindy[np.mod(rank + int(rank / nchunks[2]), nchunks[1])]]
-        indz = [locindz[np.mod(rank, nchunks[2])]]
-        allchunks = 1
-    else:
-        locindx = np.array_split(np.arange(nx) + nghost, nchunks[0])
-        locindy = np.array_split(np.arange(ny) + nghost, nchunks[1])
-        locindz = np.array_split(np.arange(nz) + nghost, nchunks[2])
-        indx = np.array_split(np.arange(nx) + nghost, nchunks[0])
-        indy = np.array_split(np.arange(ny) + nghost, nchunks[1])
-        indz = np.array_split(np.arange(nz) + nghost, nchunks[2])
-        allchunks = nchunks[0] * nchunks[1] * nchunks[2]
+    blocks = chunk_blocks([mz, my, mx], nchunks, nghost=nghost)
     # ensure derived variables are in a list
     if isinstance(mask_keys, list):
         mask_keys = mask_keys
@@ -154,71 +128,29 @@ def derive_masks(
             dtype=np.bool_,
         )
         print("writing " + key + " shape {}".format([ne, mz, my, mx]))
-        for ichunk in range(allchunks):
-            for iz in [indz[np.mod(ichunk, nchunks[2])]]:
-                n1, n2 = iz[0] - nghost, iz[-1] + nghost + 1
-                n1out = n1 + nghost
-                n2out = n2 - nghost
-                varn1 = nghost
-                varn2 = -nghost
-                if iz[0] == locindz[0][0]:
-                    n1out = 0
-                    varn1 = 0
-                if iz[-1] == locindz[-1][-1]:
-                    n2out = n2
-                    varn2 = n2
-                for iy in [indy[np.mod(ichunk + int(ichunk / nchunks[2]), nchunks[1])]]:
-                    m1, m2 = iy[0] - nghost, iy[-1] + nghost + 1
-                    m1out = m1 + nghost
-                    m2out = m2 - nghost
-                    varm1 = nghost
-                    varm2 = -nghost
-                    if iy[0] == locindy[0][0]:
-                        m1out = 0
-                        varm1 = 0
-                    if iy[-1] == locindy[-1][-1]:
-                        m2out = m2
-                        varm2 = m2
-                    for ix in [
-                        indx[
-                            np.mod(
-                                ichunk
-                                + int(ichunk / nchunks[2])
-                                + int(ichunk / nchunks[1]),
-                                nchunks[0],
-                            )
-                        ]
-                    ]:
-                        l1, l2 = ix[0] - nghost, ix[-1] + nghost + 1
-                        l1out = l1 + nghost
-                        l2out = l2 - nghost
-                        varl1 = nghost
-                        varl2 = -nghost
-                        if ix[0] == locindx[0][0]:
-                            l1out = 0
-                            varl1 = 0
-                        if ix[-1] == locindx[-1][-1]:
-                            l2out = l2
-                            varl2 = l2
-                        if data_key in src.keys():
-                            ss = src[data_key][n1:n2, m1:m2, l1:l2]
-                        else:
-                            if data_key in dst.keys():
-                                ss = dst[data_key][n1:n2, m1:m2, l1:l2]
-                            else:
-                                print(
-                                    "masks: " + data_key + " does not exist in ",
-                                    src,
-                                    "or",
-                                    dst,
-                                )
-                                return 1
-                        masks = thermal_decomposition(
-                            ss, par, unit_key=unit_key, ent_cut=ent_cuts
-                        )
-                        cut = 0
-                        for mask in masks:
-                            dst["masks"][key][
-                                cut, n1out:n2out, m1out:m2out, l1out:l2out
-                            ] = mask[varn1:varn2, varm1:varm2, varl1:varl2]
-                            cut += 1
+        for block, masks in chunked_map(
+            _mask_block,
+            blocks,
+            [src, dst],
+            args=(data_key, par, unit_key, ent_cuts),
+            select=[data_key.split("/")[-1]],
+            n_proc=n_proc,
+            rank=rank,
+            size=size,
+        ):
+            if masks is None:
+                print("masks: " + data_key + " does not exist in ", src, "or", dst)
+                return 1
+            dst["masks"][key][block.out] = masks[block.inner]
+
+
+def _mask_block(windows, block, data_key, par, unit_key, ent_cuts):
+    """Kernel of derive_masks on the windows of src and dst."""
+    l1, l2, m1, m2, n1, n2 = block.limits
+    for group in windows:
+        if data_key in group:
+            ss = group[data_key][n1:n2, m1:m2, l1:l2]
+            return np.array(
+                thermal_decomposition(ss, par, unit_key=unit_key, ent_cut=ent_cuts)
+            )
+    return None
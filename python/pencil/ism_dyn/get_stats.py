@@ -17,10 +17,11 @@ import numpy as np
 import scipy
 from pencil.ism_dyn import is_vector
 from scipy.interpolate import interp1d
-from pencil.math import dot, dot2, natural_sort, helmholtz_fft, cpu_optimal
+from pencil.math import dot, dot2, natural_sort, helmholtz_fft
 from pencil.math.derivatives import curl, div, curl2, grad
 from pencil.calc import fluid_reynolds, magnetic_reynolds
 from pencil.io import open_h5, group_h5, dataset_h5, mkdir
+from pencil.io import chunk_counts, chunk_blocks, chunked_map
 from fileinput import input
 from sys import stdout
 import subprocess as sub
@@ -45,6 +46,7 @@ def derive_stats(
     nmin=32,
     lmask=False,
     mask_key="hot",
+    n_proc=1,
 ):
 
     if comm:
@@ -64,45 +66,19 @@ def derive_stats(
         src["settings"]["mz"][0],
     )
     # split data into manageable memory chunks
-    dstchunksize = 8 * nx * ny * nz / 1024 * 1024
-    if dstchunksize > chunksize:
-        nchunks = cpu_optimal(
-            nx,
-            ny,
-            nz,
-            quiet=quiet,
-            mvar=src["settings/mvar"][0],
-            maux=src["settings/maux"][0],
-            MBmin=chunksize,
-            nmin=nmin,
-            size=size,
-        )[1]
-    else:
-        nchunks = [1, 1, 1]
+    nchunks = chunk_counts(
+        nx,
+        ny,
+        nz,
+        mvar=src["settings/mvar"][0],
+        maux=src["settings/maux"][0],
+        chunksize=chunksize,
+        nmin=nmin,
+        size=size,
+        quiet=quiet,
+    )
     print("nchunks {}".format(nchunks))
-    # for mpi split chunks across processes
-    if size > 1:
-        locindx = np.array_split(np.arange(nx) + nghost, nchunks[0])
-        locindy = np.array_split(np.arange(ny) + nghost, nchunks[1])
-        locindz = np.array_split(np.arange(nz) + nghost, nchunks[2])
-        indx = [
-            locindx[
-                np.mod(
-                    rank + int(rank / nchunks[2]) + int(rank / nchunks[1]), nchunks[0]
-                )
-            ]
-        ]
-        indy = [locindy[np.mod(rank + int(rank / nchunks[2]), nchunks[1])]]
-        indz = [locindz[np.mod(rank, nchunks[2])]]
-        allchunks = 1
-    else:
-        locindx = np.array_split(np.arange(nx) + nghost, nchunks[0])
-        locindy = np.array_split(np.arange(ny) + nghost, nchunks[1])
-        locindz = np.array_split(np.arange(nz) + nghost, nchunks[2])
-        indx = np.array_split(np.arange(nx) + nghost, nchunks[0])
-        indy = np.array_split(np.arange(ny) + nghost, nchunks[1])
-        indz = np.array_split(np.arange(nz) + nghost, nchunks[2])
-        allchunks = nchunks[0] * nchunks[1] * nchunks[2]
+    blocks = chunk_blocks([mz, my, mx], nchunks, nghost=nghost, halo=0)
     # ensure derived variables are in a list
     if isinstance(stat_keys, list):
         stat_keys = stat_keys
@@ -121,69 +97,34 @@ def derive_stats(
         mean_nmsk = list()
         stdv_nmsk = list()
         nmask_nmk = list()
-        for ichunk in range(allchunks):
-            for iz in [indz[np.mod(ichunk, nchunks[2])]]:
-                n1, n2 = iz[0], iz[-1] + 1
-                for iy in [indy[np.mod(ichunk + int(ichunk / nchunks[2]), nchunks[1])]]:
-                    m1, m2 = iy[0], iy[-1] + 1
-                    for ix in [
-                        indx[
-                            np.mod(
-                                ichunk
-                                + int(ichunk / nchunks[2])
-                                + int(ichunk / nchunks[1]),
-                                nchunks[0],
-                            )
-                        ]
-                    ]:
-                        l1, l2 = ix[0], ix[-1] + 1
-                        if key in src["data"].keys():
-                            var = src["data"][key][n1:n2, m1:m2, l1:l2]
-                        elif key == "uu" or key == "aa":
-                            tmp = np.array(
-                                [
-                                    src["data"][key[0] + "x"][n1:n2, m1:m2, l1:l2],
-                                    src["data"][key[0] + "y"][n1:n2, m1:m2, l1:l2],
-                                    src["data"][key[0] + "z"][n1:n2, m1:m2, l1:l2],
-                                ]
-                            )
-                            var = np.sqrt(dot2(tmp))
-                        else:
-                            if key in dst["data"].keys():
-                                if is_vector(key):
-                                    var = np.sqrt(
-                                        dot2(dst["data"][key][:, n1:n2, m1:m2, l1:l2])
-                                    )
-                                else:
-                                    var = dst["data"][key][n1:n2, m1:m2, l1:l2]
-                            else:
-                                print(
-                                    "stats: " + key + " does not exist in ",
-                                    src,
-                                    "or",
-                                    dst,
-                                )
-                                continue
-                        if lmask:
-                            mask = dst["masks"][mask_key][0, n1:n2, m1:m2, l1:l2]
-                            Nmask = mask[mask == False].size
-                            if Nmask > 0:
-                                mean_mask.append(var[mask == False].mean() * Nmask)
-                                stdv_mask.append(var[mask == False].std() * Nmask)
-                            else:
-                                mean_mask.append(0)
-                                stdv_mask.append(0)
-                            nmask_msk.append(Nmask)
-                            nmask = mask[mask == True].size
-                            if nmask > 0:
-                                mean_nmsk.append(var[mask == True].mean() * nmask)
-                                stdv_nmsk.append(var[mask == True].std() * nmask)
-                            else:
-                                mean_nmsk.append(0)
-                                stdv_nmsk.append(0)
-                            nmask_nmk.append(nmask)
-                        mean_stat.append(var.mean())
-                        stdv_stat.append(var.std())
+        groups = [
+            src["data"],
+            dst["data"] if "data" in dst.keys() else None,
+            dst["masks"] if lmask else None,
+        ]
+        select = [key, key[0] + "x", key[0] + "y", key[0] + "z", mask_key]
+        for block, stat in chunked_map(
+            _stats_block,
+            blocks,
+            groups,
+            args=(key, lmask, mask_key),
+            select=select,
+            n_proc=n_proc,
+            rank=rank,
+            size=size,
+        ):
+            if stat is None:
+                print("stats: " + key + " does not exist in ", src, "or", dst)
+                continue
+            if lmask:
+                mean_mask.append(stat["mean_mask"])
+                stdv_mask.append(stat["stdv_mask"])
+                nmask_msk.append(stat["nmask_msk"])
+                mean_nmsk.append(stat["mean_nmsk"])
+                stdv_nmsk.append(stat["stdv_nmsk"])
+                nmask_nmk.append(stat["nmask_nmk"])
+            mean_stat.append(stat["mean"])
+            stdv_stat.append(stat["stdv"])
         if comm:
             if lmask:
                 mean_mask = comm.gather(mean_mask, root=0)
@@ -304,6 +245,51 @@ def derive_stats(
         )
 
 
+def _stats_block(windows, block, key, lmask, mask_key):
+    """Kernel of derive_stats on the windows of src["data"], dst["data"] and
+    dst["masks"], returning the moments of key on the block or None."""
+    src, dst, masks = windows
+    l1, l2, m1, m2, n1, n2 = block.limits
+    if key in src.keys():
+        var = src[key][n1:n2, m1:m2, l1:l2]
+    elif key == "uu" or key == "aa":
+        tmp = np.array(
+            [
+                src[key[0] + "x"][n1:n2, m1:m2, l1:l2],
+                src[key[0] + "y"][n1:n2, m1:m2, l1:l2],
+                src[key[0] + "z"][n1:n2, m1:m2, l1:l2],
+            ]
+        )
+        var = np.sqrt(dot2(tmp))
+    elif dst is not None and key in dst.keys():
+        if is_vector(key):
+            var = np.sqrt(dot2(dst[key][:, n1:n2, m1:m2, l1:l2]))
+        else:
+            var = dst[key][n1:n2, m1:m2, l1:l2]
+    else:
+        return None
+    stat = dict(mean=var.mean(), stdv=var.std())
+    if lmask:
+        mask = masks[mask_key][0, n1:n2, m1:m2, l1:l2]
+        Nmask = mask[mask == False].size
+        if Nmask > 0:
+            stat["mean_mask"] = var[mask == False].mean() * Nmask
+            stat["stdv_mask"] = var[mask == False].std() * Nmask
+        else:
+            stat["mean_mask"] = 0
+            stat["stdv_mask"] = 0
+        stat["nmask_msk"] = Nmask
+        nmask = mask[mask == True].size
+        if nmask > 0:
+            stat["mean_nmsk"] = var[mask == True].mean() * nmask
+            stat["stdv_nmsk"] = var[mask == True].std() * nmask
+        else:
+            stat["mean_nmsk"] = 0
+            stat["stdv_nmsk"] = 0
+        stat["nmask_nmk"] = nmask
+    return stat
+
+
 # ==============================================================================
 def plot_hist2d(
     xvar,
@@ -14,7 +14,7 @@
       compute "structure" functions as required
 """
 import numpy as np
-from pencil.math import dot, dot2, cross, cpu_optimal
+from pencil.math import dot, dot2, cross
 from pencil.math.derivatives import curl, div, curl2, grad, del2
 try:
      from pencil.calc import grav_profile
@@ -29,7 +29,7 @@ except:
              return np.zeros_like(x)
 
 from pencil.ism_dyn import calc_derived_data, is_vector, der_limits, under_limits
-from pencil.io import group_h5, dataset_h5
+from pencil.io import group_h5, dataset_h5, chunk_counts, chunk_blocks, chunked_map
 from pencil import read
 import os
 
@@ -37,7 +37,7 @@ def rhs_data(sim_path, src, dst, magic=["uxb","etadel2a"], par=[], comm=None,
                 gd=[], grp_overwrite=False, overwrite=False, 
                 rank=0, size=1, nghost=3,status="a",
                 chunksize = 1000.0, dtype=np.float64, quiet=True, nmin=32,
-                Reynolds_shock=False, lmix=False
+                Reynolds_shock=False, lmix=False, n_proc=1
                ):
 
     if comm:
@@ -56,33 +56,11 @@ def rhs_data(sim_path, src, dst, magic=["uxb","etadel2a"], par=[], comm=None,
                  src["settings"]["my"][0],\
                  src["settings"]["mz"][0]
     #split data into manageable memory chunks
-    dstchunksize = 8*nx*ny*nz/1024*1024
-    if dstchunksize > chunksize:
-        nchunks = cpu_optimal(nx,ny,nz,quiet=quiet,
-                              mvar=src["settings/mvar"][0],
-                              maux=src["settings/maux"][0],
-                              MBmin=chunksize,nmin=nmin,size=size)[1]
-    else:
-        nchunks = [1,1,1]
+    nchunks = chunk_counts(nx, ny, nz, mvar=src["settings/mvar"][0],
+                           maux=src["settings/maux"][0], chunksize=chunksize,
+                           nmin=nmin, size=size, quiet=quiet)
     print("nchunks {}".format(nchunks)) 
-    # for mpi split chunks across processes
-    if size > 1:
-        locindx = np.array_split(np.arange(nx)+nghost,nchunks[0])
-        locindy = np.array_split(np.arange(ny)+nghost,nchunks[1])
-        locindz = np.array_split(np.arange(nz)+nghost,nchunks[2])
-        indx = [locindx[np.mod(rank+int(rank/nchunks[2])
-                                   +int(rank/nchunks[1]),nchunks[0])]]
-        indy = [locindy[np.mod(rank+int(rank/nchunks[2]),nchunks[1])]]
-        indz = [locindz[np.mod(rank,nchunks[2])]]
-        allchunks = 1
-    else:
-        locindx = np.array_split(np.arange(nx)+nghost,nchunks[0])
-        locindy = np.array_split(np.arange(ny)+nghost,nchunks[1])
-        locindz = np.array_split(np.arange(nz)+nghost,nchunks[2])
-        indx = np.array_split(np.arange(nx)+nghost,nchunks[0])
-        indy = np.array_split(np.arange(ny)+nghost,nchunks[1])
-        indz = np.array_split(np.arange(nz)+nghost,nchunks[2])
-        allchunks = nchunks[0]*nchunks[1]*nchunks[2]
+    blocks = chunk_blocks([mz, my, mx], nchunks, nghost=nghost)
     # save time
     dataset_h5(dst, "time", status=status, data=src["time"][()],
                           comm=comm, size=size, rank=rank,
@@ -109,69 +87,21 @@ def rhs_data(sim_path, src, dst, magic=["uxb","etadel2a"], par=[], comm=None,
                           comm=comm, size=size, rank=rank,
                           overwrite=overwrite, dtype=dtype)
             print("writing "+key+" shape {}".format([mz,my,mx]))
-        for ichunk in range(allchunks):
-            for iz in [indz[np.mod(ichunk,nchunks[2])]]:
-                n1, n2 = iz[ 0]-nghost,\
-                         iz[-1]+nghost+1
-                n1out = n1+nghost
-                n2out = n2-nghost
-                varn1 =  nghost
-                varn2 = -nghost
-                if iz[0] == locindz[0][0]:
-                    n1out = 0
-                    varn1 = 0
-                if iz[-1] == locindz[-1][-1]:
-                    n2out = n2
-                    varn2 = n2
-                for iy in [indy[np.mod(ichunk+
-                                   int(ichunk/nchunks[2]),nchunks[1])]]:
-                    m1, m2 = iy[ 0]-nghost,\
-                             iy[-1]+nghost+1
-                    m1out = m1+nghost
-                    m2out = m2-nghost
-                    varm1 =  nghost
-                    varm2 = -nghost
-                    if iy[0] == locindy[0][0]:
-                        m1out = 0
-                        varm1 = 0
-                    if iy[-1] == locindy[-1][-1]:
-                        m2out = m2
-                        varm2 = m2
-                    for ix in [indx[np.mod(ichunk+int(ichunk/nchunks[2])
-                                   +int(ichunk/nchunks[1]),nchunks[0])]]:
-                        l1, l2 = ix[ 0]-nghost,\
-                                 ix[-1]+nghost+1
-                        l1out = l1+nghost
-                        l2out = l2-nghost
-                        varl1 =  nghost
-                        varl2 = -nghost
-                        if ix[0] == locindx[0][0]:
-                            l1out = 0
-                            varl1 = 0
-                        if ix[-1] == locindx[-1][-1]:
-                            l2out = l2
-                            varl2 = l2
-                        if not quiet:
-                            print("remeshing "+key+" chunk {}".format(
-                                   [iz,iy,ix]))
-                        var = calc_rhs_data(src, dst,
-                              key, par, gd, l1, l2, m1, m2, n1, n2,
-                              nghost=nghost, Reynolds_shock=Reynolds_shock,
-                              lmix=lmix)
-                        if is_vector(key):
-                            dst["calc"][key][:,n1out:n2out,
-                                                m1out:m2out,
-                                                l1out:l2out] = dtype(var[:,
-                                                         varn1:varn2,
-                                                         varm1:varm2,
-                                                         varl1:varl2])
-                        else:
-                            dst["calc"][key][n1out:n2out,
-                                             m1out:m2out,
-                                             l1out:l2out] = dtype(var[
-                                                         varn1:varn2,
-                                                         varm1:varm2,
-                                                         varl1:varl2])
+        for block, var in chunked_map(_rhs_block, blocks, [src, dst],
+                              args=(key, par, gd, nghost, Reynolds_shock, lmix),
+                              skip=[key], n_proc=n_proc,
+                              rank=rank, size=size):
+            if not quiet:
+                print("remeshing "+key+" chunk {}".format(block))
+            dst["calc"][key][block.out] = dtype(var)
+
+def _rhs_block(windows, block, key, par, gd, nghost, Reynolds_shock, lmix):
+    """ Kernel of rhs_data on the windows of src and dst. The output range
+        of the block is computed, its halo covers the derivatives. """
+    return calc_rhs_data(windows[0], windows[1], key, par, gd, *block.out_limits,
+                         nghost=nghost, Reynolds_shock=Reynolds_shock,
+                         lmix=lmix)
+
 #==============================================================================
 def calc_rhs_data(src, dst, key, par, gd, l1, l2, m1, m2, n1, n2,
                       nghost=3, Reynolds_shock=False, lmix=False):
@@ -9,8 +9,9 @@ from .transform import pospolar2cart, velpolar2cart, coordinate_transformation,
 from .integration import integrate
 from .Helmholtz import *
 from .primes import *
-from .interpolation import vec_int
+from .interpolation import vec_int, vec_int_batch
 from .structure_function import *
 from .laplace_solver import *
+from .poisson_solver import *
 from . import derivatives
 from . import stats
@@ -31,3 +31,4 @@ from .div_grad_curl import (
     traceless_strain,
 )
 from .simple_centered import simple_centered
+from .stencil import apply_stencil
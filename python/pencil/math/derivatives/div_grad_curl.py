@@ -23,9 +23,11 @@ def div(
     y=None,
     coordinate_system="cartesian",
     grid=None,
+    out=None,
+    workers=None,
 ):
     """
-    div(f, dx=None, dy=None, dz=None, x=None, y=None, coordinate_system="cartesian", grid=None)
+    div(f, dx=None, dy=None, dz=None, x=None, y=None, coordinate_system="cartesian", grid=None, out=None, workers=None)
 
     Take divergence of pencil code vector array f in various coordinate systems.
 
@@ -41,6 +43,12 @@ def div(
         Coordinate system under which to take the divergence.
         Takes 'cartesian', 'cylindrical' and 'spherical'.
 
+    out : ndarray
+        Array to store the result in, e.g. to reuse it between calls.
+
+    workers : int
+        Number of threads evaluating the z-slabs of the result.
+
     Deprecated parameters (only for backwards compatibility)
     --------------------------------------------------------
     dx, dy, dz : floats
@@ -52,7 +60,7 @@ def div(
     """
 
     import numpy as np
-    from pencil.math.derivatives.der import xder, yder, zder
+    from pencil.math.derivatives.stencil import apply_stencil, div_terms
 
     if f.ndim != 4:
         print("div: must have vector 4-D array f[mvar, mz, my, mx] for divergence.")
@@ -72,20 +80,10 @@ def div(
         dy_1 = np.ones(np.size(f, -2)) / dy
         dz_1 = np.ones(np.size(f, -3)) / dz
 
-    if coordinate_system == "cartesian":
-        return xder(f[0], dx_1=dx_1) + yder(f[1], dy_1=dy_1) + zder(f[2], dz_1=dz_1)
-
     if coordinate_system == "cylindrical":
         if x is None:
             print("ERROR: need to specify x (radius) for cylindrical coordinates.")
             raise ValueError
-        # Make sure x has compatible dimensions.
-        x = x[np.newaxis, np.newaxis, :]
-        return (
-            xder(x * f[0], dx_1=dx_1) / x
-            + yder(f[1], dy_1=dy_1) / x
-            + zder(f[2], dz_1=dz_1)
-        )
 
     if coordinate_system == "spherical":
         if (x is None) or (y is None):
@@ -93,17 +91,11 @@ def div(
                 "ERROR: need to specify x (radius) and y (polar angle) for spherical coordinates."
             )
             raise ValueError
-        # Make sure x and y have compatible dimensions.
-        x = x[np.newaxis, np.newaxis, :]
-        y = y[np.newaxis, :, np.newaxis]
-        return (
-            xder(x**2 * f[0], dx_1=dx_1) / x**2
-            + yder(np.sin(y) * f[1], dy_1=dy_1) / (x * np.sin(y))
-            + zder(f[2], dz_1=dz_1) / (x * np.sin(y))
-        )
 
-    print("ERROR: could not recognize coordinate system {0}".format(coordinate_system))
-    raise ValueError
+    terms = div_terms(f, x=x, y=y, coordinate_system=coordinate_system)
+    if out is None:
+        out = np.empty(f.shape[1:], dtype=np.result_type(f, dx_1))
+    return apply_stencil(out, terms, (dz_1, dy_1, dx_1), workers=workers)
 
 
 def grad(
@@ -115,9 +107,11 @@ def grad(
     y=None,
     coordinate_system="cartesian",
     grid=None,
+    out=None,
+    workers=None,
 ):
     """
-    grad(f, dx=None, dy=None, dz=None, x=None, y=None, coordinate_system="cartesian", grid=None)
+    grad(f, dx=None, dy=None, dz=None, x=None, y=None, coordinate_system="cartesian", grid=None, out=None, workers=None)
 
     Take the gradient of a pencil code scalar array f in various coordinate systems.
 
@@ -133,6 +127,12 @@ def grad(
         Coordinate system under which to take the divergence.
         Takes 'cartesian', 'cylindrical' and 'spherical'.
 
+    out : ndarray
+        Array to store the result in, e.g. to reuse it between calls.
+
+    workers : int
+        Number of threads evaluating the z-slabs of the result.
+
     Deprecated parameters (only for backwards compatibility)
     --------------------------------------------------------
     dx, dy, dz : floats
@@ -143,7 +143,7 @@ def grad(
     """
 
     import numpy as np
-    from pencil.math.derivatives.der import xder, yder, zder
+    from pencil.math.derivatives.stencil import apply_stencil, grad_terms
 
     if f.ndim != 3:
         print("grad: must have scalar 3-D array f[mz, my, mx] for gradient.")
@@ -163,22 +163,10 @@ def grad(
         dy_1 = np.ones(np.size(f, -2)) / dy
         dz_1 = np.ones(np.size(f, -3)) / dz
 
-    grad_value = np.zeros((3,) + f.shape)
-
-    if coordinate_system == "cartesian":
-        grad_value[0] = xder(f, dx_1=dx_1)
-        grad_value[1] = yder(f, dy_1=dy_1)
-        grad_value[2] = zder(f, dz_1=dz_1)
-
     if coordinate_system == "cylindrical":
         if x is None:
             print("ERROR: need to specify x (radius) for cylindrical coordinates.")
             raise ValueError
-        # Make sure x has compatible dimensions.
-        x = x[np.newaxis, np.newaxis, :]
-        grad_value[0] = xder(f, dx_1=dx_1)
-        grad_value[1] = yder(f, dy_1=dy_1) / x
-        grad_value[2] = zder(f, dz_1=dz_1)
 
     if coordinate_system == "spherical":
         if (x is None) or (y is None):
@@ -186,14 +174,14 @@ def grad(
                 "ERROR: need to specify x (radius) and y (polar angle) for spherical coordinates."
             )
             raise ValueError
-        # Make sure x and y have compatible dimensions.
-        x = x[np.newaxis, np.newaxis, :]
-        y = y[np.newaxis, :, np.newaxis]
-        grad_value[0] = xder(f, dx_1=dx_1)
-        grad_value[1] = yder(f, dy_1=dy_1) / x
-        grad_value[2] = zder(f, dz_1=dz_1) / (x * np.sin(y))
 
-    return grad_value
+    if out is None:
+        out = np.empty((3,) + f.shape)
+    terms = grad_terms(f, x=x, y=y, coordinate_system=coordinate_system)
+    for i in range(3):
+        apply_stencil(out[i], terms[i], (dz_1, dy_1, dx_1), workers=workers)
+
+    return out
 
 
 def curl(
@@ -206,9 +194,11 @@ def curl(
     run2D=False,
     coordinate_system="cartesian",
     grid=None,
+    out=None,
+    workers=None,
 ):
     """
-    curl(f, dx=None, dy=None, dz=None, x=None, y=None, run2D=False, coordinate_system="cartesian", grid=None)
+    curl(f, dx=None, dy=None, dz=None, x=None, y=None, run2D=False, coordinate_system="cartesian", grid=None, out=None, workers=None)
 
     Take the curl of a pencil code vector array f in various coordinate systems.
 
@@ -230,6 +220,12 @@ def curl(
         Takes 'cartesian', 'cylindrical' and 'spherical'.
         !Does not work for 2d runs yet!
 
+    out : ndarray
+        Array to store the result in, e.g. to reuse it between calls.
+
+    workers : int
+        Number of threads evaluating the z-slabs of the result.
+
     Deprecated parameters (only for backwards compatibility)
     --------------------------------------------------------
     dx, dy, dz : floats
@@ -240,7 +236,7 @@ def curl(
     """
 
     import numpy as np
-    from pencil.math.derivatives.der import xder, yder, zder
+    from pencil.math.derivatives.stencil import apply_stencil, curl_terms
 
     if f.shape[0] != 3:
         print("curl: must have vector 4-D array f[3, mz, my, mx] for curl.")
@@ -292,39 +288,24 @@ def curl(
         else:
             raise RuntimeError("Unable to detect which axis was omitted in the 2D run.")
 
-    curl_value = np.zeros_like(f)
-
-    if coordinate_system == "cartesian":
-        curl_value[0] = yder(f[2], dy_1=dy_1) - zder(f[1], dz_1=dz_1)
-        curl_value[1] = zder(f[0], dz_1=dz_1) - xder(f[2], dx_1=dx_1)
-        curl_value[2] = xder(f[1], dx_1=dx_1) - yder(f[0], dy_1=dy_1)
     if coordinate_system == "cylindrical":
         if x is None:
             print("ERROR: need to specify x (radius) for cylindrical coordinates.")
             raise ValueError
-        # Make sure x has compatible dimensions.
-        x = x[np.newaxis, np.newaxis, :]
-        curl_value[0] = (1 / x) * yder(f[2], dy_1=dy_1) - zder(f[1], dz_1=dz_1)
-        curl_value[1] = zder(f[0], dz_1=dz_1) - xder(f[2], dx_1=dx_1)
-        curl_value[2] = (1 / x) * xder(x * f[1], dx_1=dx_1) - (1 / x) * yder(
-            f[0], dy_1=dy_1
-        )
     if coordinate_system == "spherical":
         if (x is None) or (y is None):
             print(
                 "ERROR: need to specify x (radius) and y (polar angle) for spherical coordinates."
             )
             raise ValueError
-        # Make sure x and y have compatible dimensions.
-        x = x[np.newaxis, np.newaxis, :]
-        y = y[np.newaxis, :, np.newaxis]
-        curl_value[0] = (yder(np.sin(y) * f[2], dy_1=dy_1) - zder(f[1], dz_1=dz_1)) / (
-            x * np.sin(y)
-        )
-        curl_value[1] = (
-            zder(f[0], dz_1=dz_1) / np.sin(y) - xder(x * f[2], dx_1=dx_1)
-        ) / x
-        curl_value[2] = (xder(x * f[1], dx_1=dx_1) - yder(f[0], dy_1=dy_1)) / x
+
+    if out is None or run2D:
+        curl_value = np.empty_like(f)
+    else:
+        curl_value = out
+    terms = curl_terms(f, x=x, y=y, coordinate_system=coordinate_system)
+    for i in range(3):
+        apply_stencil(curl_value[i], terms[i], (dz_1, dy_1, dx_1), workers=workers)
 
     if run2D:
         # Remove the dummy axis we inserted earlier
@@ -334,6 +315,9 @@ def curl(
             curl_value = curl_value[..., 0, :]
         elif grid.dz == grid.Lz:
             curl_value = curl_value[..., 0, :, :]
+        if out is not None:
+            out[...] = curl_value
+            curl_value = out
 
     return curl_value
 
@@ -347,9 +331,11 @@ def curl2(
     y=None,
     coordinate_system="cartesian",
     grid=None,
+    out=None,
+    workers=None,
 ):
     """
-    curl2(f, dx=None, dy=None, dz=None, x=None, y=None, coordinate_system="cartesian", grid=None)
+    curl2(f, dx=None, dy=None, dz=None, x=None, y=None, coordinate_system="cartesian", grid=None, out=None, workers=None)
 
     Take the double curl of a pencil code vector array f.
 
@@ -365,6 +351,12 @@ def curl2(
         Coordinate system under which to take the divergence.
         Takes 'cartesian', 'cylindrical' and 'spherical'.
 
+    out : ndarray
+        Array to store the result in, e.g. to reuse it between calls.
+
+    workers : int
+        Number of threads evaluating the z-slabs of the result.
+
     Deprecated parameters (only for backwards compatibility)
     --------------------------------------------------------
     dx, dy, dz : floats
@@ -375,7 +367,7 @@ def curl2(
     """
 
     import numpy as np
-    from pencil.math.derivatives.der import xder, yder, zder, xder2, yder2, zder2
+    from pencil.math.derivatives.stencil import apply_stencil, curl_terms, curl2_terms
 
     if f.ndim != 4 or f.shape[0] != 3:
         print("curl2: must have vector 4-D array f[3, mz, my, mx] for curl2.")
@@ -401,94 +393,38 @@ def curl2(
         dy_tilde = np.zeros(np.size(f, -2))
         dz_tilde = np.zeros(np.size(f, -3))
 
-    curl2_value = np.zeros(f.shape)
-
-    if coordinate_system == "cartesian":
-        curl2_value[0] = (
-            xder(yder(f[1], dy_1=dy_1) + zder(f[2], dz_1=dz_1), dx_1=dx_1)
-            - yder2(f[0], dy_1=dy_1, dy_tilde=dy_tilde)
-            - zder2(f[0], dz_1=dz_1, dz_tilde=dz_tilde)
-        )
-        curl2_value[1] = (
-            yder(xder(f[0], dx_1=dx_1) + zder(f[2], dz_1=dz_1), dy_1=dy_1)
-            - xder2(f[1], dx_1=dx_1, dx_tilde=dx_tilde)
-            - zder2(f[1], dz_1=dz_1, dz_tilde=dz_tilde)
-        )
-        curl2_value[2] = (
-            zder(xder(f[0], dx_1=dx_1) + yder(f[1], dy_1=dy_1), dz_1=dz_1)
-            - xder2(f[2], dx_1=dx_1, dx_tilde=dx_tilde)
-            - yder2(f[2], dy_1=dy_1, dy_tilde=dy_tilde)
-        )
     if coordinate_system == "cylindrical":
         if x is None:
             print("ERROR: need to specify x (radius) for cylindrical coordinates.")
             raise ValueError
-        # Make sure x has compatible dimensions.
-        x = x[np.newaxis, np.newaxis, :]
-        curl2_value[0] = (
-            yder(f[1], dy_1=dy_1) / x**2
-            + xder(yder(f[1], dy_1=dy_1), dx_1=dx_1) / x
-            - yder2(f[0], dy_1=dy_1, dy_tilde=dy_tilde) / x**2
-            - zder2(f[0], dz_1=dz_1, dz_tilde=dz_tilde)
-            + xder(zder(f[2], dz_1=dz_1), dx_1=dx_1)
-        )
-        curl2_value[1] = (
-            yder(zder(f[2], dz_1=dz_1), dy_1=dy_1) / x
-            - zder2(f[1], dz_1=dz_1, dz_tilde=dz_tilde)
-            + f[1] / x**2
-            - xder(f[1], dx_1=dx_1) / x
-            - xder2(f[1], dx_1=dx_1, dx_tilde=dx_tilde)
-            + xder(yder(f[0], dy_1=dy_1), dx_1=dx_1) / x
-            - yder(f[0], dy_1=dy_1) / x**2
-        )
-        curl2_value[2] = (
-            zder(f[0], dz_1=dz_1) / x
-            + xder(zder(f[0], dz_1=dz_1), dx_1=dx_1)
-            - zder(f[2], dx_1=dx_1) / x
-            - xder2(f[2], dx_1=dx_1, dx_tilde=dx_tilde)
-            - yder2(f[2], dy_1=dy_1, dy_tilde=dy_tilde) / x**2
-            + yder(zder(f[1], dz_1=dz_1), dy_1=dy_1) / x
-        )
     if coordinate_system == "spherical":
         if x is None or y is None:
             print(
                 "ERROR: need to specify x (radius) and y (polar angle) for spherical coordinates."
             )
             raise ValueError
-        # Make sure x and y have compatible dimensions.
-        x = x[np.newaxis, np.newaxis, :]
-        y = y[np.newaxis, :, np.newaxis]
-        curl2_value[0] = (
-            yder(
-                np.sin(y) * (xder(x * f[1], dx_1=dx_1) - yder(f[0], dy_1=dy_1)) / x,
-                dy_1=dy_1,
-            )
-            - zder(
-                (zder(f[0], dz_1=dz_1) / np.sin(y) - xder(x * f[2], dx_1=dx_1)) / x,
-                dz_1=dz_1,
-            )
-        ) / (x * np.sin(y))
-        curl2_value[1] = (
-            zder(
-                (yder(np.sin(y) * f[2], dy_1=dy_1) - zder(f[1], dz_1=dz_1))
-                / (x * np.sin(y)),
-                dz_1=dz_1,
-            )
-            / np.sin(y)
-            - xder((xder(x * f[1], dx_1=dx_1) - yder(f[0], dy_1=dy_1)), dx_1=dx_1)
-        ) / x
-        curl2_value[2] = (
-            xder(
-                (zder(f[0], dz_1=dz_1) / np.sin(y) - xder(x * f[2], dx_1=dx_1)),
-                dx_1=dx_1,
-            )
-            - yder(
-                (yder(np.sin(y) * f[2], dy_1=dy_1) - zder(f[1], dz_1=dz_1))
-                / (x * np.sin(y)),
-                dy_1=dy_1,
-            )
-        ) / x
-    return curl2_value
+
+    dxs_1 = (dz_1, dy_1, dx_1)
+    dxs_tilde = (dz_tilde, dy_tilde, dx_tilde)
+    if out is None:
+        out = np.empty(f.shape)
+    if coordinate_system == "cartesian":
+        # grad(div(f)) - del2(f), the mixed derivatives go through buffer.
+        buffer = np.empty(f.shape[1:])
+        for i, (mixed, terms) in enumerate(curl2_terms(f, buffer)):
+            apply_stencil(buffer, mixed, dxs_1, workers=workers)
+            apply_stencil(out[i], terms, dxs_1, dxs_tilde, workers=workers)
+    else:
+        # curl(curl(f)), written out in the curvilinear coordinates.
+        curl_value = np.empty(f.shape)
+        terms = curl_terms(f, x=x, y=y, coordinate_system=coordinate_system)
+        for i in range(3):
+            apply_stencil(curl_value[i], terms[i], dxs_1, workers=workers)
+        terms = curl_terms(curl_value, x=x, y=y, coordinate_system=coordinate_system)
+        for i in range(3):
+            apply_stencil(out[i], terms[i], dxs_1, workers=workers)
+
+    return out
 
 
 def del2(
@@ -500,9 +436,11 @@ def del2(
     y=None,
     coordinate_system="cartesian",
     grid=None,
+    out=None,
+    workers=None,
 ):
     """
-    del2(f, dx=None, dy=None, dz=None, x=None, y=None, coordinate_system="cartesian", grid=None)
+    del2(f, dx=None, dy=None, dz=None, x=None, y=None, coordinate_system="cartesian", grid=None, out=None, workers=None)
 
     Calculate del2, the Laplacian of a scalar field f.
 
@@ -518,6 +456,12 @@ def del2(
         Coordinate system under which to take the divergence.
         Takes 'cartesian', 'cylindrical' and 'spherical'.
 
+    out : ndarray
+        Array to store the result in, e.g. to reuse it between calls.
+
+    workers : int
+        Number of threads evaluating the z-slabs of the result.
+
     Deprecated parameters (only for backwards compatibility)
     --------------------------------------------------------
     dx, dy, dz : floats
@@ -528,7 +472,7 @@ def del2(
     """
 
     import numpy as np
-    from pencil.math.derivatives.der import xder2, yder2, zder2, xder, yder
+    from pencil.math.derivatives.stencil import apply_stencil, del2_terms
 
     if grid is not None:
         x = grid.x
@@ -550,39 +494,24 @@ def del2(
         dy_tilde = np.zeros(np.size(f, -2))
         dz_tilde = np.zeros(np.size(f, -3))
 
-    if coordinate_system == "cartesian":
-        del2_value = (
-            xder2(f, dx_1=dx_1, dx_tilde=dx_tilde)
-            + yder2(f, dy_1=dy_1, dy_tilde=dy_tilde)
-            + zder2(f, dz_1=dz_1, dz_tilde=dz_tilde)
-        )
     if coordinate_system == "cylindrical":
         if x is None:
             print("ERROR: need to specify x (radius)")
             raise ValueError
-        # Make sure x has compatible dimensions.
-        x = x[np.newaxis, np.newaxis, :]
-        del2_value = (
-            xder(f, dx_1=dx_1) / x
-            + xder2(f, dx_1=dx_1, dx_tilde=dx_tilde)
-            + yder2(f, dy_1=dy_1, dy_tilde=dy_tilde) / (x**2)
-            + zder2(f, dz_1=dz_1, dz_tilde=dz_tilde)
-        )
     if coordinate_system == "spherical":
         if x is None or y is None:
             print("ERROR: need to specify x (radius) and y (polar angle)")
             raise ValueError
-        # Make sure x and y have compatible dimensions.
-        x = x[np.newaxis, np.newaxis, :]
-        y = y[np.newaxis, :, np.newaxis]
-        del2_value = (
-            2 * xder(f, dx_1=dx_1) / x
-            + xder2(f, dx_1=dx_1, dx_tilde=dx_tilde)
-            + np.cos(y) * yder(f, dy_1=dy_1) / ((x**2) * np.sin(y))
-            + yder2(f, dy_1=dy_1, dy_tilde=dy_tilde) / (x**2)
-            + zder2(f, dz_1=dz_1, dz_tilde=dz_tilde) / ((x * np.sin(y)) ** 2)
-        )
-    return del2_value
+
+    if out is None:
+        out = np.empty(f.shape)
+    return apply_stencil(
+        out,
+        del2_terms(f, x=x, y=y, coordinate_system=coordinate_system),
+        (dz_1, dy_1, dx_1),
+        (dz_tilde, dy_tilde, dx_tilde),
+        workers=workers,
+    )
 
 
 def del2v(
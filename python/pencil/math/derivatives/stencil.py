@@ -0,0 +1,504 @@
+# stencil.py
+#
+# Fused evaluation of the 6th order differential operators.
+"""
+Stencil engine behind div, grad, curl, curl2 and del2.
+
+Every component of an operator is written as a sum of terms
+
+    factor * D(weight * source),
+
+where D is the 6th order first or second derivative along one axis (as in
+der_nonequi, including the periodic filling of its ghost zones) and weight
+and factor are (my, mx) profiles like x or sin(y). All terms of a component
+are evaluated in one pass over z-slabs of the output, so the only
+temporaries are of the size of a slab. The slabs are distributed over
+threads. If Numba is installed, a compiled kernel accumulates the terms
+point by point without any temporaries.
+"""
+
+import numpy as np
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+NGHOST = 3
+
+# Size of the z-slabs processed at once by the NumPy kernel.
+SLAB_BYTES = 2 ** 22
+
+
+def ghost_index(m, nghost=NGHOST):
+    """
+    ghost_index(m, nghost=3)
+
+    Return for each point of an axis of length m the point at which the
+    derivative is evaluated: the point itself in the interior and its
+    periodic image in the ghost zones, -1 where the derivative is zero.
+
+    Parameters
+    ----------
+    m : int
+        Length of the axis including the ghost zones.
+
+    nghost : int
+        Number of ghost zones.
+    """
+
+    index = np.full(m, -1, dtype=np.intp)
+    l1 = nghost
+    l2 = m - nghost
+    if l2 > l1:
+        index[l1:l2] = np.arange(l1, l2)
+        # Same assignments as for the ghost zones of the derivatives.
+        index[:l1] = index[l2 - nghost : l2]
+        index[l2:] = index[l1 : l1 + nghost]
+
+    return index
+
+
+def _stencil(shift, order, dx_1, dx_tilde):
+    """
+    Apply the 1st or 2nd derivative stencil, shift(c) returns the field
+    shifted by c points along the derivative axis.
+    """
+
+    der1 = None
+    if order == 1 or (dx_tilde is not None and np.any(dx_tilde)):
+        der1 = (dx_1 / 60) * (
+            45.0 * (shift(1) - shift(-1))
+            - 9.0 * (shift(2) - shift(-2))
+            + (shift(3) - shift(-3))
+        )
+    if order == 1:
+        return der1
+
+    der2 = dx_1 ** 2 * (
+        -490 / 180 * shift(0)
+        + 270 / 180 * (shift(1) + shift(-1))
+        - 27 / 180 * (shift(2) + shift(-2))
+        + 2 / 180 * (shift(3) + shift(-3))
+    )
+    if der1 is not None:
+        der2 += dx_tilde * der1
+
+    return der2
+
+
+def _slab_derivative(source, k0, k1, axis, order, weight, dx_1, dx_tilde, index):
+    """
+    Derivative of weight*source along axis (0: z, 1: y, 2: x) on the
+    z-slab k0:k1.
+    """
+
+    shape = (k1 - k0,) + source.shape[1:]
+    if axis == 0:
+        der = np.zeros(shape)
+        rows = index[k0:k1]
+        valid = rows >= 0
+        if not valid.any():
+            return der
+        rows = rows[valid]
+
+        def shift(c):
+            if weight is None:
+                return source[rows + c]
+            return source[rows + c] * weight
+
+        der[valid] = _stencil(
+            shift,
+            order,
+            dx_1[rows][:, np.newaxis, np.newaxis],
+            None if dx_tilde is None else dx_tilde[rows][:, np.newaxis, np.newaxis],
+        )
+        return der
+
+    field = source[k0:k1]
+    if weight is not None:
+        field = field * weight
+    field = np.moveaxis(field, axis, -1)
+    der = np.zeros(field.shape)
+    l1 = NGHOST
+    l2 = field.shape[-1] - NGHOST
+    if l2 > l1:
+        der[..., l1:l2] = _stencil(
+            lambda c: field[..., l1 + c : l2 + c],
+            order,
+            dx_1[l1:l2],
+            None if dx_tilde is None else dx_tilde[l1:l2],
+        )
+        der[..., :l1] = der[..., l2 - NGHOST : l2]
+        der[..., l2:] = der[..., l1 : l1 + NGHOST]
+
+    return np.moveaxis(der, -1, axis)
+
+
+def _apply_slab(out, terms, k0, k1, dx_1, dx_tilde, indices):
+    """
+    Evaluate the sum of the terms on the z-slab k0:k1 with NumPy.
+    """
+
+    total = None
+    for source, axis, order, scale, weight, factor in terms:
+        der = _slab_derivative(
+            source,
+            k0,
+            k1,
+            axis,
+            order,
+            weight,
+            dx_1[axis],
+            dx_tilde[axis],
+            indices[axis],
+        )
+        if factor is not None:
+            der *= factor
+        if scale != 1:
+            der *= scale
+        if total is None:
+            total = der
+        else:
+            total += der
+    out[k0:k1] = total
+
+
+def _sample(source, weight, weighted, axis, k, j, i, e):
+    """
+    Value of weight*source at the point (k, j, i) moved to e along axis.
+    """
+
+    if axis == 0:
+        k = e
+    elif axis == 1:
+        j = e
+    else:
+        i = e
+    if weighted:
+        return source[k, j, i] * weight[j, i]
+    return source[k, j, i]
+
+
+def _term_kernel(
+    out, source, axis, order, scale, weight, factor, dx_1, dx_tilde, index, accumulate
+):
+    """
+    out (+)= scale*factor*D(weight*source), evaluated point by point.
+    """
+
+    mz, my, mx = out.shape
+    weighted = weight.size > 0
+    factored = factor.size > 0
+    for k in prange(mz):
+        for j in range(my):
+            for i in range(mx):
+                if axis == 0:
+                    e = index[k]
+                elif axis == 1:
+                    e = index[j]
+                else:
+                    e = index[i]
+                value = 0.0
+                if e >= 0:
+                    s0 = _sample(source, weight, weighted, axis, k, j, i, e - 3)
+                    s1 = _sample(source, weight, weighted, axis, k, j, i, e - 2)
+                    s2 = _sample(source, weight, weighted, axis, k, j, i, e - 1)
+                    s3 = _sample(source, weight, weighted, axis, k, j, i, e)
+                    s4 = _sample(source, weight, weighted, axis, k, j, i, e + 1)
+                    s5 = _sample(source, weight, weighted, axis, k, j, i, e + 2)
+                    s6 = _sample(source, weight, weighted, axis, k, j, i, e + 3)
+                    value = (dx_1[e] / 60) * (
+                        45.0 * (s4 - s2) - 9.0 * (s5 - s1) + (s6 - s0)
+                    )
+                    if order == 2:
+                        value = dx_1[e] ** 2 * (
+                            -490 / 180 * s3
+                            + 270 / 180 * (s4 + s2)
+                            - 27 / 180 * (s5 + s1)
+                            + 2 / 180 * (s6 + s0)
+                        ) + dx_tilde[e] * value
+                    value *= scale
+                    if factored:
+                        value *= factor[j, i]
+                if accumulate:
+                    out[k, j, i] += value
+                else:
+                    out[k, j, i] = value
+
+
+if numba is not None:
+    prange = numba.prange
+    _sample = numba.njit(cache=True, inline="always")(_sample)
+    _term_kernel = numba.njit(parallel=True, cache=True)(_term_kernel)
+else:
+    prange = range
+
+
+def apply_stencil(out, terms, dx_1, dx_tilde=None, workers=None, compiled=None):
+    """
+    apply_stencil(out, terms, dx_1, dx_tilde=None, workers=None, compiled=None)
+
+    Evaluate out = sum of scale*factor*D(weight*source) over the terms.
+
+    Parameters
+    ----------
+    out : ndarray
+        Output array of shape (mz, my, mx).
+
+    terms : list of tuples
+        One tuple (source, axis, order, scale, weight, factor) per term,
+        source being an (mz, my, mx) array, axis 0, 1 or 2 for z, y or x,
+        order 1 or 2, scale a number and weight and factor (my, mx) arrays
+        or None.
+
+    dx_1 : tuple of ndarrays
+        Inverse grid spacings (dz_1, dy_1, dx_1).
+
+    dx_tilde : tuple of ndarrays
+        (dz_tilde, dy_tilde, dx_tilde) for the 2nd derivatives on
+        nonequidistant grids. If None, the grid is equidistant.
+
+    workers : int
+        Number of threads working on the z-slabs. If None, use one.
+
+    compiled : bool
+        Use the Numba kernel. If None, use it when Numba is installed.
+    """
+
+    if dx_tilde is None:
+        dx_tilde = (None, None, None)
+    indices = [ghost_index(m) for m in out.shape]
+    for source, axis, order, scale, weight, factor in terms:
+        if source.shape != out.shape:
+            raise ValueError(
+                "stencil: source of shape {0} does not match the output {1}.".format(
+                    source.shape, out.shape
+                )
+            )
+        if np.size(dx_1[axis]) != out.shape[axis]:
+            raise ValueError(
+                "Size of dx_1 ({}) != size of axis of f to be differentiated ({})".format(
+                    np.size(dx_1[axis]), out.shape[axis]
+                )
+            )
+
+    if compiled is None:
+        compiled = numba is not None
+    if compiled:
+        if numba is None:
+            raise ImportError("stencil: the compiled kernel needs numba.")
+        # The number of threads is process-wide, restore it afterwards.
+        threads = numba.get_num_threads()
+        if workers is not None:
+            numba.set_num_threads(workers)
+        empty = np.zeros((0, 0))
+        try:
+            for iterm, (source, axis, order, scale, weight, factor) in enumerate(
+                terms
+            ):
+                tilde = dx_tilde[axis]
+                if tilde is None:
+                    tilde = np.zeros(out.shape[axis])
+                if weight is None:
+                    weight = empty
+                if factor is None:
+                    factor = empty
+                _term_kernel(
+                    out,
+                    np.ascontiguousarray(source),
+                    axis,
+                    order,
+                    float(scale),
+                    np.ascontiguousarray(weight, dtype=float),
+                    np.ascontiguousarray(factor, dtype=float),
+                    np.asarray(dx_1[axis], dtype=float),
+                    np.asarray(tilde, dtype=float),
+                    indices[axis],
+                    iterm > 0,
+                )
+        finally:
+            numba.set_num_threads(threads)
+        return out
+
+    mz, my, mx = out.shape
+    nslab = max(1, min(mz, SLAB_BYTES // (8 * my * mx)))
+    slabs = [(k0, min(k0 + nslab, mz)) for k0 in range(0, mz, nslab)]
+    if workers is not None and workers > 1 and len(slabs) > 1:
+        from concurrent.futures import ThreadPoolExecutor
+
+        # The slabs are disjoint parts of out.
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(
+                executor.map(
+                    lambda slab: _apply_slab(
+                        out, terms, slab[0], slab[1], dx_1, dx_tilde, indices
+                    ),
+                    slabs,
+                )
+            )
+    else:
+        for k0, k1 in slabs:
+            _apply_slab(out, terms, k0, k1, dx_1, dx_tilde, indices)
+
+    return out
+
+
+def _profiles(shape, x, y, coordinate_system):
+    """
+    Return the (my, mx) profiles (x, sin(y), cos(y)) needed by the
+    operators in curvilinear coordinates.
+    """
+
+    my, mx = shape[-2:]
+    if coordinate_system == "cartesian":
+        return None, None, None
+    if coordinate_system not in ("cylindrical", "spherical"):
+        raise ValueError(
+            "could not recognize coordinate system {0}".format(coordinate_system)
+        )
+    xx = np.broadcast_to(np.asarray(x, dtype=float)[np.newaxis, :], (my, mx))
+    if coordinate_system == "cylindrical":
+        return xx, None, None
+    yy = np.asarray(y, dtype=float)[:, np.newaxis]
+    sin_y = np.broadcast_to(np.sin(yy), (my, mx))
+    cos_y = np.broadcast_to(np.cos(yy), (my, mx))
+
+    return xx, sin_y, cos_y
+
+
+def curl_terms(f, x=None, y=None, coordinate_system="cartesian"):
+    """
+    curl_terms(f, x=None, y=None, coordinate_system='cartesian')
+
+    Return the terms of the three components of curl(f), see apply_stencil.
+    """
+
+    xx, sin_y, _ = _profiles(f.shape, x, y, coordinate_system)
+    if coordinate_system == "cartesian":
+        return [
+            [(f[2], 1, 1, 1, None, None), (f[1], 0, 1, -1, None, None)],
+            [(f[0], 0, 1, 1, None, None), (f[2], 2, 1, -1, None, None)],
+            [(f[1], 2, 1, 1, None, None), (f[0], 1, 1, -1, None, None)],
+        ]
+    if coordinate_system == "cylindrical":
+        return [
+            [(f[2], 1, 1, 1, None, 1 / xx), (f[1], 0, 1, -1, None, None)],
+            [(f[0], 0, 1, 1, None, None), (f[2], 2, 1, -1, None, None)],
+            [(f[1], 2, 1, 1, xx, 1 / xx), (f[0], 1, 1, -1, None, 1 / xx)],
+        ]
+    return [
+        [(f[2], 1, 1, 1, sin_y, 1 / (xx * sin_y)), (f[1], 0, 1, -1, None, 1 / (xx * sin_y))],
+        [(f[0], 0, 1, 1, None, 1 / (xx * sin_y)), (f[2], 2, 1, -1, xx, 1 / xx)],
+        [(f[1], 2, 1, 1, xx, 1 / xx), (f[0], 1, 1, -1, None, 1 / xx)],
+    ]
+
+
+def div_terms(f, x=None, y=None, coordinate_system="cartesian"):
+    """
+    div_terms(f, x=None, y=None, coordinate_system='cartesian')
+
+    Return the terms of div(f), see apply_stencil.
+    """
+
+    xx, sin_y, _ = _profiles(f.shape, x, y, coordinate_system)
+    if coordinate_system == "cartesian":
+        return [
+            (f[0], 2, 1, 1, None, None),
+            (f[1], 1, 1, 1, None, None),
+            (f[2], 0, 1, 1, None, None),
+        ]
+    if coordinate_system == "cylindrical":
+        return [
+            (f[0], 2, 1, 1, xx, 1 / xx),
+            (f[1], 1, 1, 1, None, 1 / xx),
+            (f[2], 0, 1, 1, None, None),
+        ]
+    return [
+        (f[0], 2, 1, 1, xx ** 2, 1 / xx ** 2),
+        (f[1], 1, 1, 1, sin_y, 1 / (xx * sin_y)),
+        (f[2], 0, 1, 1, None, 1 / (xx * sin_y)),
+    ]
+
+
+def grad_terms(f, x=None, y=None, coordinate_system="cartesian"):
+    """
+    grad_terms(f, x=None, y=None, coordinate_system='cartesian')
+
+    Return the terms of the three components of grad(f), see apply_stencil.
+    """
+
+    xx, sin_y, _ = _profiles(f.shape, x, y, coordinate_system)
+    if coordinate_system == "cartesian":
+        return [
+            [(f, 2, 1, 1, None, None)],
+            [(f, 1, 1, 1, None, None)],
+            [(f, 0, 1, 1, None, None)],
+        ]
+    if coordinate_system == "cylindrical":
+        return [
+            [(f, 2, 1, 1, None, None)],
+            [(f, 1, 1, 1, None, 1 / xx)],
+            [(f, 0, 1, 1, None, None)],
+        ]
+    return [
+        [(f, 2, 1, 1, None, None)],
+        [(f, 1, 1, 1, None, 1 / xx)],
+        [(f, 0, 1, 1, None, 1 / (xx * sin_y))],
+    ]
+
+
+def del2_terms(f, x=None, y=None, coordinate_system="cartesian"):
+    """
+    del2_terms(f, x=None, y=None, coordinate_system='cartesian')
+
+    Return the terms of the Laplacian of the scalar f, see apply_stencil.
+    """
+
+    xx, sin_y, cos_y = _profiles(f.shape, x, y, coordinate_system)
+    if coordinate_system == "cartesian":
+        return [
+            (f, 2, 2, 1, None, None),
+            (f, 1, 2, 1, None, None),
+            (f, 0, 2, 1, None, None),
+        ]
+    if coordinate_system == "cylindrical":
+        return [
+            (f, 2, 1, 1, None, 1 / xx),
+            (f, 2, 2, 1, None, None),
+            (f, 1, 2, 1, None, 1 / xx ** 2),
+            (f, 0, 2, 1, None, None),
+        ]
+    return [
+        (f, 2, 1, 2, None, 1 / xx),
+        (f, 2, 2, 1, None, None),
+        (f, 1, 1, 1, None, cos_y / (xx ** 2 * sin_y)),
+        (f, 1, 2, 1, None, 1 / xx ** 2),
+        (f, 0, 2, 1, None, 1 / (xx * sin_y) ** 2),
+    ]
+
+
+def curl2_terms(f, buffer):
+    """
+    curl2_terms(f, buffer)
+
+    Return the terms of the Cartesian curl(curl(f)) = grad(div(f)) - del2(f)
+    as pairs (terms of the mixed part stored in buffer, terms of the
+    component using buffer), see apply_stencil.
+    """
+
+    terms = []
+    for i, (j, k) in enumerate([(1, 2), (0, 2), (0, 1)]):
+        axis_i, axis_j, axis_k = 2 - i, 2 - j, 2 - k
+        terms.append(
+            (
+                [(f[j], axis_j, 1, 1, None, None), (f[k], axis_k, 1, 1, None, None)],
+                [
+                    (buffer, axis_i, 1, 1, None, None),
+                    (f[i], axis_j, 2, -1, None, None),
+                    (f[i], axis_k, 2, -1, None, None),
+                ],
+            )
+        )
+
+    return terms
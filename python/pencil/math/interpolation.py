@@ -30,80 +30,157 @@ def vec_int(xyz, field, dxyz, oxyz, nxyz, interpolation="trilinear"):
         Number of grid points in each direction.
 
     interpolation : string
-        Interpolation method. Can be 'mean' or 'trilinear'.
+        Interpolation method. Can be 'mean', 'trilinear' or 'tricubic'.
 
     Returns
     -------
     ndarray with interpolated vector field.
     """
 
+    return vec_int_batch(
+        xyz, field, dxyz, oxyz, nxyz, interpolation=interpolation
+    )[0]
+
+
+def vec_int_batch(
+    xyz,
+    field,
+    dxyz=None,
+    oxyz=None,
+    nxyz=None,
+    interpolation="trilinear",
+    grid=None,
+    periodic=False,
+):
+    """
+    vec_int_batch(xyz, field, dxyz=None, oxyz=None, nxyz=None,
+                  interpolation='trilinear', grid=None, periodic=False)
+
+    Interpolates the field at many positions at once, like vec_int.
+
+    Parameters
+    ----------
+    xyz : ndarray
+        Position vectors of shape [N, 3] at which will be interpolated.
+        Positions outside non-periodic directions are clamped to the domain.
+
+    field : ndarray
+        Vector field to be interpolated with shape [ncomp, nz, ny, nx]
+        or scalar field with shape [nz, ny, nx].
+
+    dxyz : ndarray
+        Array with the three deltas of an equidistant grid.
+
+    oxyz : ndarray
+        Array with the position of the origin.
+
+    nxyz : ndarray
+        Number of grid points in each direction.
+
+    interpolation : string
+        Interpolation method. Can be 'mean', 'trilinear' or 'tricubic'
+        (Lagrange polynomials through the 4 nearest points in each direction).
+
+    grid : obj
+        Grid object (or var object) with the coordinate arrays x, y and z
+        matching the field, replacing dxyz, oxyz and nxyz. The grid may be
+        non-equidistant; its Lx, Ly and Lz are used as periods if present.
+
+    periodic : bool or list of bool
+        Flags for the x, y and z directions to wrap positions periodically.
+
+    Returns
+    -------
+    ndarray of shape [N, ncomp] (or [N] for a scalar field) with the
+    interpolated field.
+    """
+
     import numpy as np
 
-    if (interpolation == "mean") or (interpolation == "trilinear"):
-        # Find the adjacent indices.
-        i = (xyz[0] - oxyz[0]) / dxyz[0]
-        ii = np.array([int(np.floor(i)), int(np.ceil(i))])
-        if i < 0:
-            i = 0
-        if i > nxyz[0] - 1:
-            i = nxyz[0] - 1
-        ii = np.array([int(np.floor(i)), int(np.ceil(i))])
-
-        j = (xyz[1] - oxyz[1]) / dxyz[1]
-        jj = np.array([int(np.floor(j)), int(np.ceil(j))])
-        if j < 0:
-            j = 0
-        if j > nxyz[1] - 1:
-            j = nxyz[1] - 1
-        jj = np.array([int(np.floor(j)), int(np.ceil(j))])
-
-        k = (xyz[2] - oxyz[2]) / dxyz[2]
-        kk = np.array([int(np.floor(k)), int(np.ceil(k))])
-        if k < 0:
-            k = 0
-        if k > nxyz[2] - 1:
-            k = nxyz[2] - 1
-        kk = np.array([int(np.floor(k)), int(np.ceil(k))])
-
-    # Interpolate the field.
-    if interpolation == "mean":
-        sub_field = field[:, :, :, ii[0] : ii[1] + 1]
-        sub_field = sub_field[:, :, jj[0] : jj[1] + 1, :]
-        sub_field = sub_field[:, kk[0] : kk[1] + 1, :, :]
-        return np.mean(sub_field, axis=(1, 2, 3))
-
-    if interpolation == "trilinear":
-        if ii[0] == ii[1]:
-            w1 = np.array([1, 1])
-        else:
-            w1 = i - ii[::-1]
-
-        if jj[0] == jj[1]:
-            w2 = np.array([1, 1])
-        else:
-            w2 = np.array([nxyz[1] - j, j - jj[0]])
-
-        if kk[0] == kk[1]:
-            w3 = np.array([1, 1])
-        else:
-            w3 = np.array([nxyz[2] - k, k - kk[0]])
-
-        weight = abs(
-            w3.reshape((2, 1, 1)) * w2.reshape((1, 2, 1)) * w1.reshape((1, 1, 2))
+    if interpolation not in ("mean", "trilinear", "tricubic"):
+        raise ValueError("Unknown interpolation '{0}'.".format(interpolation))
+    xyz = np.atleast_2d(np.asarray(xyz, dtype=float))
+    periodic = np.broadcast_to(periodic, 3)
+    scalar = field.ndim == 3
+    if scalar:
+        field = field[np.newaxis]
+
+    # Coordinates and periods of the three directions.
+    if grid is None:
+        coords = [
+            oxyz[i] + dxyz[i] * np.arange(int(nxyz[i])) for i in range(3)
+        ]
+        periods = [dxyz[i] * int(nxyz[i]) for i in range(3)]
+    else:
+        coords = [np.asarray(grid.x), np.asarray(grid.y), np.asarray(grid.z)]
+        periods = [
+            getattr(grid, "L" + direction, None) for direction in ("x", "y", "z")
+        ]
+        for i in range(3):
+            n = coords[i].size
+            if not periods[i] and n > 1:
+                periods[i] = (coords[i][-1] - coords[i][0]) * n / (n - 1)
+    if not all(coords[2 - i].size == field.shape[1 + i] for i in range(3)):
+        raise ValueError(
+            "Field shape {0} does not match the grid.".format(field.shape[1:])
         )
 
-        sub_field = field[:, :, :, ii[0] : ii[1] + 1]
-        sub_field = sub_field[:, :, jj[0] : jj[1] + 1, :]
-        sub_field = sub_field[:, kk[0] : kk[1] + 1, :, :]
-        return np.sum(sub_field * weight, axis=(1, 2, 3)) / np.sum(weight)
-
-    # If the point lies outside the domain, return 0.
-    if (
-        (ii[0] < -1)
-        or (ii[1] > nxyz[0])
-        or (jj[0] < -1)
-        or (jj[1] > nxyz[1])
-        or (kk[0] < -1)
-        or (kk[1] > nxyz[2])
-    ):
-        return np.zeros([0, 0, 0])
+    npoints = 4 if interpolation == "tricubic" else 2
+    stencils = [
+        _stencil(xyz[:, i], coords[i], periods[i] if periodic[i] else None, npoints)
+        for i in range(3)
+    ]
+    if interpolation == "mean":
+        # Average over the distinct adjacent grid points.
+        stencils = [
+            (index, np.where((weight == 0) | (weight == 1), weight, 0.5))
+            for index, weight in stencils
+        ]
+
+    (i, wx), (j, wy), (k, wz) = stencils
+    values = 0
+    for a in range(i.shape[1]):
+        for b in range(j.shape[1]):
+            for c in range(k.shape[1]):
+                values = values + field[:, k[:, c], j[:, b], i[:, a]] * (
+                    wx[:, a] * wy[:, b] * wz[:, c]
+                )
+    if scalar:
+        return values[0]
+    return values.T
+
+
+def _stencil(x, coords, period, npoints):
+    """
+    Indices and Lagrange weights of the npoints grid points around the
+    positions x along one direction.
+    """
+
+    import numpy as np
+
+    n = coords.size
+    if n == 1:
+        return np.zeros([x.size, 1], dtype=int), np.ones([x.size, 1])
+    if period is None:
+        npoints = min(npoints, n)
+        x = np.clip(x, coords[0], coords[-1])
+        pos = np.interp(x, coords, np.arange(n))
+        lower = np.minimum(np.floor(pos).astype(int), n - 2)
+        first = np.clip(lower - (npoints // 2 - 1), 0, n - npoints)
+    else:
+        x = coords[0] + np.mod(x - coords[0], period)
+        pos = np.interp(x, np.append(coords, coords[0] + period), np.arange(n + 1))
+        lower = np.minimum(np.floor(pos).astype(int), n - 1)
+        first = lower - (npoints // 2 - 1)
+    index = first[:, np.newaxis] + np.arange(npoints)
+    if period is None:
+        points = coords[index]
+    else:
+        points = coords[index % n] + (index // n) * period
+        index = index % n
+    weight = np.ones(index.shape)
+    for a in range(npoints):
+        for b in range(npoints):
+            if a != b:
+                weight[:, a] *= (x - points[:, b]) / (points[:, a] - points[:, b])
+    return index, weight
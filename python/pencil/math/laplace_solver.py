@@ -2,15 +2,18 @@
 This code contains various functions to solve the vector form of the Laplace
 equation in various coordinate systems (Cartesian, cylindrical and spherical)
 using finite differences.
+With tol, they are solved to a given tolerance, see poisson_solver.
 Additionally, one can find functions to solve the scalar Laplace equation
 in Cartesian, cylidrindical and spherical coordinate systems, since these are used
 (at least in the case of Cartesian and cylindrical) in the vector solvers.
 """
 
+from .poisson_solver import poisson_cg, poisson_fft, poisson_vector_cg
 
-def laplace_scalar_cartesian(bc, dx, dy, dz, niter=200):
+
+def laplace_scalar_cartesian(bc, dx, dy, dz, niter=200, tol=None):
     """
-    laplace_scalar_cartesian(bc, dx, dy, dz, niter=100)
+    laplace_scalar_cartesian(bc, dx, dy, dz, niter=200, tol=None)
 
     Solve the scalar Laplace equation in Cartesian coordinates in 3 dimensions
     using finite differences.
@@ -27,6 +30,11 @@ def laplace_scalar_cartesian(bc, dx, dy, dz, niter=200):
     niter : int
         Number of iterations.
 
+    tol : float
+        If given, solve the finite difference equations directly with sine
+        transforms, see poisson_fft, instead of doing niter Jacobi
+        iterations. The result is exact to round-off for any tol.
+
     Returns
     ----------
     ndarray with the same shape as bc, representing solution to the Laplace equation.
@@ -34,6 +42,9 @@ def laplace_scalar_cartesian(bc, dx, dy, dz, niter=200):
 
     import numpy as np
 
+    if tol is not None:
+        return poisson_fft(np.zeros(np.shape(bc)), dx, dy, dz, bc=bc)
+
     m = 1 / (2 / dx ** 2 + 2 / dy ** 2 + 2 / dz ** 2)
 
     uu = bc
@@ -51,9 +62,9 @@ def laplace_scalar_cartesian(bc, dx, dy, dz, niter=200):
     return uu
 
 
-def laplace_vector_cartesian(bx, by, bz, dx, dy, dz, niter=200):
+def laplace_vector_cartesian(bx, by, bz, dx, dy, dz, niter=200, tol=None):
     """
-    laplace_vector_cartesian(bx, by, bz, dx, dy, dz, niter=1000)
+    laplace_vector_cartesian(bx, by, bz, dx, dy, dz, niter=200, tol=None)
 
     Solve the vector Laplace equation in Cartesian coordinates in 3 dimensions
     using finite differences. This function simply applies the scalar function
@@ -71,6 +82,11 @@ def laplace_vector_cartesian(bx, by, bz, dx, dy, dz, niter=200):
     niter : int
         Number of iterations.
 
+    tol : float
+        If given, solve the finite difference equations directly with sine
+        transforms, see poisson_fft, instead of doing niter Jacobi
+        iterations. The result is exact to round-off for any tol.
+
     Returns
     ----------
     ndarray with the shape [3, nz, ny, nx], representing solution to the Laplace equation.
@@ -78,6 +94,11 @@ def laplace_vector_cartesian(bx, by, bz, dx, dy, dz, niter=200):
 
     import numpy as np
 
+    if tol is not None:
+        return poisson_fft(
+            np.zeros((3,) + np.shape(bx)), dx, dy, dz, bc=np.array([bx, by, bz])
+        )
+
     return np.array(
         [
             laplace_scalar_cartesian(bx, dx, dy, dz, niter=niter),
@@ -87,9 +108,9 @@ def laplace_vector_cartesian(bx, by, bz, dx, dy, dz, niter=200):
     )
 
 
-def laplace_scalar_cylindrical(bc, r, theta, z, niter=200):
+def laplace_scalar_cylindrical(bc, r, theta, z, niter=200, tol=None):
     """
-    laplace_scalar_cylindrical(bc, r, theta, z, niter=1000)
+    laplace_scalar_cylindrical(bc, r, theta, z, niter=200, tol=None)
 
     Solve the scalar Laplace equation in cylindical coordinates in 3 dimensions
     using finite differences.
@@ -106,6 +127,11 @@ def laplace_scalar_cylindrical(bc, r, theta, z, niter=200):
     niter : int
         Number of iterations.
 
+    tol : float
+        If given, solve with the preconditioned conjugate gradient method,
+        see poisson_cg, until the residual has dropped by this factor instead of
+        doing niter Jacobi iterations.
+
     Returns
     ----------
     ndarray with the same shape as bc, representing solution to the Laplace equation.
@@ -113,7 +139,19 @@ def laplace_scalar_cylindrical(bc, r, theta, z, niter=200):
 
     import numpy as np
 
-    radius_matrix = np.swapaxes(np.meshgrid(theta, r, z, indexing="ij")[1], 0, 2)
+    if tol is not None:
+        return poisson_cg(
+            np.zeros(np.shape(bc)),
+            bc,
+            r,
+            theta,
+            z,
+            coordinate_system="cylindrical",
+            periodic=(False, True, True),
+            tol=tol,
+        )[0]
+
+    radius_matrix = np.meshgrid(z, theta, r, indexing="ij")[2]
     uu = bc
     dr = r[1] - r[0]
     dtheta = theta[1] - theta[0]
@@ -137,9 +175,11 @@ def laplace_scalar_cylindrical(bc, r, theta, z, niter=200):
     return uu
 
 
-def laplace_vector_cylindrical(br, btheta, bz, r, theta, z, niter=200):
+def laplace_vector_cylindrical(
+    br, btheta, bz, r, theta, z, niter=200, tol=None
+):
     """
-    laplace_vector_cylindrical(br, btheta, bz, r, theta, z, niter=200)
+    laplace_vector_cylindrical(br, btheta, bz, r, theta, z, niter=200, tol=None)
 
     Solve the vector Laplace equation in cylindrical coordinates in 3 dimensions
     using finite differences.
@@ -156,6 +196,11 @@ def laplace_vector_cylindrical(br, btheta, bz, r, theta, z, niter=200):
     niter : int
         Number of iterations.
 
+    tol : float
+        If given, solve with the preconditioned conjugate gradient method,
+        see poisson_vector_cg, until the residual has dropped by this factor instead of
+        doing niter Jacobi iterations.
+
     Returns
     ----------
     ndarray with the shape [3, nz, ny, nx], representing solution to the Laplace equation.
@@ -163,7 +208,19 @@ def laplace_vector_cylindrical(br, btheta, bz, r, theta, z, niter=200):
 
     import numpy as np
 
-    radius_matrix = np.swapaxes(np.meshgrid(theta, r, z, indexing="ij")[1], 0, 2)
+    if tol is not None:
+        return poisson_vector_cg(
+            np.zeros((3,) + np.shape(br)),
+            np.array([br, btheta, bz]),
+            r,
+            theta,
+            z,
+            coordinate_system="cylindrical",
+            periodic=(False, True, True),
+            tol=tol,
+        )[0]
+
+    radius_matrix = np.meshgrid(z, theta, r, indexing="ij")[2]
     dr = r[1] - r[0]
     dtheta = theta[1] - theta[0]
     dz = z[1] - z[0]
@@ -207,9 +264,9 @@ def laplace_vector_cylindrical(br, btheta, bz, r, theta, z, niter=200):
     return np.array([R, Theta, bz])
 
 
-def laplace_scalar_spherical(bc, r, theta, phi, niter=200):
+def laplace_scalar_spherical(bc, r, theta, phi, niter=200, tol=None):
     """
-    laplace_scalar_spherical(bc, r, theta, phi, niter=200)
+    laplace_scalar_spherical(bc, r, theta, phi, niter=200, tol=None)
 
     Solve the scalar Laplace equation in spherical coordinates in 3 dimensions
     using finite differences.
@@ -230,6 +287,11 @@ def laplace_scalar_spherical(bc, r, theta, phi, niter=200):
     niter : int
         Number of iterations.
 
+    tol : float
+        If given, solve with the preconditioned conjugate gradient method,
+        see poisson_cg, until the residual has dropped by this factor instead of
+        doing niter Jacobi iterations.
+
     Returns
     ----------
     ndarray with the same shape as bc, representing solution to the Laplace equation.
@@ -237,6 +299,18 @@ def laplace_scalar_spherical(bc, r, theta, phi, niter=200):
 
     import numpy as np
 
+    if tol is not None:
+        return poisson_cg(
+            np.zeros(np.shape(bc)),
+            bc,
+            r,
+            theta,
+            phi,
+            coordinate_system="spherical",
+            periodic=(False, False, True),
+            tol=tol,
+        )[0]
+
     radius_matrix, theta_matrix, phi_matrix = np.meshgrid(r, theta, phi, indexing="ij")
     radius_matrix = np.swapaxes(radius_matrix, 0, 2)
     theta_matrix = np.swapaxes(theta_matrix, 0, 2)
@@ -277,9 +351,11 @@ def laplace_scalar_spherical(bc, r, theta, phi, niter=200):
     return uu
 
 
-def laplace_vector_spherical(br, btheta, bphi, r, theta, phi, niter=200):
+def laplace_vector_spherical(
+    br, btheta, bphi, r, theta, phi, niter=200, tol=None
+):
     """
-    laplace_vector_spherical(br, btheta, bphi, r, theta, phi, niter=200)
+    laplace_vector_spherical(br, btheta, bphi, r, theta, phi, niter=200, tol=None)
 
     Solve the scalar Laplace equation in spherical coordinates in 3 dimensions
     using finite differences.
@@ -300,6 +376,11 @@ def laplace_vector_spherical(br, btheta, bphi, r, theta, phi, niter=200):
     niter : int
         Number of iterations.
 
+    tol : float
+        If given, solve with the preconditioned conjugate gradient method,
+        see poisson_vector_cg, until the residual has dropped by this factor instead of
+        doing niter Jacobi iterations.
+
     Returns
     ----------
     ndarray with the shape [3, nz, ny, nx], representing solution to the Laplace equation.
@@ -307,6 +388,18 @@ def laplace_vector_spherical(br, btheta, bphi, r, theta, phi, niter=200):
 
     import numpy as np
 
+    if tol is not None:
+        return poisson_vector_cg(
+            np.zeros((3,) + np.shape(br)),
+            np.array([br, btheta, bphi]),
+            r,
+            theta,
+            phi,
+            coordinate_system="spherical",
+            periodic=(False, False, True),
+            tol=tol,
+        )[0]
+
     radius_matrix, theta_matrix, phi_matrix = np.meshgrid(r, theta, phi, indexing="ij")
     radius_matrix = np.swapaxes(radius_matrix, 0, 2)
     theta_matrix = np.swapaxes(theta_matrix, 0, 2)
@@ -2,12 +2,17 @@
 This code contains various functions to solve the vector form of the Poisson
 equation in various coordinate systems (Cartesian, cylindrical and spherical)
 using finite differences.
+Besides the fixed number of Jacobi iterations, poisson_fft solves directly
+with Fourier or sine transforms in Cartesian boxes, and poisson_cg and
+poisson_vector_cg iterate to a given tolerance in any coordinate system.
 """
 
 
-def poisson_vector_cartesian(bx, by, bz, x, y, z, hx, hy, hz, niter=1000):
+def poisson_vector_cartesian(
+    bx, by, bz, x, y, z, hx, hy, hz, niter=1000, tol=None
+):
     """
-    poisson_vector_cartesian(bx, by, bz, x, y, z, hx, hy, hz, niter=1000)
+    poisson_vector_cartesian(bx, by, bz, x, y, z, hx, hy, hz, niter=1000, tol=None)
 
     Solve the vector form of the Poisson equation in 3D Cartesian coordinates,
     $\nabla^2 u = h$, using finite differences.
@@ -27,6 +32,11 @@ def poisson_vector_cartesian(bx, by, bz, x, y, z, hx, hy, hz, niter=1000):
     niter : int
         Number of iterations.
 
+    tol : float
+        If given, solve the finite difference equations directly with sine
+        transforms, see poisson_fft, instead of doing niter Jacobi
+        iterations. The result is exact to round-off for any tol.
+
     Returns
     ----------
     ndarray with the shape [3, nz, ny, nx], representing solution to the Poisson equation.
@@ -34,6 +44,15 @@ def poisson_vector_cartesian(bx, by, bz, x, y, z, hx, hy, hz, niter=1000):
 
     import numpy as np
 
+    if tol is not None:
+        return poisson_fft(
+            np.array([hx, hy, hz]),
+            x[1] - x[0],
+            y[1] - y[0],
+            z[1] - z[0],
+            bc=np.array([bx, by, bz]),
+        )
+
     dx = x[1] - x[0]
     dy = y[1] - y[0]
     dz = z[1] - z[0]
@@ -75,9 +94,9 @@ def poisson_vector_cartesian(bx, by, bz, x, y, z, hx, hy, hz, niter=1000):
     return np.array([ux, uy, uz])
 
 
-def poisson_scalar_cylindrical(bc, r, theta, z, h, niter=200):
+def poisson_scalar_cylindrical(bc, r, theta, z, h, niter=200, tol=None):
     """
-    poisson_scalar_cylindrical(bc, r, theta, z, h, niter=200)
+    poisson_scalar_cylindrical(bc, r, theta, z, h, niter=200, tol=None)
 
     Solve the scalar form of the Poisson equation in cylindical coordinates using finite differences.
 
@@ -96,6 +115,11 @@ def poisson_scalar_cylindrical(bc, r, theta, z, h, niter=200):
     niter : int
         Number of iterations.
 
+    tol : float
+        If given, solve with the preconditioned conjugate gradient method,
+        see poisson_cg, until the residual has dropped by this factor instead of
+        doing niter Jacobi iterations.
+
     Returns
     ----------
     ndarray with the shape [nz, ny, nx], representing solution to the Poisson equation.
@@ -103,7 +127,19 @@ def poisson_scalar_cylindrical(bc, r, theta, z, h, niter=200):
 
     import numpy as np
 
-    radius_matrix = np.swapaxes(np.meshgrid(theta, r, z, indexing="ij")[1], 0, 2)
+    if tol is not None:
+        return poisson_cg(
+            h,
+            bc,
+            r,
+            theta,
+            z,
+            coordinate_system="cylindrical",
+            periodic=(False, True, True),
+            tol=tol,
+        )[0]
+
+    radius_matrix = np.meshgrid(z, theta, r, indexing="ij")[2]
     u = bc
     dx = r[1] - r[0]
     dy = theta[1] - theta[0]
@@ -128,9 +164,11 @@ def poisson_scalar_cylindrical(bc, r, theta, z, h, niter=200):
     return u
 
 
-def poisson_vector_cylindrical(br, btheta, bz, r, theta, z, hr, htheta, hz, niter=1000):
+def poisson_vector_cylindrical(
+    br, btheta, bz, r, theta, z, hr, htheta, hz, niter=1000, tol=None
+):
     """
-    poisson_vector_cylindrical(br, btheta, bz, r, theta, z, hr, htheta, hz, niter=1000)
+    poisson_vector_cylindrical(br, btheta, bz, r, theta, z, hr, htheta, hz, niter=1000, tol=None)
 
     Solve the vector form of the Poisson equation, $\nabla^2 u = h$, in cylindrical
     coordinates using finite diffferences.
@@ -150,6 +188,11 @@ def poisson_vector_cylindrical(br, btheta, bz, r, theta, z, hr, htheta, hz, nite
     niter : int
         Number of iterations.
 
+    tol : float
+        If given, solve with the preconditioned conjugate gradient method,
+        see poisson_vector_cg, until the residual has dropped by this factor instead of
+        doing niter Jacobi iterations.
+
     Returns
     ----------
     ndarray with the shape [3, nz, ny, nx], representing solution to the Poisson equation.
@@ -157,10 +200,19 @@ def poisson_vector_cylindrical(br, btheta, bz, r, theta, z, hr, htheta, hz, nite
 
     import numpy as np
 
-    theta_matrix, radius_matrix, z_matrix = np.meshgrid(theta, r, z, indexing="ij")
-    theta_matrix = np.swapaxes(theta_matrix, 0, 2)
-    radius_matrix = np.swapaxes(radius_matrix, 0, 2)
-    z_matrix = np.swapaxes(z_matrix, 0, 2)
+    if tol is not None:
+        return poisson_vector_cg(
+            np.array([hr, htheta, hz]),
+            np.array([br, btheta, bz]),
+            r,
+            theta,
+            z,
+            coordinate_system="cylindrical",
+            periodic=(False, True, True),
+            tol=tol,
+        )[0]
+
+    z_matrix, theta_matrix, radius_matrix = np.meshgrid(z, theta, r, indexing="ij")
     dx = r[1] - r[0]
     dy = theta[1] - theta[0]
     dz = z[1] - z[0]
@@ -206,10 +258,10 @@ def poisson_vector_cylindrical(br, btheta, bz, r, theta, z, hr, htheta, hz, nite
 
 
 def poisson_vector_spherical(
-    br, btheta, bphi, r, theta, phi, hr, htheta, hphi, niter=200
+    br, btheta, bphi, r, theta, phi, hr, htheta, hphi, niter=200, tol=None
 ):
     """
-    poisson_vector_spherical(br, btheta, bphi, r, theta, phi, hr, htheta, hphi, niter=200)
+    poisson_vector_spherical(br, btheta, bphi, r, theta, phi, hr, htheta, hphi, niter=200, tol=None)
 
     Solve the vector form of the Poisson equation, $\nabla^2 u = h$,
     in spherical coordinates using finite differences.
@@ -232,6 +284,11 @@ def poisson_vector_spherical(
     niter : int
         Number of iterations.
 
+    tol : float
+        If given, solve with the preconditioned conjugate gradient method,
+        see poisson_vector_cg, until the residual has dropped by this factor instead of
+        doing niter Jacobi iterations.
+
     Returns
     ----------
     ndarray with the shape [3, nz, ny, nx], representing solution to the Poisson equation.
@@ -239,6 +296,18 @@ def poisson_vector_spherical(
 
     import numpy as np
 
+    if tol is not None:
+        return poisson_vector_cg(
+            np.array([hr, htheta, hphi]),
+            np.array([br, btheta, bphi]),
+            r,
+            theta,
+            phi,
+            coordinate_system="spherical",
+            periodic=(False, False, True),
+            tol=tol,
+        )[0]
+
     theta_matrix, radius_matrix, phi_matrix = np.meshgrid(theta, r, phi, indexing="ij")
     theta_matrix = np.swapaxes(theta_matrix, 0, 2)
     radius_matrix = np.swapaxes(radius_matrix, 0, 2)
@@ -349,3 +418,412 @@ def poisson_vector_spherical(
         bphi[1:-1, :, :] = Phi[1:-1, :, :]
 
     return np.array([R, Theta, Phi])
+
+
+def poisson_fft(h, dx, dy, dz, bc=None, spectral=False, workers=None):
+    """
+    poisson_fft(h, dx, dy, dz, bc=None, spectral=False, workers=None)
+
+    Solve the Poisson equation $\nabla^2 u = h$ in 3D Cartesian coordinates
+    directly with fast Fourier transforms in a periodic box, or with sine
+    transforms for the boundary values bc.
+
+    Parameters
+    ----------
+    h : ndarray of shape [..., nz, ny, nx]
+        The known function h, e.g. [3, nz, ny, nx] for a vector.
+        In a periodic box its mean is ignored.
+
+    dx, dy, dz : floats
+        Grid spacing in each direction.
+
+    bc : ndarray of the shape of h
+        Boundary conditions on exterior points. Keep the inner points 0.
+        If None, the box is periodic.
+
+    spectral : bool
+        In a periodic box, solve with the exact Laplacian -k^2 instead of
+        the 2nd order finite differences used by the other solvers.
+
+    workers : int
+        Number of threads computing the transforms.
+
+    Returns
+    ----------
+    ndarray with the shape of h, representing solution to the Poisson equation.
+    The solution in a periodic box has zero mean.
+    """
+
+    import numpy as np
+    from scipy import fft
+
+    axes = (-3, -2, -1)
+    spacing = (dz, dy, dx)
+
+    if bc is None:
+        shape = h.shape[-3:]
+        k = [2 * np.pi * fft.fftfreq(n, d) for n, d in zip(shape[:2], spacing[:2])]
+        k.append(2 * np.pi * fft.rfftfreq(shape[2], dx))
+        if spectral:
+            k2 = [ki ** 2 for ki in k]
+        else:
+            k2 = [(2 - 2 * np.cos(ki * d)) / d ** 2 for ki, d in zip(k, spacing)]
+        k2 = k2[0][:, None, None] + k2[1][None, :, None] + k2[2][None, None, :]
+        k2[0, 0, 0] = 1
+        uk = fft.rfftn(h, axes=axes, workers=workers)
+        uk /= -k2
+        uk[..., 0, 0, 0] = 0
+        return fft.irfftn(uk, s=shape, axes=axes, workers=workers)
+
+    # Move the boundary values to the right hand side and solve for the
+    # inner points, the eigenfunctions of the stencil are sines.
+    u = np.array(bc, dtype=float)
+    u[..., 1:-1, 1:-1, 1:-1] = 0
+    inner = (Ellipsis, slice(1, -1), slice(1, -1), slice(1, -1))
+    rhs = np.array(h[inner], dtype=float)
+    for axis, d in zip(axes, spacing):
+        lower = [slice(1, -1)] * 3
+        upper = [slice(1, -1)] * 3
+        lower[axis] = slice(None, -2)
+        upper[axis] = slice(2, None)
+        rhs -= (u[(Ellipsis,) + tuple(lower)] + u[(Ellipsis,) + tuple(upper)]) / d ** 2
+    eigenvalues = [
+        (2 * np.cos(np.pi * np.arange(1, n + 1) / (n + 1)) - 2) / d ** 2
+        for n, d in zip(rhs.shape[-3:], spacing)
+    ]
+    eigenvalues = (
+        eigenvalues[0][:, None, None]
+        + eigenvalues[1][None, :, None]
+        + eigenvalues[2][None, None, :]
+    )
+    uk = fft.dstn(rhs, type=1, axes=axes, workers=workers)
+    uk /= eigenvalues
+    u[inner] = fft.idstn(uk, type=1, axes=axes, workers=workers)
+
+    return u
+
+
+def _widths(s, periodic):
+    """
+    Return the face positions, face spacings and cell widths of the 1D
+    coordinate s.
+    """
+
+    import numpy as np
+
+    if periodic:
+        ds = s[1] - s[0]
+        return s + ds / 2, np.full(len(s), ds), np.full(len(s), ds)
+    faces = (s[1:] + s[:-1]) / 2
+    spacing = np.diff(s)
+    widths = np.empty(len(s))
+    widths[1:-1] = (s[2:] - s[:-2]) / 2
+    widths[0] = spacing[0] / 2
+    widths[-1] = spacing[-1] / 2
+    return faces, spacing, widths
+
+
+def _laplacian_coefficients(x, y, z, coordinate_system, periodic):
+    """
+    Return the coefficients of the Laplacian in flux form multiplied with
+    the cell volumes, which is symmetric. For each axis (z, y, x) and the
+    volume a pair (z-profile, (y, x)-profile).
+    """
+
+    import numpy as np
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    z = np.asarray(z, dtype=float)
+    xf, hx, wx = _widths(x, periodic[0])
+    yf, hy, wy = _widths(y, periodic[1])
+    zf, hz, wz = _widths(z, periodic[2])
+
+    # Jacobian J and J*g^aa of the coordinate axes, as functions of (x, y).
+    if coordinate_system == "cartesian":
+        jacobian = lambda r, theta: np.ones(np.broadcast(r, theta).shape)
+        kx = ky = kz = jacobian
+    elif coordinate_system == "cylindrical":
+        jacobian = lambda r, theta: r + 0 * theta
+        kx = kz = jacobian
+        ky = lambda r, theta: 1 / r + 0 * theta
+    elif coordinate_system == "spherical":
+        jacobian = lambda r, theta: r ** 2 * np.sin(theta)
+        kx = jacobian
+        ky = lambda r, theta: np.sin(theta) + 0 * r
+        kz = lambda r, theta: 1 / np.sin(theta) + 0 * r
+    else:
+        raise ValueError(
+            "could not recognize coordinate system {0}".format(coordinate_system)
+        )
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        coefficients = [
+            (1 / hz, kz(x[None, :], y[:, None]) * wx[None, :] * wy[:, None]),
+            (wz, ky(x[None, :], yf[:, None]) * wx[None, :] / hy[:, None]),
+            (wz, kx(xf[None, :], y[:, None]) * wy[:, None] / hx[None, :]),
+        ]
+        volume = (wz, jacobian(x[None, :], y[:, None]) * wx[None, :] * wy[:, None])
+
+    return coefficients, volume
+
+
+def _apply_laplacian(u, coefficients, periodic):
+    """
+    Return the volume weighted Laplacian of u in flux form.
+    """
+
+    import numpy as np
+
+    out = np.zeros(u.shape)
+    with np.errstate(invalid="ignore", over="ignore"):
+        for axis, (cz, cyx) in enumerate(coefficients):
+            if periodic[axis]:
+                flux = np.roll(u, -1, axis) - u
+            else:
+                flux = np.diff(u, axis=axis)
+            flux *= cz[:, None, None]
+            flux *= cyx[None, :, :]
+            if periodic[axis]:
+                out += flux - np.roll(flux, 1, axis)
+            else:
+                inner = [slice(None)] * 3
+                inner[axis] = slice(1, -1)
+                lower = [slice(None)] * 3
+                lower[axis] = slice(None, -1)
+                upper = [slice(None)] * 3
+                upper[axis] = slice(1, None)
+                out[tuple(inner)] += flux[tuple(upper)] - flux[tuple(lower)]
+
+    return out
+
+
+def poisson_cg(
+    h,
+    bc,
+    x,
+    y,
+    z,
+    coordinate_system="cartesian",
+    periodic=(False, False, False),
+    tol=1e-8,
+    maxiter=None,
+):
+    """
+    poisson_cg(h, bc, x, y, z, coordinate_system="cartesian", periodic=(False, False, False), tol=1e-8, maxiter=None)
+
+    Solve the scalar Poisson equation $\nabla^2 u = h$ in Cartesian,
+    cylindrical or spherical coordinates with 2nd order finite differences
+    and the conjugate gradient method, preconditioned with the diagonal.
+
+    Parameters
+    ----------
+    h : ndarray of shape [nz, ny, nx]
+        The known function h.
+
+    bc : ndarray of shape [nz, ny, nx]
+        Boundary conditions on exterior points of the non-periodic axes.
+        Keep the inner points 0.
+
+    x, y, z : ndarrays of shape [nx], [ny] and [nz]
+        Coordinate arrays, (r, theta, z) or (r, theta, phi) in cylindrical
+        and spherical coordinates. They need not be equidistant, except
+        along periodic axes.
+
+    coordinate_system : string
+        'cartesian', 'cylindrical' or 'spherical'.
+
+    periodic : tuple of 3 bool
+        Periodicity of the x, y and z axes, e.g. (False, True, False) for
+        the azimuth in cylindrical coordinates.
+
+    tol : float
+        Stop when the residual has dropped by this factor.
+
+    maxiter : int
+        Maximum number of iterations, defaults to 10 times the largest
+        number of points along an axis.
+
+    Returns
+    ----------
+    Tuple (u, residuals): ndarray with the shape [nz, ny, nx] representing
+    solution to the Poisson equation and list of the residuals of the
+    iterations relative to the initial one.
+    """
+
+    import numpy as np
+
+    periodic = tuple(periodic)[::-1]
+    coefficients, volume = _laplacian_coefficients(
+        x, y, z, coordinate_system, periodic[::-1]
+    )
+    inner = tuple(slice(None) if p else slice(1, -1) for p in periodic)
+    if maxiter is None:
+        maxiter = 10 * max(np.shape(h))
+
+    def operator(v):
+        out = np.zeros(v.shape)
+        out[inner] = -_apply_laplacian(v, coefficients, periodic)[inner]
+        return out
+
+    u = np.array(bc, dtype=float)
+    u[inner] = 0
+    b = np.zeros(u.shape)
+    b[inner] = (
+        _apply_laplacian(u, coefficients, periodic)
+        - np.asarray(h) * volume[0][:, None, None] * volume[1][None, :, :]
+    )[inner]
+
+    # Diagonal of the operator.
+    diagonal = np.zeros(u.shape)
+    with np.errstate(invalid="ignore", over="ignore"):
+        for axis, (cz, cyx) in enumerate(coefficients):
+            c = cz[:, None, None] * cyx[None, :, :]
+            if periodic[axis]:
+                diagonal += c + np.roll(c, 1, axis)
+            else:
+                lower = [slice(None)] * 3
+                lower[axis] = slice(None, -1)
+                upper = [slice(None)] * 3
+                upper[axis] = slice(1, None)
+                c_inner = [slice(None)] * 3
+                c_inner[axis] = slice(1, -1)
+                diagonal[tuple(c_inner)] += c[tuple(lower)] + c[tuple(upper)]
+    preconditioner = np.zeros(u.shape)
+    preconditioner[inner] = 1 / diagonal[inner]
+
+    b_norm = np.linalg.norm(b)
+    if b_norm == 0:
+        return u, [0.0]
+    v = np.zeros(u.shape)
+    r = b
+    s = preconditioner * r
+    p = s.copy()
+    rs = np.vdot(r, s)
+    residuals = [1.0]
+    for iteration in range(maxiter):
+        ap = operator(p)
+        alpha = rs / np.vdot(p, ap)
+        v += alpha * p
+        r -= alpha * ap
+        residuals.append(np.linalg.norm(r) / b_norm)
+        if residuals[-1] < tol:
+            break
+        s = preconditioner * r
+        rs_new = np.vdot(r, s)
+        p *= rs_new / rs
+        p += s
+        rs = rs_new
+    else:
+        import warnings
+
+        warnings.warn(
+            "poisson_cg: residual {0:.3e} after {1} iterations.".format(
+                residuals[-1], maxiter
+            )
+        )
+
+    u[inner] = v[inner]
+
+    return u, residuals
+
+
+def _cartesian_rotation(y, z, coordinate_system):
+    """
+    Return the matrix rotating vector components of the coordinate system
+    into Cartesian components.
+    """
+
+    import numpy as np
+
+    if coordinate_system == "cartesian":
+        return np.eye(3)[:, :, None, None, None]
+    theta = np.asarray(y, dtype=float)[None, :, None]
+    if coordinate_system == "cylindrical":
+        zero = np.zeros_like(theta)
+        one = np.ones_like(theta)
+        return np.array(
+            [
+                [np.cos(theta), -np.sin(theta), zero],
+                [np.sin(theta), np.cos(theta), zero],
+                [zero, zero, one],
+            ]
+        )
+    phi = np.asarray(z, dtype=float)[:, None, None]
+    return np.array(
+        [
+            [
+                np.sin(theta) * np.cos(phi),
+                np.cos(theta) * np.cos(phi),
+                -np.sin(phi) + 0 * theta,
+            ],
+            [
+                np.sin(theta) * np.sin(phi),
+                np.cos(theta) * np.sin(phi),
+                np.cos(phi) + 0 * theta,
+            ],
+            [np.cos(theta) + 0 * phi, -np.sin(theta) + 0 * phi, 0 * theta * phi],
+        ]
+    )
+
+
+def poisson_vector_cg(
+    h,
+    bc,
+    x,
+    y,
+    z,
+    coordinate_system="cartesian",
+    periodic=(False, False, False),
+    tol=1e-8,
+    maxiter=None,
+):
+    """
+    poisson_vector_cg(h, bc, x, y, z, coordinate_system="cartesian", periodic=(False, False, False), tol=1e-8, maxiter=None)
+
+    Solve the vector Poisson equation $\nabla^2 u = h$ in Cartesian,
+    cylindrical or spherical coordinates. The vectors are rotated to
+    Cartesian components, whose Laplacians are scalar ones, and solved
+    for with poisson_cg.
+
+    Parameters
+    ----------
+    h : ndarray of shape [3, nz, ny, nx]
+        The components of the known function h.
+
+    bc : ndarray of shape [3, nz, ny, nx]
+        Boundary conditions on exterior points of the non-periodic axes
+        for each component. Keep the inner points 0.
+
+    x, y, z, coordinate_system, periodic, tol, maxiter
+        See poisson_cg.
+
+    Returns
+    ----------
+    Tuple (u, residuals): ndarray with the shape [3, nz, ny, nx]
+    representing solution to the Poisson equation and the list of relative
+    residuals of each Cartesian component.
+    """
+
+    import numpy as np
+
+    rotation = _cartesian_rotation(y, z, coordinate_system)
+    h = np.einsum("ij...,j...->i...", rotation, np.asarray(h))
+    bc = np.einsum("ij...,j...->i...", rotation, np.asarray(bc))
+    u = np.empty(h.shape)
+    residuals = []
+    for i in range(3):
+        u[i], residuals_i = poisson_cg(
+            h[i],
+            bc[i],
+            x,
+            y,
+            z,
+            coordinate_system=coordinate_system,
+            periodic=periodic,
+            tol=tol,
+            maxiter=maxiter,
+        )
+        residuals.append(residuals_i)
+
+    return np.einsum("ji...,j...->i...", rotation, u), residuals
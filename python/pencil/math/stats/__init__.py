@@ -1,6 +1,6 @@
 """
-Differential operators in different coordinate systems.
+Statistics of data, e.g. structure functions.
 """
 
 from .struct import space_struct, time_struct, fit_gaussm1, fit_expm1
-from .struct import fit_gauss, fit_exp
+from .struct import fit_gauss, fit_exp, struct_lags
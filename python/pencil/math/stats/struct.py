@@ -50,6 +50,205 @@ def fit_exp(t, sigma, L0):
     return sigma * np.exp(t * L0)
 
 
+# ------------------------------------------------------------------------------
+def struct_lags(
+    arr,
+    lags=None,
+    Dorder=2,
+    axes=None,
+    lperi=True,
+    method="fft",
+    where=None,
+    workers=None,
+    batch_bytes=2 ** 27,
+):
+    """
+    Calculate the structure function for every lag at once.
+
+    call signature:
+
+    struct_lags(arr, lags=None, Dorder=2, axes=None, lperi=True,
+                method='fft', where=None, workers=None, batch_bytes=2**27)
+
+    Keyword arguments:
+
+    *arr*:
+      numpy data array of shape, e.g., [nz,ny,nx]. Masked and NaN points
+      are excluded from all pairs they belong to.
+
+    *lags*:
+      Number of lags for each of the axes, by default half their lengths.
+
+    *Dorder*:
+      Integer order of structure function, by default 2nd.
+
+    *axes*:
+      Axes along which the lags are taken, by default all. The structure
+      function is averaged over the remaining axes.
+
+    *lperi*:
+      Flag indicates for each array axis, or for all, whether boundary is
+      periodic. Pairs are not wrapped across non-periodic boundaries.
+
+    *method*:
+      'fft' obtains the pair sums of all lags as correlations in
+      O(N log N), expanding higher orders binomially; 'direct' differences
+      batches of lags explicitly, which avoids the round-off cancellation of
+      the binomial sum at high orders, at O(N) per lag.
+
+    *where*:
+      Boolean array of arr shape selecting the points from which the
+      lags are taken, by default all.
+
+    *workers*:
+      Number of threads for the Fourier transforms.
+
+    *batch_bytes*:
+      Memory bound of the difference arrays of the 'direct' method.
+
+    Returns
+    -------
+    D structure function (mean over valid pairs, NaN if there are none) and
+    N fraction of valid pairs, both of shape lags.
+
+    Examples
+    --------
+    >>> D, N = pc.math.stats.struct_lags(var.rho[n1:n2,m1:m2,l1:l2])
+    """
+
+    from scipy import fft
+    from scipy.special import comb
+
+    if not isinstance(Dorder, (int, np.integer)) or Dorder < 1:
+        raise ValueError("Dorder must be a positive integer, not {}".format(Dorder))
+    if method not in ("fft", "direct"):
+        raise ValueError("method must be 'fft' or 'direct', not {}".format(method))
+    f = np.ma.filled(np.ma.array(arr, dtype=np.float64), np.nan)
+    valid = np.isfinite(f)
+    if axes is None:
+        axes = tuple(range(f.ndim))
+    axes = tuple(sorted(int(axis) % f.ndim for axis in np.atleast_1d(axes)))
+    if np.size(lperi) == 1:
+        lperi = f.ndim * [bool(np.all(lperi))]
+    if lags is None:
+        lags = [max(1, f.shape[axis] // 2) for axis in axes]
+    lags = [int(lag) for lag in np.atleast_1d(lags)]
+    if len(lags) != len(axes):
+        raise ValueError("lags {} do not match axes {}".format(lags, axes))
+    for lag, axis in zip(lags, axes):
+        if not 0 < lag <= f.shape[axis]:
+            raise ValueError(
+                "lags {} exceed the length {} of axis {}".format(
+                    lag, f.shape[axis], axis
+                )
+            )
+    base = valid if where is None else np.logical_and(valid, where)
+    others = tuple(i for i in range(f.ndim) if i not in axes)
+    # sizes of the transforms, padded to avoid wrapping non-periodic axes
+    sizes = [
+        f.shape[axis] if lperi[axis] else fft.next_fast_len(f.shape[axis] + lag - 1)
+        for lag, axis in zip(lags, axes)
+    ]
+    box = tuple(
+        slice(0, lags[axes.index(i)]) if i in axes else slice(None)
+        for i in range(f.ndim)
+    )
+
+    def corr(a, b):
+        """Sum over the other axes of a(x) b(x+l) for all lags l."""
+        c = fft.irfftn(
+            np.conj(fft.rfftn(a, s=sizes, axes=axes, workers=workers))
+            * fft.rfftn(b, s=sizes, axes=axes, workers=workers),
+            s=sizes,
+            axes=axes,
+            workers=workers,
+        )
+        return c[box].sum(axis=others)
+
+    # geometric pair count, as if no point were invalid
+    selected = np.ones(f.shape) if where is None else np.asarray(where, dtype=float)
+    total = np.rint(corr(selected, np.ones(f.shape)))
+    if method == "fft":
+        count = np.rint(corr(base.astype(float), valid.astype(float)))
+        # subtract the mean to limit the cancellation of the binomial terms
+        f = np.where(valid, f - (f[valid].mean() if valid.any() else 0.0), 0.0)
+        spec = [
+            fft.rfftn(
+                np.where(valid, f ** k, 0.0), s=sizes, axes=axes, workers=workers
+            )
+            for k in range(Dorder + 1)
+        ]
+        if where is None:
+            pspec = [(-1) ** k * spec[k] for k in range(Dorder + 1)]
+        else:
+            pspec = [
+                fft.rfftn(
+                    np.where(base, (-f) ** k, 0.0), s=sizes, axes=axes, workers=workers
+                )
+                for k in range(Dorder + 1)
+            ]
+        acc = np.zeros_like(spec[0])
+        for k in range(Dorder + 1):
+            acc += comb(Dorder, k, exact=True) * (
+                np.conj(pspec[Dorder - k]) * spec[k]
+            )
+        S = fft.irfftn(acc, s=sizes, axes=axes, workers=workers)
+        S = S[box].sum(axis=others)
+    else:
+        S, count = _struct_lags_direct(
+            np.where(base, f, np.nan), f, Dorder, axes, lags, lperi, batch_bytes
+        )
+    with np.errstate(invalid="ignore", divide="ignore"):
+        D = np.where(count > 0, S / np.maximum(count, 1), np.nan)
+        N = np.where(total > 0, count / np.maximum(total, 1), 0.0)
+    return D, N
+
+
+def _struct_lags_direct(f0, f, Dorder, axes, lags, lperi, batch_bytes):
+    """
+    Sum the differences f(x+l) - f0(x) explicitly, lag by lag along the
+    last of the axes in batches bounded by batch_bytes.
+    """
+
+    from numpy.lib.stride_tricks import sliding_window_view
+
+    # extend the shifted array by the lags, wrapped or invalid
+    pad = [(0, 0)] * f.ndim
+    for lag, axis in zip(lags, axes):
+        pad[axis] = (0, lag - 1)
+    g = f
+    for axis in axes:
+        width = [(0, 0)] * f.ndim
+        width[axis] = pad[axis]
+        if lperi[axis]:
+            g = np.pad(g, width, mode="wrap")
+        else:
+            g = np.pad(g, width, mode="constant", constant_values=np.nan)
+    last = axes[-1]
+    f0 = np.moveaxis(f0, last, -1)
+    n = f0.shape[-1]
+    batch = int(max(1, batch_bytes // (8 * f0.size)))
+    S = np.zeros(lags)
+    count = np.zeros(lags)
+    for lag in np.ndindex(*lags[:-1]):
+        shifted = [slice(None)] * f.ndim
+        for l, axis in zip(lag, axes[:-1]):
+            shifted[axis] = slice(l, l + f.shape[axis])
+        windows = sliding_window_view(
+            np.moveaxis(g[tuple(shifted)], last, -1), n, axis=-1
+        )
+        for i0 in range(0, lags[-1], batch):
+            i1 = min(i0 + batch, lags[-1])
+            diff = windows[..., i0:i1, :] - f0[..., None, :]
+            ok = np.isfinite(diff)
+            sum_axes = tuple(i for i in range(diff.ndim) if i != diff.ndim - 2)
+            S[lag + (slice(i0, i1),)] = (np.where(ok, diff, 0.0) ** Dorder).sum(
+                axis=sum_axes
+            )
+            count[lag + (slice(i0, i1),)] = ok.sum(axis=sum_axes)
+    return S, count
+
+
 # ------------------------------------------------------------------------------
 
 
@@ -69,6 +268,8 @@ def space_struct(
     downsample=[1, 1, 1],
     maxl=[-1, -1, -1],
     loopsample=[1, 1, 1],
+    exact=False,
+    workers=None,
 ):
     """
     Calculate the structure function in space.
@@ -80,7 +281,7 @@ def space_struct(
                  InitialGuess = [1.0,1.0],
                  deltay=0.,
                  figname = None, dlabel = 'data',
-                 quiet=False)
+                 quiet=False, exact=False, workers=None)
 
     Keyword arguments:
 
@@ -117,6 +318,15 @@ def space_struct(
     *quiet*
       Flag for switching off output.
 
+    *exact*
+      Flag to evaluate D for all separations from all point pairs with
+      struct_lags, instead of the sampled loops; downsample, maxl and
+      loopsample are then ignored. Requires deltay=0, only the sampled
+      loops account for the shear.
+
+    *workers*
+      Number of threads for the Fourier transforms if exact.
+
     Returns
     -------
     D1 Structure function, length array, fit parameters [sigma, L0].
@@ -295,153 +505,174 @@ def space_struct(
     if not quiet:
         print(lmax)
     # compute correlations
-    zskip = max(1, int(np.random.uniform() * loopsample[0]))
-    for iz in range(1, Dshape[0], zskip):
-        # downsample array in steps of zstep over subset starting at iz0
-        zstep = max(np.mod(iz, downsample[0]), 1)
-        iz0 = int(np.random.uniform() / zstep * (nz - 1))
-        if not len(Dshape) > 1:
-            if D1:
-                marr = np.ma.array(arr[::zstep])
-            elif D2:
-                marr = np.ma.array(arr[::zstep, ::zstep])
-            else:
-                marr = np.ma.array(arr[::zstep, ::zstep, ::zstep])
-            ell[iz] = np.sqrt((dims[Daxis[0]][iz] - dims[Daxis[0]][0]) ** 2)
-            zshift = np.roll(marr, np.mod(zstep, iz), axis=Daxis[0])
-            shift_diff = zshift[iz0 : iz0 + maxl[0]] - marr[iz0 : iz0 + maxl[0]]
-            shift_power = np.power(shift_diff, Dorder)
-            D[iz] = np.mean(shift_power[np.logical_not(np.isnan(shift_diff))])
-            if D1:
-                N[iz] = (
-                    marr[iz0 : iz0 + maxl[0]][
-                        marr[iz0 : iz0 + maxl[0]].mask == False
-                    ].size
-                    / arr[::zstep][iz0 : iz0 + maxl[0]].size
-                )
-            elif D2:
-                N[iz] = (
-                    marr[iz0 : iz0 + maxl[0]][
-                        marr[iz0 : iz0 + maxl[0]].mask == False
-                    ].size
-                    / arr[::zstep, ::ystep][iz0 : iz0 + maxl[0]].size
-                )
-            elif D3:
-                N[iz] = (
-                    marr[iz0 : iz0 + maxl[0]][
-                        marr[iz0 : iz0 + maxl[0]].mask == False
-                    ].size
-                    / arr[::zstep, ::ystep, ::xstep][iz0 : iz0 + maxl[0]].size
+    if exact:
+        if not deltay == 0.0:
+            raise ValueError(
+                "exact structure function does not account for shear deltay"
+            )
+        D, N = struct_lags(
+            arr, lags=Dshape, Dorder=Dorder, axes=Daxis, lperi=lperi, workers=workers
+        )
+        ell = np.sqrt(
+            sum(
+                np.meshgrid(
+                    *[
+                        (np.asarray(dims[axis][:n]) - dims[axis][0]) ** 2
+                        for axis, n in zip(Daxis, Dshape)
+                    ],
+                    indexing="ij"
                 )
-        else:
-            marr = np.ma.array(arr[::zstep])
-            zshift = np.roll(marr, int(iz / zstep), axis=Daxis[0])[iz0 : iz0 + maxl[0]]
-            yskip = max(1, int(np.random.uniform() * loopsample[1]))
-            for iy in range(0, Dshape[1], yskip):
-                # downsample array in steps of ystep over subset starting at iy0
-                ystep = max(np.mod(iy, downsample[1]), 1)
-                iy0 = int(np.random.uniform() / ystep * (ny - 1))
-                if not len(Dshape) > 2:
-                    ell[iz, iy] = np.sqrt(
-                        (dims[Daxis[0]][iz] - dims[Daxis[0]][0]) ** 2
-                        + (dims[Daxis[1]][iy] - dims[Daxis[1]][0]) ** 2
-                    )
-                    # calculate D if ell <= lmax
-                    if ell[iz, iy] <= lmax:
-                        if D2:
-                            marr = np.ma.array(arr[::zstep, ::ystep])
-                        elif D3:
-                            marr = np.ma.array(arr[::zstep, ::ystep, ::ystep])
-                        yshift = np.roll(
-                            zshift[:, ::ystep, ::ystep], int(iy / ystep), axis=Daxis[1]
-                        )
-                        # account for shear if D2 'yx'
-                        if "x" in dirs and iy > 0 and not deltay == 0.0:
-                            ishear = round(
-                                2 * ny * deltay / (max(dims[0]) - min(dims[0])) / ystep
-                            )
-                            yshift[:, : int(iy / ystep)] = np.roll(
-                                yshift[:, : int(iy / istep)], ishear, axis=0
-                            )
-                        shift_diff = (
-                            yshift[:, iy0 : iy0 + maxl[1]]
-                            - marr[iz0 : iz0 + maxl[0], iy0 : iy0 + maxl[1]]
-                        )
-                        shift_power = np.power(shift_diff, Dorder)
-                        D[iz, iy] = np.ma.mean(
-                            shift_power[np.logical_not(np.isnan(shift_diff))]
-                        )
-                        if D2:
-                            N[iz, iy] = (
-                                marr[iz0 : iz0 + maxl[0], iy0 : iy0 + maxl[1]][
-                                    marr[iz0 : iz0 + maxl[0], iy0 : iy0 + maxl[1]].mask
-                                    == False
-                                ].size
-                                / arr[::zstep, ::ystep][
-                                    iz0 : iz0 + maxl[0], iy0 : iy0 + maxl[1]
-                                ].size
-                            )
-                        elif D3:
-                            N[iz, iy] = (
-                                marr[iz0 : iz0 + maxl[0], iy0 : iy0 + maxl[1]][
-                                    marr[iz0 : iz0 + maxl[0], iy0 : iy0 + maxl[1]].mask
-                                    == False
-                                ].size
-                                / arr[::zstep, ::ystep, ::xstep][
-                                    iz0 : iz0 + maxl[0], iy0 : iy0 + maxl[1]
-                                ].size
-                            )
+            )
+        )
+        D[ell > lmax] = np.nan
+    else:
+        zskip = max(1, int(np.random.uniform() * loopsample[0]))
+        for iz in range(1, Dshape[0], zskip):
+            # downsample array in steps of zstep over subset starting at iz0
+            zstep = max(np.mod(iz, downsample[0]), 1)
+            iz0 = int(np.random.uniform() / zstep * (nz - 1))
+            if not len(Dshape) > 1:
+                if D1:
+                    marr = np.ma.array(arr[::zstep])
+                elif D2:
+                    marr = np.ma.array(arr[::zstep, ::zstep])
                 else:
-                    marr = np.ma.array(arr[::zstep, ::ystep])
-                    yshift = np.roll(
-                        zshift[:, ::ystep], int(iy / ystep), axis=Daxis[1]
-                    )[:, iy0 : iy0 + maxl[1]]
-                    xskip = max(1, int(np.random.uniform() * loopsample[2]))
-                    # print('iz {}, iy {}, zskip {} yskip, xskip {}'.format(iz,iy,zskip,yskip,zskip))
-                    for ix in range(0, Dshape[2], xskip):
-                        # downsample array in steps of xstep over subset starting at ix0
-                        xstep = max(np.mod(ix, downsample[2]), 1)
-                        ix0 = int(np.random.uniform() / xstep * (nx - 1))
-                        ell[iz, iy, ix] = np.sqrt(
+                    marr = np.ma.array(arr[::zstep, ::zstep, ::zstep])
+                ell[iz] = np.sqrt((dims[Daxis[0]][iz] - dims[Daxis[0]][0]) ** 2)
+                zshift = np.roll(marr, np.mod(zstep, iz), axis=Daxis[0])
+                shift_diff = zshift[iz0 : iz0 + maxl[0]] - marr[iz0 : iz0 + maxl[0]]
+                shift_power = np.power(shift_diff, Dorder)
+                D[iz] = np.mean(shift_power[np.logical_not(np.isnan(shift_diff))])
+                if D1:
+                    N[iz] = (
+                        marr[iz0 : iz0 + maxl[0]][
+                            marr[iz0 : iz0 + maxl[0]].mask == False
+                        ].size
+                        / arr[::zstep][iz0 : iz0 + maxl[0]].size
+                    )
+                elif D2:
+                    N[iz] = (
+                        marr[iz0 : iz0 + maxl[0]][
+                            marr[iz0 : iz0 + maxl[0]].mask == False
+                        ].size
+                        / arr[::zstep, ::ystep][iz0 : iz0 + maxl[0]].size
+                    )
+                elif D3:
+                    N[iz] = (
+                        marr[iz0 : iz0 + maxl[0]][
+                            marr[iz0 : iz0 + maxl[0]].mask == False
+                        ].size
+                        / arr[::zstep, ::ystep, ::xstep][iz0 : iz0 + maxl[0]].size
+                    )
+            else:
+                marr = np.ma.array(arr[::zstep])
+                zshift = np.roll(marr, int(iz / zstep), axis=Daxis[0])[iz0 : iz0 + maxl[0]]
+                yskip = max(1, int(np.random.uniform() * loopsample[1]))
+                for iy in range(0, Dshape[1], yskip):
+                    # downsample array in steps of ystep over subset starting at iy0
+                    ystep = max(np.mod(iy, downsample[1]), 1)
+                    iy0 = int(np.random.uniform() / ystep * (ny - 1))
+                    if not len(Dshape) > 2:
+                        ell[iz, iy] = np.sqrt(
                             (dims[Daxis[0]][iz] - dims[Daxis[0]][0]) ** 2
                             + (dims[Daxis[1]][iy] - dims[Daxis[1]][0]) ** 2
-                            + (dims[Daxis[2]][ix] - dims[Daxis[2]][0]) ** 2
                         )
                         # calculate D if ell <= lmax
-                        if ell[iz, iy, ix] <= lmax:
-                            marr = np.ma.array(arr[::zstep, ::ystep, ::xstep])
-                            xshift = np.roll(
-                                yshift[:, :, ::xstep], int(ix / xstep), axis=Daxis[2]
+                        if ell[iz, iy] <= lmax:
+                            if D2:
+                                marr = np.ma.array(arr[::zstep, ::ystep])
+                            elif D3:
+                                marr = np.ma.array(arr[::zstep, ::ystep, ::ystep])
+                            yshift = np.roll(
+                                zshift[:, ::ystep, ::ystep], int(iy / ystep), axis=Daxis[1]
                             )
-                            # account for shear if D3 'zyx'
-                            if ix > 0 and not deltay == 0.0:
+                            # account for shear if D2 'yx'
+                            if "x" in dirs and iy > 0 and not deltay == 0.0:
                                 ishear = round(
-                                    2
-                                    * ny
-                                    * deltay
-                                    / (max(dims[1]) - min(dims[1]))
-                                    / ystep
+                                    2 * ny * deltay / (max(dims[0]) - min(dims[0])) / ystep
                                 )
-                                xshift[:, :, : int(ix / xstep)] = np.roll(
-                                    xshift[:, :, : int(ix / xstep)], ishear, axis=1
+                                yshift[:, : int(iy / ystep)] = np.roll(
+                                    yshift[:, : int(iy / istep)], ishear, axis=0
                                 )
                             shift_diff = (
-                                xshift[:, :, ix0 : ix0 + maxl[2]]
-                                - marr[
-                                    iz0 : iz0 + maxl[0],
-                                    iy0 : iy0 + maxl[1],
-                                    ix0 : ix0 + maxl[2],
-                                ]
+                                yshift[:, iy0 : iy0 + maxl[1]]
+                                - marr[iz0 : iz0 + maxl[0], iy0 : iy0 + maxl[1]]
                             )
                             shift_power = np.power(shift_diff, Dorder)
-                            D[iz, iy, ix] = np.mean(
+                            D[iz, iy] = np.ma.mean(
                                 shift_power[np.logical_not(np.isnan(shift_diff))]
                             )
-                            # N[iz,iy,ix] = marr[iz0:iz0+maxl[0],iy0:iy0+maxl[1],ix0:ix0+maxl[2]][marr[iz0:iz0+maxl[0],iy0:iy0+maxl[1],ix0:ix0+maxl[2]].mask==False].size/arr[::zstep,::ystep,::xstep][iz0:iz0+maxl[0],iy0:iy0+maxl[1],ix0:ix0+maxl[2]].size
-                            N[iz, iy, ix] = (
-                                shift_power[shift_power.mask == False].size
-                                / shift_power.size
-                            )  # marr[iz0:iz0+maxl[0],iy0:iy0+maxl[1],ix0:ix0+maxl[2]][marr[iz0:iz0+maxl[0],iy0:iy0+maxl[1],ix0:ix0+maxl[2]].mask==False].size/arr[::zstep,::ystep,::xstep][iz0:iz0+maxl[0],iy0:iy0+maxl[1],ix0:ix0+maxl[2]].size
+                            if D2:
+                                N[iz, iy] = (
+                                    marr[iz0 : iz0 + maxl[0], iy0 : iy0 + maxl[1]][
+                                        marr[iz0 : iz0 + maxl[0], iy0 : iy0 + maxl[1]].mask
+                                        == False
+                                    ].size
+                                    / arr[::zstep, ::ystep][
+                                        iz0 : iz0 + maxl[0], iy0 : iy0 + maxl[1]
+                                    ].size
+                                )
+                            elif D3:
+                                N[iz, iy] = (
+                                    marr[iz0 : iz0 + maxl[0], iy0 : iy0 + maxl[1]][
+                                        marr[iz0 : iz0 + maxl[0], iy0 : iy0 + maxl[1]].mask
+                                        == False
+                                    ].size
+                                    / arr[::zstep, ::ystep, ::xstep][
+                                        iz0 : iz0 + maxl[0], iy0 : iy0 + maxl[1]
+                                    ].size
+                                )
+                    else:
+                        marr = np.ma.array(arr[::zstep, ::ystep])
+                        yshift = np.roll(
+                            zshift[:, ::ystep], int(iy / ystep), axis=Daxis[1]
+                        )[:, iy0 : iy0 + maxl[1]]
+                        xskip = max(1, int(np.random.uniform() * loopsample[2]))
+                        # print('iz {}, iy {}, zskip {} yskip, xskip {}'.format(iz,iy,zskip,yskip,zskip))
+                        for ix in range(0, Dshape[2], xskip):
+                            # downsample array in steps of xstep over subset starting at ix0
+                            xstep = max(np.mod(ix, downsample[2]), 1)
+                            ix0 = int(np.random.uniform() / xstep * (nx - 1))
+                            ell[iz, iy, ix] = np.sqrt(
+                                (dims[Daxis[0]][iz] - dims[Daxis[0]][0]) ** 2
+                                + (dims[Daxis[1]][iy] - dims[Daxis[1]][0]) ** 2
+                                + (dims[Daxis[2]][ix] - dims[Daxis[2]][0]) ** 2
+                            )
+                            # calculate D if ell <= lmax
+                            if ell[iz, iy, ix] <= lmax:
+                                marr = np.ma.array(arr[::zstep, ::ystep, ::xstep])
+                                xshift = np.roll(
+                                    yshift[:, :, ::xstep], int(ix / xstep), axis=Daxis[2]
+                                )
+                                # account for shear if D3 'zyx'
+                                if ix > 0 and not deltay == 0.0:
+                                    ishear = round(
+                                        2
+                                        * ny
+                                        * deltay
+                                        / (max(dims[1]) - min(dims[1]))
+                                        / ystep
+                                    )
+                                    xshift[:, :, : int(ix / xstep)] = np.roll(
+                                        xshift[:, :, : int(ix / xstep)], ishear, axis=1
+                                    )
+                                shift_diff = (
+                                    xshift[:, :, ix0 : ix0 + maxl[2]]
+                                    - marr[
+                                        iz0 : iz0 + maxl[0],
+                                        iy0 : iy0 + maxl[1],
+                                        ix0 : ix0 + maxl[2],
+                                    ]
+                                )
+                                shift_power = np.power(shift_diff, Dorder)
+                                D[iz, iy, ix] = np.mean(
+                                    shift_power[np.logical_not(np.isnan(shift_diff))]
+                                )
+                                # N[iz,iy,ix] = marr[iz0:iz0+maxl[0],iy0:iy0+maxl[1],ix0:ix0+maxl[2]][marr[iz0:iz0+maxl[0],iy0:iy0+maxl[1],ix0:ix0+maxl[2]].mask==False].size/arr[::zstep,::ystep,::xstep][iz0:iz0+maxl[0],iy0:iy0+maxl[1],ix0:ix0+maxl[2]].size
+                                N[iz, iy, ix] = (
+                                    shift_power[shift_power.mask == False].size
+                                    / shift_power.size
+                                )  # marr[iz0:iz0+maxl[0],iy0:iy0+maxl[1],ix0:ix0+maxl[2]][marr[iz0:iz0+maxl[0],iy0:iy0+maxl[1],ix0:ix0+maxl[2]].mask==False].size/arr[::zstep,::ystep,::xstep][iz0:iz0+maxl[0],iy0:iy0+maxl[1],ix0:ix0+maxl[2]].size
     ltmp = np.unique(ell[np.logical_not(np.isnan(ell))])
     l1dtmp = np.linspace(0, lmax, int(lmax / ltmp[1]))
     print("l1dtmp.size", l1dtmp.size)
@@ -454,27 +685,27 @@ def space_struct(
     if D3:
         N1d = [N[0, 0, 0]]
     D1dsd = [0]
-    for il in range(1, l1dtmp.size):
-        Dtmp = np.ma.array(D.copy())[np.logical_not(np.isnan(D))]
-        Ntmp = np.ma.array(N.copy())[np.logical_not(np.isnan(D))]
-        elltmp = np.ma.array(ell.copy())[np.logical_not(np.isnan(D))]
-        Dtmp[elltmp <= l1dtmp[il - 1]] = np.ma.masked
-        Dtmp[elltmp > l1dtmp[il]] = np.ma.masked
-        Ntmp[elltmp <= l1dtmp[il - 1]] = np.ma.masked
-        Ntmp[elltmp > l1dtmp[il]] = np.ma.masked
-        if Dtmp[Dtmp.mask == False].size > 0:
-            tmp = np.ma.mean(Dtmp)
-            Nmp = np.ma.mean(Ntmp)
-            std = np.ma.std(Dtmp)
-            if not quiet:
-                print(il, tmp)
-            if not np.isnan(tmp):
-                D1d.append(tmp)
-                N1d.append(Nmp)
-                D1dsd.append(std)
-                l1d.append(l1dtmp[il])
-                if not quiet:
-                    print(l1dtmp[il], tmp)
+    # bin D by separation into the shells l1dtmp[il-1] < ell <= l1dtmp[il]
+    lvalid = np.logical_not(np.isnan(D))
+    Dtmp, Ntmp, elltmp = D[lvalid], N[lvalid], ell[lvalid]
+    ibin = np.searchsorted(l1dtmp, elltmp, side="left")
+    inbin = np.logical_and(ibin > 0, ibin < l1dtmp.size)
+    Dtmp, Ntmp, ibin = Dtmp[inbin], Ntmp[inbin], ibin[inbin]
+    count = np.bincount(ibin, minlength=l1dtmp.size)
+    nonzero = np.maximum(count, 1)
+    Dmean = np.bincount(ibin, weights=Dtmp, minlength=l1dtmp.size) / nonzero
+    Nmean = np.bincount(ibin, weights=Ntmp, minlength=l1dtmp.size) / nonzero
+    Dstd = np.sqrt(
+        np.bincount(ibin, weights=(Dtmp - Dmean[ibin]) ** 2, minlength=l1dtmp.size)
+        / nonzero
+    )
+    for il in np.flatnonzero(count):
+        if not quiet:
+            print(il, l1dtmp[il], Dmean[il])
+    D1d += list(Dmean[count > 0])
+    N1d += list(Nmean[count > 0])
+    D1dsd += list(Dstd[count > 0])
+    l1d += list(l1dtmp[count > 0])
 
     D1d = np.array(D1d)
     N1d = np.array(N1d)
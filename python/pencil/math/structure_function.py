@@ -8,43 +8,33 @@ import numpy as np
 import scipy as sp
 
 
+def _strip_struct(arr, m):
+    """
+    Second order structure function of the periodic arr for all lags
+    (-i, -j), averaged over the points in the columns m/2:m.
+    """
+
+    from .stats.struct import struct_lags
+
+    arr = np.asarray(arr)
+    where = np.zeros(arr.shape, dtype=bool)
+    where[:, int(m / 2) : m] = True
+    D, N = struct_lags(arr, lags=arr.shape[:2], Dorder=2, axes=(0, 1), where=where)
+    return D
+
+
 def structure_function(arr, y, x):
     n = int(np.size(y) / 2)
     m = int(np.size(x) / 2)
-    D = np.zeros((n, m))
-    for i in range(0, n, 1):
-        yshift = np.roll(arr, i, axis=0)
-        for j in range(0, m, 1):
-            xshift = np.roll(yshift, j, axis=1)
-            shift_diff = xshift - arr
-            shift_squared = np.power(shift_diff, 2)
-            shift_squared_cut = shift_squared[:, int(m / 2) : m]
-            shift_squared_cut = shift_squared_cut[
-                np.logical_not(np.isnan(shift_squared_cut))
-            ]
-            if np.size(shift_squared_cut) == 0:
-                D[i, j] = float("nan")
-            else:
-                D[i, j] = np.mean(shift_squared_cut)
-    return D
+    D = _strip_struct(arr, m)
+    i = -np.arange(n)[:, None] % D.shape[0]
+    j = -np.arange(m)[None, :] % D.shape[1]
+    return D[i, j]
 
 
 def structure_function_shift_range(arr, nmin, nmax, x):
-    n = nmax - nmin
     m = int(np.size(x) / 2)
-    D = np.zeros((n, m))
-    for i in range(nmin, nmax, 1):
-        yshift = np.roll(arr, i, axis=0)
-        for j in range(0, m, 1):
-            xshift = np.roll(yshift, j, axis=1)
-            shift_diff = xshift - arr
-            shift_squared = np.power(shift_diff, 2)
-            shift_squared_cut = shift_squared[:, int(m / 2) : m]
-            shift_squared_cut = shift_squared_cut[
-                np.logical_not(np.isnan(shift_squared_cut))
-            ]
-            if np.size(shift_squared_cut) == 0:
-                D[(i - nmin), j] = float("nan")
-            else:
-                D[(i - nmin), j] = np.mean(shift_squared_cut)
-    return D
+    D = _strip_struct(arr, m)
+    i = -np.arange(nmin, nmax)[:, None] % D.shape[0]
+    j = -np.arange(m)[None, :] % D.shape[1]
+    return D[i, j]
@@ -13,10 +13,11 @@ from .dims import dim
 from .params import param
 from .grids import grid
 from .varfile import var
-from .allslices import slices
+from .allslices import slices, slice_frames
 from .averages import aver
 from .pvarfile import pvar
 from .phiaverages import phiaver
+from .cache import metadata_cache
 
 # idl workarounds
 from .pstalk import pstalk
@@ -8,6 +8,7 @@ Contains the classes and methods to read slice files.
 import numpy as np
 from math import ceil
 
+
 def slices(*args, **kwargs):
     """
     slices(field='', extension='', datadir='data', proc=-1, old_file=False,
@@ -170,7 +171,6 @@ class SliceSeries(object):
         import os
         import sys
         import numpy as np
-        from scipy.io import FortranFile
         from pencil import read
 
         param = read.param(datadir=datadir)
@@ -429,105 +429,53 @@ class SliceSeries(object):
                         read_precision = "f"
 
                     # Set up slice plane.
+                    hsize, vsize = _slice_size(extension, dim, datadir)
                     if extension == "xy" or extension == "Xy" or extension == "xy2" or extension == "xy3" or extension == "xy4":
-                        hsize = dim.nx
-                        vsize = dim.ny
                         pos = grid.z[ind]
                     elif extension == "xz":
-                        hsize = dim.nx
-                        vsize = dim.nz
                         pos = grid.y[ind]
                     elif extension == "yz":
-                        hsize = dim.ny
-                        vsize = dim.nz
                         pos = grid.x[ind]
                     elif extension == "r":
-                        # Read grid size of radial slices by iterating to the last
-                        # line of slice_position.dat. This will break if/when there
-                        # are changes to slice_position.dat!
-                        slicepos_fn = os.path.join(datadir, "slice_position.dat")
-                        slicepos = open(slicepos_fn, 'r')
-                        for line in slicepos:
-                            line = line.strip()
-                        pars = line.split()
-                        hsize = int(pars[1])
-                        vsize = int(pars[2])
-                        #slicepos.close()
                         pos = param.r_rslice
-                    else:
-                        raise ValueError("Unknown extension: {}".format(extension))
 
-                    try:
-                        infile = FortranFile(file_name)
-                    except:
+                    if not os.path.exists(file_name):
                         continue
 
-                    islice = 0
-                    it = 0
-                    self.t = list()
-                    slice_series = list()
                     add_pos = len(pos_list) == 0
                     if not quiet:
                         print("  -> Reading... ", file_name)
                         sys.stdout.flush()
                     if not nt:
                         iter_list = list()
-                    if not quiet:
-                        print("Entering while loop")
-                    while True:
-                        try:
-                            raw_data = infile.read_record(dtype=read_precision).astype(
-                                precision
-                            )
-                        except ValueError:
-                            break
-                        except TypeError:
-                            break
-
-                        if old_file:
-                            time = raw_data[-1]
-                        else:
-                            time = raw_data[-2:-1]
-                        if time >= tstart:
-                            if tend:
-                                if time <= tend:
-                                    self.t.append(time)
-                                    if old_file:
-                                        slice_series.append(raw_data[:-1])
-                                    else:
-                                        slice_series.append(raw_data[:-2])
-                                    if add_pos:
-                                        ind_list.append(ind)
-                                        pos_list.append(pos)
-                                    islice += 1
-                            elif it in iter_list or not nt:
-                                self.t.append(time)
-                                if old_file:
-                                    slice_series.append(raw_data[:-1])
-                                else:
-                                    slice_series.append(raw_data[:-2])
-                                if add_pos:
-                                    ind_list.append(ind)
-                                    pos_list.append(pos)
-                                islice += 1
-                        it += 1
+                    # Select the records from the times only, then read
+                    # and downsample the selected slices one by one.
+                    records = _slice_records(
+                        file_name, vsize, hsize, read_precision, old_file
+                    )
+                    t_all = np.array(records["t"], dtype=precision)
+                    selected = _slice_selection(t_all, iter_list, tstart, tend)
+                    downsample = max(1, int(downsample))
+                    slice_series = np.zeros(
+                        [
+                            len(selected),
+                            int(ceil(vsize / float(downsample))),
+                            int(ceil(hsize / float(downsample))),
+                        ],
+                        dtype=precision,
+                    )
+                    for islice, irec in enumerate(selected):
+                        slice_series[islice] = records["data"][
+                            irec, ::downsample, ::downsample
+                        ]
+                    del records
+                    self.t = t_all[selected]
+                    if add_pos:
+                        ind_list.extend([ind] * len(selected))
+                        pos_list.extend([pos] * len(selected))
                     if not quiet:
                         print("  -> Done")
                         sys.stdout.flush()
-
-                    # Remove first entry and reshape.
-                    if not quiet:
-                        print("Reshaping array")
-                        sys.stdout.flush()
-                    self.t = np.array(self.t, dtype=precision)[:, 0]
-                    slice_series = np.array(slice_series, dtype=precision)
-                    slice_series = slice_series.reshape(islice, vsize, hsize)
-                    if downsample > 1:
-                        downsample = int(downsample)
-                        tmp_series = list()
-                        for iislice in range(islice):
-                            tmp_series.append(slice_series[iislice, ::downsample, ::downsample])
-                        slice_series = np.array(tmp_series)
                     setattr(ext_object, field, slice_series)
                 setattr(pos_object, extension, np.array(pos_list))
                 setattr(ind_object, extension, np.array(ind_list))
@@ -535,3 +483,205 @@ class SliceSeries(object):
                 setattr(self, extension, ext_object)
                 setattr(self, "position", pos_object)
                 setattr(self, "coordinate", ind_object)
+
+
+def slice_frames(
+    field,
+    extension,
+    datadir="data",
+    proc=-1,
+    old_file=False,
+    precision="f",
+    iter_list=list(),
+    tstart=0,
+    tend=None,
+    downsample=1,
+):
+    """
+    slice_frames(field, extension, datadir='data', proc=-1, old_file=False,
+                 precision='f', iter_list=list(), tstart=0, tend=None,
+                 downsample=1)
+
+    Iterate over the slices of one field and extension, reading one slice at
+    a time, so that long slice series can be processed without holding them
+    in memory.
+
+    Parameters
+    ----------
+    field : string
+        Name of the field to be read.
+
+    extension : string
+        Specifies the plane slice.
+
+    datadir : string
+        Directory where the data is stored.
+
+    proc : int
+        Processor to be read. If -1 read the assembled slices.
+
+    old_file : bool
+        Flag for reading old file format.
+
+    precision : string
+        Precision of the data. Either float 'f' or double 'd'.
+
+    iter_list : list
+        Iteration indices for which to sample the slices.
+        Overrides tstart and tend.
+
+    tstart : float
+        Start time interval from which to sample slices.
+
+    tend : float
+        End time interval from which to sample slices.
+
+    downsample : integer
+        Sample rate to reduce slice array size.
+
+    Returns
+    -------
+    Generator of tuples (t, slice).
+
+    Examples
+    --------
+    >>> for t, bb1 in pc.read.slice_frames('bb1', 'xy', tstart=10, downsample=4):
+    ...     print(t, bb1.max())
+    """
+
+    import os
+    from pencil import read
+
+    if not isinstance(iter_list, list):
+        iter_list = [iter_list]
+    if len(iter_list) > 0:
+        tstart = 0
+        tend = None
+    downsample = max(1, int(downsample))
+    datadir = os.path.expanduser(datadir)
+
+    param = read.param(datadir=datadir, quiet=True)
+    if param.io_strategy == "HDF5" or os.path.exists(
+        os.path.join(datadir, "grid.h5")
+    ):
+        import h5py
+
+        file_name = os.path.join(datadir, "slices", field + "_" + extension + ".h5")
+        with h5py.File(file_name, "r") as ds:
+            if len(iter_list) == 0:
+                iter_list = range(1, len(ds.keys()))
+            for it in iter_list:
+                if not ds.__contains__(str(it)):
+                    continue
+                time = ds[str(it) + "/time"][()]
+                if time < tstart or (tend and time > tend):
+                    continue
+                yield (
+                    np.array(time, dtype=precision),
+                    np.array(
+                        ds[str(it) + "/data"][::downsample, ::downsample],
+                        dtype=precision,
+                    ),
+                )
+        return
+
+    if proc < 0:
+        file_name = os.path.join(datadir, "slice_" + field + "." + extension)
+    else:
+        file_name = os.path.join(
+            datadir, "proc{0}".format(proc), "slice_" + field + "." + extension
+        )
+    dim = read.dim(datadir, proc)
+    if dim.precision == "D":
+        read_precision = "d"
+    else:
+        read_precision = "f"
+    hsize, vsize = _slice_size(extension, dim, datadir)
+
+    records = _slice_records(file_name, vsize, hsize, read_precision, old_file)
+    t_all = np.array(records["t"], dtype=precision)
+    for irec in _slice_selection(t_all, iter_list, tstart, tend):
+        yield (
+            t_all[irec],
+            np.array(
+                records["data"][irec, ::downsample, ::downsample], dtype=precision
+            ),
+        )
+
+
+def _slice_size(extension, dim, datadir):
+    """
+    Return the horizontal and vertical size of the slices of an extension.
+    """
+
+    import os
+
+    if extension in ["xy", "Xy", "xy2", "xy3", "xy4"]:
+        return dim.nx, dim.ny
+    if extension == "xz":
+        return dim.nx, dim.nz
+    if extension == "yz":
+        return dim.ny, dim.nz
+    if extension == "r":
+        # Read grid size of radial slices by iterating to the last
+        # line of slice_position.dat. This will break if/when there
+        # are changes to slice_position.dat!
+        with open(os.path.join(datadir, "slice_position.dat"), "r") as slicepos:
+            for line in slicepos:
+                line = line.strip()
+        pars = line.split()
+        return int(pars[1]), int(pars[2])
+
+    raise ValueError("Unknown extension: {}".format(extension))
+
+
+def _slice_records(file_name, vsize, hsize, read_precision, old_file=False):
+    """
+    Map a Fortran slice file as an array of records with the fields
+    'data' of shape (vsize, hsize) and 't'.
+    Every record holds the slice followed by the time and, unless old_file,
+    the slice position.
+    """
+
+    import os
+    from pencil.read.lazyvar import fortran_record_offset
+
+    read_precision = np.dtype(read_precision)
+    tail = [("t", read_precision)]
+    if not old_file:
+        tail.append(("pos", read_precision))
+    nbytes = (vsize * hsize + len(tail)) * read_precision.itemsize
+    if os.path.getsize(file_name) == 0:
+        return np.zeros(0, dtype=[("data", read_precision, (vsize, hsize))] + tail)
+
+    marker, reclen = fortran_record_offset(file_name, nbytes)
+    if reclen != nbytes:
+        raise ValueError(
+            "read.slices: records of {0} have {1} bytes, expected {2} for "
+            "{3}x{4} slices.".format(file_name, reclen, nbytes, vsize, hsize)
+        )
+    marker_dtype = np.dtype("i{0}".format(marker))
+    record = np.dtype(
+        [("m1", marker_dtype), ("data", read_precision, (vsize, hsize))]
+        + tail
+        + [("m2", marker_dtype)]
+    )
+    n_records = os.path.getsize(file_name) // record.itemsize
+
+    return np.memmap(file_name, dtype=record, mode="r", shape=(n_records,))
+
+
+def _slice_selection(t, iter_list, tstart, tend):
+    """
+    Return the indices of the records to be read, either those in iter_list
+    or those with tstart <= t <= tend.
+    """
+
+    if len(iter_list) > 0:
+        iter_list = [it for it in iter_list if 0 <= it < len(t)]
+        return np.unique(np.array(iter_list, dtype=int))
+    mask = t >= tstart
+    if tend:
+        mask &= t <= tend
+
+    return np.nonzero(mask)[0]
@@ -48,6 +48,17 @@ def aver(*args, **kwargs):
     precision : string
         Float (f), double (d) or half (half).
 
+    fast : bool
+        Memory-map the 'yaverages.dat' and 'zaverages.dat' files and read
+        only the selected records and variables. Parse the xy, xz and yz
+        averages in bulk, converting only the times within time_range.
+        Set False for the line by line readers.
+
+    workers : int
+        Number of threads reading the processor files of the 'y' and 'z'
+        averages concurrently with fast=True. If None, the processors are
+        read one after another.
+
     Returns
     -------
     Class containing the averages.
@@ -98,6 +109,8 @@ class Averages(object):
         param=list(),
         proc=-1,
         precision="f",
+        fast=True,
+        workers=None,
     ):
         """
         read(plane_list=None, datadir='data', proc=-1, var_index=-1, proc=-1):
@@ -152,6 +165,17 @@ class Averages(object):
         precision : string
             Float (f), double (d) or half (half).
 
+        fast : bool
+            Memory-map the 'yaverages.dat' and 'zaverages.dat' files and read
+            only the selected records and variables. Parse the xy, xz and yz
+            averages in bulk, converting only the times within time_range.
+            Set False for the line by line readers.
+
+        workers : int
+            Number of threads reading the processor files of the 'y' and 'z'
+            averages concurrently with fast=True. If None, the processors are
+            read one after another.
+
         Returns
         -------
         Class containing the averages.
@@ -289,7 +313,16 @@ class Averages(object):
                         for indx, var in zip(range(n_vars),variables):
                             if var in plane_var_names:
                                 var_index.append(indx)
-                if plane == "xy" or plane == "xz" or plane == "yz":
+                if (plane == "xy" or plane == "xz" or plane == "yz") and fast:
+                    t, raw_data = self.__read_2d_aver_bulk(
+                        plane,
+                        datadir,
+                        aver_file_name,
+                        n_vars,
+                        time_range,
+                        precision=precision,
+                    )
+                elif plane == "xy" or plane == "xz" or plane == "yz":
                     t, raw_data = self.__read_2d_aver(
                         plane,
                         datadir,
@@ -303,7 +336,20 @@ class Averages(object):
                         proc,
                         precision=precision,
                     )
-                if plane == "y" or plane == "z" or plane == "phi":
+                if (plane == "y" or plane == "z") and fast:
+                    t, raw_data = self.__read_1d_aver_mmap(
+                        plane,
+                        datadir,
+                        aver_file_name,
+                        n_vars,
+                        var_index,
+                        iter_list,
+                        time_range,
+                        proc,
+                        precision=precision,
+                        workers=workers,
+                    )
+                elif plane == "y" or plane == "z" or plane == "phi":
                     t, raw_data = self.__read_1d_aver(
                         plane,
                         datadir,
@@ -742,6 +788,156 @@ class Averages(object):
 
         return t, raw_data
 
+    def __read_1d_aver_mmap(
+        self,
+        plane,
+        datadir,
+        aver_file_name,
+        n_vars,
+        var_index,
+        iter_list,
+        time_range,
+        proc,
+        precision="f",
+        workers=None,
+    ):
+        """
+        Read the yaverages.dat, zaverages.dat through memory maps.
+        Return the raw data and the time array.
+
+        Each output time is a pair of Fortran records, t and
+        data(nu, nv, n_vars), so the files are arrays of records with a fixed
+        stride. Only the selected records and variables are read.
+        """
+
+        import os
+        import numpy as np
+        from pencil.read.cache import metadata_cache
+        from pencil.read.lazyvar import fortran_record_offset
+
+        glob_dim = metadata_cache.dim(datadir)
+        if plane == "y":
+            nu = glob_dim.nx
+            nv = glob_dim.nz
+        if plane == "z":
+            nu = glob_dim.nx
+            nv = glob_dim.ny
+
+        if proc < 0:
+            offset = glob_dim.nprocx * glob_dim.nprocy
+            if plane == "z":
+                proc_list = list(range(offset))
+            if plane == "y":
+                proc_list = []
+                xr = range(glob_dim.nprocx)
+                for iz in range(glob_dim.nprocz):
+                    proc_list.extend(xr)
+                    xr = [x + offset for x in xr]
+            all_procs = True
+        else:
+            proc_list = [proc]
+            all_procs = False
+
+        if metadata_cache.dim(datadir, proc).precision == "D":
+            read_precision = np.dtype(np.float64)
+        else:
+            read_precision = np.dtype(np.float32)
+
+        # Map the files as arrays of records.
+        records = []
+        for iproc in proc_list:
+            file_name = os.path.join(datadir, "proc{0}".format(iproc), aver_file_name)
+            if not os.path.exists(file_name):
+                # Not all proc dirs have a [yz]averages.dat.
+                print("Averages of processor {0} missing.".format(iproc))
+                sys.stdout.flush()
+                continue
+            proc_dim = metadata_cache.dim(datadir, iproc)
+            if plane == "y":
+                pnu, pnv = proc_dim.nx, proc_dim.nz
+                idx_u, idx_v = proc_dim.ipx * proc_dim.nx, proc_dim.ipz * proc_dim.nz
+            if plane == "z":
+                pnu, pnv = proc_dim.nx, proc_dim.ny
+                idx_u, idx_v = proc_dim.ipx * proc_dim.nx, proc_dim.ipy * proc_dim.ny
+            if not all_procs:
+                idx_u = idx_v = 0
+            marker, t_len = fortran_record_offset(file_name, read_precision.itemsize)
+            with open(file_name, "rb") as file_id:
+                file_id.seek(2 * marker + t_len)
+                data_len = int(
+                    np.frombuffer(file_id.read(marker), dtype="i{0}".format(marker))[0]
+                )
+            n_vars_file = data_len // (pnu * pnv * read_precision.itemsize)
+            marker_dtype = np.dtype("i{0}".format(marker))
+            record = np.dtype(
+                [
+                    ("m1", marker_dtype),
+                    ("t", read_precision, (t_len // read_precision.itemsize,)),
+                    ("m2", marker_dtype),
+                    ("m3", marker_dtype),
+                    ("data", read_precision, (n_vars_file, pnv, pnu)),
+                    ("m4", marker_dtype),
+                ]
+            )
+            n_records = os.path.getsize(file_name) // record.itemsize
+            records.append((file_name, record, n_records, pnu, pnv, idx_u, idx_v))
+        if not records:
+            return np.array([], dtype=precision), np.zeros([0, 0, nu, nv], dtype=precision)
+
+        # Select the records from the first processor, all have the same times.
+        n_times = min(rec[2] for rec in records)
+        mapped = np.memmap(records[0][0], dtype=records[0][1], mode="r", shape=(n_times,))
+        t_all = np.array(mapped["t"][:, 0])
+        del mapped
+        it_idx = np.arange(n_times)
+        if iter_list:
+            if not isinstance(iter_list, list):
+                iter_list = [iter_list]
+            it_idx = np.unique([it for it in iter_list if 0 <= it < n_times]).astype(int)
+        if time_range:
+            if not isinstance(time_range, list):
+                time_range = [time_range]
+            if len(time_range) == 1:
+                start_time, end_time = 0.0, time_range[0]
+            else:
+                start_time, end_time = time_range[0], time_range[1]
+            it_idx = it_idx[
+                (t_all[it_idx] >= start_time) & (t_all[it_idx] <= end_time)
+            ]
+        t = t_all[it_idx].astype(precision)
+
+        if not isinstance(var_index, list):
+            if var_index >= 0:
+                var_idx = [var_index]
+            else:
+                var_idx = list(range(min(n_vars, records[0][1]["data"].shape[0])))
+        else:
+            var_idx = list(var_index)
+
+        if not all_procs:
+            nu, nv = records[0][3], records[0][4]
+        raw_data = np.zeros([len(t), len(var_idx), nv, nu], dtype=precision)
+
+        def read_proc(rec):
+            file_name, record, n_records, pnu, pnv, idx_u, idx_v = rec
+            mapped = np.memmap(file_name, dtype=record, mode="r", shape=(n_times,))
+            raw_data[:, :, idx_v : idx_v + pnv, idx_u : idx_u + pnu] = mapped["data"][
+                np.ix_(it_idx, var_idx)
+            ]
+            del mapped
+
+        if workers is not None and workers > 1 and len(records) > 1:
+            from concurrent.futures import ThreadPoolExecutor
+
+            # The procs write into disjoint parts of raw_data.
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                list(executor.map(read_proc, records))
+        else:
+            for rec in records:
+                read_proc(rec)
+
+        return t, np.swapaxes(raw_data, 2, 3)
+
     def __read_2d_aver(
         self,
         plane,
@@ -806,6 +1002,117 @@ class Averages(object):
 
         return t, raw_data
 
+    def __read_2d_aver_bulk(
+        self,
+        plane,
+        datadir,
+        aver_file_name,
+        n_vars,
+        time_range,
+        precision="f",
+        chunk_size=2**26,
+    ):
+        """
+        Read the xyaverages.dat, xzaverages.dat, yzaverages.dat in blocks of
+        chunk_size bytes and convert the values with numpy.
+        Return the raw data and the time array.
+
+        Every output time is a line with t followed by ceil(nw*n_vars/8)
+        lines of data. Only the time lines are converted to select the
+        times within time_range. An incomplete last output time is ignored.
+        """
+
+        import os
+        import numpy as np
+        from pencil.read.cache import metadata_cache
+
+        # Determine the structure of the xy/xz/yz averages.
+        if plane == "xy":
+            nw = getattr(metadata_cache.dim(datadir=datadir), "nz")
+        if plane == "xz":
+            nw = getattr(metadata_cache.dim(datadir=datadir), "ny")
+        if plane == "yz":
+            nw = getattr(metadata_cache.dim(datadir=datadir), "nx")
+        entry_length = int(np.ceil(nw * n_vars / 8.0))
+        block_length = entry_length + 1
+        n_values = 1 + nw * n_vars
+
+        if time_range:
+            if not isinstance(time_range, list):
+                time_range = [time_range]
+            if len(time_range) == 1:
+                start_time, end_time = 0.0, time_range[0]
+            else:
+                start_time, end_time = time_range[0], time_range[1]
+
+        t = []
+        raw_data = []
+        pending = []
+        n_lines = 0
+        with open(os.path.join(datadir, aver_file_name), "rb") as file_id:
+            rest = b""
+            while True:
+                chunk = file_id.read(chunk_size)
+                lines = (rest + chunk).split(b"\n")
+                if chunk:
+                    rest = lines.pop()
+                else:
+                    while lines and not lines[-1].strip():
+                        lines.pop()
+                pending.extend(lines)
+                n_blocks = len(pending) // block_length
+                if n_blocks > 0:
+                    block_lines = pending[: n_blocks * block_length]
+                    pending = pending[n_blocks * block_length :]
+                    t_block = np.array(block_lines[::block_length], dtype=np.float64)
+                    if time_range:
+                        selected = np.nonzero(
+                            (t_block >= start_time) & (t_block <= end_time)
+                        )[0]
+                    else:
+                        selected = np.arange(n_blocks)
+                    # Convert the runs of consecutive selected times at once.
+                    runs = np.split(selected, np.nonzero(np.diff(selected) != 1)[0] + 1)
+                    for run in runs:
+                        if len(run) == 0:
+                            continue
+                        values = np.fromstring(
+                            b"\n".join(
+                                block_lines[
+                                    run[0] * block_length : (run[-1] + 1) * block_length
+                                ]
+                            ),
+                            dtype=np.float64,
+                            sep=" ",
+                        )
+                        if values.size != len(run) * n_values:
+                            print(
+                                "Error: There was a problem reading {} at line {}.\n"
+                                "Calculated values: n_vars = {}, nw = {}.\n"
+                                "Are these correct?".format(
+                                    aver_file_name,
+                                    n_lines + run[0] * block_length,
+                                    n_vars,
+                                    nw,
+                                )
+                            )
+                            raise ValueError(
+                                "Wrong number of values in {}.".format(aver_file_name)
+                            )
+                        values = values.reshape([len(run), n_values])
+                        t.append(values[:, 0].astype(precision))
+                        raw_data.append(values[:, 1:].astype(precision))
+                    n_lines += n_blocks * block_length
+                if not chunk:
+                    break
+
+        if not t:
+            return np.zeros(0, dtype=precision), np.zeros([0, n_vars, nw], dtype=precision)
+        t = np.concatenate(t)
+        raw_data = np.concatenate(raw_data).reshape([len(t), n_vars, nw])
+
+        return t, raw_data
+
     def __natural_sort(self, l):
         """
         Sort array in a more natural way, e.g. 9VAR < 10VAR
@@ -0,0 +1,219 @@
+# cache.py
+#
+# Cache the parsed metadata (param, index, grid, dim) of data directories.
+"""
+Contains the metadata cache shared by the readers, so that repeated reads
+of snapshots of the same run reuse the parsed Param, Index, Grid and Dim
+objects as long as the underlying files do not change.
+"""
+
+import os
+import threading
+
+
+class MetadataCache(object):
+    """
+    MetadataCache -- parsed metadata of data directories keyed on file mtimes.
+
+    Every entry remembers the modification time and size of the files it was
+    read from and is read again as soon as one of them changes, appears or
+    disappears. The cached objects are shared, so they must not be modified.
+    """
+
+    def __init__(self):
+        """
+        Fill members with default values.
+        """
+
+        self.enabled = True
+        self.hits = 0
+        self.misses = 0
+        self.__entries = {}
+        self.__counts = {}
+        self.__lock = threading.Lock()
+
+    def keys(self):
+        for i in self.__dict__.keys():
+            print(i)
+
+    def clear(self):
+        """
+        Drop all entries and reset the hit/miss counters.
+        """
+
+        with self.__lock:
+            self.__entries.clear()
+            self.__counts.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def info(self):
+        """
+        Return a dictionary with the number of entries and the hit/miss
+        counters, in total and per kind of metadata.
+        """
+
+        with self.__lock:
+            info = {"entries": len(self.__entries), "hits": self.hits,
+                    "misses": self.misses}
+            for kind, (hits, misses) in self.__counts.items():
+                info[kind] = {"hits": hits, "misses": misses}
+
+        return info
+
+    def get(self, kind, datadir, files, reader, key=()):
+        """
+        get(kind, datadir, files, reader, key=())
+
+        Return the cached object, or call reader() and cache its result.
+
+        Parameters
+        ----------
+        kind : string
+            Kind of metadata, e.g. 'param'.
+
+        datadir : string
+            Directory where the data is stored.
+
+        files : list of string
+            Files relative to datadir the object is read from.
+
+        reader : callable
+            Function without arguments returning the object.
+
+        key : tuple
+            Further hashable arguments distinguishing the entries.
+        """
+
+        datadir = os.path.realpath(os.path.expanduser(datadir))
+        stamp = []
+        for file_name in files:
+            try:
+                stat = os.stat(os.path.join(datadir, file_name))
+                stamp.append((file_name, stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                stamp.append((file_name, None, None))
+        stamp = tuple(stamp)
+        entry_key = (kind, datadir, key)
+
+        with self.__lock:
+            entry = self.__entries.get(entry_key)
+            hit = self.enabled and entry is not None and entry[0] == stamp
+            self.__count(kind, hit)
+            if hit:
+                return entry[1]
+
+        obj = reader()
+        if self.enabled:
+            with self.__lock:
+                self.__entries[entry_key] = (stamp, obj)
+
+        return obj
+
+    def __count(self, kind, hit):
+        hits, misses = self.__counts.get(kind, (0, 0))
+        if hit:
+            self.hits += 1
+            self.__counts[kind] = (hits + 1, misses)
+        else:
+            self.misses += 1
+            self.__counts[kind] = (hits, misses + 1)
+
+    def param(self, datadir="data", **kwargs):
+        """
+        param(datadir='data', **kwargs)
+
+        Cached read.param. The keyword arguments are passed on.
+        """
+
+        from pencil import read
+
+        return self.get(
+            "param",
+            datadir,
+            ["param.nml", "param2.nml"],
+            lambda: read.param(datadir=datadir, **kwargs),
+            key=self.__key(kwargs),
+        )
+
+    def dim(self, datadir="data", proc=-1, ogrid=False, down=False):
+        """
+        dim(datadir='data', proc=-1, ogrid=False, down=False)
+
+        Cached read.dim.
+        """
+
+        from pencil import read
+
+        if ogrid:
+            file_name = "ogdim.dat"
+        elif down:
+            file_name = "dim_down.dat"
+        else:
+            file_name = "dim.dat"
+        if proc >= 0:
+            file_name = os.path.join("proc{0}".format(proc), file_name)
+
+        return self.get(
+            "dim",
+            datadir,
+            ["grid.h5", file_name],
+            lambda: read.dim(datadir, proc, ogrid=ogrid, down=down),
+            key=(proc, ogrid, down),
+        )
+
+    def index(self, datadir="data"):
+        """
+        index(datadir='data')
+
+        Cached read.index.
+        """
+
+        from pencil import read
+
+        return self.get(
+            "index",
+            datadir,
+            ["index.pro", "param.nml", "param2.nml", "dim.dat", "grid.h5"],
+            lambda: read.index(
+                datadir=datadir,
+                param=self.param(datadir=datadir, quiet=True, conflicts_quiet=True),
+                dim=self.dim(datadir=datadir),
+            ),
+        )
+
+    def grid(self, datadir="data", proc=-1, **kwargs):
+        """
+        grid(datadir='data', proc=-1, **kwargs)
+
+        Cached read.grid. The keyword arguments are passed on.
+        The grid files are written at the start of a run, together with
+        dim.dat and the grid of the first processor, so only those are
+        checked instead of every procN/grid.dat.
+        """
+
+        from pencil import read
+
+        files = ["grid.h5", "dim.dat", "param.nml", "allprocs/grid.dat"]
+        files.append("proc{0}/grid.dat".format(max(proc, 0)))
+
+        return self.get(
+            "grid",
+            datadir,
+            files,
+            lambda: read.grid(datadir=datadir, proc=proc, **kwargs),
+            key=(proc,) + self.__key(kwargs),
+        )
+
+    @staticmethod
+    def __key(kwargs):
+        """
+        Turn the keyword arguments of a reader into an entry key, ignoring
+        those which do not change the result.
+        """
+
+        ignore = ("quiet", "conflicts_quiet", "workers")
+        return tuple(sorted((k, v) for k, v in kwargs.items() if k not in ignore))
+
+
+metadata_cache = MetadataCache()
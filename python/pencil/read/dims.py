@@ -199,3 +199,43 @@ class Dim(object):
                 self.mxgrid = self.mygrid = self.mzgrid = 0
 
         return 0
+
+
+def proc_bounds(procdim, nprocs=2):
+    """
+    proc_bounds(procdim, nprocs=2)
+
+    Calculate where the local processor array goes in the global array.
+
+    Ghost zones of the processor to the left (and accordingly in y and z
+    direction) are not overwritten, which makes a difference on the
+    diagonals.
+
+    Parameters
+    ----------
+    procdim : obj
+        Dimension object of the processor, as returned by read.dim(proc=n).
+
+    nprocs : int
+        Number of processor directories. With a single directory the local
+        array is the global array.
+
+    Returns
+    -------
+    Tuple of three tuples (i0, i1, i0loc, i1loc) for the z, y and x
+    direction, such that global[i0:i1] = local[i0loc:i1loc].
+    """
+
+    bounds = []
+    for ip, m, n, nghost in (
+        (procdim.ipz, procdim.mz, procdim.nz, procdim.nghostz),
+        (procdim.ipy, procdim.my, procdim.ny, procdim.nghosty),
+        (procdim.ipx, procdim.mx, procdim.nx, procdim.nghostx),
+    ):
+        if nprocs <= 1 or ip <= 0:
+            bounds.append((0, m, 0, m))
+        else:
+            i0 = ip * n + nghost
+            bounds.append((i0, i0 + m - nghost, nghost, m))
+
+    return tuple(bounds)
@@ -8,7 +8,7 @@ Contains classes and methods to read the grid data.
 
 def grid(*args, **kwargs):
     """
-    grid(datadir='data', proc=-1, quiet=False, trim=False)
+    grid(datadir='data', proc=-1, quiet=False, trim=False, workers=None)
 
     Read the grid data from the pencil code simulation.
     If proc < 0, then load all data and assemble.
@@ -30,6 +30,10 @@ def grid(*args, **kwargs):
     trim : bool
       Cuts off the ghost points.
 
+    workers : int
+      Number of threads reading the processor grids (and their dim.dat)
+      concurrently. If None, the processors are read one after another.
+
     Returns
     -------
     Class containing the grid information.
@@ -62,9 +66,17 @@ class Grid(object):
         for i in self.__dict__.keys():
             print(i)
 
-    def read(self, datadir="data", proc=-1, quiet=False, precision="f", trim=False):
+    def read(
+        self,
+        datadir="data",
+        proc=-1,
+        quiet=False,
+        precision="f",
+        trim=False,
+        workers=None,
+    ):
         """
-        read(datadir='data', proc=-1, quiet=False, trim=False)
+        read(datadir='data', proc=-1, quiet=False, trim=False, workers=None)
 
         Read the grid data from the pencil code simulation.
         If proc < 0, then load all data and assemble.
@@ -86,6 +98,10 @@ class Grid(object):
         trim : bool
           Cuts off the ghost points.
 
+        workers : int
+          Number of threads reading the processor grids (and their dim.dat)
+          concurrently. If None, the processors are read one after another.
+
         Returns
         -------
         Class containing the grid information.
@@ -93,8 +109,10 @@ class Grid(object):
 
         import numpy as np
         import os
+        import time
         from scipy.io import FortranFile
         from pencil import read
+        from pencil.read.dims import proc_bounds
 
         if precision == "f":
             dtype = np.float32
@@ -151,25 +169,20 @@ class Grid(object):
                 proc_dirs = ["proc" + str(proc)]
 
             # Define the global arrays.
-            x = np.zeros(dim.mx, dtype=precision)
-            y = np.zeros(dim.my, dtype=precision)
-            z = np.zeros(dim.mz, dtype=precision)
-            dx_1 = np.zeros(dim.mx, dtype=precision)
-            dy_1 = np.zeros(dim.my, dtype=precision)
-            dz_1 = np.zeros(dim.mz, dtype=precision)
-            dx_tilde = np.zeros(dim.mx, dtype=precision)
-            dy_tilde = np.zeros(dim.my, dtype=precision)
-            dz_tilde = np.zeros(dim.mz, dtype=precision)
-
-            for directory in proc_dirs:
+            arrays = {}
+            for key, m in (("x", dim.mx), ("y", dim.my), ("z", dim.mz)):
+                arrays[key] = np.zeros(m, dtype=precision)
+                arrays["d{0}_1".format(key)] = np.zeros(m, dtype=precision)
+                arrays["d{0}_tilde".format(key)] = np.zeros(m, dtype=precision)
+
+            def read_proc(directory):
+                """
+                Read the grid of one processor directory.
+                """
+
+                time_start = time.time()
                 if not param.lcollective_io:
-                    proc = int(directory[4:])
-                    procdim = read.dim(datadir, proc)
-                    if not quiet:
-                        print(
-                            "reading grid data from processor"
-                            + " {0} of {1} ...".format(proc, len(proc_dirs))
-                        )
+                    procdim = read.dim(datadir, int(directory[4:]))
                 else:
                     procdim = dim
                 mxloc = procdim.mx
@@ -188,71 +201,72 @@ class Grid(object):
 
                 # Reshape the arrays.
                 t = dtype(grid_raw[0])
-                x_loc = grid_raw[1 : mxloc + 1]
-                y_loc = grid_raw[mxloc + 1 : mxloc + myloc + 1]
-                z_loc = grid_raw[mxloc + myloc + 1 : mxloc + myloc + mzloc + 1]
-                dx_1_loc = dx_1_raw[0:mxloc]
-                dy_1_loc = dx_1_raw[mxloc : mxloc + myloc]
-                dz_1_loc = dx_1_raw[mxloc + myloc : mxloc + myloc + mzloc]
-                dx_tilde_loc = dx_tilde_raw[0:mxloc]
-                dy_tilde_loc = dx_tilde_raw[mxloc : mxloc + myloc]
-                dz_tilde_loc = dx_tilde_raw[mxloc + myloc : mxloc + myloc + mzloc]
+                loc = {}
+                loc["x"] = grid_raw[1 : mxloc + 1]
+                loc["y"] = grid_raw[mxloc + 1 : mxloc + myloc + 1]
+                loc["z"] = grid_raw[mxloc + myloc + 1 : mxloc + myloc + mzloc + 1]
+                loc["dx_1"] = dx_1_raw[0:mxloc]
+                loc["dy_1"] = dx_1_raw[mxloc : mxloc + myloc]
+                loc["dz_1"] = dx_1_raw[mxloc + myloc : mxloc + myloc + mzloc]
+                loc["dx_tilde"] = dx_tilde_raw[0:mxloc]
+                loc["dy_tilde"] = dx_tilde_raw[mxloc : mxloc + myloc]
+                loc["dz_tilde"] = dx_tilde_raw[mxloc + myloc : mxloc + myloc + mzloc]
+
+                return directory, procdim, loc, (t, dx, dy, dz, Lx, Ly, Lz), time_start
+
+            def insert_proc(directory, procdim, loc, scalars, time_start):
+                """
+                Copy the grid of one processor into the global arrays. The
+                parts overlap in the ghost zones, so the procs are inserted
+                in the order of proc_dirs.
+                """
 
                 if len(proc_dirs) > 1:
-                    if procdim.ipx == 0:
-                        i0x = 0
-                        i1x = i0x + procdim.mx
-                        i0x_loc = 0
-                        i1x_loc = procdim.mx
-                    else:
-                        i0x = procdim.ipx * procdim.nx + procdim.nghostx
-                        i1x = i0x + procdim.mx - procdim.nghostx
-                        i0x_loc = procdim.nghostx
-                        i1x_loc = procdim.mx
-
-                    if procdim.ipy == 0:
-                        i0y = 0
-                        i1y = i0y + procdim.my
-                        i0y_loc = 0
-                        i1y_loc = procdim.my
-                    else:
-                        i0y = procdim.ipy * procdim.ny + procdim.nghosty
-                        i1y = i0y + procdim.my - procdim.nghosty
-                        i0y_loc = procdim.nghosty
-                        i1y_loc = procdim.my
-
-                    if procdim.ipz == 0:
-                        i0z = 0
-                        i1z = i0z + procdim.mz
-                        i0z_loc = 0
-                        i1z_loc = procdim.mz
-                    else:
-                        i0z = procdim.ipz * procdim.nz + procdim.nghostz
-                        i1z = i0z + procdim.mz - procdim.nghostz
-                        i0z_loc = procdim.nghostz
-                        i1z_loc = procdim.mz
-
-                    x[i0x:i1x] = x_loc[i0x_loc:i1x_loc]
-                    y[i0y:i1y] = y_loc[i0y_loc:i1y_loc]
-                    z[i0z:i1z] = z_loc[i0z_loc:i1z_loc]
-                    dx_1[i0x:i1x] = dx_1_loc[i0x_loc:i1x_loc]
-                    dy_1[i0y:i1y] = dy_1_loc[i0y_loc:i1y_loc]
-                    dz_1[i0z:i1z] = dz_1_loc[i0z_loc:i1z_loc]
-                    dx_tilde[i0x:i1x] = dx_tilde_loc[i0x_loc:i1x_loc]
-                    dy_tilde[i0y:i1y] = dy_tilde_loc[i0y_loc:i1y_loc]
-                    dz_tilde[i0z:i1z] = dz_tilde_loc[i0z_loc:i1z_loc]
-
+                    zb, yb, xb = proc_bounds(procdim, len(proc_dirs))
+                    for key, (i0, i1, i0_loc, i1_loc) in (
+                        ("x", xb), ("dx_1", xb), ("dx_tilde", xb),
+                        ("y", yb), ("dy_1", yb), ("dy_tilde", yb),
+                        ("z", zb), ("dz_1", zb), ("dz_tilde", zb),
+                    ):
+                        arrays[key][i0:i1] = loc[key][i0_loc:i1_loc]
                 else:
-                    # x = dtype(x_loc.astype)
-                    x = dtype(x_loc)
-                    y = dtype(y_loc)
-                    z = dtype(z_loc)
-                    dx_1 = dtype(dx_1_loc)
-                    dy_1 = dtype(dy_1_loc)
-                    dz_1 = dtype(dz_1_loc)
-                    dx_tilde = dtype(dx_tilde_loc)
-                    dy_tilde = dtype(dy_tilde_loc)
-                    dz_tilde = dtype(dz_tilde_loc)
+                    for key in arrays.keys():
+                        arrays[key] = dtype(loc[key])
+
+                if not quiet:
+                    print(
+                        "Read grid data from {0} ({1} of {2}) in {3:.3f} s".format(
+                            directory,
+                            proc_dirs.index(directory) + 1,
+                            len(proc_dirs),
+                            time.time() - time_start,
+                        )
+                    )
+
+                return scalars
+
+            if workers is not None and workers > 1 and len(proc_dirs) > 1:
+                from concurrent.futures import ThreadPoolExecutor
+
+                # The files are read in parallel, map returns them in the
+                # order of proc_dirs to be inserted one after the other.
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    for proc_data in executor.map(read_proc, proc_dirs):
+                        scalars = insert_proc(*proc_data)
+            else:
+                for directory in proc_dirs:
+                    scalars = insert_proc(*read_proc(directory))
+            t, dx, dy, dz, Lx, Ly, Lz = scalars
+
+            x = arrays["x"]
+            y = arrays["y"]
+            z = arrays["z"]
+            dx_1 = arrays["dx_1"]
+            dy_1 = arrays["dy_1"]
+            dz_1 = arrays["dz_1"]
+            dx_tilde = arrays["dx_tilde"]
+            dy_tilde = arrays["dy_tilde"]
+            dz_tilde = arrays["dz_tilde"]
 
         if trim:
             self.x = x[dim.l1 : dim.l2 + 1]
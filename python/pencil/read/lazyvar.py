@@ -0,0 +1,353 @@
+# lazyvar.py
+#
+# Memory-mapped, lazily stitched view of the distributed VAR files.
+# NB: the array is C-ordered: f[nvar, nz, ny, nx]
+#     NOT Fortran as in Pencil (& IDL):  f[nx, ny, nz, nvar]
+"""
+Contains the lazy data array used by read.var(lazy=True) for the 'dist'
+io_strategy.
+"""
+
+import os
+import numpy as np
+from pencil.read.dims import proc_bounds
+
+
+def fortran_record_offset(file_name, nbytes):
+    """
+    fortran_record_offset(file_name, nbytes)
+
+    Return the byte offset of the payload of the first record of an
+    unformatted sequential Fortran file, i.e. the size of its record marker.
+
+    Parameters
+    ----------
+    file_name : string
+        Name of the Fortran binary file.
+
+    nbytes : int
+        Expected minimum length of the first record in bytes.
+
+    Returns
+    -------
+    Tuple (offset, record length in bytes).
+    """
+
+    with open(file_name, "rb") as infile:
+        header = infile.read(8)
+    for marker_dtype in (np.int32, np.int64):
+        size = np.dtype(marker_dtype).itemsize
+        reclen = int(np.frombuffer(header[:size], dtype=marker_dtype)[0])
+        if reclen >= nbytes and reclen % nbytes == 0:
+            return size, reclen
+
+    raise ValueError(
+        "lazyvar: cannot determine the record marker of {0}.".format(file_name)
+    )
+
+
+def fortran_records(file_name, n_records=None, swap_endian=False):
+    """
+    fortran_records(file_name, n_records=None, swap_endian=False)
+
+    Locate the records of an unformatted sequential Fortran file from the
+    record markers only, without reading the payloads.
+
+    Parameters
+    ----------
+    file_name : string
+        Name of the Fortran binary file.
+
+    n_records : int
+        Stop after this many records. If None, locate all complete records.
+
+    swap_endian : bool
+        Set True if the file was written with the opposite byte order.
+
+    Returns
+    -------
+    Tuple (np.memmap of the file as bytes, list of (offset, length) of the
+    payloads in bytes).
+    """
+
+    size = os.path.getsize(file_name)
+    if size == 0:
+        return np.zeros(0, dtype=np.uint8), []
+    data = np.memmap(file_name, dtype=np.uint8, mode="r")
+    for marker_dtype in (np.dtype(np.int32), np.dtype(np.int64)):
+        if swap_endian:
+            marker_dtype = marker_dtype.newbyteorder()
+        size_marker = marker_dtype.itemsize
+        records = []
+        pos = 0
+        while pos + size_marker <= size:
+            if n_records is not None and len(records) >= n_records:
+                break
+            reclen = int(data[pos : pos + size_marker].view(marker_dtype)[0])
+            end = pos + size_marker + reclen
+            if reclen < 0 or end + size_marker > size:
+                break
+            if int(data[end : end + size_marker].view(marker_dtype)[0]) != reclen:
+                break
+            records.append((pos + size_marker, reclen))
+            pos = end + size_marker
+        # With the wrong marker size already the first record does not match.
+        # A partially written last record is ignored.
+        if records:
+            return data, records
+
+    raise ValueError(
+        "lazyvar: cannot determine the record markers of {0}.".format(file_name)
+    )
+
+
+class LazyVarArray(object):
+    """
+    LazyVarArray -- sliceable view of the f array scattered over procN/VARn.
+
+    Every processor file is mapped with np.memmap and only the variables
+    and the sub-box requested by an index expression are read, e.g.
+    f[index.rho-1] or f[:, n1:n2, m1:m2, l1:l2]. Indexing returns a
+    regular numpy array, np.asarray(f) reads the whole array.
+    Index arrays act independently on each axis (outer indexing as in h5py),
+    so f[[0, 4], :, [1, 2]] has the shape (2, mz, 2, mx).
+    """
+
+    def __init__(self, procs, shape, read_precision, dtype=np.float64):
+        """
+        Set up the view.
+
+        Parameters
+        ----------
+        procs : list of tuples
+            One tuple (file_name, offset, local_shape, bounds) per processor,
+            where local_shape is (nvar, mz, my, mx) of the processor array,
+            offset the byte offset of the data and bounds as returned by
+            proc_bounds.
+
+        shape : tuple of int
+            Global shape (nvar, mz, my, mx).
+
+        read_precision : string
+            Precision of the data on disk, 'f' or 'd'.
+
+        dtype : type
+            Type of the returned arrays.
+        """
+
+        self._procs = procs
+        self._full_shape = tuple(shape)
+        self._origin = (0, 0, 0)
+        self.shape = tuple(shape)
+        self.read_precision = read_precision
+        self.dtype = np.dtype(dtype)
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    @property
+    def size(self):
+        return int(np.prod(self.shape))
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __repr__(self):
+        return "LazyVarArray(shape={0}, dtype={1}, nprocs={2})".format(
+            self.shape, self.dtype, len(self._procs)
+        )
+
+    def __array__(self, dtype=None, copy=None):
+        data = self[...]
+        if dtype is not None:
+            data = data.astype(dtype, copy=False)
+        return data
+
+    def window(self, zslice, yslice, xslice):
+        """
+        window(zslice, yslice, xslice)
+
+        Return a new lazy view restricted to the given contiguous sub-box,
+        e.g. to trim the ghost zones without reading any data.
+        """
+
+        view = LazyVarArray(
+            self._procs, self._full_shape, self.read_precision, self.dtype
+        )
+        origin = []
+        shape = [self.shape[0]]
+        for axis, sl in enumerate((zslice, yslice, xslice)):
+            start, stop, step = sl.indices(self.shape[axis + 1])
+            if step != 1:
+                raise ValueError("lazyvar: window slices must be contiguous.")
+            origin.append(self._origin[axis] + start)
+            shape.append(max(stop - start, 0))
+        view._origin = tuple(origin)
+        view.shape = tuple(shape)
+
+        return view
+
+    def __getitem__(self, key):
+        indices, drop = self.__normalize_key(key)
+        out = np.empty([len(idx) for idx in indices], dtype=self.dtype)
+        if out.size == 0:
+            return self.__squeeze(out, drop)
+
+        ivar = indices[0]
+        spatial = [idx + origin for idx, origin in zip(indices[1:], self._origin)]
+        for file_name, offset, local_shape, bounds in self._procs:
+            pos = []
+            loc = []
+            for glob, (i0, i1, i0loc, _) in zip(spatial, bounds):
+                mask = (glob >= i0) & (glob < i1)
+                if not mask.any():
+                    break
+                pos.append(np.nonzero(mask)[0])
+                loc.append(glob[mask] - i0 + i0loc)
+            else:
+                data = np.memmap(
+                    file_name,
+                    dtype=self.read_precision,
+                    mode="r",
+                    offset=offset,
+                    shape=local_shape,
+                )
+                pos = [np.arange(len(ivar))] + pos
+                loc = [ivar] + loc
+                out[self.__select(pos)] = self.__select(loc, data)
+                del data
+
+        return self.__squeeze(out, drop)
+
+    def __normalize_key(self, key):
+        """
+        Turn an index expression into one index array per axis and flag
+        the axes indexed by an integer.
+        """
+
+        if not isinstance(key, tuple):
+            key = (key,)
+        if any(k is Ellipsis for k in key):
+            iell = [k is Ellipsis for k in key].index(True)
+            fill = (slice(None),) * (self.ndim - len(key) + 1)
+            key = key[:iell] + fill + key[iell + 1 :]
+        if len(key) > self.ndim:
+            raise IndexError("lazyvar: too many indices for array.")
+        key = key + (slice(None),) * (self.ndim - len(key))
+
+        indices = []
+        drop = []
+        for k, n in zip(key, self.shape):
+            if isinstance(k, slice):
+                indices.append(np.arange(*k.indices(n)))
+                drop.append(False)
+            elif isinstance(k, (int, np.integer)):
+                if k < -n or k >= n:
+                    raise IndexError(
+                        "lazyvar: index {0} out of bounds for size {1}.".format(k, n)
+                    )
+                indices.append(np.array([k % n]))
+                drop.append(True)
+            else:
+                k = np.asarray(k)
+                if k.dtype == bool:
+                    k = np.nonzero(k)[0]
+                if np.any((k < -n) | (k >= n)):
+                    raise IndexError("lazyvar: index out of bounds.")
+                indices.append(k.astype(np.intp) % n)
+                drop.append(False)
+
+        return indices, drop
+
+    @staticmethod
+    def __select(indices, data=None):
+        """
+        Build the cheapest index expression for the given index arrays:
+        basic slices if all are contiguous, otherwise an open mesh applied
+        to the bounding box of the data.
+        """
+
+        slices = []
+        for idx in indices:
+            step = idx[1] - idx[0] if len(idx) > 1 else 1
+            if step > 0 and np.all(np.diff(idx) == step):
+                slices.append(slice(idx[0], idx[-1] + 1, step))
+            else:
+                slices.append(None)
+        if all(sl is not None for sl in slices):
+            if data is None:
+                return tuple(slices)
+            return data[tuple(slices)]
+
+        if data is None:
+            return np.ix_(*indices)
+        lower = [idx.min() for idx in indices]
+        upper = [idx.max() + 1 for idx in indices]
+        box = data[tuple(slice(l, u) for l, u in zip(lower, upper))]
+        return box[np.ix_(*[idx - l for idx, l in zip(indices, lower)])]
+
+    @staticmethod
+    def __squeeze(out, drop):
+        return out.reshape([n for n, d in zip(out.shape, drop) if not d])
+
+
+def lazy_var_array(datadir, proc_dirs, var_file, procdims, read_precision, dtype):
+    """
+    lazy_var_array(datadir, proc_dirs, var_file, procdims, read_precision, dtype)
+
+    Map the first record of the VAR file in every processor directory.
+
+    Parameters
+    ----------
+    datadir : string
+        Directory where the data is stored.
+
+    proc_dirs : list of string
+        Processor directories, e.g. ['proc0', 'proc1'] or ['allprocs'].
+
+    var_file : string
+        Name of the VAR file.
+
+    procdims : list of obj
+        Dimension object for each processor directory.
+
+    read_precision : string
+        Precision of the data on disk, 'f' or 'd'.
+
+    dtype : type
+        Type of the returned arrays.
+
+    Returns
+    -------
+    Tuple (LazyVarArray, list of (file_name, offset of the second record)).
+    """
+
+    itemsize = np.dtype(read_precision).itemsize
+    procs = []
+    records = []
+    nvar = None
+    mz = my = mx = 0
+    for directory, procdim in zip(proc_dirs, procdims):
+        file_name = os.path.join(datadir, directory, var_file)
+        nbytes = procdim.mz * procdim.my * procdim.mx * itemsize
+        offset, reclen = fortran_record_offset(file_name, nbytes)
+        nvar_loc = reclen // nbytes
+        if nvar is None:
+            nvar = nvar_loc
+        elif nvar != nvar_loc:
+            raise ValueError(
+                "lazyvar: {0} holds {1} variables, expected {2}.".format(
+                    file_name, nvar_loc, nvar
+                )
+            )
+        bounds = proc_bounds(procdim, len(proc_dirs))
+        mz = max(mz, bounds[0][1])
+        my = max(my, bounds[1][1])
+        mx = max(mx, bounds[2][1])
+        procs.append(
+            (file_name, offset, (nvar, procdim.mz, procdim.my, procdim.mx), bounds)
+        )
+        records.append((file_name, 2 * offset + reclen))
+
+    return LazyVarArray(procs, (nvar, mz, my, mx), read_precision, dtype), records
@@ -33,7 +33,7 @@ class PDim(object):
     Class holding the data from pdim.dat and its methods.
     """
 
-    def __init__(self, npar, mpvar, npar_stalk, mpaux):
+    def __init__(self, npar=0, mpvar=0, npar_stalk=0, mpaux=0):
         """
         Fill members with default values.
         """
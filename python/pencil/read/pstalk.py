@@ -1,13 +1,21 @@
 def pstalk(*args, **kwargs):
     """
-    Read PSTALK files from Pencil Code using IDL.
-    Uses IDL<->Python Bridge, this must be activated manually!
+    Read PSTALK files from Pencil Code.
+    The particles_stalker.dat files are read with numpy, unless use_idl is
+    set, which uses the IDL<->Python Bridge, this must be activated manually!
 
     Args:
         - datadir      specify datadir, default False
         - sim           specify simulation from which you want to read
+        - tmin          index of the first output to be read, default 0
+        - noutmax       maximal number of outputs to be read, default all
+        - ipar          list of particle indices to be read in, default all
         - swap_endian   change if needed to True, default False
         - quiet         verbosity, default False
+        - workers       number of threads reading the proc files, default None
+        - use_idl       read the files in IDL, default False
+
+    The quantities have the shape (len(t), len(ipar)).
     """
 
     var_tmp = ParticleStalkData(*args, **kwargs)
@@ -29,16 +37,26 @@ class ParticleStalkData(object):
         swap_endian=False,
         quiet=False,
         use_existing_pstalk_sav=False,
+        ipar=None,
+        workers=None,
+        use_idl=False,
     ):
         """
-        Read PSTALK files from Pencil Code using IDL.
-        Uses IDL<->Python Bridge, this must be activated manually!
+        Read PSTALK files from Pencil Code.
+        The particles_stalker.dat files are read with numpy, unless use_idl is
+        set, which uses the IDL<->Python Bridge, this must be activated manually!
 
         Args:
             - datadir      specify datadir, default False
             - sim           specify simulation from which you want to read
+            - tmin          index of the first output to be read, default 0
+            - tmax          with IDL, print every tmax-th output read
+            - noutmax       maximal number of outputs to be read, default all
+            - ipar          list of particle indices to be read in, default all
             - swap_endian   change if needed to True, default False
             - quiet         verbosity, default False
+            - workers       number of threads reading the proc files, default None
+            - use_idl       read the files in IDL, default False
             - use_existing_pstalk_sav
                             use existing <sim.datadir>/data/pc/tmp/pstalk.sav for speed up
 
@@ -55,6 +73,12 @@ class ParticleStalkData(object):
                 sim = get_sim()
             datadir = sim.datadir
 
+        if not use_idl and not use_existing_pstalk_sav:
+            self.__read_fortran(
+                datadir, tmin, noutmax, ipar, swap_endian, quiet, workers
+            )
+            return
+
         if quiet == False:
             quiet = "0"
         else:
@@ -170,3 +194,148 @@ class ParticleStalkData(object):
                     if hasattr(self, key.lower()):
                         continue
                     setattr(self, key.lower(), ps[key][0].T)
+
+    def keys(self):
+        for i in self.__dict__.keys():
+            print(i)
+
+    def __read_fortran(self, datadir, tmin, noutmax, ipar, swap_endian, quiet, workers):
+        """
+        Read the procN/particles_stalker.dat files with numpy.
+
+        Every output consists of the records (t, npar_stalk_loc) and, if
+        npar_stalk_loc > 0, ipar(npar_stalk_loc) and
+        data(nfields, npar_stalk_loc).
+        """
+
+        import os
+        import sys
+        import time
+        import numpy as np
+        from os.path import join
+        from pencil import read
+        from pencil.read.cache import metadata_cache
+        from pencil.read.lazyvar import fortran_records
+
+        dim = metadata_cache.dim(datadir)
+        pdim = read.pdim(datadir=datadir)
+        param = metadata_cache.param(datadir=datadir, quiet=True)
+        if pdim.npar_stalk == 0:
+            print("pstalk: npar_stalk is zero - set it in cparam.local and rerun")
+            return
+        lstalk_sink_particles = getattr(param, "lstalk_sink_particles", False)
+        if dim.precision == "D":
+            read_precision = np.dtype(np.float64)
+        else:
+            read_precision = np.dtype(np.float32)
+        precision = read_precision
+        int_type = np.dtype(np.int32)
+        if swap_endian:
+            read_precision = read_precision.newbyteorder()
+            int_type = int_type.newbyteorder()
+
+        nout = int(noutmax)
+        if os.path.exists(join(datadir, "tstalk.dat")):
+            with open(join(datadir, "tstalk.dat"), "r") as tstalk_file:
+                noutmaxfile = int(tstalk_file.readline().split()[1])
+            if nout < 0 or nout > noutmaxfile:
+                nout = noutmaxfile
+        with open(join(datadir, "particles_stalker_header.dat"), "r") as header_file:
+            fields = [
+                field.strip().lower()
+                for field in header_file.readline().split(",")
+                if field.strip()
+            ]
+        nfields = len(fields)
+        if not quiet:
+            print("Going to read the {0} fields: {1}".format(nfields, fields))
+            sys.stdout.flush()
+
+        def read_proc(iproc):
+            """
+            Return the list of outputs (index, t, ipar_loc, data_loc).
+            """
+
+            start_time = time.time()
+            file_name = join(datadir, "proc{0}".format(iproc), "particles_stalker.dat")
+            data, records = fortran_records(file_name, swap_endian=swap_endian)
+            outputs = []
+            irec = 0
+            it = 0
+            while irec < len(records) and (nout < 0 or it < tmin + nout):
+                offset, _ = records[irec]
+                t_loc = data[offset : offset + read_precision.itemsize].view(
+                    read_precision
+                )[0]
+                offset += read_precision.itemsize
+                npar_loc = int(data[offset : offset + 4].view(int_type)[0])
+                irec += 1
+                if npar_loc >= 1:
+                    if irec + 1 >= len(records):
+                        # Output still being written.
+                        break
+                    if it >= tmin:
+                        offset, _ = records[irec]
+                        ipar_loc = data[offset : offset + 4 * npar_loc].view(int_type)
+                        offset, _ = records[irec + 1]
+                        data_loc = data[
+                            offset : offset + read_precision.itemsize * nfields * npar_loc
+                        ].view(read_precision)
+                        outputs.append(
+                            (
+                                it - tmin,
+                                t_loc,
+                                np.array(ipar_loc, dtype=int),
+                                data_loc.reshape([npar_loc, nfields]),
+                            )
+                        )
+                    irec += 2
+                elif it >= tmin:
+                    outputs.append((it - tmin, t_loc, None, None))
+                it += 1
+            if not quiet:
+                print(
+                    "Read {0} outputs of proc{1} in {2:.2f} s".format(
+                        len(outputs), iproc, time.time() - start_time
+                    )
+                )
+                sys.stdout.flush()
+
+            return outputs
+
+        procs = list(range(dim.nprocx * dim.nprocy * dim.nprocz))
+        if workers is not None and workers > 1 and len(procs) > 1:
+            from concurrent.futures import ThreadPoolExecutor
+
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(read_proc, procs))
+        else:
+            results = [read_proc(iproc) for iproc in procs]
+
+        # Sink particles come and go, so only the indices found are kept.
+        if lstalk_sink_particles:
+            ipar_all = [
+                output[2] for outputs in results for output in outputs if output[2] is not None
+            ]
+            ipars = np.unique(np.concatenate(ipar_all)) if ipar_all else np.zeros(0, dtype=int)
+        else:
+            ipars = np.arange(1, pdim.npar_stalk + 1)
+        if ipar is not None:
+            ipars = ipars[np.isin(ipars, np.asarray(ipar, dtype=int))]
+
+        n_t = max([output[0] + 1 for outputs in results for output in outputs] + [0])
+        self.t = np.zeros(n_t, dtype=precision)
+        self.ipar = ipars
+        array = np.zeros([nfields, n_t, len(ipars)], dtype=precision)
+        for outputs in results:
+            for it, t_loc, ipar_loc, data_loc in outputs:
+                self.t[it] = t_loc
+                if ipar_loc is None or len(ipars) == 0:
+                    continue
+                columns = np.searchsorted(ipars, ipar_loc)
+                mask = (columns < len(ipars)) & (
+                    ipars[np.minimum(columns, len(ipars) - 1)] == ipar_loc
+                )
+                array[:, it, columns[mask]] = data_loc[mask].T
+        for ifield, field in enumerate(fields):
+            setattr(self, field, array[ifield])
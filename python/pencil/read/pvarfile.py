@@ -1,19 +1,24 @@
 def pvar(*args, **kwargs):
     """
-    Read PVAR files from Pencil Code using IDL. Does also work with block decomposition.
-    Uses IDL<->Python Bridge, this must be activated manually!
-
-    !! WARNING: SHAPE IS AS IN IDL: (X, Y, Z) !!
+    Read PVAR files from Pencil Code. Does also work with block decomposition.
+    Fortran binary files are read with numpy, unless use_idl is set, which
+    uses the IDL<->Python Bridge, this must be activated manually!
 
     Args:
         - varfile       put 'PVARXYZ' or just number here, 'VAR' will be replaced by 'PVAR' autom.
         - npar_max      maximal number of particles to be read in
+        - ipar          list of particle indices to be read in, default all
 
         - datadir      specify datadir, default False
         - sim           specify simulation from which you want to read
         - proc          read from single proc, set number here
         - swap_endian   change if needed to True, default False
         - quiet         verbosity, default False
+        - workers       number of threads reading the proc files, default None
+        - use_idl       read Fortran binary files in IDL, default False
+
+    The particles are sorted by their index ipars. With use_idl the shapes
+    are as in IDL: (X, Y, Z).
 
     If needed add manually to this script:
         - rmv, irmv, trmv, oldrmv are used for ???
@@ -29,20 +34,22 @@ def pvar(*args, **kwargs):
 
 class ParticleData(object):
     """
-    Read PVAR files from Pencil Code using IDL.
-    Uses IDL<->Python Bridge, this must be activated manually!
-
-    !! WARNING: SHAPE IS AS IN IDL: (X, Y, Z) !!
+    Read PVAR files from Pencil Code.
+    Fortran binary files are read with numpy, unless use_idl is set, which
+    uses the IDL<->Python Bridge, this must be activated manually!
 
     Args:
         - datadir      specify datadir, default False
         - sim           specify simulation from which you want to read
         - varfile       put 'PVARXYZ' or just number here, 'VAR' will be replaced by 'PVAR' autom.
         - npar_max      maximal number of particles to be read in
+        - ipar          list of particle indices to be read in, default all
 
         - proc          read from single proc, set number here
         - swap_endian   change if needed to True, default False
         - quiet         verbosity, default False
+        - workers       number of threads reading the proc files, default None
+        - use_idl       read Fortran binary files in IDL, default False
 
     If needed add manually to this script:
         - rmv, irmv, trmv, oldrmv are used for ???
@@ -62,20 +69,27 @@ class ParticleData(object):
         swap_endian=False,
         quiet=False,
         DEBUG=False,
+        ipar=None,
+        workers=None,
+        use_idl=False,
     ):
         """
-        Read PVAR files from Pencil Code using IDL.
-        Uses IDL<->Python Bridge, this must be activated manually!
+        Read PVAR files from Pencil Code.
+        Fortran binary files are read with numpy, unless use_idl is set, which
+        uses the IDL<->Python Bridge, this must be activated manually!
 
         Args:
             - datadir      specify datadir, default False
             - sim           specify simulation from which you want to read
             - varfile       put 'PVARXYZ' or just number here, 'VAR' will be replaced by 'PVAR' autom.
             - npar_max      maximal number of particles to be read in
+            - ipar          list of particle indices to be read in, default all
 
             - proc          read from single proc, set number here
             - swap_endian   change if needed to True, default False
             - quiet         verbosity, default False
+            - workers       number of threads reading the proc files, default None
+            - use_idl       read Fortran binary files in IDL, default False
 
         """
 
@@ -89,51 +103,14 @@ class ParticleData(object):
         if datadir == False:
             if sim == False:
                 sim = get_sim()
-        datadir = sim.datadir
+            datadir = sim.datadir
 
         l_h5 = False
         if os.path.exists(os.path.join(datadir, "grid.h5")):
             l_h5 = True
             import h5py
-        if not l_h5:
-            try:
-                cwd = os.getcwd()
-                from idlpy import IDL
-
-                os.chdir(cwd)
-
-            except:
-                print(
-                    "! ERROR: no idl<->python bridge found. Try whats written in pstalk-comment to fix that issue."
-                )
-                print("! ")
-                print("! Use something like: (ensure you have IDL 8.5.1 or larger)")
-                print(
-                    "! export PYTHONPATH=$PYTHONPATH:$IDL_HOME/lib/bridges:$IDL_HOME/bin/bin.linux.x86_64"
-                )
-                print(
-                    "! export LD_LIBRARY_PATH=$LD_LIBRARY_PATH:/usr/lib64:$IDL_HOME/bin/bin.linux.x86_64"
-                )
-                print("! in your .bashrc")
-                print("! ")
-                return None
 
-        if not l_h5:
-            if quiet == False:
-                quiet = "0"
-            else:
-                quiet = "1"
-
-            if swap_endian == False:
-                if byteorder == "little":
-                    swap_endian = "0"
-                elif byteorder == "big":
-                    swap_endian = "1"
-            else:
-                print("? WARNING: Couldnt determine endianness!")
-
-        ####### preparing IDL call
-        # cleanup of varfile string
+        ####### cleanup of varfile string
         if is_number(varfile):
             varfile = "PVAR" + str(varfile)
         varfile = str(varfile)
@@ -141,46 +118,256 @@ class ParticleData(object):
             varfile = "pvar.dat"
         if varfile[:3] == "VAR":
             varfile = "P" + varfile
+
         if l_h5:
             varfile = str.strip(varfile, ".dat") + ".h5"
             with h5py.File(os.path.join(datadir, "allprocs", varfile), "r") as hf:
                 for key in hf["part"].keys():
                     setattr(self, key.lower(), hf["part"][key][()])
-        #
-        else:
-            idl_call = ", ".join(
-                [
-                    "pc_read_pvar",
-                    "obj=pvar",
-                    'varfile="' + varfile + '"',
-                    'datadir="' + datadir + '"',
-                    "quiet=" + quiet,
-                    "swap_endian=" + swap_endian,
-                    "proc=" + str(proc),
-                ]
+            return
+
+        if not use_idl:
+            self.__read_fortran(
+                varfile, datadir, proc, npar_max, ipar, swap_endian, quiet, workers
+            )
+            return
+
+        try:
+            cwd = os.getcwd()
+            from idlpy import IDL
+
+            os.chdir(cwd)
+
+        except:
+            print(
+                "! ERROR: no idl<->python bridge found. Try whats written in pstalk-comment to fix that issue."
             )
+            print("! ")
+            print("! Use something like: (ensure you have IDL 8.5.1 or larger)")
+            print(
+                "! export PYTHONPATH=$PYTHONPATH:$IDL_HOME/lib/bridges:$IDL_HOME/bin/bin.linux.x86_64"
+            )
+            print(
+                "! export LD_LIBRARY_PATH=$LD_LIBRARY_PATH:/usr/lib64:$IDL_HOME/bin/bin.linux.x86_64"
+            )
+            print("! in your .bashrc")
+            print("! ")
+            return None
+
+        if quiet == False:
+            quiet = "0"
+        else:
+            quiet = "1"
+
+        if swap_endian == False:
+            if byteorder == "little":
+                swap_endian = "0"
+            elif byteorder == "big":
+                swap_endian = "1"
+        else:
+            print("? WARNING: Couldnt determine endianness!")
+
+        ####### preparing IDL call
+        idl_call = ", ".join(
+            [
+                "pc_read_pvar",
+                "obj=pvar",
+                'varfile="' + varfile + '"',
+                'datadir="' + datadir + '"',
+                "quiet=" + quiet,
+                "swap_endian=" + swap_endian,
+                "proc=" + str(proc),
+            ]
+        )
+
+        # reduce number of particles to be read in
+        if npar_max > 0:
+            idl_call = idl_call + ", npar_max=" + str(npar_max)
+
+        ####### show idl_call string if DEBUG
+        if DEBUG == True:
+            print("~ DEBUG: idl_call: " + idl_call)
+
+        ###### read in var file in IDL
+        print("~ reading " + varfile + " in IDL..")
+        IDL.run(idl_call)
+
+        ####### parse to python
+        print("~ parsing PVAR from IDL to python..")
+        pvar = IDL.pvar
 
-            # reduce number of particles to be read in
+        for key in pvar.keys():
+            setattr(self, key.lower(), pvar[key])
+        setattr(self, "xp", pvar["XX"][0])
+        setattr(self, "yp", pvar["XX"][1])
+        setattr(self, "zp", pvar["XX"][2])
+        setattr(self, "vpx", pvar["VV"][0])
+        setattr(self, "vpy", pvar["VV"][1])
+        setattr(self, "vpz", pvar["VV"][2])
+
+    def keys(self):
+        for i in self.__dict__.keys():
+            print(i)
+
+    def __read_fortran(
+        self, varfile, datadir, proc, npar_max, ipar, swap_endian, quiet, workers
+    ):
+        """
+        Read the procN/PVAR files with numpy.
+
+        Every file holds the records npar_loc, ipar(npar_loc),
+        fp(npar_loc, mpvar+mpaux) and t, x, y, z, dx, dy, dz.
+        The particle data are mapped and only the selected particles read.
+        """
+
+        import os
+        import sys
+        import time
+        import numpy as np
+        from pencil import read
+        from pencil.read.cache import metadata_cache
+        from pencil.read.dims import proc_bounds
+        from pencil.read.lazyvar import fortran_records
+
+        dim = metadata_cache.dim(datadir)
+        pdim = read.pdim(datadir=datadir)
+        if dim.precision == "D":
+            read_precision = np.dtype(np.float64)
+        else:
+            read_precision = np.dtype(np.float32)
+        precision = read_precision
+        int_type = np.dtype(np.int32)
+        if swap_endian:
+            read_precision = read_precision.newbyteorder()
+            int_type = int_type.newbyteorder()
+        nvars = pdim.mpvar + pdim.mpaux
+        names = particle_index(datadir, nvars)
+
+        if proc < 0:
+            procs = list(range(dim.nprocx * dim.nprocy * dim.nprocz))
+        else:
+            procs = [proc]
+        if ipar is not None:
+            ipar = np.unique(np.atleast_1d(np.asarray(ipar, dtype=int)))
             if npar_max > 0:
-                idl_call = idl_call + ", npar_max=" + str(npar_max)
-
-            ####### show idl_call string if DEBUG
-            if DEBUG == True:
-                print("~ DEBUG: idl_call: " + idl_call)
-
-            ###### read in var file in IDL
-            print("~ reading " + varfile + " in IDL..")
-            IDL.run(idl_call)
-
-            ####### parse to python
-            print("~ parsing PVAR from IDL to python..")
-            pvar = IDL.pvar
-
-            for key in pvar.keys():
-                setattr(self, key.lower(), pvar[key])
-            setattr(self, "xp", pvar["XX"][0])
-            setattr(self, "yp", pvar["XX"][1])
-            setattr(self, "zp", pvar["XX"][2])
-            setattr(self, "vpx", pvar["VV"][0])
-            setattr(self, "vpy", pvar["VV"][1])
-            setattr(self, "vpz", pvar["VV"][2])
+                ipar = ipar[ipar <= npar_max]
+
+        def read_proc(iproc):
+            start_time = time.time()
+            file_name = os.path.join(datadir, "proc{0}".format(iproc), varfile)
+            if not os.path.exists(file_name):
+                raise ValueError("ERROR: cannot find file {0}".format(file_name))
+            data, records = fortran_records(file_name, swap_endian=swap_endian)
+            npar_loc = int(data[records[0][0] : records[0][0] + 4].view(int_type)[0])
+            if npar_loc > 0:
+                offset, _ = records[1]
+                ipar_loc = np.array(
+                    data[offset : offset + 4 * npar_loc].view(int_type), dtype=int
+                )
+                offset, _ = records[2]
+                fp_loc = data[
+                    offset : offset + read_precision.itemsize * npar_loc * nvars
+                ].view(read_precision)
+                fp_loc = fp_loc.reshape([nvars, npar_loc])
+                mask = np.ones(npar_loc, dtype=bool)
+                if ipar is not None:
+                    mask = np.isin(ipar_loc, ipar)
+                elif npar_max > 0:
+                    mask = ipar_loc <= npar_max
+                ipar_loc = ipar_loc[mask]
+                fp_loc = np.array(fp_loc[:, mask], dtype=precision)
+            else:
+                ipar_loc = np.zeros(0, dtype=int)
+                fp_loc = np.zeros([nvars, 0], dtype=precision)
+            offset, _ = records[-1]
+            grid_loc = np.array(
+                data[offset : offset + records[-1][1]].view(read_precision),
+                dtype=precision,
+            )
+            del data
+            if not quiet:
+                print(
+                    "Read {0} particles of proc{1} in {2:.2f} s".format(
+                        len(ipar_loc), iproc, time.time() - start_time
+                    )
+                )
+                sys.stdout.flush()
+
+            return ipar_loc, fp_loc, grid_loc
+
+        if workers is not None and workers > 1 and len(procs) > 1:
+            from concurrent.futures import ThreadPoolExecutor
+
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(read_proc, procs))
+        else:
+            results = [read_proc(iproc) for iproc in procs]
+
+        # Sort the particles by their index.
+        ipars = np.concatenate([result[0] for result in results])
+        fp = np.concatenate([result[1] for result in results], axis=1)
+        order = np.argsort(ipars, kind="stable")
+        self.ipars = ipars[order]
+        fp = fp[:, order]
+        if not quiet:
+            counts = np.bincount(self.ipars)
+            if np.any(counts > 1):
+                print("Warning: Some particles found more than once in snapshot files.")
+        for ivar, name in enumerate(names):
+            if name:
+                setattr(self, name, fp[ivar])
+
+        # Assemble the grid, which follows the time in the last record.
+        if proc >= 0:
+            dim = metadata_cache.dim(datadir, proc)
+        self.x = np.zeros(dim.mx, dtype=precision)
+        self.y = np.zeros(dim.my, dtype=precision)
+        self.z = np.zeros(dim.mz, dtype=precision)
+        for iproc, result in zip(procs, results):
+            grid_loc = result[2]
+            procdim = metadata_cache.dim(datadir, iproc)
+            self.t = grid_loc[0]
+            xloc = grid_loc[1 : 1 + procdim.mx]
+            yloc = grid_loc[1 + procdim.mx : 1 + procdim.mx + procdim.my]
+            zloc = grid_loc[
+                1 + procdim.mx + procdim.my : 1 + procdim.mx + procdim.my + procdim.mz
+            ]
+            self.dx, self.dy, self.dz = grid_loc[-3:]
+            bounds = proc_bounds(procdim, len(procs))
+            for coord, loc, (i0, i1, i0loc, i1loc) in zip(
+                (self.z, self.y, self.x), (zloc, yloc, xloc), bounds
+            ):
+                coord[i0:i1] = loc[i0loc:i1loc]
+        self.x = self.x[dim.l1 : dim.l2 + 1]
+        self.y = self.y[dim.m1 : dim.m2 + 1]
+        self.z = self.z[dim.n1 : dim.n2 + 1]
+
+
+def particle_index(datadir="data", nvars=None):
+    """
+    particle_index(datadir='data', nvars=None)
+
+    Read the particle_index.pro file and return the names of the particle
+    variables in the order of the fp array, e.g. ['xp', 'yp', 'zp', 'vpx'].
+    Variables without a name are returned as empty strings.
+
+    Args:
+        - datadir       directory where the data is stored
+        - nvars         number of particle variables mpvar+mpaux
+    """
+
+    import os
+    import re
+
+    indices = {}
+    file_name = os.path.join(datadir, "particle_index.pro")
+    if os.path.exists(file_name):
+        with open(file_name, "r") as index_file:
+            for line in index_file:
+                for label, value in re.findall(r"(\w+)\s*=\s*(\d+)", line):
+                    if int(value) > 0 and label[0] == "i":
+                        indices[int(value) - 1] = label[1:]
+    if nvars is None:
+        nvars = max(indices.keys()) + 1 if indices else 0
+
+    return [indices.get(ivar, "") for ivar in range(nvars)]
@@ -6,11 +6,14 @@
 Contains the classes and methods to read the time series file.
 """
 
+import re
+
 
 def ts(*args, **kwargs):
     """
     ts(file_name='time_series.dat', datadir='data',
-       quiet=False, comment_char='#', sim=None, unique_clean=False)
+       quiet=False, comment_char='#', sim=None, unique_clean=False,
+       fast=True, chunk_size=2**26)
 
     Read Pencil Code time series data.
 
@@ -35,6 +38,16 @@ def ts(*args, **kwargs):
     unique_clean : bool
       Set True, np.unique is used to clean up the ts, e.g. remove errors
       at the end of crashed runs.
+
+    fast : bool
+      Parse the blocks between header lines in bulk. Quantities are matched
+      by name if the header changes, values missing in a block are NaN.
+      Set False for the line by line parser.
+
+    chunk_size : int
+      Number of bytes read and parsed at once by the fast parser.
+
+    Use TimeSeries.update() to append the lines written since the last read.
     """
 
     ts_tmp = TimeSeries()
@@ -67,10 +80,13 @@ class TimeSeries(object):
         comment_char="#",
         sim=None,
         unique_clean=False,
+        fast=True,
+        chunk_size=2 ** 26,
     ):
         """
         read(file_name='time_series.dat', datadir='data',
-             quiet=False, comment_char='#', sim=None, unique_clean=False)
+             quiet=False, comment_char='#', sim=None, unique_clean=False,
+             fast=True, chunk_size=2**26)
 
         Read Pencil Code time series data.
 
@@ -95,6 +111,14 @@ class TimeSeries(object):
         unique_clean : bool
           Set True, np.unique is used to clean up the ts, e.g. remove errors
           at the end of crashed runs.
+
+        fast : bool
+          Parse the blocks between header lines in bulk. Quantities are
+          matched by name if the header changes, values missing in a block
+          are NaN. Set False for the line by line parser.
+
+        chunk_size : int
+          Number of bytes read and parsed at once by the fast parser.
         """
 
         import numpy as np
@@ -108,6 +132,19 @@ class TimeSeries(object):
                 datadir = sim.datadir
 
         datadir = os.path.expanduser(datadir)
+        if fast:
+            self.keys = []
+            self._file_name = os.path.join(datadir, file_name)
+            self._offset = 0
+            self._comment_char = comment_char
+            self._unique_clean = unique_clean
+            self._chunk_size = chunk_size
+            self._header = None
+            nlines = self.__read_blocks()
+            if not quiet:
+                print("Read {0} lines.".format(nlines))
+            return
+
         infile = open(os.path.join(datadir, file_name), "r")
         lines = infile.readlines()
         infile.close()
@@ -149,3 +186,140 @@ class TimeSeries(object):
             if np.size(clean_t) != np.size(self.t):
                 for key in self.keys:
                     setattr(self, key, getattr(self, key)[unique_indices])
+
+    def update(self, quiet=True):
+        """
+        update(quiet=True)
+
+        Append the lines written to the time series file since it was read,
+        e.g. while the simulation is running. Only complete lines are read,
+        starting from the byte offset where the last read stopped.
+
+        Parameters
+        ----------
+        quiet : bool
+            Flag for switching off output.
+
+        Returns
+        -------
+        Number of new lines.
+        """
+
+        import os
+
+        if getattr(self, "_file_name", None) is None:
+            raise ValueError("TimeSeries.update: read the time series with fast=True first.")
+
+        # The file was truncated, e.g. by restarting the run, so read it anew.
+        if os.path.getsize(self._file_name) < self._offset:
+            for key in self.keys:
+                delattr(self, key)
+            self.keys = []
+            self._offset = 0
+            self._header = None
+
+        nlines = self.__read_blocks()
+        if not quiet:
+            print("Read {0} new lines.".format(nlines))
+
+        return nlines
+
+    def __read_blocks(self):
+        """
+        Read the time series file from the stored byte offset in chunks and
+        append the data blocks to the arrays.
+        """
+
+        import numpy as np
+
+        header_start = "{0}--".format(self._comment_char)
+        segments = []
+        with open(self._file_name, "rb") as infile:
+            infile.seek(self._offset)
+            rest = b""
+            while True:
+                chunk = infile.read(self._chunk_size)
+                if not chunk:
+                    break
+                chunk = rest + chunk
+                # Keep incomplete lines for the next chunk or update.
+                end = chunk.rfind(b"\n") + 1
+                rest = chunk[end:]
+                self._offset += end
+                lines = chunk[:end].decode(errors="replace").splitlines()
+
+                block = []
+                for line in lines:
+                    if line.startswith(header_start):
+                        if block:
+                            segments.append((self._header, self.__parse_block(block)))
+                            block = []
+                        line = line.strip("{0}-\n".format(self._comment_char))
+                        self._header = re.split("-+", line)
+                    elif line.strip() and not line.startswith(self._comment_char):
+                        block.append(line)
+                if block:
+                    segments.append((self._header, self.__parse_block(block)))
+
+        segments = [(keys, data) for keys, data in segments if keys and len(data) > 0]
+        nlines = sum(len(data) for keys, data in segments)
+        if nlines == 0 and self.keys:
+            return 0
+
+        # Assemble the blocks, matching the quantities by name.
+        keys = list(self.keys)
+        for header, data in segments:
+            keys += [key for key in header if key not in keys]
+        nold = len(getattr(self, keys[0])) if self.keys else 0
+        columns = {}
+        for key in keys:
+            columns[key] = np.full(nold + nlines, np.nan)
+            if key in self.keys:
+                columns[key][:nold] = getattr(self, key)
+        row = nold
+        for header, data in segments:
+            for i, key in enumerate(header):
+                columns[key][row : row + len(data)] = data[:, i]
+            row += len(data)
+
+        self.keys = keys
+        for key in keys:
+            setattr(self, key, columns[key])
+
+        # Do unique clean up.
+        if self._unique_clean and "t" in keys:
+            clean_t, unique_indices = np.unique(self.t, return_index=True)
+            if np.size(clean_t) != np.size(self.t):
+                for key in self.keys:
+                    setattr(self, key, getattr(self, key)[unique_indices])
+
+        return nlines
+
+    def __parse_block(self, lines):
+        """
+        Convert the lines of one header block into a 2D array in one go,
+        falling back to the lines one by one if the block is malformed.
+        """
+
+        import numpy as np
+
+        ncols = len(self._header) if self._header else 0
+        try:
+            data = np.loadtxt(lines, comments=None, ndmin=2)
+            if data.shape[1] == ncols:
+                return data
+        except ValueError:
+            pass
+
+        rows = []
+        for line in lines:
+            try:
+                row = np.array(line.split(), dtype=float)
+            except ValueError:
+                row = None
+            if row is None or len(row) != ncols:
+                print("Invalid data on line '{0}'. Skipping.".format(line.strip()))
+            else:
+                rows.append(row)
+
+        return np.array(rows).reshape(-1, ncols)
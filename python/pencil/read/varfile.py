@@ -20,7 +20,8 @@ from pencil.math import natural_sort
 def var(*args, **kwargs):
     """
     var(var_file='', datadir='data', proc=-1, ivar=-1, quiet=True,
-        trimall=False, magic=None, sim=None, precision='f')
+        trimall=False, magic=None, sim=None, precision='f', lazy=False,
+        workers=None, cache=True, variables=None, region=None)
 
     Read VAR files from Pencil Code. If proc < 0, then load all data
     and assemble, otherwise load VAR file from specified processor.
@@ -55,8 +56,12 @@ def var(*args, **kwargs):
      trimall : bool
          Trim the data cube to exclude ghost zones.
 
-     magic : bool
-         Values to be computed from the data, e.g. B = curl(A).
+     magic : list of string
+         Values to be computed from the data, e.g. B = curl(A). Any of
+         calc.derived_quantities(), e.g. 'bb', 'jj', 'vort', 'tt', 'pp',
+         'ou' or 'ab', and 'bbtest'. They share their intermediates, e.g. bb
+         and jj the gradient tensor of A. With lazy=True they are computed on
+         first access.
 
      sim : pencil code simulation object
          Contains information about the local simulation.
@@ -67,6 +72,38 @@ def var(*args, **kwargs):
      lpersist : bool
          Read the persistent variables if they exist
 
+     lazy : bool
+         For the 'dist' io_strategy, memory-map the VAR files instead of
+         reading them. The f array is then a LazyVarArray which only reads
+         the requested variables and sub-box, e.g. var.f[index.rho-1], and
+         the field attributes (var.rho, var.uu, ...) are read on first access.
+         The magic quantities are computed on first access.
+
+     workers : int
+         Number of threads reading the processor files (and their dim.dat)
+         concurrently. The data of at most workers processors is held
+         besides the global array, into which it is copied in the order of
+         the processors. If None, the processors are read one after another.
+
+     cache : bool
+         Reuse the param, index, grid and dim objects parsed by earlier reads
+         of the same data directory, see read.metadata_cache. They are read
+         again when their files change.
+
+     variables : list of string
+         For the 'HDF5' io_strategy, read only these variables, e.g.
+         ['rho'] or ['uu', 'lnrho']. The names are those of index.pro, 'uu'
+         and 'aa' stand for their three components. The variables needed
+         by the magic quantities are added. The f
+         array then holds the selected variables in the order of index.pro.
+
+     region : tuple of slice
+         For the 'HDF5' io_strategy, read only the sub-box
+         (z-slice, y-slice, x-slice) of the (mz, my, mx) array including
+         the ghost zones. With trimall the box is further restricted to the
+         physical domain. If magic needs derivatives, nghost points around
+         the box are read as well.
+
     Returns
     -------
     DataCube
@@ -83,6 +120,15 @@ def var(*args, **kwargs):
     the vorticity omega = curl(u) and remove the ghost zones:
     >>> var = pc.read.var(var_file='VAR2', magic=['bb', 'vort'], trimall=True)
     >>> print(var.bb.shape)
+
+    Map a large snapshot and read only the density near the midplane:
+    >>> index = pc.read.index()
+    >>> var = pc.read.var(var_file='VAR2', lazy=True, trimall=True)
+    >>> rho = var.f[index.rho - 1, 120:136]
+
+    Read only the density near the midplane of an HDF5 snapshot:
+    >>> var = pc.read.var(var_file='VAR2.h5', variables=['rho'],
+    ...                   region=(slice(120, 136), None, None), trimall=True)
     """
 
     from pencil.sim import __Simulation__
@@ -148,8 +194,64 @@ class DataCube(object):
 
     def keys(self):
         for i in self.__dict__.keys():
+            if not i.startswith("_"):
+                print(i)
+        for i in self.__dict__.get("_lazy_fields", {}):
+            print(i)
+        for i in self.__dict__.get("_derived_fields", {}):
             print(i)
 
+    def __getstate__(self):
+        """
+        Compute the pending magic quantities, so that the pickled data cube
+        does not refer to the untrimmed f-array.
+        """
+
+        for name in list(self.__dict__.get("_derived_fields", {})):
+            getattr(self, name)
+        return self.__dict__
+
+    def __getattr__(self, name):
+        """
+        Read fields of a lazily mapped data cube and compute the magic
+        quantities on first access.
+        """
+
+        lazy_fields = self.__dict__.get("_lazy_fields", {})
+        derived_fields = self.__dict__.get("_derived_fields", {})
+        if name in lazy_fields:
+            value = self.f[lazy_fields.pop(name)]
+        elif name in derived_fields:
+            keep, dtype = derived_fields.pop(name)
+            value = self._derived[name]
+            if keep is not None:
+                value = value[(Ellipsis,) + keep]
+            value = value.astype(dtype, copy=False)
+            if not derived_fields:
+                # Free the intermediates and the untrimmed f-array.
+                del self._derived
+        else:
+            raise AttributeError(
+                "'{0}' object has no attribute '{1}'".format(
+                    type(self).__name__, name
+                )
+            )
+        setattr(self, name, value)
+        return value
+
+    def __set_field(self, key, index, lazy=False):
+        """
+        Assign the field self.f[index] to the attribute key, or register it
+        to be read on first access if the data cube is lazy.
+        """
+
+        if lazy:
+            if "_lazy_fields" not in self.__dict__:
+                self._lazy_fields = {}
+            self._lazy_fields[key] = index
+        else:
+            setattr(self, key, self.f[index, ...])
+
     def read(
         self,
         var_file="",
@@ -163,10 +265,16 @@ class DataCube(object):
         precision="d",
         lpersist=False,
         dtype=np.float64,
+        lazy=False,
+        workers=None,
+        cache=True,
+        variables=None,
+        region=None,
     ):
         """
         read(var_file='', datadir='data', proc=-1, ivar=-1, quiet=True,
-             trimall=False, magic=None, sim=None, precision='d')
+             trimall=False, magic=None, sim=None, precision='d', lazy=False,
+             workers=None, cache=True, variables=None, region=None)
 
         Read VAR files from Pencil Code. If proc < 0, then load all data
         and assemble, otherwise load VAR file from specified processor.
@@ -201,8 +309,12 @@ class DataCube(object):
          trimall : bool
              Trim the data cube to exclude ghost zones.
 
-         magic : bool
-             Values to be computed from the data, e.g. B = curl(A).
+         magic : list of string
+             Values to be computed from the data, e.g. B = curl(A). Any of
+             calc.derived_quantities(), e.g. 'bb', 'jj', 'vort', 'tt', 'pp',
+             'ou' or 'ab', and 'bbtest'. They are computed on first access
+             and share their intermediates, e.g. bb and jj the gradient
+             tensor of A.
 
          sim : pencil code simulation object
              Contains information about the local simulation.
@@ -213,6 +325,39 @@ class DataCube(object):
          lpersist : bool
              Read the persistent variables if they exist
 
+         lazy : bool
+             For the 'dist' io_strategy, memory-map the VAR files instead of
+             reading them. The f array is then a LazyVarArray which only reads
+             the requested variables and sub-box, e.g. var.f[index.rho-1], and
+             the field attributes (var.rho, var.uu, ...) are read on first
+             access. The magic quantities are computed on first access.
+
+         workers : int
+             Number of threads reading the processor files (and their
+             dim.dat) concurrently. The data of at most workers processors
+             is held besides the global array, into which it is copied in the
+             order of the processors. If None, the processors are read one
+             after another.
+
+         cache : bool
+             Reuse the param, index, grid and dim objects parsed by earlier
+             reads of the same data directory, see read.metadata_cache.
+             They are read again when their files change.
+
+         variables : list of string
+             For the 'HDF5' io_strategy, read only these variables, e.g.
+             ['rho'] or ['uu', 'lnrho']. The names are those of index.pro,
+             'uu' and 'aa' stand for their three components. The variables
+             needed by the magic quantities are added. The f array then holds the selected variables in the order of
+             index.pro.
+
+         region : tuple of slice
+             For the 'HDF5' io_strategy, read only the sub-box
+             (z-slice, y-slice, x-slice) of the (mz, my, mx) array including
+             the ghost zones. With trimall the box is further restricted to
+             the physical domain. If magic needs derivatives, nghost points
+             around the box are read as well.
+
         Returns
         -------
         DataCube
@@ -229,14 +374,32 @@ class DataCube(object):
         the vorticity omega = curl(u) and remove the ghost zones:
         >>> var = pc.read.var(var_file='VAR2', magic=['bb', 'vort'], trimall=True)
         >>> print(var.bb.shape)
+
+        Map a large snapshot and read only the density near the midplane:
+        >>> index = pc.read.index()
+        >>> var = pc.read.var(var_file='VAR2', lazy=True, trimall=True)
+        >>> rho = var.f[index.rho - 1, 120:136]
+
+        Read only the density near the midplane of an HDF5 snapshot:
+        >>> var = pc.read.var(var_file='VAR2.h5', variables=['rho'],
+        ...                   region=(slice(120, 136), None, None), trimall=True)
         """
 
         import os
+        import time
         from scipy.io import FortranFile
-        from pencil.math.derivatives import curl, curl2
+        from pencil.math.derivatives import curl
         from pencil import read
+        from pencil.read.cache import metadata_cache
+        from pencil.read.dims import proc_bounds
         from pencil.sim import __Simulation__
 
+        # Parsed metadata is reused between reads of the same run.
+        if cache:
+            meta = metadata_cache
+        else:
+            meta = read
+
         def persist(self, infile=None, precision="d", quiet=quiet):
             """An open Fortran file potentially containing persistent variables appended
             to the f array and grid data are read from the first proc data
@@ -280,9 +443,9 @@ class DataCube(object):
         if isinstance(sim, __Simulation__):
             datadir = os.path.expanduser(sim.datadir)
             dim = sim.dim
-            param = read.param(datadir=sim.datadir, quiet=True, conflicts_quiet=True)
-            index = read.index(datadir=sim.datadir)
-            grid = read.grid(datadir=sim.datadir, quiet=True)
+            param = meta.param(datadir=sim.datadir, quiet=True, conflicts_quiet=True)
+            index = meta.index(datadir=sim.datadir)
+            grid = meta.grid(datadir=sim.datadir, quiet=True)
         else:
             datadir = os.path.expanduser(datadir)
             if dim is None:
@@ -290,16 +453,16 @@ class DataCube(object):
                     dim = read.ogdim(datadir, proc)
                 else:
                     if var_file[0:4] == "VARd":
-                        dim = read.dim(datadir, proc, down=True)
+                        dim = meta.dim(datadir, proc, down=True)
                     else:
-                        dim = read.dim(datadir, proc)
+                        dim = meta.dim(datadir, proc)
             if param is None:
-                param = read.param(datadir=datadir, quiet=quiet, conflicts_quiet=True)
+                param = meta.param(datadir=datadir, quiet=quiet, conflicts_quiet=True)
             if index is None:
-                index = read.index(datadir=datadir)
+                index = meta.index(datadir=datadir)
             if grid is None:
                 try:
-                    grid = read.grid(datadir=datadir, quiet=True)
+                    grid = meta.grid(datadir=datadir, quiet=True, workers=workers)
                 except FileNotFoundError:
                     # KG: Handling this case because there is no grid.dat in `tests/input/serial-1/proc0` and we don't want the test to fail. Should we just drop this and add a grid.dat in the test input?
                     warnings.warn("Grid.dat not found. Assuming the grid is uniform.")
@@ -309,6 +472,15 @@ class DataCube(object):
         else:
             total_vars = dim.mvar
 
+        # Part of the data cube which is kept, as (z, y, x) slices.
+        keep = None
+        if trimall:
+            keep = (
+                slice(dim.n1, dim.n2 + 1),
+                slice(dim.m1, dim.m2 + 1),
+                slice(dim.l1, dim.l2 + 1),
+            )
+
         lh5 = False
         if param.io_strategy == "HDF5":
             #
@@ -319,15 +491,6 @@ class DataCube(object):
 
             run2D = param.lwrite_2d
 
-            # Set up the global array.
-            if not run2D:
-                self.f = np.zeros((total_vars, dim.mz, dim.my, dim.mx), dtype=dtype)
-            else:
-                if dim.ny == 1:
-                    self.f = np.zeros((total_vars, dim.mz, dim.mx), dtype=dtype)
-                else:
-                    self.f = np.zeros((total_vars, dim.my, dim.mx), dtype=dtype)
-
             if not var_file:
                 if ivar < 0:
                     var_file = "var.h5"
@@ -336,14 +499,48 @@ class DataCube(object):
 
             file_name = os.path.join(datadir, "allprocs", var_file)
             with h5py.File(file_name, "r") as tmp:
-                for key in tmp["data"].keys():
+                keys = list(tmp["data"].keys())
+                if variables is not None:
+                    keys = self.__select_variables(keys, variables, magic)
+                    # Renumber the index for the reduced f array.
+                    index = self.__sub_index(index, keys)
+                    total_vars = len(keys)
+                box = (slice(None),) * 3
+                if region is not None:
+                    if run2D:
+                        raise ValueError("region is not supported for 2D runs.")
+                    box, keep, ghosts = self.__region_box(
+                        region, dim, trimall, magic
+                    )
+                    if not trimall:
+                        self.n1, self.n2 = ghosts[0]
+                        self.m1, self.m2 = ghosts[1]
+                        self.l1, self.l2 = ghosts[2]
+                    if grid is not None:
+                        grid = self.__sub_grid(grid, box)
+
+                # Set up the global array.
+                if not run2D:
+                    shape = [
+                        len(range(*sl.indices(m)))
+                        for sl, m in zip(box, (dim.mz, dim.my, dim.mx))
+                    ]
+                    self.f = np.zeros([total_vars] + shape, dtype=dtype)
+                else:
+                    if dim.ny == 1:
+                        self.f = np.zeros((total_vars, dim.mz, dim.mx), dtype=dtype)
+                    else:
+                        self.f = np.zeros((total_vars, dim.my, dim.mx), dtype=dtype)
+
+                # Hyperslab selection reads only the requested box.
+                for key in keys:
                     self.f[index.__getattribute__(key) - 1, :] = dtype(
-                        tmp["data/" + key][:]
+                        tmp["data/" + key][... if run2D else box]
                     )
                 t = (tmp["time"][()]).astype(precision)
-                x = (tmp["grid/x"][()]).astype(precision)
-                y = (tmp["grid/y"][()]).astype(precision)
-                z = (tmp["grid/z"][()]).astype(precision)
+                x = (tmp["grid/x"][box[2]]).astype(precision)
+                y = (tmp["grid/y"][box[1]]).astype(precision)
+                z = (tmp["grid/z"][box[0]]).astype(precision)
                 dx = (tmp["grid/dx"][()]).astype(precision)
                 dy = (tmp["grid/dy"][()]).astype(precision)
                 dz = (tmp["grid/dz"][()]).astype(precision)
@@ -385,6 +582,80 @@ class DataCube(object):
             else:
                 proc_dirs = ["proc" + str(proc)]
 
+            if lazy and run2D:
+                warnings.warn("lazy reading of 2D runs is not supported, reading all data.")
+                lazy = False
+            if variables is not None or region is not None:
+                raise ValueError(
+                    "variables and region need the HDF5 io_strategy, "
+                    + "use lazy=True to read parts of a 'dist' snapshot."
+                )
+        else:
+            raise NotImplementedError(
+                "IO strategy {} not supported by the Python module.".format(
+                    param.io_strategy
+                )
+            )
+
+        if lazy and not lh5:
+            #
+            #  Memory-map the scattered Fortran binary files.
+            #
+            from pencil.read.lazyvar import lazy_var_array
+
+            def read_procdim(directory):
+                if param.lcollective_io:
+                    return dim
+                elif var_file[0:2].lower() == "og":
+                    return read.ogdim(datadir, int(directory[4:]))
+                else:
+                    return meta.dim(
+                        datadir, int(directory[4:]), down=var_file[0:4] == "VARd"
+                    )
+
+            if workers is not None and workers > 1 and len(proc_dirs) > 1:
+                from concurrent.futures import ThreadPoolExecutor
+
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    procdims = list(executor.map(read_procdim, proc_dirs))
+            else:
+                procdims = [read_procdim(directory) for directory in proc_dirs]
+            self.f, records = lazy_var_array(
+                datadir, proc_dirs, var_file, procdims, read_precision, dtype
+            )
+            x = np.zeros(self.f.shape[3], dtype=precision)
+            y = np.zeros(self.f.shape[2], dtype=precision)
+            z = np.zeros(self.f.shape[1], dtype=precision)
+
+            for (file_name, offset), procdim in zip(records, procdims):
+                if not quiet:
+                    print("Mapping data from {0} ...".format(file_name))
+                with open(file_name, "rb") as fortran_file:
+                    fortran_file.seek(offset)
+                    infile = FortranFile(fortran_file)
+                    raw_etc = infile.read_record(dtype=read_precision)
+                    if lpersist and file_name == records[0][0]:
+                        persist(self, infile=infile, precision=read_precision, quiet=quiet)
+
+                mxloc, myloc, mzloc = procdim.mx, procdim.my, procdim.mz
+                t = raw_etc[0]
+                zb, yb, xb = proc_bounds(procdim, len(proc_dirs))
+                x_loc = raw_etc[1 : mxloc + 1]
+                y_loc = raw_etc[mxloc + 1 : mxloc + myloc + 1]
+                z_loc = raw_etc[mxloc + myloc + 1 : mxloc + myloc + mzloc + 1]
+                x[xb[0] : xb[1]] = x_loc[xb[2] : xb[3]]
+                y[yb[0] : yb[1]] = y_loc[yb[2] : yb[3]]
+                z[zb[0] : zb[1]] = z_loc[zb[2] : zb[3]]
+                if param.lshear:
+                    shear_offset = 1
+                    deltay = raw_etc[-1]
+                else:
+                    shear_offset = 0
+                dx = raw_etc[-3 - shear_offset]
+                dy = raw_etc[-2 - shear_offset]
+                dz = raw_etc[-1 - shear_offset]
+
+        elif not lh5:
             # Set up the global array.
             if not run2D:
                 self.f = np.zeros((total_vars, dim.mz, dim.my, dim.mx), dtype=dtype)
@@ -398,32 +669,24 @@ class DataCube(object):
             y = np.zeros(dim.my, dtype=precision)
             z = np.zeros(dim.mz, dtype=precision)
 
-            for directory in proc_dirs:
+            def read_proc(directory):
+                """
+                Read the VAR file of one processor directory.
+                """
+
+                time_start = time.time()
                 if not param.lcollective_io:
                     proc = int(directory[4:])
                     if var_file[0:2].lower() == "og":
                         procdim = read.ogdim(datadir, proc)
                     else:
                         if var_file[0:4] == "VARd":
-                            procdim = read.dim(datadir, proc, down=True)
+                            procdim = meta.dim(datadir, proc, down=True)
                         else:
-                            procdim = read.dim(datadir, proc)
-                    if not quiet:
-                        print(
-                            "Reading data from processor"
-                            + " {0} of {1} ...".format(proc, len(proc_dirs))
-                        )
-
+                            procdim = meta.dim(datadir, proc)
                 else:
                     # A collective IO strategy is being used
                     procdim = dim
-                #                else:
-                #                    procdim.mx = dim.mx
-                #                    procdim.my = dim.my
-                #                    procdim.nx = dim.nx
-                #                    procdim.ny = dim.ny
-                #                    procdim.ipx = dim.ipx
-                #                    procdim.ipy = dim.ipy
 
                 mxloc = procdim.mx
                 myloc = procdim.my
@@ -443,68 +706,40 @@ class DataCube(object):
                         f_loc = dtype(infile.read_record(dtype=read_precision))
                         f_loc = f_loc.reshape((-1, myloc, mxloc))
                 raw_etc = infile.read_record(dtype=read_precision)
-                if lpersist:
+                if lpersist and directory == proc_dirs[0]:
                     persist(self, infile=infile, precision=read_precision, quiet=quiet)
                 infile.close()
 
-                t = raw_etc[0]
                 x_loc = raw_etc[1 : mxloc + 1]
                 y_loc = raw_etc[mxloc + 1 : mxloc + myloc + 1]
                 z_loc = raw_etc[mxloc + myloc + 1 : mxloc + myloc + mzloc + 1]
-                if param.lshear:
-                    shear_offset = 1
-                    deltay = raw_etc[-1]
-                else:
-                    shear_offset = 0
 
-                dx = raw_etc[-3 - shear_offset]
-                dy = raw_etc[-2 - shear_offset]
-                dz = raw_etc[-1 - shear_offset]
+                return (
+                    directory,
+                    procdim,
+                    f_loc,
+                    raw_etc,
+                    x_loc,
+                    y_loc,
+                    z_loc,
+                    time_start,
+                )
+
+            def insert_proc(
+                directory, procdim, f_loc, raw_etc, x_loc, y_loc, z_loc, time_start
+            ):
+                """
+                Copy the data of one processor into its slab of the global
+                array. The slabs overlap in the ghost zones, so the procs
+                are inserted in the order of proc_dirs.
+                """
 
                 if len(proc_dirs) > 1:
                     # Calculate where the local processor will go in
                     # the global array.
-                    #
-                    # Don't overwrite ghost zones of processor to the
-                    # left (and accordingly in y and z direction -- makes
-                    # a difference on the diagonals)
-                    #
-                    # Recall that in NumPy, slicing is NON-INCLUSIVE on
-                    # the right end, ie, x[0:4] will slice all of a
-                    # 4-digit array, not produce an error like in idl.
-
-                    if procdim.ipx == 0:
-                        i0x = 0
-                        i1x = i0x + procdim.mx
-                        i0xloc = 0
-                        i1xloc = procdim.mx
-                    else:
-                        i0x = procdim.ipx * procdim.nx + procdim.nghostx
-                        i1x = i0x + procdim.mx - procdim.nghostx
-                        i0xloc = procdim.nghostx
-                        i1xloc = procdim.mx
-
-                    if procdim.ipy == 0:
-                        i0y = 0
-                        i1y = i0y + procdim.my
-                        i0yloc = 0
-                        i1yloc = procdim.my
-                    else:
-                        i0y = procdim.ipy * procdim.ny + procdim.nghosty
-                        i1y = i0y + procdim.my - procdim.nghosty
-                        i0yloc = procdim.nghosty
-                        i1yloc = procdim.my
-
-                    if procdim.ipz == 0:
-                        i0z = 0
-                        i1z = i0z + procdim.mz
-                        i0zloc = 0
-                        i1zloc = procdim.mz
-                    else:
-                        i0z = procdim.ipz * procdim.nz + procdim.nghostz
-                        i1z = i0z + procdim.mz - procdim.nghostz
-                        i0zloc = procdim.nghostz
-                        i1zloc = procdim.mz
+                    (i0z, i1z, i0zloc, i1zloc), (i0y, i1y, i0yloc, i1yloc), (
+                        i0x, i1x, i0xloc, i1xloc
+                    ) = proc_bounds(procdim, len(proc_dirs))
 
                     x[i0x:i1x] = x_loc[i0xloc:i1xloc]
                     y[i0y:i1y] = y_loc[i0yloc:i1yloc]
@@ -525,15 +760,54 @@ class DataCube(object):
                             ]
                 else:
                     self.f = f_loc
+
+                if not quiet:
+                    print(
+                        "Read data from {0} ({1} of {2}) in {3:.3f} s".format(
+                            directory,
+                            proc_dirs.index(directory) + 1,
+                            len(proc_dirs),
+                            time.time() - time_start,
+                        )
+                    )
+
+                return raw_etc, x_loc, y_loc, z_loc
+
+            if workers is not None and workers > 1 and len(proc_dirs) > 1:
+                from collections import deque
+                from concurrent.futures import ThreadPoolExecutor
+
+                # The files are read in parallel and inserted one after the
+                # other in the order of proc_dirs. At most workers files are
+                # read ahead, so only their data is held besides the array.
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    pending = deque()
+                    for directory in proc_dirs:
+                        pending.append(executor.submit(read_proc, directory))
+                        if len(pending) == workers:
+                            proc_data = pending.popleft().result()
+                            raw_etc, x_loc, y_loc, z_loc = insert_proc(*proc_data)
+                    while pending:
+                        proc_data = pending.popleft().result()
+                        raw_etc, x_loc, y_loc, z_loc = insert_proc(*proc_data)
+            else:
+                for directory in proc_dirs:
+                    raw_etc, x_loc, y_loc, z_loc = insert_proc(*read_proc(directory))
+                if len(proc_dirs) == 1:
                     x = x_loc
                     y = y_loc
                     z = z_loc
-        else:
-            raise NotImplementedError(
-                "IO strategy {} not supported by the Python module.".format(
-                    param.io_strategy
-                )
-            )
+
+            t = raw_etc[0]
+            if param.lshear:
+                shear_offset = 1
+                deltay = raw_etc[-1]
+            else:
+                shear_offset = 0
+
+            dx = raw_etc[-3 - shear_offset]
+            dy = raw_etc[-2 - shear_offset]
+            dz = raw_etc[-1 - shear_offset]
 
         aatest = []
         uutest = []
@@ -544,28 +818,8 @@ class DataCube(object):
                 uutest.append(key)
         if magic is not None:
             """
-            In the functions curl and curl2, the arguments (dx,dy,dz,x,y) are ignored when grid is not None. Nevertheless, we pass them below to take care of the case where the user is trying to read a snapshot without the corresponding grid.dat being present (such as in the test test_read_var).
+            In the function curl, the arguments (dx,dy,dz,x,y) are ignored when grid is not None. Nevertheless, we pass them below to take care of the case where the user is trying to read a snapshot without the corresponding grid.dat being present (such as in the test test_read_var).
             """
-            if "bb" in magic:
-                # Compute the magnetic field before doing trimall.
-                aa = self.f[index.ax - 1 : index.az, ...]
-                self.bb = dtype(
-                    curl(
-                        aa,
-                        dx=dx,
-                        dy=dy,
-                        dz=dz,
-                        x=x,
-                        y=y,
-                        run2D=run2D,
-                        coordinate_system=param.coord_system,
-                        grid=grid,
-                    )
-                )
-                if trimall:
-                    self.bb = self.bb[
-                        :, dim.n1 : dim.n2 + 1, dim.m1 : dim.m2 + 1, dim.l1 : dim.l2 + 1
-                    ]
             if "bbtest" in magic:
                 if lh5:
                     # Compute the magnetic field before doing trimall.
@@ -586,10 +840,8 @@ class DataCube(object):
                                 grid=grid,
                             )
                         )
-                        if trimall:
-                            setattr(self,"bb"+key[2:],bb[
-                                :, dim.n1 : dim.n2 + 1, dim.m1 : dim.m2 + 1, dim.l1 : dim.l2 + 1
-                            ])
+                        if keep is not None:
+                            setattr(self, "bb" + key[2:], bb[(slice(None),) + keep])
                         else:
                             setattr(self,"bb"+key[2:],bb)
                 else:
@@ -612,74 +864,39 @@ class DataCube(object):
                                     grid=grid,
                                 )
                             )
-                            if trimall:
-                                setattr(self,"bb"+key[2:],bb[
-                                    :, dim.n1 : dim.n2 + 1, dim.m1 : dim.m2 + 1, dim.l1 : dim.l2 + 1
-                                ])
+                            if keep is not None:
+                                setattr(
+                                    self, "bb" + key[2:], bb[(slice(None),) + keep]
+                                )
                             else:
                                 setattr(self,"bb"+key[2:],bb)
-            if "jj" in magic:
-                # Compute the electric current field before doing trimall.
-                aa = self.f[index.ax - 1 : index.az, ...]
-                self.jj = dtype(
-                    curl2(
-                        aa,
-                        dx=dx,
-                        dy=dy,
-                        dz=dz,
-                        x=x,
-                        y=y,
-                        coordinate_system=param.coord_system,
-                        grid=grid,
-                    )
-                )
-                if trimall:
-                    self.jj = self.jj[
-                        :, dim.n1 : dim.n2 + 1, dim.m1 : dim.m2 + 1, dim.l1 : dim.l2 + 1
-                    ]
-            if "vort" in magic:
-                # Compute the vorticity field before doing trimall.
-                uu = self.f[index.ux - 1 : index.uz, ...]
-                self.vort = dtype(
-                    curl(
-                        uu,
-                        dx=dx,
-                        dy=dy,
-                        dz=dz,
-                        x=x,
-                        y=y,
-                        run2D=run2D,
-                        coordinate_system=param.coord_system,
-                        grid=grid,
-                    )
-                )
-                if trimall:
-                    if run2D:
-                        if dim.nz == 1:
-                            self.vort = self.vort[
-                                :, dim.m1 : dim.m2 + 1, dim.l1 : dim.l2 + 1
-                            ]
-                        else:
-                            self.vort = self.vort[
-                                :, dim.n1 : dim.n2 + 1, dim.l1 : dim.l2 + 1
-                            ]
-                    else:
-                        self.vort = self.vort[
-                            :,
-                            dim.n1 : dim.n2 + 1,
-                            dim.m1 : dim.m2 + 1,
-                            dim.l1 : dim.l2 + 1,
-                        ]
-
-        # Trim the ghost zones of the global f-array if asked.
-        if trimall:
-            self.x = x[dim.l1 : dim.l2 + 1]
-            self.y = y[dim.m1 : dim.m2 + 1]
-            self.z = z[dim.n1 : dim.n2 + 1]
-            if not run2D:
-                self.f = self.f[
-                    :, dim.n1 : dim.n2 + 1, dim.m1 : dim.m2 + 1, dim.l1 : dim.l2 + 1
-                ]
+            # The other magic quantities are derived on first access,
+            # from the f-array with its ghost zones.
+            self.__derive_magic(
+                magic,
+                index,
+                param,
+                grid,
+                (dx, dy, dz, x, y),
+                run2D,
+                keep,
+                dim,
+                dtype,
+            )
+            if not lazy:
+                for name in list(self.__dict__.get("_derived_fields", {})):
+                    getattr(self, name)
+
+        # Trim the ghost zones of the global f-array if asked, and the
+        # ghost zones read around a region.
+        if keep is not None:
+            self.x = x[keep[2]]
+            self.y = y[keep[1]]
+            self.z = z[keep[0]]
+            if lazy:
+                self.f = self.f.window(*keep)
+            elif not run2D:
+                self.f = self.f[(slice(None),) + keep]
             else:
                 if dim.ny == 1:
                     self.f = self.f[:, dim.n1 : dim.n2 + 1, dim.l1 : dim.l2 + 1]
@@ -706,16 +923,16 @@ class DataCube(object):
                 and "uutest" not in key
             ):
                 value = index.__dict__[key]
-                setattr(self, key, self.f[value - 1, ...])
+                self.__set_field(key, value - 1, lazy)
         # Special treatment for vector quantities.
-        if hasattr(index, "ux"):
-            setattr(self, "uu", self.f[index.ux - 1 : index.uz, ...])
-        if hasattr(index, "ax"):
-            setattr(self, "aa", self.f[index.ax - 1 : index.az, ...])
+        if hasattr(index, "ux") and hasattr(index, "uz"):
+            self.__set_field("uu", slice(index.ux - 1, index.uz), lazy)
+        if hasattr(index, "ax") and hasattr(index, "az"):
+            self.__set_field("aa", slice(index.ax - 1, index.az), lazy)
         if hasattr(index, "uu_sph"):
-            self.uu_sph = self.f[index.uu_sphx - 1 : index.uu_sphz, ...]
+            self.__set_field("uu_sph", slice(index.uu_sphx - 1, index.uu_sphz), lazy)
         if hasattr(index, "bb_sph"):
-            self.bb_sph = self.f[index.bb_sphx - 1 : index.bb_sphz, ...]
+            self.__set_field("bb_sph", slice(index.bb_sphx - 1, index.bb_sphz), lazy)
         # Special treatment for test method vector quantities.
         # Note index 1,2,3,...,0 last vector may be the zero field/flow
         if not lh5:
@@ -724,23 +941,23 @@ class DataCube(object):
                 for j in range(0, naatest):
                     key = "aatest" + str(np.mod(j + 1, naatest))
                     value = index.__dict__["aatest1"] + 3 * j
-                    setattr(self, key, self.f[value - 1 : value + 2, ...])
+                    self.__set_field(key, slice(value - 1, value + 2), lazy)
             if hasattr(index, "uutest1"):
                 nuutest = int(len(uutest) / 3)
                 for j in range(0, nuutest):
                     key = "uutest" + str(np.mod(j + 1, nuutest))
                     value = index.__dict__["uutest"] + 3 * j
-                    setattr(self, key, self.f[value - 1 : value + 2, ...])
+                    self.__set_field(key, slice(value - 1, value + 2), lazy)
         else:
             #Dummy operation to be corrected
             for j in range(int(len(aatest) / 3)):
                 key = aatest[j*3][:-1]
                 value = index.__dict__[aatest[j*3]]
-                setattr(self, key, self.f[value - 1 : value + 2, ...])
+                self.__set_field(key, slice(value - 1, value + 2), lazy)
             for j in range(int(len(uutest) / 3)):
                 key = uutest[j*3][:-1]
                 value = index.__dict__[uutest[j*3]]
-                setattr(self, key, self.f[value - 1 : value + 2, ...])
+                self.__set_field(key, slice(value - 1, value + 2), lazy)
             
 
         self.t = t
@@ -750,10 +967,199 @@ class DataCube(object):
         if param.lshear:
             self.deltay = deltay
 
-        # Do the rest of magic after the trimall (i.e. no additional curl.)
         self.magic = magic
-        if self.magic is not None:
-            self.magic_attributes(param, dtype=dtype)
+
+    def __derive_magic(
+        self, magic, index, param, grid, spacing, run2D, keep, dim, dtype
+    ):
+        """
+        Register the magic quantities known to pencil.calc.derived to be
+        computed from the untrimmed f-array on first access. The untrimmed
+        f-array is released once all of them are computed.
+        """
+
+        from functools import partial
+        from operator import getitem
+        from pencil.calc.derived import DerivedFields, derived_quantities
+
+        f = self.f
+        fields = {}
+        for key in index.__dict__.keys():
+            if (
+                key != "global_gg"
+                and key != "keys"
+                and "aatest" not in key
+                and "uutest" not in key
+            ):
+                fields[key] = partial(getitem, f, index.__dict__[key] - 1)
+        for vector, (first, _, last) in self._vector_components.items():
+            if hasattr(index, first) and hasattr(index, last):
+                fields[vector] = partial(
+                    getitem, f, slice(index.__dict__[first] - 1, index.__dict__[last])
+                )
+
+        dx, dy, dz, x, y = spacing
+        derived = DerivedFields(
+            fields,
+            param=param,
+            grid=grid,
+            dx=dx,
+            dy=dy,
+            dz=dz,
+            x=x,
+            y=y,
+            coordinate_system=param.coord_system,
+            run2D=run2D,
+        )
+        names = [
+            field
+            for field in magic
+            if field in derived_quantities() and field not in fields
+        ]
+        for name in names:
+            if not derived.available(name):
+                raise ValueError(
+                    "cannot compute the magic quantity {0} from {1}.".format(
+                        name, sorted(fields)
+                    )
+                )
+        derived.require(names)
+
+        if keep is not None and run2D:
+            if dim.ny == 1:
+                keep = (keep[0], keep[2])
+            else:
+                keep = (keep[1], keep[2])
+        if names:
+            self._derived = derived
+            self._derived_fields = dict((name, (keep, dtype)) for name in names)
+
+    # Components read for the vector names accepted by variables=[...].
+    _vector_components = {
+        "uu": ("ux", "uy", "uz"),
+        "aa": ("ax", "ay", "az"),
+    }
+
+    def __select_variables(self, keys, variables, magic):
+        """
+        Return the datasets of an HDF5 snapshot needed for the requested
+        variables and magic quantities.
+        """
+
+        wanted = []
+        for name in variables:
+            wanted.extend(self._vector_components.get(name, (name,)))
+        if magic is not None:
+            from pencil.calc.derived import DerivedFields
+
+            available = dict.fromkeys(keys)
+            for vector, components in self._vector_components.items():
+                if all(name in keys for name in components):
+                    available[vector] = None
+            for name in DerivedFields(available).sources(magic):
+                wanted.extend(self._vector_components.get(name, (name,)))
+            if "bbtest" in magic:
+                wanted.extend(key for key in keys if "aatest" in key)
+        for name in wanted:
+            if name not in keys:
+                raise ValueError(
+                    "Variable {0} is not in the snapshot, available are {1}.".format(
+                        name, keys
+                    )
+                )
+
+        return [key for key in keys if key in wanted]
+
+    @staticmethod
+    def __sub_index(index, keys):
+        """
+        Return a copy of index numbering the selected variables 1, 2, ...
+        in their original order.
+        """
+
+        from pencil.read.indices import Index
+
+        sub_index = Index()
+        keys = sorted(keys, key=lambda key: index.__getattribute__(key))
+        for i, key in enumerate(keys):
+            setattr(sub_index, key, i + 1)
+
+        return sub_index
+
+    @staticmethod
+    def __region_box(region, dim, trimall, magic):
+        """
+        Return the box read for a region as (z, y, x) slices, the part of
+        the box which is kept and the ghost zone boundaries (n1, n2),
+        (m1, m2), (l1, l2) within the kept part.
+        """
+
+        if len(region) != 3:
+            raise ValueError("region must be a tuple (z-slice, y-slice, x-slice).")
+        # Magic taking derivatives needs nghost points around the region.
+        from pencil.calc.derived import needs_derivatives
+
+        derivatives = magic is not None and (
+            "bbtest" in magic or needs_derivatives(magic)
+        )
+        box = []
+        keep = []
+        ghosts = []
+        for sl, m, nghost, (i1, i2) in zip(
+            region,
+            (dim.mz, dim.my, dim.mx),
+            (dim.nghostz, dim.nghosty, dim.nghostx),
+            ((dim.n1, dim.n2), (dim.m1, dim.m2), (dim.l1, dim.l2)),
+        ):
+            if sl is None:
+                sl = slice(None)
+            start, stop, step = sl.indices(m)
+            if step != 1 or stop <= start:
+                raise ValueError(
+                    "region slices must be contiguous and not empty, got {0}.".format(
+                        sl
+                    )
+                )
+            if derivatives:
+                box_start = max(start - nghost, 0)
+                box_stop = min(stop + nghost, m)
+            else:
+                box_start, box_stop = start, stop
+            if trimall:
+                start = max(start, i1)
+                stop = min(stop, i2 + 1)
+                if stop <= start:
+                    raise ValueError(
+                        "region {0} lies in the ghost zones.".format(region)
+                    )
+            box.append(slice(box_start, box_stop))
+            keep.append(slice(start - box_start, stop - box_start))
+            ghosts.append(
+                (
+                    min(max(i1 - start, 0), stop - start),
+                    min(max(i2 + 1 - start, 0), stop - start),
+                )
+            )
+
+        return tuple(box), tuple(keep), tuple(ghosts)
+
+    @staticmethod
+    def __sub_grid(grid, box):
+        """
+        Return a copy of grid restricted to the box given as (z, y, x)
+        slices.
+        """
+
+        import copy
+
+        grid = copy.copy(grid)
+        for sl, coords in zip(box, ("z", "y", "x")):
+            for name in (coords, "d" + coords + "_1", "d" + coords + "_tilde"):
+                value = getattr(grid, name, None)
+                if np.ndim(value) == 1:
+                    setattr(grid, name, value[sl])
+
+        return grid
 
     def __natural_sort(self, procs_list):
         """
@@ -766,110 +1172,11 @@ class DataCube(object):
         alphanum_key = lambda key: [convert(c) for c in re.split("([0-9]+)", key)]
         return sorted(procs_list, key=alphanum_key)
 
-    def magic_attributes(self, param, dtype=np.float64):
+    def magic_attributes(self, param=None, dtype=None):
         """
-        Compute some additional 'magic' quantities.
+        Compute the pending 'magic' quantities now instead of on first
+        access. The arguments are kept for backwards compatibility.
         """
 
-        import sys
-
-        for field in self.magic:
-            if field == "rho" and not hasattr(self, "rho"):
-                if hasattr(self, "lnrho"):
-                    setattr(self, "rho", np.exp(self.lnrho))
-                else:
-                    sys.exit("Problem in magic: lnrho is missing")
-
-            if field == "tt" and not hasattr(self, "tt"):
-                if hasattr(self, "lnTT"):
-                    tt = np.exp(self.lnTT)
-                    setattr(self, "tt", tt)
-                else:
-                    if hasattr(self, "ss"):
-                        if hasattr(self, "lnrho"):
-                            lnrho = self.lnrho
-                        elif hasattr(self, "rho"):
-                            lnrho = np.log(self.rho)
-                        else:
-                            sys.exit(
-                                "Problem in magic: missing rho or" + " lnrho variable"
-                            )
-                        cp = param.cp
-                        gamma = param.gamma
-                        cs20 = param.cs0 ** 2
-                        lnrho0 = np.log(param.rho0)
-                        lnTT0 = np.log(cs20 / (cp * (gamma - 1.0)))
-                        lnTT = (
-                            lnTT0
-                            + gamma / cp * self.ss
-                            + (gamma - 1.0) * (lnrho - lnrho0)
-                        )
-                        setattr(self, "tt", dtype(np.exp(lnTT)))
-                    else:
-                        sys.exit("Problem in magic: ss is missing ")
-
-            if field == "ss" and not hasattr(self, "ss"):
-                cp = param.cp
-                gamma = param.gamma
-                cs20 = param.cs0 ** 2
-                lnrho0 = np.log(param.rho0)
-                lnTT0 = np.log(cs20 / (cp * (gamma - 1.0)))
-                if hasattr(self, "lnTT"):
-                    setattr(
-                        self,
-                        "ss",
-                        dtype(
-                            cp
-                            / gamma
-                            * (
-                                self.lnTT
-                                - lnTT0
-                                - (gamma - 1.0) * (self.lnrho - lnrho0)
-                            )
-                        ),
-                    )
-                elif hasattr(self, "tt"):
-                    setattr(
-                        self,
-                        "ss",
-                        dtype(
-                            cp
-                            / gamma
-                            * (
-                                np.log(self.tt)
-                                - lnTT0
-                                - (gamma - 1.0) * (self.lnrho - lnrho0)
-                            )
-                        ),
-                    )
-                else:
-                    sys.exit("Problem in magic: missing lnTT or tt")
-
-            if field == "pp" and not hasattr(self, "pp"):
-                cp = param.cp
-                gamma = param.gamma
-                cv = cp / gamma
-                cs20 = param.cs0 ** 2
-                lnrho0 = np.log(param.rho0)
-                rho0 = param.rho0
-                if hasattr(self, "lnrho"):
-                    lnrho = self.lnrho
-                elif hasattr(self, "rho"):
-                    lnrho = np.log(self.rho)
-                else:
-                    sys.exit("pb in magic: missing rho or lnrho variable")
-                if hasattr(self, "ss"):
-                    setattr(
-                        self,
-                        "pp",
-                        dtype(
-                            (rho0 * cs20 / gamma)
-                            * np.exp(gamma * (self.ss + lnrho - lnrho0))
-                        ),
-                    )
-                elif hasattr(self, "lntt"):
-                    setattr(self, "pp", dtype((cp - cv) * np.exp(self.lnTT + lnrho)))
-                elif hasattr(self, "tt"):
-                    setattr(self, "pp", dtype((cp - cv) * self.TT * np.exp(lnrho)))
-                else:
-                    sys.exit("Problem in magic: missing ss or lntt or tt")
+        for field in list(self.__dict__.get("_derived_fields", {})):
+            getattr(self, field)
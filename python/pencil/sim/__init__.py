@@ -9,3 +9,4 @@ from .get import *
 from .group import *
 from .sort import *
 from .remesh import *
+from .catalog import catalog, __Catalog__
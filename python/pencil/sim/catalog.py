@@ -0,0 +1,414 @@
+#
+# catalog.py
+#
+# On-disk index of the simulations below a directory.
+#
+"""
+Contains the catalog class, an SQLite index of the simulations below a root
+directory. Parameters of all simulations can be filtered, sorted and grouped
+without creating a simulation object for each of them.
+"""
+
+import os
+from os.path import join, exists, basename
+
+# Files whose modification times decide if a simulation is read again. For
+# time_series.dat only its existence matters, it grows while a run is going.
+TRACKED_FILES = [
+    "start.in",
+    "run.in",
+    "src/cparam.local",
+    "src/Makefile.local",
+    "data/param.nml",
+    "data/param2.nml",
+    "data/dim.dat",
+    "data/grid.dat",
+    "data/proc0/grid.dat",
+    "data/grid.h5",
+    "data/allprocs/grid.h5",
+    "pc/sim.dill",
+]
+
+OPERATORS = ["==", "!=", "<", "<=", ">", ">="]
+
+
+def catalog(*args, **kwargs):
+    """
+    catalog(path_root=".", depth=1, db_file=None, n_proc=1, show_hidden=False,
+            refresh=True, quiet=False)
+
+    Generate catalog object, an SQLite index of the simulations below
+    path_root. It stores per simulation the name, hidden flag, whether it
+    has started, the parameters of param.nml, the grid sizes and dim, and
+    the modification times of the files they are read from. A refresh only
+    reads the simulations again whose files changed since the last one.
+
+    Parameters
+    ----------
+    path_root : string
+        Base directory where to look for simulations.
+
+    depth : int
+        Depth of searching for simulations, default is 1,
+        i.e. only one level deeper directories will be scanned.
+
+    db_file : string
+        SQLite file of the index, default is path_root/pc_catalog.db.
+
+    n_proc : int
+        Number of processes reading changed simulations.
+
+    show_hidden : bool
+        Include hidden simulations in queries, default is False.
+
+    refresh : bool
+        Update the index on creation, default is True.
+
+    quiet : bool
+        Switches out the output of the function. Default: False.
+
+    Methods
+    -------
+    self.refresh:  rescan the directories and read changed simulations
+    self.paths:    paths of all simulations in the index
+    self.value:    parameter value of one simulation
+    self.filter:   paths of simulations with a parameter condition
+    self.sort:     paths sorted by a parameter
+    self.group:    paths grouped by a parameter
+    self.load:     simulation objects for paths
+
+    Examples
+    --------
+    >>> cat = pc.sim.catalog("runs", n_proc=8)
+    >>> paths = cat.filter("nx", 256, op=">=")
+    >>> groups = cat.group("nu", paths=paths)
+    >>> sims = cat.load(groups["0.001"])
+    """
+
+    return __Catalog__(*args, **kwargs)
+
+
+class __Catalog__(object):
+    """
+    Catalog object.
+    """
+
+    def __init__(
+        self,
+        path_root=".",
+        depth=1,
+        db_file=None,
+        n_proc=1,
+        show_hidden=False,
+        refresh=True,
+        quiet=False,
+    ):
+        import sqlite3
+
+        self.path_root = os.path.abspath(path_root)
+        self.depth = depth
+        if db_file is None:
+            db_file = join(self.path_root, "pc_catalog.db")
+        self.db_file = db_file
+        self.n_proc = n_proc
+        self.show_hidden = show_hidden
+        self.db = sqlite3.connect(db_file)
+        with self.db:
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS sims (path TEXT PRIMARY KEY, "
+                "name TEXT, hidden INTEGER, started INTEGER, signature TEXT)"
+            )
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS params (path TEXT, key TEXT, "
+                "value TEXT, num REAL, PRIMARY KEY (path, key))"
+            )
+            self.db.execute(
+                "CREATE INDEX IF NOT EXISTS params_key ON params (key, num)"
+            )
+        if refresh:
+            self.refresh(quiet=quiet)
+
+    def refresh(self, quiet=True):
+        """
+        refresh(quiet=True)
+
+        Find the simulations below path_root and read those that are new or
+        whose tracked files changed. Simulations no longer found are removed.
+        Directories are checked by a thread pool, simulations are read by
+        n_proc processes.
+
+        Returns
+        -------
+        List of the paths read again.
+        """
+
+        import json
+        from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+        from pencil.io import walklevel
+
+        candidates = [self.path_root]
+        for path, dirs in walklevel(self.path_root, self.depth):
+            candidates += [join(path, sdir) for sdir in dirs]
+        with ThreadPoolExecutor() as pool:
+            signatures = list(pool.map(_signature, candidates))
+        found = dict((p, s) for p, s in zip(candidates, signatures) if s is not None)
+        known = dict(self.db.execute("SELECT path, signature FROM sims"))
+        changed = [p for p in found if known.get(p) != json.dumps(found[p])]
+        removed = [p for p in known if p not in found]
+        if not quiet:
+            print(
+                "~ Found {} simulations, reading {} new or changed..".format(
+                    len(found), len(changed)
+                )
+            )
+        if self.n_proc > 1 and len(changed) > 1:
+            with ProcessPoolExecutor(max_workers=self.n_proc) as pool:
+                scans = list(pool.map(_scan_sim, changed))
+        else:
+            scans = [_scan_sim(path) for path in changed]
+        with self.db:
+            for path in removed + changed:
+                self.db.execute("DELETE FROM sims WHERE path = ?", (path,))
+                self.db.execute("DELETE FROM params WHERE path = ?", (path,))
+            for path, (values, hidden) in zip(changed, scans):
+                self.db.execute(
+                    "INSERT INTO sims VALUES (?, ?, ?, ?, ?)",
+                    (
+                        path,
+                        basename(path),
+                        hidden,
+                        found[path]["data/time_series.dat"],
+                        json.dumps(found[path]),
+                    ),
+                )
+                self.db.executemany(
+                    "INSERT INTO params VALUES (?, ?, ?, ?)",
+                    [(path, key) + _encode(value) for key, value in values.items()],
+                )
+        return changed
+
+    def paths(self, only_started=False):
+        """
+        paths(only_started=False)
+
+        Paths of all simulations in the catalog, sorted by name.
+        """
+
+        from pencil.math import natural_sort
+
+        query = "SELECT path FROM sims WHERE 1"
+        if not self.show_hidden:
+            query += " AND NOT hidden"
+        if only_started:
+            query += " AND started"
+        return natural_sort([row[0] for row in self.db.execute(query)])
+
+    def value(self, path, key):
+        """
+        value(path, key)
+
+        Value of parameter key of the simulation in path, or None.
+        """
+
+        import json
+
+        row = self.db.execute(
+            "SELECT value FROM params WHERE path = ? AND key = ?",
+            (os.path.abspath(path), key),
+        ).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0])
+
+    def filter(self, key, value, op="==", paths=None, only_started=False):
+        """
+        filter(key, value, op="==", paths=None, only_started=False)
+
+        Paths of the simulations whose parameter key compares to value.
+
+        Parameters
+        ----------
+        key : string
+            Parameter, e.g. 'nu', 'nx' or 'Lx'.
+
+        value : number, string or list
+            Value compared to. Numbers are compared numerically, everything
+            else by equality of the stored value.
+
+        op : string
+            One of '==', '!=', '<', '<=', '>', '>='.
+
+        paths : list
+            Restrict to these paths, e.g. the result of another query.
+
+        only_started : bool
+            Only return simulations that have already started.
+        """
+
+        if not op in OPERATORS:
+            raise ValueError("op has to be one of " + ", ".join(OPERATORS))
+        text, num = _encode(value)
+        if num is None:
+            if not op in ["==", "!="]:
+                raise ValueError(op + " needs a number to compare to")
+            rows = self._select(key, "value " + op + " ?", (text,), paths, only_started)
+        else:
+            rows = self._select(key, "num " + op + " ?", (num,), paths, only_started)
+        return [row[0] for row in rows]
+
+    def sort(self, key, paths=None, only_started=False, reverse=False):
+        """
+        sort(key, paths=None, only_started=False, reverse=False)
+
+        Paths of the simulations sorted by parameter key, numerically where
+        possible. Simulations without the parameter are left out.
+        """
+
+        order = " ORDER BY num {0}, value {0}, params.path".format(
+            "DESC" if reverse else "ASC"
+        )
+        rows = self._select(key, "1", (), paths, only_started, order)
+        return [row[0] for row in rows]
+
+    def group(self, key, paths=None, only_started=False, reverse=False):
+        """
+        group(key, paths=None, only_started=False, reverse=False)
+
+        Group the simulations by parameter key, as pc.sim.group does.
+
+        Returns
+        -------
+        Dictionary with keywords are the group entries, sorted by value, and
+        values are lists of paths in that group.
+        """
+
+        import json
+        from collections import OrderedDict
+
+        order = " ORDER BY num {0}, value {0}, params.path".format(
+            "DESC" if reverse else "ASC"
+        )
+        groups = OrderedDict()
+        for path, value in self._select(key, "1", (), paths, only_started, order):
+            groups.setdefault(str(json.loads(value)), []).append(path)
+        return groups
+
+    def load(self, paths=None, quiet=True):
+        """
+        load(paths=None, quiet=True)
+
+        Simulation objects of paths, default all paths in the catalog.
+        """
+
+        from pencil.sim import get
+
+        if paths is None:
+            paths = self.paths()
+        return [get(path, quiet=quiet) for path in paths]
+
+    def close(self):
+        """Close the database connection."""
+        self.db.close()
+
+    def _select(self, key, condition, args, paths, only_started, order=""):
+        query = (
+            "SELECT params.path, params.value FROM params JOIN sims "
+            "ON params.path = sims.path WHERE key = ? AND " + condition
+        )
+        if not self.show_hidden:
+            query += " AND NOT hidden"
+        if only_started:
+            query += " AND started"
+        rows = self.db.execute(query + order, (key,) + tuple(args)).fetchall()
+        if paths is not None:
+            paths = set(os.path.abspath(path) for path in paths)
+            rows = [row for row in rows if row[0] in paths]
+        return rows
+
+
+def _signature(path):
+    """Modification times of the tracked files if path is a simulation."""
+    from pencil import is_sim_dir
+
+    if basename(path).startswith(".") or not is_sim_dir(path):
+        return None
+    signature = dict()
+    for filename in TRACKED_FILES:
+        try:
+            signature[filename] = os.stat(join(path, filename)).st_mtime
+        except OSError:
+            continue
+    signature["data/time_series.dat"] = exists(join(path, "data", "time_series.dat"))
+    return signature
+
+
+def _encode(value):
+    """Stored text and number, or None, of a parameter value."""
+    import json
+    import numpy as np
+
+    if isinstance(value, np.ndarray):
+        value = value.tolist()
+    elif isinstance(value, np.generic):
+        value = value.item()
+    num = None
+    if isinstance(value, (bool, int, float)):
+        num = float(value)
+    return json.dumps(value), num
+
+
+def _scan_sim(path):
+    """Read the parameters, grid and dim of the simulation in path, as
+    __Simulation__.update does, and its hidden flag."""
+    from pencil.read import param, grid, dim
+
+    datadir = join(path, "data")
+    values = dict()
+    try:
+        par = param(datadir=datadir, quiet=True, conflicts_quiet=True)
+        for key in dir(par):
+            if key.startswith("_") or key == "read":
+                continue
+            item = getattr(par, key)
+            if type(item) in [bool, list, float, int, str]:
+                values[key] = item
+            else:
+                # nested param objects
+                for subkey in dir(item):
+                    if subkey.startswith("_") or subkey == "read":
+                        continue
+                    if type(getattr(item, subkey)) in [bool, list, float, int, str]:
+                        values[key + "." + subkey] = getattr(item, subkey)
+    except Exception:
+        pass
+    if not exists(join(datadir, "dim.dat")):
+        return values, _hidden(path)
+    try:
+        dims = dim(datadir=datadir)
+        for key in dir(dims):
+            if key.startswith("_") or key in values:
+                continue
+            if type(getattr(dims, key)) in [bool, float, int, str]:
+                values[key] = getattr(dims, key)
+    except Exception:
+        pass
+    try:
+        gd = grid(datadir=datadir, trim=True, quiet=True)
+        for key in ["Lx", "Ly", "Lz", "dx", "dy", "dz"]:
+            values[key] = getattr(gd, key)
+            values[key.lower()] = getattr(gd, key)
+    except Exception:
+        pass
+    return values, _hidden(path)
+
+
+def _hidden(path):
+    """Hidden flag of the simulation object exported to path/pc."""
+    from pencil.io import load
+
+    if exists(join(path, "pc", "sim.dill")):
+        try:
+            return bool(load("sim", folder=join(path, "pc")).hidden)
+        except Exception:
+            pass
+    return False
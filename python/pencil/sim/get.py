@@ -70,6 +70,9 @@ def get_sims(path_root=".", depth=0, unhide_all=True, quiet=False):
 
     quiet : bool
         Switches out the output of the function. Default: False.
+
+    For many simulations, pc.sim.catalog keeps an index of their parameters
+    on disk, that is only updated for changed simulations.
     """
     from os.path import join, basename
     import numpy as np
@@ -5,13 +5,13 @@ copying the base simulation files, existing start output files.
 
 uses:
 local_remesh to apply the interpolation onto a variable array
+remesh_operators to tabulate the interpolation weights once per axis
 get_dstgrid to derive the new grid layout
 src2dst_remesh to create the new simulation object and files
 """
 
 from fileinput import input
 import numpy as np
-from scipy.interpolate import interp1d
 import subprocess as sub
 from sys import stdout
 
@@ -19,9 +19,25 @@ from pencil.math.derivatives import grad
 from pencil.io import open_h5, group_h5, dataset_h5
 
 
-def local_remesh(var, xsrc, ysrc, zsrc, xdst, ydst, zdst, quiet=True):
+def local_remesh(
+    var,
+    xsrc,
+    ysrc,
+    zsrc,
+    xdst,
+    ydst,
+    zdst,
+    quiet=True,
+    kind="linear",
+    periodic=[False, False, False],
+    nghost=3,
+    operators=None,
+    n_proc=1,
+):
     """
-    local_remesh(var, xsrc, ysrc, zsrc, xdst, ydst, zdst, quiet=True)
+    local_remesh(var, xsrc, ysrc, zsrc, xdst, ydst, zdst, quiet=True,
+                 kind='linear', periodic=[False, False, False], nghost=3,
+                 operators=None, n_proc=1)
 
     Parameters
     ----------
@@ -36,31 +52,275 @@ def local_remesh(var, xsrc, ysrc, zsrc, xdst, ydst, zdst, quiet=True):
 
     quiet : bool
       Flag for switching of output.
+
+    kind : string
+      Interpolation 'linear', 'cubic', 'spectral' or 'conservative',
+      see remesh_operator.
+
+    periodic : list of bool
+      Periodicity of the x, y and z axes, e.g. param.lperi.
+
+    nghost : int
+      Number of ghost zones of the source grid.
+
+    operators : tuple
+      Operators from remesh_operators, which are computed if None.
+
+    n_proc : int
+      Number of processes remeshing slabs of var.
     """
 
-    tmp = var.copy()
-    if not quiet:
-        print("x", tmp.shape, xsrc.min(), xsrc.max(), xdst.min(), xdst.max())
-        print("x", tmp.shape, xsrc.shape, xdst.shape)
-    if not xsrc.size == xdst.size:
-        interpx = interp1d(xsrc, tmp, axis=-1, fill_value="extrapolate")
-        tmp = interpx(xdst)
-    if not quiet:
-        print("y", tmp.shape, ysrc.min(), ysrc.max(), ydst.min(), ydst.max())
-        print("y", tmp.shape, ysrc.shape, ydst.shape)
-    if not ysrc.size == ydst.size:
-        interpy = interp1d(ysrc, tmp, axis=-2, fill_value="extrapolate")
-        tmp = interpy(ydst)
+    from concurrent.futures import ProcessPoolExecutor
+
+    if operators is None:
+        operators = remesh_operators(
+            xsrc,
+            ysrc,
+            zsrc,
+            xdst,
+            ydst,
+            zdst,
+            kind=kind,
+            periodic=periodic,
+            nghost=nghost,
+        )
     if not quiet:
-        print("z", tmp.shape, zsrc.min(), zsrc.max(), zdst.min(), zdst.max())
-        print("z", tmp.shape, zsrc.shape, zdst.shape)
-    if not zsrc.size == zdst.size:
-        interpz = interp1d(zsrc, tmp, axis=-3, fill_value="extrapolate")
-        tmp = interpz(zdst)
+        for axis, src, dst in zip("xyz", (xsrc, ysrc, zsrc), (xdst, ydst, zdst)):
+            print(axis, var.shape, np.min(src), np.max(src), np.min(dst), np.max(dst))
+            print(axis, var.shape, np.shape(src), np.shape(dst))
+
+    shape = [np.size(zdst), np.size(ydst), np.size(xdst)]
+    if n_proc == 1:
+        return apply_remesh(np.asarray(var), operators)
+
+    # Slabs of the destination along z, each with the source planes it needs.
+    tmp = np.zeros(shape)
+    boxes = [
+        (slice(iz[0], iz[-1] + 1), slice(None), slice(None))
+        for iz in np.array_split(np.arange(shape[0]), min(shape[0], 4 * n_proc))
+    ]
+    with ProcessPoolExecutor(max_workers=n_proc) as executor:
+        futures = []
+        for box in boxes:
+            sub_operators, src_box = remesh_box(operators, box)
+            futures.append(
+                executor.submit(apply_remesh, np.asarray(var[src_box]), sub_operators)
+            )
+        for box, future in zip(boxes, futures):
+            tmp[box] = future.result()
 
     return tmp
 
 
+def remesh_operator(src, dst, kind="linear", periodic=False, nghost=3):
+    """
+    remesh_operator(src, dst, kind='linear', periodic=False, nghost=3)
+
+    Return the sparse matrix which interpolates data on the coordinates src
+    to the coordinates dst along one axis.
+
+    Parameters
+    ----------
+    src, dst : ndarrays
+        Increasing source and destination coordinates with ghost zones.
+
+    kind : string
+        'linear' or 'cubic' Lagrange interpolation, which extrapolates
+        beyond src, 'spectral' trigonometric interpolation of a periodic
+        equidistant axis, or 'conservative' averages over the overlapping
+        cells, which conserve the integral.
+
+    periodic : bool
+        The axis is periodic, needed for 'spectral'.
+
+    nghost : int
+        Number of ghost zones of src, which 'spectral' does not sample.
+
+    Returns
+    -------
+    scipy.sparse.csr_matrix of shape (len(dst), len(src)).
+    """
+
+    from scipy import sparse
+
+    src = np.asarray(src, dtype=np.float64)
+    dst = np.asarray(dst, dtype=np.float64)
+    nsrc, ndst = src.size, dst.size
+    if nsrc == 1:
+        return sparse.csr_matrix(np.ones((ndst, 1)))
+
+    if kind == "linear" or (kind == "cubic" and nsrc < 4):
+        j = np.clip(np.searchsorted(src, dst) - 1, 0, nsrc - 2)
+        w = (dst - src[j]) / (src[j + 1] - src[j])
+        cols = np.stack([j, j + 1])
+        weights = np.stack([1 - w, w])
+    elif kind == "cubic":
+        # Lagrange polynomials through the four nearest points.
+        j = np.clip(np.searchsorted(src, dst) - 2, 0, nsrc - 4)
+        cols = j + np.arange(4)[:, np.newaxis]
+        weights = np.ones((4, ndst))
+        for a in range(4):
+            for b in range(4):
+                if a != b:
+                    weights[a] *= (dst - src[cols[b]]) / (src[cols[a]] - src[cols[b]])
+    elif kind == "spectral":
+        if not periodic:
+            raise ValueError(
+                "remesh_operator: spectral interpolation needs a periodic axis."
+            )
+        n = nsrc - 2 * nghost
+        cols = nghost + np.arange(n)
+        length = n * (src[nghost + 1] - src[nghost])
+        half = np.pi * (dst[:, np.newaxis] - src[cols]) / length
+        with np.errstate(divide="ignore", invalid="ignore"):
+            # Dirichlet kernel, the Nyquist mode of even n as a cosine.
+            if n % 2:
+                w = np.sin(n * half) / (n * np.sin(half))
+            else:
+                w = np.sin(n * half) / (n * np.tan(half))
+        w[np.abs(np.sin(half)) < 1e-12] = 1.0
+        return sparse.csr_matrix(
+            (w.ravel(), np.tile(cols, ndst), np.arange(ndst + 1) * n),
+            shape=(ndst, nsrc),
+        )
+    elif kind == "conservative":
+        def edges(x):
+            return np.concatenate(
+                [
+                    [1.5 * x[0] - 0.5 * x[1]],
+                    0.5 * (x[1:] + x[:-1]),
+                    [1.5 * x[-1] - 0.5 * x[-2]],
+                ]
+            )
+
+        if ndst == 1:
+            dst_edges = np.array([src[0], src[-1]])
+        else:
+            dst_edges = edges(dst)
+        src_edges = edges(src)
+        j0 = np.searchsorted(src_edges, dst_edges[:-1], "right") - 1
+        j1 = np.searchsorted(src_edges, dst_edges[1:], "left") - 1
+        j0, j1 = np.clip(j0, 0, nsrc - 1), np.clip(j1, 0, nsrc - 1)
+        cols = np.minimum(j0 + np.arange(np.max(j1 - j0) + 1)[:, np.newaxis], j1)
+        weights = np.clip(
+            np.minimum(dst_edges[1:], src_edges[cols + 1])
+            - np.maximum(dst_edges[:-1], src_edges[cols]),
+            0,
+            None,
+        )
+        # Repeated columns at the end of short rows add nothing.
+        weights[1:][cols[1:] == cols[:-1]] = 0
+        covered = weights.sum(axis=0)
+        outside = covered == 0
+        weights[0, outside] = 1
+        covered[outside] = 1
+        weights /= covered
+    else:
+        raise ValueError("remesh_operator: unknown kind {0}.".format(kind))
+
+    rows = np.broadcast_to(np.arange(ndst), cols.shape)
+    return sparse.csr_matrix(
+        (weights.ravel(), (rows.ravel(), cols.ravel())), shape=(ndst, nsrc)
+    )
+
+
+def remesh_operators(
+    xsrc,
+    ysrc,
+    zsrc,
+    xdst,
+    ydst,
+    zdst,
+    kind="linear",
+    periodic=[False, False, False],
+    nghost=3,
+):
+    """
+    remesh_operators(xsrc, ysrc, zsrc, xdst, ydst, zdst, kind='linear',
+                     periodic=[False, False, False], nghost=3)
+
+    Return the operators of remesh_operator for the z, y and x axes, which
+    are computed once and applied to all variables and chunks. Axes whose
+    size does not change are not interpolated and have the operator None.
+    """
+
+    operators = []
+    for src, dst, lperi in zip(
+        (zsrc, ysrc, xsrc), (zdst, ydst, xdst), periodic[::-1]
+    ):
+        if np.size(src) == np.size(dst):
+            operators.append(None)
+        else:
+            operators.append(
+                remesh_operator(
+                    np.asarray(src),
+                    np.asarray(dst),
+                    kind=kind,
+                    periodic=lperi,
+                    nghost=nghost,
+                )
+            )
+
+    return tuple(operators)
+
+
+def remesh_box(operators, box):
+    """
+    remesh_box(operators, box)
+
+    Return the operators restricted to the destination box, a tuple of
+    (z, y, x) slices, and the box of source data they act on, which
+    includes the halo of the interpolation stencils.
+    """
+
+    sub_operators = []
+    src_box = []
+    for op, sl in zip(operators, box):
+        if op is None:
+            sub_operators.append(None)
+            src_box.append(sl)
+            continue
+        rows = op[sl]
+        cols = np.nonzero(rows.getnnz(axis=0))[0]
+        sub_operators.append(rows[:, cols[0] : cols[-1] + 1])
+        src_box.append(slice(cols[0], cols[-1] + 1))
+
+    return tuple(sub_operators), tuple(src_box)
+
+
+def apply_remesh(var, operators):
+    """
+    apply_remesh(var, operators)
+
+    Apply the (z, y, x) operators one axis after the other to var of shape
+    [..., mz, my, mx]. Axes with the operator None are left unchanged.
+    """
+
+    tmp = var
+    for axis, op in zip((-1, -2, -3), operators[::-1]):
+        if op is None:
+            continue
+        moved = np.moveaxis(tmp, axis, 0)
+        tmp = op @ moved.reshape(moved.shape[0], -1)
+        tmp = np.moveaxis(tmp.reshape((op.shape[0],) + moved.shape[1:]), 0, axis)
+
+    return np.asarray(tmp, dtype=np.result_type(var, np.float64))
+
+
+def _remesh_h5_chunk(file_name, key, src_box, operators):
+    """
+    Read a box of the source variable key and remesh it.
+    Module level function, so that it can run in worker processes.
+    """
+
+    import h5py
+
+    with h5py.File(file_name, "r") as srch5:
+        var = srch5["data"][key][src_box]
+
+    return apply_remesh(var, operators)
+
+
 def get_dstgrid(
     srch5,
     srcpar,
@@ -278,6 +538,8 @@ def src2dst_remesh(
     size=1,
     rank=0,
     comm=None,
+    kind="linear",
+    n_proc=1,
 ):
     """
     src2dst_remesh(src, dst, h5in='var.h5', h5out='var.h5', multxyz=[2, 2, 2],
@@ -288,7 +550,7 @@ def src2dst_remesh(
                    rename_submit_script=False, MBmin=5.0, ncpus=[1, 1, 1],
                    start_optionals=False, hostfile=None, submit_new=False,
                    chunksize=1000.0, lfs=False,  MB=1, count=1, size=1,
-                   rank=0, comm=None)
+                   rank=0, comm=None, kind='linear', n_proc=1)
 
     Parameters
     ----------
@@ -387,12 +649,20 @@ def src2dst_remesh(
 
     comm :
         MPI library calls
+
+    kind : string
+        Interpolation 'linear', 'cubic', 'spectral' or 'conservative',
+        see remesh_operator.
+
+    n_proc : int
+        Number of local processes remeshing the chunks of each MPI rank.
     """
 
     import h5py
     import os
     from os.path import join, abspath
     import time
+    from concurrent.futures import ProcessPoolExecutor
 
     from pencil import read
     from pencil.io import mkdir
@@ -621,14 +891,24 @@ def src2dst_remesh(
             )
             dstchunksize = 8 * nx * ny * nz / 1024 * 1024
             lchunks = False
+            # Interpolation weights along each axis, shared by all variables
+            # and chunks.
+            operators = remesh_operators(
+                srch5["grid/x"][()],
+                srch5["grid/y"][()],
+                srch5["grid/z"][()],
+                dsth5["grid/x"][()],
+                dsth5["grid/y"][()],
+                dsth5["grid/z"][()],
+                kind=kind,
+                periodic=srcsim.param.lperi,
+                nghost=srcghost,
+            )
             if dstchunksize > chunksize:
                 lchunks = True
                 nchunks = cpu_optimal(nx, ny, nz, mvar=1, maux=0, MBmin=chunksize)[1]
                 if rank == 0 or rank == size - 1:
                     print("nchunks {}".format(nchunks))
-                indx = np.array_split(np.arange(nx) + dstghost, nchunks[0])
-                indy = np.array_split(np.arange(ny) + dstghost, nchunks[1])
-                indz = np.array_split(np.arange(nz) + dstghost, nchunks[2])
                 mx, my, mz = (
                     dsth5["settings"]["mx"][0],
                     dsth5["settings"]["my"][0],
@@ -638,13 +918,23 @@ def src2dst_remesh(
                     if rank == 0 or rank == size - 1:
                         print("nx {}, ny {}, nz {}".format(nx, ny, nz))
                         print("mx {}, my {}, mz {}".format(mx, my, mz))
+                # Each chunk of the destination, ghost zones included, is
+                # computed from the source box under its stencils. With MPI
+                # the chunks are shared out between the ranks.
+                boxes = [
+                    tuple(slice(ind[0], ind[-1] + 1) for ind in (iz, iy, ix))
+                    for iz in np.array_split(np.arange(mz), nchunks[2])
+                    for iy in np.array_split(np.arange(my), nchunks[1])
+                    for ix in np.array_split(np.arange(mx), nchunks[0])
+                ][rank::size]
+                chunks = [remesh_box(operators, box) for box in boxes]
             group = group_h5(dsth5, "data", status="w")
             for key in srch5["data"].keys():
                 if rank == 0 or rank == size - 1:
                     print("remeshing " + key)
                 if not lchunks:
                     var = local_remesh(
-                        srch5["data"][key][()],
+                        srch5["data"][key],
                         srch5["grid"]["x"],
                         srch5["grid"]["y"],
                         srch5["grid"]["z"],
@@ -652,6 +942,8 @@ def src2dst_remesh(
                         dsth5["grid"]["y"],
                         dsth5["grid"]["z"],
                         quiet=quiet,
+                        operators=operators,
+                        n_proc=n_proc,
                     )
                     if rank == 0 or rank == size - 1:
                         print("writing " + key + " shape {}".format(var.shape))
@@ -669,110 +961,26 @@ def src2dst_remesh(
                     )
                     if rank == 0 or rank == size - 1:
                         print("writing " + key + " shape {}".format([mz, my, mx]))
-                    for iz in range(nchunks[2]):
-                        n1, n2 = indz[iz][0] - dstghost, indz[iz][-1] + dstghost
-                        srcn1 = np.max(
-                            np.where(srch5["grid/z"][()] < dsth5["grid/z"][n1])
+                    if n_proc > 1:
+                        executor = ProcessPoolExecutor(max_workers=n_proc)
+                        results = executor.map(
+                            _remesh_h5_chunk,
+                            [join(srcsim.path, srcdatadir, h5in)] * len(chunks),
+                            [key] * len(chunks),
+                            [src_box for _, src_box in chunks],
+                            [sub_operators for sub_operators, _ in chunks],
                         )
-                        srcn2 = np.min(
-                            np.where(srch5["grid/z"][()] > dsth5["grid/z"][n2])
+                    else:
+                        results = (
+                            apply_remesh(srch5["data"][key][src_box], sub_operators)
+                            for sub_operators, src_box in chunks
                         )
-                        n1out = n1 + dstghost
-                        n2out = n2 - dstghost + 1
-                        varn1 = dstghost
-                        varn2 = -dstghost
-                        if iz == 0:
-                            n1out = 0
-                            varn1 = 0
-                        if iz == nchunks[2] - 1:
-                            n2out = n2 + 1
-                            varn2 = n2 + 1
+                    for box, var in zip(boxes, results):
                         if not quiet:
-                            print(
-                                "n1 {}, n2 {}, srcn1 {}, srcn2 {}".format(
-                                    n1, n2, srcn1, srcn2
-                                )
-                            )
-                        for iy in range(nchunks[1]):
-                            m1, m2 = indy[iy][0] - dstghost, indy[iy][-1] + dstghost
-                            srcm1 = np.max(
-                                np.where(srch5["grid/y"][()] < dsth5["grid/y"][m1])
-                            )
-                            srcm2 = np.min(
-                                np.where(srch5["grid/y"][()] > dsth5["grid/y"][m2])
-                            )
-                            m1out = m1 + dstghost
-                            m2out = m2 - dstghost + 1
-                            varm1 = dstghost
-                            varm2 = -dstghost
-                            if iy == 0:
-                                m1out = 0
-                                varm1 = 0
-                            if iy == nchunks[1] - 1:
-                                m2out = m2 + 1
-                                varm2 = m2 + 1
-                            if not quiet:
-                                print(
-                                    "m1 {}, m2 {}, srcm1 {}, srcm2 {}".format(
-                                        m1, m2, srcm1, srcm2
-                                    )
-                                )
-                            for ix in range(nchunks[0]):
-                                l1, l2 = indx[ix][0] - dstghost, indx[ix][-1] + dstghost
-                                srcl1 = np.max(
-                                    np.where(srch5["grid/x"][()] < dsth5["grid/x"][l1])
-                                )
-                                srcl2 = np.min(
-                                    np.where(srch5["grid/x"][()] > dsth5["grid/x"][l2])
-                                )
-                                l1out = l1 + dstghost
-                                l2out = l2 - dstghost + 1
-                                varl1 = dstghost
-                                varl2 = -dstghost
-                                if ix == 0:
-                                    l1out = 0
-                                    varl1 = 0
-                                if ix == nchunks[0] - 1:
-                                    l2out = l2 + 1
-                                    varl2 = l2 + 1
-                                if not quiet:
-                                    print(
-                                        "l1 {}, l2 {}, srcl1 {}, srcl2 {}".format(
-                                            l1, l2, srcl1, srcl2
-                                        )
-                                    )
-                                if not quiet:
-                                    print(
-                                        "remeshing "
-                                        + key
-                                        + " chunk {}".format([iz, iy, ix])
-                                    )
-
-                                var = local_remesh(
-                                    srch5["data"][key][
-                                        srcn1 : srcn2 + 1,
-                                        srcm1 : srcm2 + 1,
-                                        srcl1 : srcl2 + 1,
-                                    ],
-                                    srch5["grid"]["x"][srcl1 : srcl2 + 1],
-                                    srch5["grid"]["y"][srcm1 : srcm2 + 1],
-                                    srch5["grid"]["z"][srcn1 : srcn2 + 1],
-                                    dsth5["grid"]["x"][l1 : l2 + 1],
-                                    dsth5["grid"]["y"][m1 : m2 + 1],
-                                    dsth5["grid"]["z"][n1 : n2 + 1],
-                                    quiet=quiet,
-                                )
-                                if not quiet:
-                                    print(
-                                        "writing "
-                                        + key
-                                        + " shape {} chunk {}".format(
-                                            var.shape, [iz, iy, ix]
-                                        )
-                                    )
-                                dset[n1out:n2out, m1out:m2out, l1out:l2out] = dtype(
-                                    var[varn1:varn2, varm1:varm2, varl1:varl2]
-                                )
+                            print("writing " + key + " chunk {}".format(box))
+                        dset[box] = dtype(var)
+                    if n_proc > 1:
+                        executor.shutdown()
     #"mpio" cannot handle byte types so update settings in serial on root 
     if ladd_bytes:
         if comm:
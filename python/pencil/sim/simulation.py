@@ -1047,17 +1047,20 @@ class __Simulation__(object):
                            e.g. remove errors at the end of crashed runs"""
         from pencil.read import ts
 
-        # check if already loaded
-        if (
-            "ts" in self.tmp_dict.keys()
-            and self.tmp_dict["ts"].t[-1] == self.get_T_last()
-        ):
-            return self.tmp_dict["ts"]
+        # check if already loaded with the same cleaning, then only append
+        # the new lines, otherwise read the whole file again
+        if "ts" in self.tmp_dict.keys():
+            cached = self.tmp_dict["ts"]
+            if (
+                getattr(cached, "_file_name", None) is not None
+                and getattr(cached, "_unique_clean", None) == unique_clean
+            ):
+                cached.update()
+                return cached
 
         if self.started():
-            ts = ts(sim=self, quiet=True, unique_clean=unique_clean)
-            self.tmp_dict["ts"] = ts
-            return ts
+            self.tmp_dict["ts"] = ts(sim=self, quiet=True, unique_clean=unique_clean)
+            return self.tmp_dict["ts"]
         else:
             print(
                 "? WARNING: Simulation "
@@ -39,6 +39,7 @@ class NullPoint(object):
         """
 
         import numpy as np
+        from scipy.spatial import cKDTree
 
         # 1) Reduction step.
         # Find all cells for which all three field components change sign.
@@ -55,442 +56,129 @@ class NullPoint(object):
                 + (sign_field[comp, 1:, 1:, 1:] * sign_field[comp, :-1, :-1, :-1] < 0)
             )
 
-        # Find null points in these cells.
-        self.nulls = []
-        nulls_list = []
+        # 2) Analysis step.
+        # Find the indices of the cells where to look for null points.
+        idx_z, idx_y, idx_x = np.nonzero(reduced_cells)
+        n_cells = len(idx_x)
         delta = min((var.dx, var.dy, var.dz)) / 500
-        for cell_idx in range(np.sum(reduced_cells)):
-            # 2) Analysis step.
-
-            # Find the indices of the cell where to look for the null point.
-            idx_x = np.where(reduced_cells is True)[2][cell_idx]
-            idx_y = np.where(reduced_cells is True)[1][cell_idx]
-            idx_z = np.where(reduced_cells is True)[0][cell_idx]
-            x = var.x
-            y = var.y
-            z = var.z
-
-            # Compute the coefficients for the trilinear interpolation.
-            coefTri = np.zeros((8, 3))
-            coefTri[0] = field[:, idx_z, idx_y, idx_x]
-            coefTri[1] = (
-                field[:, idx_z, idx_y, idx_x + 1] - field[:, idx_z, idx_y, idx_x]
-            )
-            coefTri[2] = (
-                field[:, idx_z, idx_y + 1, idx_x] - field[:, idx_z, idx_y, idx_x]
-            )
-            coefTri[3] = (
-                field[:, idx_z, idx_y + 1, idx_x + 1]
-                - field[:, idx_z, idx_y, idx_x + 1]
-                - field[:, idx_z, idx_y + 1, idx_x]
-                + field[:, idx_z, idx_y, idx_x]
-            )
-            coefTri[4] = (
-                field[:, idx_z + 1, idx_y, idx_x] - field[:, idx_z, idx_y, idx_x]
-            )
-            coefTri[5] = (
-                field[:, idx_z + 1, idx_y, idx_x + 1]
-                - field[:, idx_z, idx_y, idx_x + 1]
-                - field[:, idx_z + 1, idx_y, idx_x]
-                + field[:, idx_z, idx_y, idx_x]
-            )
-            coefTri[6] = (
-                field[:, idx_z + 1, idx_y + 1, idx_x]
-                - field[:, idx_z, idx_y + 1, idx_x]
-                - field[:, idx_z + 1, idx_y, idx_x]
-                + field[:, idx_z, idx_y, idx_x]
-            )
-            coefTri[7] = (
-                field[:, idx_z + 1, idx_y + 1, idx_x + 1]
-                - field[:, idx_z, idx_y + 1, idx_x + 1]
-                - field[:, idx_z + 1, idx_y, idx_x + 1]
-                - field[:, idx_z + 1, idx_y + 1, idx_x]
-                + field[:, idx_z, idx_y, idx_x + 1]
-                + field[:, idx_z, idx_y + 1, idx_x]
-                + field[:, idx_z + 1, idx_y, idx_x]
-                - field[:, idx_z, idx_y, idx_x]
-            )
-
-            # Contains the nulls obtained from each face.
-            null_cell = []
-
-            # Find the intersection of the curves field_i = field_j = 0.
-            # The units are first normalized to the unit cube from (0, 0, 0) to (1, 1, 1).
-
-            # face 1
-            intersection = False
-            coefBi = np.zeros((4, 3))
-            coefBi[0] = coefTri[0] + coefTri[4] * 0
-            coefBi[1] = coefTri[1] + coefTri[5] * 0
-            coefBi[2] = coefTri[2] + coefTri[6] * 0
-            coefBi[3] = coefTri[3] + coefTri[7] * 0
-            # Find the roots for x0 and y0.
-            polynomial = np.array(
-                [
-                    coefBi[1, 0] * coefBi[3, 1] - coefBi[1, 1] * coefBi[3, 0],
-                    coefBi[0, 0] * coefBi[3, 1]
-                    + coefBi[1, 0] * coefBi[2, 1]
-                    - coefBi[0, 1] * coefBi[3, 0]
-                    - coefBi[2, 0] * coefBi[1, 1],
-                    coefBi[0, 0] * coefBi[2, 1] - coefBi[0, 1] * coefBi[2, 0],
-                ]
-            )
-            roots_x = np.roots(polynomial)
-            if not roots_x:
-                roots_x = -np.ones(2)
-            if len(roots_x) == 1:
-                roots_x = np.array([roots_x, roots_x])
-            roots_y = -(coefBi[0, 0] + coefBi[1, 0] * roots_x) / (
-                coefBi[2, 0] + coefBi[3, 0] * roots_x
-            )
-            if (
-                np.real(roots_x[0]) >= 0
-                and np.real(roots_x[0]) <= 1
-                and np.real(roots_y[0]) >= 0
-                and np.real(roots_y[0]) <= 1
-            ):
-                intersection = True
-                root_idx = 0
-            if (
-                np.real(roots_x[1]) >= 0
-                and np.real(roots_x[1]) <= 1
-                and np.real(roots_y[1]) >= 0
-                and np.real(roots_y[1]) <= 1
-            ):
-                intersection = True
-                root_idx = 1
-            if intersection:
-                xyz0 = [roots_x[root_idx], roots_y[root_idx], 0]
-                xyz = np.real(self.__newton_raphson(xyz0, coefTri, dd=delta))
-                # Check if the null point lies inside the cell.
-                if np.all(xyz >= 0) and np.all(xyz <= 1):
-                    null_cell.append(
-                        [
-                            xyz[0] * var.dx + x[idx_x],
-                            xyz[1] * var.dy + y[idx_y],
-                            xyz[2] * var.dz + z[idx_z],
-                        ]
-                    )
-
-            # face 2
-            intersection = False
-            coefBi = np.zeros((4, 3))
-            coefBi[0] = coefTri[0] + coefTri[4] * 1
-            coefBi[1] = coefTri[1] + coefTri[5] * 1
-            coefBi[2] = coefTri[2] + coefTri[6] * 1
-            coefBi[3] = coefTri[3] + coefTri[7] * 1
-            # Find the roots for x0 and y0.
-            polynomial = np.array(
-                [
-                    coefBi[1, 0] * coefBi[3, 1] - coefBi[1, 1] * coefBi[3, 0],
-                    coefBi[0, 0] * coefBi[3, 1]
-                    + coefBi[1, 0] * coefBi[2, 1]
-                    - coefBi[0, 1] * coefBi[3, 0]
-                    - coefBi[2, 0] * coefBi[1, 1],
-                    coefBi[0, 0] * coefBi[2, 1] - coefBi[0, 1] * coefBi[2, 0],
-                ]
-            )
-            roots_x = np.roots(polynomial)
-            if not roots_x:
-                roots_x = -np.ones(2)
-            if len(roots_x) == 1:
-                roots_x = np.array([roots_x, roots_x])
-            roots_y = -(coefBi[0, 0] + coefBi[1, 0] * roots_x) / (
-                coefBi[2, 0] + coefBi[3, 0] * roots_x
-            )
-            if (
-                np.real(roots_x[0]) >= 0
-                and np.real(roots_x[0]) <= 1
-                and np.real(roots_y[0]) >= 0
-                and np.real(roots_y[0]) <= 1
-            ):
-                intersection = True
-                root_idx = 0
-            if (
-                np.real(roots_x[1]) >= 0
-                and np.real(roots_x[1]) <= 1
-                and np.real(roots_y[1]) >= 0
-                and np.real(roots_y[1]) <= 1
-            ):
-                intersection = True
-                root_idx = 1
-            if intersection:
-                xyz0 = [roots_x[root_idx], roots_y[root_idx], 1]
-                xyz = np.real(self.__newton_raphson(xyz0, coefTri, dd=delta))
-                # Check if the null point lies inside the cell.
-                if np.all(xyz >= 0) and np.all(xyz <= 1):
-                    null_cell.append(
-                        [
-                            xyz[0] * var.dx + x[idx_x],
-                            xyz[1] * var.dy + y[idx_y],
-                            xyz[2] * var.dz + z[idx_z],
-                        ]
-                    )
-
-            # face 3
-            intersection = False
-            coefBi = np.zeros((4, 3))
-            coefBi[0] = coefTri[0] + coefTri[2] * 0
-            coefBi[1] = coefTri[1] + coefTri[3] * 0
-            coefBi[2] = coefTri[4] + coefTri[6] * 0
-            coefBi[3] = coefTri[5] + coefTri[7] * 0
-            # Find the roots for x0 and z0.
-            polynomial = np.array(
-                [
-                    coefBi[1, 0] * coefBi[3, 2] - coefBi[1, 2] * coefBi[3, 0],
-                    coefBi[0, 0] * coefBi[3, 2]
-                    + coefBi[1, 0] * coefBi[2, 2]
-                    - coefBi[0, 2] * coefBi[3, 0]
-                    - coefBi[2, 0] * coefBi[1, 2],
-                    coefBi[0, 0] * coefBi[2, 2] - coefBi[0, 2] * coefBi[2, 0],
-                ]
-            )
-            roots_x = np.roots(polynomial)
-            if not roots_x:
-                roots_x = -np.ones(2)
-            if len(roots_x) == 1:
-                roots_x = np.array([roots_x, roots_x])
-            roots_z = -(coefBi[0, 0] + coefBi[1, 0] * roots_x) / (
-                coefBi[2, 0] + coefBi[3, 0] * roots_x
-            )
-            if (
-                np.real(roots_x[0]) >= 0
-                and np.real(roots_x[0]) <= 1
-                and np.real(roots_z[0]) >= 0
-                and np.real(roots_z[0]) <= 1
-            ):
-                intersection = True
-                root_idx = 0
-            if (
-                np.real(roots_x[1]) >= 0
-                and np.real(roots_x[1]) <= 1
-                and np.real(roots_z[1]) >= 0
-                and np.real(roots_z[1]) <= 1
-            ):
-                intersection = True
-                root_idx = 1
-            if intersection:
-                xyz0 = [roots_x[root_idx], 0, roots_z[root_idx]]
-                xyz = np.real(self.__newton_raphson(xyz0, coefTri, dd=delta))
-                # Check if the null point lies inside the cell.
-                if np.all(xyz >= 0) and np.all(xyz <= 1):
-                    null_cell.append(
-                        [
-                            xyz[0] * var.dx + x[idx_x],
-                            xyz[1] * var.dy + y[idx_y],
-                            xyz[2] * var.dz + z[idx_z],
-                        ]
-                    )
-
-            # face 4
-            intersection = False
-            coefBi = np.zeros((4, 3))
-            coefBi[0] = coefTri[0] + coefTri[2] * 1
-            coefBi[1] = coefTri[1] + coefTri[3] * 1
-            coefBi[2] = coefTri[4] + coefTri[6] * 1
-            coefBi[3] = coefTri[5] + coefTri[7] * 1
-            # Find the roots for x0 and z0.
-            polynomial = np.array(
-                [
-                    coefBi[1, 0] * coefBi[3, 2] - coefBi[1, 2] * coefBi[3, 0],
-                    coefBi[0, 0] * coefBi[3, 2]
-                    + coefBi[1, 0] * coefBi[2, 2]
-                    - coefBi[0, 2] * coefBi[3, 0]
-                    - coefBi[2, 0] * coefBi[1, 2],
-                    coefBi[0, 0] * coefBi[2, 2] - coefBi[0, 2] * coefBi[2, 0],
-                ]
-            )
-            roots_x = np.roots(polynomial)
-            if not roots_x:
-                roots_x = -np.ones(2)
-            if len(roots_x) == 1:
-                roots_x = np.array([roots_x, roots_x])
-            roots_z = -(coefBi[0, 0] + coefBi[1, 0] * roots_x) / (
-                coefBi[2, 0] + coefBi[3, 0] * roots_x
-            )
-            if (
-                np.real(roots_x[0]) >= 0
-                and np.real(roots_x[0]) <= 1
-                and np.real(roots_z[0]) >= 0
-                and np.real(roots_z[0]) <= 1
-            ):
-                intersection = True
-                root_idx = 0
-            if (
-                np.real(roots_x[1]) >= 0
-                and np.real(roots_x[1]) <= 1
-                and np.real(roots_z[1]) >= 0
-                and np.real(roots_z[1]) <= 1
-            ):
-                intersection = True
-                root_idx = 1
-            if intersection:
-                xyz0 = [roots_x[root_idx], 1, roots_z[root_idx]]
-                xyz = np.real(self.__newton_raphson(xyz0, coefTri, dd=delta))
-                # Check if the null point lies inside the cell.
-                if np.all(xyz >= 0) and np.all(xyz <= 1):
-                    null_cell.append(
-                        [
-                            xyz[0] * var.dx + x[idx_x],
-                            xyz[1] * var.dy + y[idx_y],
-                            xyz[2] * var.dz + z[idx_z],
-                        ]
-                    )
-
-            # face 5
-            intersection = False
-            coefBi = np.zeros((4, 3))
-            coefBi[0] = coefTri[0] + coefTri[1] * 0
-            coefBi[1] = coefTri[2] + coefTri[3] * 0
-            coefBi[2] = coefTri[4] + coefTri[5] * 0
-            coefBi[3] = coefTri[6] + coefTri[7] * 0
-            # Find the roots for y0 and z0.
-            polynomial = np.array(
-                [
-                    coefBi[1, 1] * coefBi[3, 2] - coefBi[1, 2] * coefBi[3, 1],
-                    coefBi[0, 1] * coefBi[3, 2]
-                    + coefBi[1, 1] * coefBi[2, 2]
-                    - coefBi[0, 2] * coefBi[3, 1]
-                    - coefBi[2, 1] * coefBi[1, 2],
-                    coefBi[0, 1] * coefBi[2, 2] - coefBi[0, 2] * coefBi[2, 1],
-                ]
-            )
-            roots_y = np.roots(polynomial)
-            if not roots_y:
-                roots_y = -np.ones(2)
-            if len(roots_y) == 1:
-                roots_y = np.array([roots_y, roots_y])
-            roots_z = -(coefBi[0, 1] + coefBi[1, 1] * roots_y) / (
-                coefBi[2, 1] + coefBi[3, 1] * roots_y
-            )
-            if (
-                np.real(roots_y[0]) >= 0
-                and np.real(roots_y[0]) <= 1
-                and np.real(roots_z[0]) >= 0
-                and np.real(roots_z[0]) <= 1
-            ):
-                intersection = True
-                root_idx = 0
-            if (np.real(roots_y[1]) >= 0 and np.real(roots_y[1]) <= 1) and (
-                np.real(roots_z[1]) >= 0 and np.real(roots_z[1]) <= 1
-            ):
-                intersection = True
-                root_idx = 1
-            if intersection:
-                xyz0 = [0, roots_y[root_idx], roots_z[root_idx]]
-                xyz = np.real(self.__newton_raphson(xyz0, coefTri, dd=delta))
-                # Check if the null point lies inside the cell.
-                if np.all(xyz >= 0) and np.all(xyz <= 1):
-                    null_cell.append(
-                        [
-                            xyz[0] * var.dx + x[idx_x],
-                            xyz[1] * var.dy + y[idx_y],
-                            xyz[2] * var.dz + z[idx_z],
-                        ]
-                    )
 
-            # face 6
-            intersection = False
-            coefBi = np.zeros((4, 3))
-            coefBi[0] = coefTri[0] + coefTri[1] * 1
-            coefBi[1] = coefTri[2] + coefTri[3] * 1
-            coefBi[2] = coefTri[4] + coefTri[5] * 1
-            coefBi[3] = coefTri[6] + coefTri[7] * 1
-            # Find the roots for y0 and z0.
-            polynomial = np.array(
-                [
-                    coefBi[1, 1] * coefBi[3, 2] - coefBi[1, 2] * coefBi[3, 1],
-                    coefBi[0, 1] * coefBi[3, 2]
-                    + coefBi[1, 1] * coefBi[2, 2]
-                    - coefBi[0, 2] * coefBi[3, 1]
-                    - coefBi[2, 1] * coefBi[1, 2],
-                    coefBi[0, 1] * coefBi[2, 2] - coefBi[0, 2] * coefBi[2, 1],
+        # Compute the coefficients for the trilinear interpolation in all cells.
+        # The coefficient m belongs to the monomial with x if m & 1, y if m & 2
+        # and z if m & 4, and is the alternating sum over the corners k & m == k.
+        corners = np.zeros((8, n_cells, 3))
+        for m in range(8):
+            corners[m] = field[
+                :, idx_z + (m >> 2), idx_y + (m >> 1 & 1), idx_x + (m & 1)
+            ].T
+        coef_tri = np.zeros((8, n_cells, 3))
+        for m in range(8):
+            for k in range(8):
+                if k & m == k:
+                    coef_tri[m] += (-1) ** bin(m ^ k).count("1") * corners[k]
+
+        # Find the intersection of the curves field_i = field_j = 0 on the six faces
+        # of all cells as starting points for the Newton-Raphson method.
+        # The units are first normalized to the unit cube from (0, 0, 0) to (1, 1, 1).
+        xyz0 = []
+        cell_idx = []
+        for fixed, free_a, free_b in [(2, 0, 1), (1, 0, 2), (0, 1, 2)]:
+            f, a, b = 1 << fixed, 1 << free_a, 1 << free_b
+            for value in (0, 1):
+                # Bilinear coefficients on the face.
+                coef_bi = [
+                    coef_tri[0] + coef_tri[f] * value,
+                    coef_tri[a] + coef_tri[a | f] * value,
+                    coef_tri[b] + coef_tri[b | f] * value,
+                    coef_tri[a | b] + coef_tri[a | b | f] * value,
                 ]
-            )
-            roots_y = np.roots(polynomial)
-            if not roots_y:
-                roots_y = -np.ones(2)
-            if len(roots_y) == 1:
-                roots_y = np.array([roots_y, roots_y])
-            roots_z = -(coefBi[0, 1] + coefBi[1, 1] * roots_y) / (
-                coefBi[2, 1] + coefBi[3, 1] * roots_y
-            )
-            if (
-                np.real(roots_y[0]) >= 0
-                and np.real(roots_y[0]) <= 1
-                and np.real(roots_z[0]) >= 0
-                and np.real(roots_z[0]) <= 1
-            ):
-                intersection = True
-                root_idx = 0
-            if (
-                np.real(roots_y[1]) >= 0
-                and np.real(roots_y[1]) <= 1
-                and np.real(roots_z[1]) >= 0
-                and np.real(roots_z[1]) <= 1
-            ):
-                intersection = True
-                root_idx = 1
-            if intersection:
-                xyz0 = [1, roots_y[root_idx], roots_z[root_idx]]
-                xyz = np.real(self.__newton_raphson(xyz0, coefTri, dd=delta))
-                # Check if the null point lies inside the cell.
-                if np.all(xyz >= 0) and np.all(xyz <= 1):
-                    null_cell.append(
-                        [
-                            xyz[0] * var.dx + x[idx_x],
-                            xyz[1] * var.dy + y[idx_y],
-                            xyz[2] * var.dz + z[idx_z],
-                        ]
-                    )
-
-            # Compute the average of the null found from different faces.
-            if null_cell:
-                nulls_list.append(np.mean(null_cell, axis=0))
-
-        # Discard nulls which are too close to each other.
-        nulls_list = np.array(nulls_list)
+                c0, c1, c2, c3 = [coef[:, [free_a, free_b]].T for coef in coef_bi]
+                roots_a = self.__quadratic_roots(
+                    c1[0] * c3[1] - c1[1] * c3[0],
+                    c0[0] * c3[1] + c1[0] * c2[1] - c0[1] * c3[0] - c2[0] * c1[1],
+                    c0[0] * c2[1] - c0[1] * c2[0],
+                )
+                # Use the component which depends more strongly on the second
+                # coordinate to find its roots.
+                denominator = c2[:, np.newaxis] + c3[:, np.newaxis] * roots_a
+                comp = np.argmax(abs(denominator), axis=0)[np.newaxis]
+                numerator = c0[:, np.newaxis] + c1[:, np.newaxis] * roots_a
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    roots_b = -(
+                        np.take_along_axis(numerator, comp, 0)
+                        / np.take_along_axis(denominator, comp, 0)
+                    )[0]
+                roots_a = np.real(roots_a)
+                roots_b = np.real(roots_b)
+                intersection = (
+                    (roots_a >= 0) & (roots_a <= 1) & (roots_b >= 0) & (roots_b <= 1)
+                )
+                # Prefer the second root if both lie on the face.
+                root_idx = intersection[1].astype(int)
+                found = np.nonzero(intersection[0] | intersection[1])[0]
+                xyz0_face = np.full((len(found), 3), float(value))
+                xyz0_face[:, free_a] = roots_a[root_idx[found], found]
+                xyz0_face[:, free_b] = roots_b[root_idx[found], found]
+                xyz0.append(xyz0_face)
+                cell_idx.append(found)
+        xyz0 = np.concatenate(xyz0)
+        cell_idx = np.concatenate(cell_idx)
+
+        # Find the null points from all starting points at once.
+        xyz = self.__newton_raphson(xyz0, coef_tri[:, cell_idx], dd=delta)
+        # Check if the null point lies inside the cell.
+        inside = np.all((xyz >= 0) & (xyz <= 1), axis=1)
+        cell_idx = cell_idx[inside]
+        null_cell = xyz[inside] * np.array([var.dx, var.dy, var.dz]) + np.array(
+            [var.x[idx_x[cell_idx]], var.y[idx_y[cell_idx]], var.z[idx_z[cell_idx]]]
+        ).T
+
+        # Compute the average of the null found from different faces.
+        cells, cell_idx = np.unique(cell_idx, return_inverse=True)
+        nulls_list = np.zeros((len(cells), 3))
+        np.add.at(nulls_list, cell_idx, null_cell)
+        nulls_list /= np.bincount(cell_idx, minlength=len(cells))[:, np.newaxis]
+
+        # Discard nulls which are too close to each other, i.e. closer than one grid
+        # cell in each direction to a null found in an earlier cell.
         keep_null = np.ones(len(nulls_list), dtype=bool)
-        for idx_null_1 in range(len(nulls_list)):
-            for idx_null_2 in range(idx_null_1 + 1, len(nulls_list)):
-                diff_nulls = abs(nulls_list[idx_null_1] - nulls_list[idx_null_2])
-                if (
-                    diff_nulls[0] < var.dx
-                    and diff_nulls[1] < var.dy
-                    and diff_nulls[2] < var.dz
-                ):
-                    keep_null[idx_null_2] = False
-        nulls_list = nulls_list[keep_null is True]
+        if len(nulls_list) > 1:
+            tree = cKDTree(nulls_list / np.array([var.dx, var.dy, var.dz]))
+            pairs = tree.query_pairs(1, p=np.inf, output_type="ndarray")
+            keep_null[pairs.max(axis=1)] = False
+        nulls_list = nulls_list[keep_null]
 
         # Compute the field's characteristics around each null.
-        for null in nulls_list:
-            # Find the Jacobian grad(field).
-            grad_field = self.__grad_field(null, var, field, delta)
-            if abs(np.real(np.linalg.det(grad_field))) > 1e-8 * np.min(
-                [var.dx, var.dy, var.dz]
-            ):
-                # Find the eigenvalues of the Jacobian.
-                eigen_values = np.array(np.linalg.eig(grad_field)[0])
-                # Find the eigenvectors of the Jacobian.
-                eigen_vectors = np.array(np.linalg.eig(grad_field)[1].T)
+        self.nulls = []
+        self.eigen_values = []
+        self.eigen_vectors = []
+        self.sign_trace = []
+        self.fan_vectors = []
+        self.normals = []
+        # Find the Jacobians grad(field).
+        grad_fields = self.__grad_field(nulls_list, var, field, delta)
+        for null, grad_field in zip(nulls_list, grad_fields):
+            det = np.linalg.det(grad_field)
+            if abs(det) > 1e-8 * np.min([var.dx, var.dy, var.dz]):
+                # Find the eigenvalues and eigenvectors of the Jacobian.
+                eigen_values, eigen_vectors = np.linalg.eig(grad_field)
+                eigen_vectors = eigen_vectors.T
                 # Determine which way to trace the streamlines.
-                if np.real(np.linalg.det(grad_field)) < 0:
+                if det < 0:
                     sign_trace = 1
-                    fan_vectors = eigen_vectors[np.where(np.sign(eigen_values) > 0)]
-                if np.real(np.linalg.det(grad_field)) > 0:
+                    fan_vectors = eigen_vectors[np.real(eigen_values) > 0]
+                if det > 0:
                     sign_trace = -1
-                    fan_vectors = eigen_vectors[np.where(np.sign(eigen_values) < 0)]
-                if (np.linalg.det(grad_field) == 0) or (len(fan_vectors) == 0):
+                    fan_vectors = eigen_vectors[np.real(eigen_values) < 0]
+                if len(fan_vectors) != 2:
                     print("error: Null point is not of x-type. Skip this null.")
                     continue
-                fan_vectors = np.array(fan_vectors)
                 # Compute the normal to the fan-plane.
                 normal = np.cross(fan_vectors[0], fan_vectors[1])
-                normal = normal / np.sqrt(np.sum(normal ** 2))
+                normal = normal / np.sqrt(np.sum(np.abs(normal) ** 2))
             else:
                 print(
                     "Warning: det(Jacobian) = {0}, grad(field) = {1}".format(
-                        np.linalg.det(grad_field), grad_field
+                        det, grad_field
                     )
                 )
                 eigen_values = np.zeros(3)
@@ -669,11 +357,12 @@ class NullPoint(object):
         self.sign_trace = np.array(sign_trace)
         self.normals = np.array(normals)
 
-    def __triLinear_interpolation(self, x, y, z, coef_tri):
+    def __triLinear_interpolation(self, xyz, coef_tri):
         """
-        Compute the interpolated field at (normalized) x, y, z.
+        Compute the interpolated field at the (normalized) points xyz.
         """
 
+        x, y, z = [xyz[:, i : i + 1] for i in range(3)]
         return (
             coef_tri[0]
             + coef_tri[1] * x
@@ -687,77 +376,83 @@ class NullPoint(object):
 
     def __grad_field(self, xyz, var, field, dd):
         """
-        Compute the gradient if the field at xyz.
+        Compute the gradient of the field at the points xyz.
         """
 
         import numpy as np
-        from pencil.math.interpolation import vec_int
-
-        gf = np.zeros((3, 3))
-        gf[0, :] = (
-            vec_int(xyz + np.array([dd, 0, 0]), var, field)
-            - vec_int(xyz - np.array([dd, 0, 0]), var, field)
-        ) / (2 * dd)
-        gf[1, :] = (
-            vec_int(xyz + np.array([0, dd, 0]), var, field)
-            - vec_int(xyz - np.array([0, dd, 0]), var, field)
-        ) / (2 * dd)
-        gf[2, :] = (
-            vec_int(xyz + np.array([0, 0, dd]), var, field)
-            - vec_int(xyz - np.array([0, 0, dd]), var, field)
-        ) / (2 * dd)
-
-        return np.matrix(gf)
-
-    def __grad_field_1(self, x, y, z, coef_tri, dd):
+        from pencil.math.interpolation import vec_int_batch
+
+        shifts = np.eye(3) * dd
+        xyz = xyz[:, np.newaxis]
+        points = np.concatenate([xyz + shifts, xyz - shifts])
+        values = vec_int_batch(points.reshape(-1, 3), field, grid=var)
+        values = values.reshape(points.shape)
+        gf = (values[: len(xyz)] - values[len(xyz) :]) / (2 * dd)
+
+        return gf
+
+    def __grad_tri(self, xyz, coef_tri):
         """
-        Compute the inverse of the gradient of the field.
+        Compute the Jacobian of the trilinear interpolation at the (normalized)
+        points xyz, with the field components along the second axis.
         """
 
         import numpy as np
 
-        gf1 = np.zeros((3, 3))
-        gf1[0, :] = (
-            self.__triLinear_interpolation(x + dd, y, z, coef_tri)
-            - self.__triLinear_interpolation(x - dd, y, z, coef_tri)
-        ) / (2 * dd)
-        gf1[1, :] = (
-            self.__triLinear_interpolation(x, y + dd, z, coef_tri)
-            - self.__triLinear_interpolation(x, y - dd, z, coef_tri)
-        ) / (2 * dd)
-        gf1[2, :] = (
-            self.__triLinear_interpolation(x, y, z + dd, coef_tri)
-            - self.__triLinear_interpolation(x, y, z - dd, coef_tri)
-        ) / (2 * dd)
-
-        # Invert the matrix.
-        if np.linalg.det(gf1) != 0 and not np.max(np.isnan(gf1)):
-            gf1 = np.matrix(gf1).I
-        else:
-            gf1 *= 0
+        x, y, z = [xyz[:, i : i + 1] for i in range(3)]
+        return np.stack(
+            [
+                coef_tri[1] + coef_tri[3] * y + coef_tri[5] * z + coef_tri[7] * y * z,
+                coef_tri[2] + coef_tri[3] * x + coef_tri[6] * z + coef_tri[7] * x * z,
+                coef_tri[4] + coef_tri[5] * x + coef_tri[6] * y + coef_tri[7] * x * y,
+            ],
+            axis=-1,
+        )
 
-        return gf1
+    def __quadratic_roots(self, a, b, c):
+        """
+        Compute the two complex roots of a*x**2 + b*x + c for arrays of
+        coefficients. Linear equations have a double root, NaN if there is none.
+        """
+
+        import numpy as np
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            sqrt_disc = np.sqrt(b.astype(complex) ** 2 - 4 * a * c)
+            roots = np.array([(-b + sqrt_disc) / (2 * a), (-b - sqrt_disc) / (2 * a)])
+            linear = a == 0
+            roots[:, linear] = -c[linear] / b[linear]
+        return roots
 
     def __newton_raphson(self, xyz0, coef_tri, dd):
         """
-        Newton-Raphson method for finding null-points.
+        Newton-Raphson method for finding null-points from all starting
+        points xyz0 at once.
         """
 
         import numpy as np
 
-        xyz = np.array(xyz0)
+        xyz = np.array(xyz0, dtype=float)
         iter_max = 10
         tol = dd / 10
 
+        active = np.arange(len(xyz))
         for i in range(iter_max):
-            diff = self.__triLinear_interpolation(
-                xyz[0], xyz[1], xyz[2], coef_tri
-            ) * self.__grad_field_1(xyz[0], xyz[1], xyz[2], coef_tri, dd)
-            diff = np.array(diff)[0]
-            xyz = xyz - diff
-            if any(abs(diff) < tol) or any(abs(diff) > 1):
-                return xyz
-        return np.array(xyz)
+            if len(active) == 0:
+                break
+            value = self.__triLinear_interpolation(xyz[active], coef_tri[:, active])
+            jacobian = self.__grad_tri(xyz[active], coef_tri[:, active])
+            det = np.linalg.det(jacobian)
+            regular = (det != 0) & np.isfinite(det)
+            diff = np.zeros_like(value)
+            diff[regular] = np.linalg.solve(
+                jacobian[regular], value[regular][..., np.newaxis]
+            )[..., 0]
+            xyz[active] -= diff
+            done = np.all(abs(diff) < tol, axis=1) | np.any(abs(diff) > 1, axis=1)
+            done |= ~regular
+            active = active[~done]
+        return xyz
 
 
 class Separatrix(object):
@@ -780,11 +475,11 @@ class Separatrix(object):
         self.connectivity = []
 
     def find_separatrices(
-        self, var, field, null_point, delta=0.1, iter_max=100, ring_density=8
+        self, var, field, null_point, delta=0.1, iter_max=100, ring_density=8, n_proc=1
     ):
         """
         find_separatrices(var, field, null_point, delta=0.1,
-                          iter_max=100, ring_density=8)
+                          iter_max=100, ring_density=8, n_proc=1)
 
         Find the separatrices to the field 'field' with information from 'var'.
 
@@ -807,128 +502,40 @@ class Separatrix(object):
 
         ring_density : float
             Density of the tracer rings.
+
+        n_proc : int
+            Number of processes tracing the separatrix layers of different
+            null points in parallel.
         """
 
         import numpy as np
-        from pencil.math.interpolation import vec_int
 
+        # Trace the separatrix layer of each null point.
+        null_args = [
+            (
+                null_point.nulls[null_idx],
+                null_point.normals[null_idx],
+                null_point.fan_vectors[null_idx],
+                null_point.sign_trace[null_idx],
+                null_point.eigen_vectors[null_idx],
+            )
+            for null_idx in range(len(null_point.nulls))
+        ]
+        layers = _map_nulls(
+            _separatrix,
+            var,
+            field,
+            null_args,
+            (delta, iter_max, ring_density),
+            n_proc,
+        )
+
+        # Join the layers, shifting their point indices.
         separatrices = []
         connectivity = []
-        for null_idx in range(len(null_point.nulls)):
-            null = null_point.nulls[null_idx]
-            normal = null_point.normals[null_idx]
-            fan_vectors = null_point.fan_vectors[null_idx]
-            sign_trace = null_point.sign_trace[null_idx]
-
-            tracing = True
-            separatrices.append(null)
-
-            # Only trace separatrices for x-point lilke nulls.
-            if abs(np.linalg.det(null_point.eigen_vectors[null_idx])) < delta * 1e-8:
-                continue
-
-            # Create the first ring of points.
-            ring = []
-            offset = len(separatrices) - 1
-            for theta in np.linspace(
-                0, 2 * np.pi * (1 - 1.0 / ring_density), ring_density
-            ):
-                ring.append(
-                    null + self.__rotate_vector(normal, fan_vectors[0], theta) * delta
-                )
-                separatrices.append(ring[-1])
-                # Set the connectivity with the null point.
-                connectivity.append(np.array([0, len(ring)]) + offset)
-
-            # Set the connectivity within the ring.
-            for idx in range(ring_density - 1):
-                connectivity.append(np.array([idx + 1, idx + 2]) + offset)
-            connectivity.append(np.array([1, ring_density]) + offset)
-
-            # Trace the rings around the null.
-            iteration = 0
-            while tracing and iteration < iter_max:
-                ring_old = ring
-
-                # Trace field lines on ring.
-                point_idx = 0
-                for point in ring:
-                    field_norm = vec_int(point, var, field) * sign_trace
-                    field_norm = field_norm / np.sqrt(np.sum(field_norm ** 2))
-                    point = point + field_norm * delta
-                    ring[point_idx] = point
-                    point_idx += 1
-
-                # Connectivity array between old and new ring.
-                connectivity_rings = np.ones((2, len(ring)), dtype="int") * range(
-                    len(ring)
-                )
-
-                # Add points if distance becomes too large.
-                ring_new = []
-                ring_new.append(ring[0])
-                for point_idx in range(len(ring) - 1):
-                    if self.__distance(ring[point_idx], ring[point_idx + 1]) > delta:
-                        ring_new.append((ring[point_idx] + ring[point_idx + 1]) / 2)
-                        connectivity_rings[1, point_idx + 1 :] += 1
-                    ring_new.append(ring[point_idx + 1])
-                if self.__distance(ring[0], ring[-1]) > delta:
-                    ring_new.append((ring[0] + ring[-1]) / 2)
-                ring = ring_new
-
-                # Remove points which lie outside.
-                ring_new = []
-                not_connect_to_next = []
-                left_shift = np.zeros(connectivity_rings.shape[1])
-                for point_idx in range(len(ring)):
-                    if self.__inside_domain(ring[point_idx], var):
-                        ring_new.append(ring[point_idx])
-                        separatrices.append(ring[point_idx])
-                    else:
-                        not_connect_to_next.append(len(ring_new) - 1)
-                        mask = connectivity_rings[1, :] == point_idx
-                        connectivity_rings[1, mask] = -1
-                        mask = connectivity_rings[1, :] > point_idx
-                        left_shift += mask
-                connectivity_rings[1, :] -= left_shift
-                ring = ring_new
-
-                # Stop the tracing routine if there are no points in the ring.
-                if not ring:
-                    tracing = False
-                    continue
-
-                # Set the connectivity within the ring.
-                offset = len(separatrices) - len(ring_new)
-                for point_idx in range(len(ring_new) - 1):
-                    if not np.any(np.array(not_connect_to_next) == point_idx):
-                        connectivity.append(
-                            np.array([offset + point_idx, offset + point_idx + 1])
-                        )
-                if not np.any(
-                    np.array(not_connect_to_next) == len(ring_new)
-                ) and not np.any(np.array(not_connect_to_next) == -1):
-                    connectivity.append(np.array([offset, offset + len(ring_new) - 1]))
-
-                # Set the connectivity between the old and new ring.
-                for point_old_idx in range(len(ring_old)):
-                    if connectivity_rings[1, point_old_idx] >= 0:
-                        connectivity_rings[0, point_old_idx] += (
-                            len(separatrices) - len(ring_old) - len(ring)
-                        )
-                        connectivity_rings[1, point_old_idx] += len(separatrices) - len(
-                            ring
-                        )
-                        connectivity.append(
-                            np.array(
-                                [
-                                    connectivity_rings[0, point_old_idx],
-                                    connectivity_rings[1, point_old_idx],
-                                ]
-                            )
-                        )
-
-                iteration += 1
+        for points, connections in layers:
+            connectivity.extend(np.array(connections, dtype=int) + len(separatrices))
+            separatrices.extend(points)
 
         self.separatrices = np.array(separatrices)
         self.connectivity = np.array(connectivity)
@@ -1029,62 +636,6 @@ class Separatrix(object):
         )
         self.connectivity = self.connectivity.swapaxes(0, 1)
 
-    def __distance(self, point_a, point_b):
-        """
-        Compute the distance of two points (Euclidian geometry).
-        """
-
-        import numpy as np
-
-        return np.sqrt(np.sum((point_a - point_b) ** 2))
-
-    def __inside_domain(self, point, var):
-        """
-        Determine of a point lies within the simulation domain.
-        """
-
-        return (
-            (point[0] > var.x[0])
-            * (point[0] < var.x[-1])
-            * (point[1] > var.y[0])
-            * (point[1] < var.y[-1])
-            * (point[2] > var.z[0])
-            * (point[2] < var.z[-1])
-        )
-
-    def __rotate_vector(self, rot_normal, vector, theta):
-        """
-        Rotate vector around the vector rot_normal by theta.
-        """
-
-        import numpy as np
-
-        # Compute the rotation matrix.
-        u = rot_normal[0]
-        v = rot_normal[1]
-        w = rot_normal[2]
-        rot_matrix = np.matrix(
-            [
-                [
-                    u ** 2 + (1 - u ** 2) * np.cos(theta),
-                    u * v * (1 - np.cos(theta)) - w * np.sin(theta),
-                    u * w * (1 - np.cos(theta) + v * np.sin(theta)),
-                ],
-                [
-                    u * v * (1 - np.cos(theta) + w * np.sin(theta)),
-                    v ** 2 + (1 - v ** 2) * np.cos(theta),
-                    v * w * (1 - np.cos(theta)) - u * np.sin(theta),
-                ],
-                [
-                    u * w * (1 - np.cos(theta)) - v * np.sin(theta),
-                    v * w * (1 - np.cos(theta)) + u * np.sin(theta),
-                    w ** 2 + (1 - w ** 2) * np.cos(theta),
-                ],
-            ]
-        )
-        return np.array(vector * rot_matrix)[0]
-
-
 class Spine(object):
     """
     Contains the spines of the null points and their finding routines.
@@ -1097,9 +648,9 @@ class Spine(object):
 
         self.spines = []
 
-    def find_spines(self, var, field, null_point, delta=0.1, iter_max=100):
+    def find_spines(self, var, field, null_point, delta=0.1, iter_max=100, n_proc=1):
         """
-        find_spines(var, field, null_point, delta=0.1, iter_max=100)
+        find_spines(var, field, null_point, delta=0.1, iter_max=100, n_proc=1)
 
         Find the spines to the field 'field' with information from 'var'.
 
@@ -1120,50 +671,32 @@ class Spine(object):
 
         iter_max : int
             Maximum iteration steps for the fiel line tracing.
+
+        n_proc : int
+            Number of processes tracing the spines of different null points
+            in parallel.
         """
 
         import numpy as np
-        from pencil.math.interpolation import vec_int
 
+        null_args = [
+            (
+                null_point.nulls[null_idx],
+                null_point.normals[null_idx],
+                null_point.sign_trace[null_idx],
+            )
+            for null_idx in range(len(null_point.nulls))
+        ]
         spines = []
-        for null_idx in range(len(null_point.nulls)):
-            field_sgn = -field * null_point.sign_trace[null_idx]
-            null = null_point.nulls[null_idx]
-            spine_up = []
-            spine_down = []
-            spine_up.append(null)
-            spine_down.append(null)
-
-            # Trace spine above the null.
-            iteration = 0
-            point = null + null_point.normals[null_idx] * delta
-            tracing = True
-            iteration = 0
-            while tracing and iteration < iter_max:
-                spine_up.append(point)
-                field_norm = vec_int(point, var, field_sgn)
-                field_norm = field_norm / np.sqrt(np.sum(field_norm ** 2))
-                point = point + field_norm * delta
-                if not self.__inside_domain(point, var):
-                    tracing = False
-                iteration += 1
-            spines.append(np.array(spine_up))
-
-            # Trace spine below the null.
-            iteration = 0
-            point = null - null_point.normals[null_idx] * delta
-            tracing = True
-            iteration = 0
-            while tracing and iteration < iter_max:
-                spine_down.append(point)
-                field_norm = vec_int(point, var, field_sgn)
-                field_norm = field_norm / np.sqrt(np.sum(field_norm ** 2))
-                point = point + field_norm * delta
-                if not self.__inside_domain(point, var):
-                    tracing = False
-                iteration += 1
-            spines.append(np.array(spine_down))
-        self.spines = np.array(spines)
+        for spine_up, spine_down in _map_nulls(
+            _spine, var, field, null_args, (delta, iter_max), n_proc
+        ):
+            spines.append(spine_up)
+            spines.append(spine_down)
+        # The spines differ in length.
+        self.spines = np.empty(len(spines), dtype=object)
+        for spine_idx, spine in enumerate(spines):
+            self.spines[spine_idx] = spine
 
     def write_vtk(self, datadir="data", file_name="spines.vtk", binary=False):
         """
@@ -1266,16 +799,267 @@ class Spine(object):
             self.spines.append(point_array)
         self.spines = np.array(self.spines)
 
-    def __inside_domain(self, point, var):
-        """
-        Determine of a point lies within the simulation domain.
-        """
 
-        return (
-            (point[0] > var.x[0])
-            * (point[0] < var.x[-1])
-            * (point[1] > var.y[0])
-            * (point[1] < var.y[-1])
-            * (point[2] > var.z[0])
-            * (point[2] < var.z[-1])
+def _separatrix(
+    field,
+    grid,
+    null,
+    normal,
+    fan_vectors,
+    sign_trace,
+    eigen_vectors,
+    delta,
+    iter_max,
+    ring_density,
+):
+    """
+    Trace the separatrix layer of one null point. Return its points and their
+    connectivity, with the indices starting at 0 for the null point.
+    """
+
+    import numpy as np
+    from pencil.math.interpolation import vec_int_batch
+
+    separatrices = []
+    connectivity = []
+    tracing = True
+    separatrices.append(null)
+
+    # Only trace separatrices for x-point lilke nulls.
+    if abs(np.linalg.det(eigen_vectors)) < delta * 1e-8:
+        return separatrices, connectivity
+
+    # Create the first ring of points.
+    ring = []
+    offset = len(separatrices) - 1
+    for theta in np.linspace(0, 2 * np.pi * (1 - 1.0 / ring_density), ring_density):
+        ring.append(null + _rotate_vector(normal, fan_vectors[0], theta) * delta)
+        separatrices.append(ring[-1])
+        # Set the connectivity with the null point.
+        connectivity.append(np.array([0, len(ring)]) + offset)
+
+    # Set the connectivity within the ring.
+    for idx in range(ring_density - 1):
+        connectivity.append(np.array([idx + 1, idx + 2]) + offset)
+    connectivity.append(np.array([1, ring_density]) + offset)
+
+    # Trace the rings around the null.
+    iteration = 0
+    while tracing and iteration < iter_max:
+        ring_old = ring
+
+        # Trace field lines on ring.
+        field_norm = vec_int_batch(np.array(ring), field, grid=grid) * sign_trace
+        field_norm = field_norm / np.sqrt(
+            np.sum(field_norm ** 2, axis=1, keepdims=True)
         )
+        ring = list(np.array(ring) + field_norm * delta)
+
+        # Connectivity array between old and new ring.
+        connectivity_rings = np.ones((2, len(ring)), dtype="int") * range(len(ring))
+
+        # Add points if distance becomes too large.
+        ring_new = []
+        ring_new.append(ring[0])
+        for point_idx in range(len(ring) - 1):
+            if _distance(ring[point_idx], ring[point_idx + 1]) > delta:
+                ring_new.append((ring[point_idx] + ring[point_idx + 1]) / 2)
+                connectivity_rings[1, point_idx + 1 :] += 1
+            ring_new.append(ring[point_idx + 1])
+        if _distance(ring[0], ring[-1]) > delta:
+            ring_new.append((ring[0] + ring[-1]) / 2)
+        ring = ring_new
+
+        # Remove points which lie outside.
+        ring_new = []
+        not_connect_to_next = []
+        left_shift = np.zeros(connectivity_rings.shape[1], dtype=int)
+        for point_idx in range(len(ring)):
+            if _inside_domain(ring[point_idx], grid):
+                ring_new.append(ring[point_idx])
+                separatrices.append(ring[point_idx])
+            else:
+                not_connect_to_next.append(len(ring_new) - 1)
+                mask = connectivity_rings[1, :] == point_idx
+                connectivity_rings[1, mask] = -1
+                mask = connectivity_rings[1, :] > point_idx
+                left_shift += mask
+        connectivity_rings[1, :] -= left_shift
+        ring = ring_new
+
+        # Stop the tracing routine if there are no points in the ring.
+        if not ring:
+            tracing = False
+            continue
+
+        # Set the connectivity within the ring.
+        offset = len(separatrices) - len(ring_new)
+        for point_idx in range(len(ring_new) - 1):
+            if not np.any(np.array(not_connect_to_next) == point_idx):
+                connectivity.append(
+                    np.array([offset + point_idx, offset + point_idx + 1])
+                )
+        if not np.any(np.array(not_connect_to_next) == len(ring_new)) and not np.any(
+            np.array(not_connect_to_next) == -1
+        ):
+            connectivity.append(np.array([offset, offset + len(ring_new) - 1]))
+
+        # Set the connectivity between the old and new ring.
+        for point_old_idx in range(len(ring_old)):
+            if connectivity_rings[1, point_old_idx] >= 0:
+                connectivity_rings[0, point_old_idx] += (
+                    len(separatrices) - len(ring_old) - len(ring)
+                )
+                connectivity_rings[1, point_old_idx] += len(separatrices) - len(ring)
+                connectivity.append(
+                    np.array(
+                        [
+                            connectivity_rings[0, point_old_idx],
+                            connectivity_rings[1, point_old_idx],
+                        ]
+                    )
+                )
+
+        iteration += 1
+
+    return separatrices, connectivity
+
+
+def _spine(field, grid, null, normal, sign_trace, delta, iter_max):
+    """
+    Trace the two spines of one null point.
+    """
+
+    import numpy as np
+    from pencil.math.interpolation import vec_int_batch
+
+    spines = []
+    for direction in (1, -1):
+        spine = [null]
+        point = null + direction * normal * delta
+        tracing = True
+        iteration = 0
+        while tracing and iteration < iter_max:
+            spine.append(point)
+            field_norm = -sign_trace * vec_int_batch(point, field, grid=grid)[0]
+            field_norm = field_norm / np.sqrt(np.sum(field_norm ** 2))
+            point = point + field_norm * delta
+            if not _inside_domain(point, grid):
+                tracing = False
+            iteration += 1
+        spines.append(np.array(spine))
+    return spines
+
+
+def _map_nulls(function, var, field, null_args, args, n_proc):
+    """
+    Apply function(field, grid, *null, *args) to every null point. With
+    n_proc > 1 chunks of null points are distributed over a pool of processes,
+    which share the field. Return the results in the order of the null points.
+    """
+
+    import numpy as np
+    from pencil.read.grids import Grid
+
+    grid = Grid()
+    grid.x, grid.y, grid.z = var.x, var.y, var.z
+    if n_proc <= 1 or len(null_args) < 2:
+        return _sub_nulls(function, field, grid, null_args, args)
+
+    from concurrent.futures import ProcessPoolExecutor
+    from pencil.util import SharedArray
+
+    shared_field = SharedArray(field.shape)
+    shared_field.array[...] = field
+    n_chunks = min(len(null_args), 4 * n_proc)
+    bounds = np.linspace(0, len(null_args), n_chunks + 1).astype(int)
+    results = []
+    with ProcessPoolExecutor(max_workers=n_proc) as executor:
+        futures = [
+            executor.submit(
+                _sub_nulls,
+                function,
+                shared_field,
+                grid,
+                null_args[bounds[i] : bounds[i + 1]],
+                args,
+            )
+            for i in range(n_chunks)
+        ]
+        for future in futures:
+            results.extend(future.result())
+    shared_field.unlink()
+    return results
+
+
+def _sub_nulls(function, field, grid, null_args, args):
+    """
+    Worker for _map_nulls, which applies function to a chunk of null points.
+    In the worker processes the field is a SharedArray.
+    """
+
+    from pencil.util import SharedArray
+
+    if isinstance(field, SharedArray):
+        results = _sub_nulls(function, field.array, grid, null_args, args)
+        field.close()
+        return results
+    return [function(field, grid, *null, *args) for null in null_args]
+
+
+def _distance(point_a, point_b):
+    """
+    Compute the distance of two points (Euclidian geometry).
+    """
+
+    import numpy as np
+
+    return np.sqrt(np.sum((point_a - point_b) ** 2))
+
+
+def _inside_domain(point, grid):
+    """
+    Determine of a point lies within the simulation domain.
+    """
+
+    return (
+        (point[0] > grid.x[0])
+        * (point[0] < grid.x[-1])
+        * (point[1] > grid.y[0])
+        * (point[1] < grid.y[-1])
+        * (point[2] > grid.z[0])
+        * (point[2] < grid.z[-1])
+    )
+
+
+def _rotate_vector(rot_normal, vector, theta):
+    """
+    Rotate vector around the vector rot_normal by theta.
+    """
+
+    import numpy as np
+
+    # Compute the rotation matrix.
+    u = rot_normal[0]
+    v = rot_normal[1]
+    w = rot_normal[2]
+    rot_matrix = np.matrix(
+        [
+            [
+                u ** 2 + (1 - u ** 2) * np.cos(theta),
+                u * v * (1 - np.cos(theta)) - w * np.sin(theta),
+                u * w * (1 - np.cos(theta) + v * np.sin(theta)),
+            ],
+            [
+                u * v * (1 - np.cos(theta) + w * np.sin(theta)),
+                v ** 2 + (1 - v ** 2) * np.cos(theta),
+                v * w * (1 - np.cos(theta)) - u * np.sin(theta),
+            ],
+            [
+                u * w * (1 - np.cos(theta)) - v * np.sin(theta),
+                v * w * (1 - np.cos(theta)) + u * np.sin(theta),
+                w ** 2 + (1 - w ** 2) * np.cos(theta),
+            ],
+        ]
+    )
+    return np.array(vector * rot_matrix)[0]
@@ -10,6 +10,7 @@ defined here are not allowed to import any other pencil packages.
 
 import os
 import re
+import threading
 
 MARKER_FILES = ["run.in", "start.in", "src/cparam.local", "src/Makefile.local"]
 
@@ -40,3 +41,106 @@ def ffloat(x):
     except:
         val = re.sub(r"(-?\d+\.?\d*)([+-]\d+)", r"\1E\2", x)
         return float(val)
+
+
+# Serialises SharedArray attaches that switch off the resource tracker.
+_tracker_lock = threading.Lock()
+
+
+class SharedArray(object):
+    """
+    Numpy array in shared memory for multiprocessing workers.
+
+    The array is created by the parent process. Worker processes receive
+    the object as argument and attach to the same memory without copying,
+    also with the 'spawn' start method, where arguments are pickled.
+    The creating process frees the memory with unlink().
+
+    Example:
+    field = SharedArray(var.bb.shape)
+    field.array[...] = var.bb
+    mp.Process(target=work, args=(field,)).start()
+    """
+
+    def __init__(self, shape, dtype=float, fill=None):
+        import numpy as np
+        from multiprocessing import shared_memory
+
+        self.shape = tuple(int(n) for n in np.atleast_1d(shape))
+        self.dtype = np.dtype(dtype)
+        size = max(1, int(np.prod(self.shape)) * self.dtype.itemsize)
+        with _tracker_lock:
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+        self.array = np.ndarray(self.shape, dtype=self.dtype, buffer=self.shm.buf)
+        if fill is not None:
+            self.array[...] = fill
+
+    def __getstate__(self):
+        return self.shm.name, self.shape, self.dtype.str
+
+    def __setstate__(self, state):
+        import numpy as np
+        from multiprocessing import shared_memory, resource_tracker
+
+        name, self.shape, dtype = state
+        self.dtype = np.dtype(dtype)
+        try:
+            self.shm = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            # Before Python 3.13 attaching registers the memory for removal
+            # with the resource tracker, which the creator already did.
+            with _tracker_lock:
+                register = resource_tracker.register
+                resource_tracker.register = lambda name, rtype: None
+                try:
+                    self.shm = shared_memory.SharedMemory(name=name)
+                finally:
+                    resource_tracker.register = register
+        self.array = np.ndarray(self.shape, dtype=self.dtype, buffer=self.shm.buf)
+
+    def close(self):
+        """
+        Detach a worker from the shared memory, e.g. at the end of a task of
+        a process pool. Copy the array before if needed.
+        """
+
+        del self.array
+        self.shm.close()
+
+    def unlink(self):
+        """
+        Release the shared memory. Copy the array before if needed.
+        """
+
+        del self.array
+        self.shm.close()
+        self.shm.unlink()
+
+
+def run_processes(target, args, n_proc):
+    """
+    Run target(*args) in n_proc processes and wait for them, e.g. workers
+    filling SharedArrays. Raise a RuntimeError if a process fails, e.g. by
+    an exception or when it is killed, since its results are then missing.
+    """
+
+    import multiprocessing as mp
+
+    proc = [mp.Process(target=target, args=args) for i_proc in range(n_proc)]
+    try:
+        for process in proc:
+            process.start()
+        for process in proc:
+            process.join()
+    finally:
+        for process in proc:
+            if process.is_alive():
+                process.terminate()
+                process.join()
+    exitcodes = [process.exitcode for process in proc]
+    if any(exitcode != 0 for exitcode in exitcodes):
+        raise RuntimeError(
+            "{0}: worker processes failed with exit codes {1}.".format(
+                target.__name__, exitcodes
+            )
+        )
@@ -14,11 +14,21 @@ def make_movie(
     save=None,
     figsize=(16, 4),
     fps=12,
+    movie_file="animation.mp4",
+    encoder="ffmpeg",
+    encoder_args=None,
+    cmap="hot",
+    downsample=1,
+    rc=None,
+    n_proc=1,
 ):
     """
-    read 2D slice files and assemble an animation in a mpg movie.
+    read 2D slice files and assemble an animation in a movie.
 
-    Quickly written from the example at http://matplotlib.sourceforge.net/faq/howto_faq.html
+    The slices are read one record at a time and rendered by n_proc worker
+    processes, each of which keeps its own figure and only replaces the
+    image data and title for every frame. The raw RGB frames are piped in
+    order to the encoder, so no image files are written unless save is set.
 
     Options:
 
@@ -26,158 +36,272 @@ def make_movie(
      datadir--- path to data directory
      proc   --- an integer giving the processor to read a slice from
      extension --- which plane of xy,xz,yz,Xz. for 2D this should be overwritten.
-     format  --- endian. one of little, big, or native (default)
+     format  --- endian. Unused, kept for compatibility.
      tmin    --- start time
      tmax    --- end time
      amin    --- minimum value for image scaling
      amax    --- maximum value for image scaling
      transform --- insert arbitrary numerical code to modify the slice
-     norm    --- scales calar data
-     save    --- directory to save file
+     norm    --- scales calar data, replaces amin and amax
+     save    --- directory to save the frames as png files in addition
      figsize --- tuple containing the size of the figure
      fps     --- Frames per seconds for the video
+     movie_file --- name of the movie file
+     encoder --- ffmpeg executable reading the raw frames from stdin
+     encoder_args --- list of ffmpeg output options, default H.264
+     cmap    --- color map of the slices
+     downsample --- sample rate to reduce the slice size
+     rc      --- dictionary of matplotlib rcParams overriding the defaults
+     n_proc  --- number of processes rendering the frames
+
+    Returns -1 if the encoder is not available. Raises a RuntimeError with
+    the end of its output if the encoder fails.
     """
     import os
-    from pencil.io import npfile
+    import shutil
+    import tempfile
+    from collections import deque
+    from concurrent.futures import ProcessPoolExecutor
     from pencil import read
-    import numpy as np
-    import pylab as plt
-    from matplotlib import colors
+
+    if shutil.which(encoder) is None:
+        print("make_movie: encoder {0} not found.".format(encoder))
+        return -1
+    if encoder_args is None:
+        encoder_args = ["-vcodec", "libx264", "-pix_fmt", "yuv420p"]
 
     # Global configuration:
-    # lines
-    plt.rcParams["lines.linewidth"] = 2
-    plt.rcParams["lines.color"] = "k"
-    # font
-    plt.rcParams["font.size"] = 30
-
-    plt.rcParams["font.family"] = "serif"
-    # legend
-    plt.rcParams["legend.fontsize"] = 20
-    plt.rcParams["legend.fancybox"] = False
-    plt.rcParams["legend.numpoints"] = 2
-    plt.rcParams["legend.shadow"] = False
-    plt.rcParams["legend.frameon"] = False
-    # latex
-    plt.rc("text", usetex=True)
-    plt.rcParams["text.latex.preamble"] = [r"\usepackage{amsmath}"]
+    rc_params = {
+        # lines
+        "lines.linewidth": 2,
+        "lines.color": "k",
+        # font
+        "font.size": 30,
+        "font.family": "serif",
+        # legend
+        "legend.fontsize": 20,
+        "legend.fancybox": False,
+        "legend.numpoints": 2,
+        "legend.shadow": False,
+        "legend.frameon": False,
+        # latex
+        "text.usetex": True,
+        "text.latex.preamble": r"\usepackage{amsmath}",
+    }
+    if rc:
+        rc_params.update(rc)
 
     datadir = os.path.expanduser(datadir)
-    if proc < 0:
-        filename = os.path.join(datadir, "slice_" + field + "." + extension)
-    else:
-        filename = os.path.join(
-            datadir, "proc" + str(proc) + "/slice_" + field + "." + extension
+    grid = read.grid(datadir=datadir, trim=True, quiet=True)
+    # set up slice plane
+    if extension == "xy" or extension == "Xy":
+        xlabel, ylabel = "x", "y"
+        x, y = grid.x, grid.y
+    if extension == "xz":
+        xlabel, ylabel = "x", "z"
+        x, y = grid.x, grid.z
+    if extension == "yz":
+        xlabel, ylabel = "y", "z"
+        x, y = grid.y, grid.z
+    if save:
+        os.makedirs(save, exist_ok=True)
+
+    layout = dict(
+        extent=[x[0], x[-1], y[0], y[-1]],
+        xlabel=xlabel,
+        ylabel=ylabel,
+        amin=amin,
+        amax=amax,
+        norm=norm,
+        cmap=cmap,
+        figsize=figsize,
+        rc=rc_params,
+        save=save,
+    )
+    frames = read.slice_frames(
+        field,
+        extension,
+        datadir=datadir,
+        proc=proc,
+        old_file=oldfile,
+        tstart=tmin,
+        tend=tmax,
+        downsample=downsample,
+    )
+
+    print("Making movie {0} - this make take a while".format(movie_file))
+    command = [encoder, "-y", "-r", str(fps)]
+    output = encoder_args + [movie_file]
+    executor = None
+    encoder_process = None
+    # The encoder output goes to a file, a pipe could fill up and block it.
+    with tempfile.TemporaryFile() as log:
+        try:
+            if n_proc > 1:
+                executor = ProcessPoolExecutor(
+                    max_workers=n_proc, initializer=_init_renderer, initargs=(layout,)
+                )
+                render = executor.submit
+            else:
+                _init_renderer(layout)
+                render = _Done
+
+            # Keep a few frames per process in flight and write them in order.
+            pending = deque()
+            islice = 0
+            for t, plane in frames:
+                if encoder_process is not None and encoder_process.poll() is not None:
+                    # The encoder has stopped, its exit code is checked below.
+                    break
+                if not tmin < t < tmax:
+                    continue
+                if transform:
+                    plane = eval("plane" + transform)
+                if islice == 0:
+                    print("----islice----------t---------min-------max-------delta")
+                print(
+                    "%10i %10.3e %10.3e %10.3e %10.3e"
+                    % (islice, t, plane.min(), plane.max(), plane.max() - plane.min())
+                )
+                pending.append(render(_render_frame, islice, t, plane))
+                islice += 1
+                while len(pending) > 2 * n_proc or (pending and pending[0].done()):
+                    encoder_process = _encode_frame(
+                        pending.popleft().result(),
+                        encoder_process,
+                        command,
+                        output,
+                        log,
+                    )
+            while pending:
+                encoder_process = _encode_frame(
+                    pending.popleft().result(), encoder_process, command, output, log
+                )
+            if encoder_process is None:
+                print("make_movie: no slices between tmin and tmax.")
+                return
+            try:
+                encoder_process.stdin.close()
+            except BrokenPipeError:
+                pass
+            encoder_process.wait()
+        finally:
+            if executor:
+                executor.shutdown(cancel_futures=True)
+            if encoder_process is not None and encoder_process.poll() is None:
+                encoder_process.kill()
+                encoder_process.wait()
+        if encoder_process.returncode != 0:
+            log.seek(0)
+            tail = log.read().decode(errors="replace").splitlines()[-10:]
+            raise RuntimeError(
+                "make_movie: {0} failed with exit code {1}:\n{2}".format(
+                    encoder, encoder_process.returncode, "\n".join(tail)
+                )
+            )
+    if save:
+        print(f"Saved frames in {save}")
+
+
+class _Done(object):
+    """
+    Result of a frame rendered in the calling process, with the interface
+    of a future.
+    """
+
+    def __init__(self, fn, *args):
+        self.value = fn(*args)
+
+    def done(self):
+        return True
+
+    def result(self):
+        return self.value
+
+
+def _encode_frame(frame, encoder_process, command, output, log):
+    """
+    Write a raw RGB frame to the encoder, which is started at the first
+    frame, when the frame size is known, with its output going to log.
+    """
+
+    import subprocess
+
+    width, height, rgb = frame
+    if encoder_process is None:
+        # libx264 and yuv420p need an even frame size.
+        encoder_process = subprocess.Popen(
+            command
+            + ["-f", "rawvideo", "-pix_fmt", "rgb24"]
+            + ["-s", "{0}x{1}".format(width, height), "-i", "-"]
+            + ["-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2"]
+            + output,
+            stdin=subprocess.PIPE,
+            stdout=log,
+            stderr=log,
         )
+    try:
+        encoder_process.stdin.write(rgb)
+    except BrokenPipeError:
+        # The encoder has stopped, make_movie checks its exit code.
+        pass
 
-    # global dim
-    # param = read.param(datadir)
+    return encoder_process
 
-    dim = read.dim(datadir, proc)
 
-    if dim.precision == "D":
-        precision = "d"
-    else:
-        precision = "f"
+_renderer = {}
 
-    grid = read.grid(datadir=datadir, trim=True)
-    # set up slice plane
-    if extension == "xy" or extension == "Xy":
-        hsize = dim.nx
-        vsize = dim.ny
-        xlabel = "x"
-        ylabel = "y"
-        x = grid.x
-        y = grid.y
-    if extension == "xz":
-        hsize = dim.nx
-        vsize = dim.nz
-        xlabel = "x"
-        ylabel = "z"
-        x = grid.x
-        y = grid.z
-    if extension == "yz":
-        hsize = dim.ny
-        vsize = dim.nz
-        xlabel = "y"
-        ylabel = "z"
-        x = grid.y
-        y = grid.z
 
-    plane = np.zeros((vsize, hsize), dtype=precision)
+def _init_renderer(layout):
+    """
+    Create the figure and image of a rendering process, which are reused
+    for all its frames.
+    """
 
-    infile = npfile(filename, endian=format)
+    import numpy as np
+    import matplotlib
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
 
-    files = []
-    fig = plt.figure(figsize=figsize)
+    matplotlib.rcParams.update(layout["rc"])
+    fig = Figure(figsize=layout["figsize"])
+    FigureCanvasAgg(fig)
     fig.subplots_adjust(
         left=0.12, bottom=0.1, right=0.98, top=0.96, wspace=0.23, hspace=0.2
     )
     ax = fig.add_subplot(111)
+    ax.set_xlabel(layout["xlabel"])
+    ax.set_ylabel(layout["ylabel"])
+    if layout["norm"] is None:
+        scale = dict(vmin=layout["amin"], vmax=layout["amax"])
+    else:
+        scale = dict(norm=layout["norm"])
+    image = ax.imshow(
+        np.zeros((2, 2)),
+        origin="lower",
+        cmap=layout["cmap"],
+        extent=layout["extent"],
+        aspect=1,
+        **scale
+    )
+    _renderer.update(fig=fig, ax=ax, image=image, save=layout["save"])
 
-    ifirst = True
-    islice = 0
-    while 1:
-        try:
-            raw_data = infile.fort_read(precision)
-        except ValueError:
-            break
-        except TypeError:
-            break
-
-        if oldfile:
-            t = raw_data[-1]
-            plane = raw_data[:-1].reshape(vsize, hsize)
-        else:
-            slice_z2pos = raw_data[-1]
-            t = raw_data[-2]
-            plane = raw_data[:-2].reshape(vsize, hsize)
-
-        if transform:
-            exec("plane = plane" + transform)
-
-        if t > tmin and t < tmax:
-            ax.cla()
-            title = "t = %11.3e" % t
-            ax.set_title(title)
-            ax.set_xlabel(xlabel)
-            ax.set_ylabel(ylabel)
-
-            ax.imshow(
-                plane,
-                origin="lower",
-                vmin=amin,
-                vmax=amax,
-                norm=norm,
-                cmap="hot",
-                extent=[x[0], x[-1], y[0], y[-1]],
-                aspect=1,
-            )
-            fname = "_tmp%03d.png" % islice
-            print("Saving frame", fname)
-            fig.savefig(fname)
-            files.append(fname)
-
-            if ifirst:
-                print("----islice----------t---------min-------max-------delta")
-            print(
-                "%10i %10.3e %10.3e %10.3e %10.3e"
-                % (islice, t, plane.min(), plane.max(), plane.max() - plane.min())
-            )
 
-            ifirst = False
-            islice += 1
-        if t > tmax:
-            break
+def _render_frame(islice, t, plane):
+    """
+    Draw one slice into the figure of the process and return the width,
+    height and bytes of the RGB frame.
+    """
 
-    print("Making movie animation.mpg - this make take a while")
-    os.system(
-        f"mencoder 'mf://_tmp*.png' -mf type=png:fps={fps} -ovc lavc -lavcopts vcodec=wmv2 -oac copy -o animation.mpg"
-    )
-    if save:
-        os.system(f"mv _tmp*.png {save}")
-        print(f"Moving files to {save}")
-    else:
-        os.system("rm _tmp*.png")
-        print("Removing all files")
-    infile.close()
+    import os
+    import numpy as np
+
+    _renderer["image"].set_data(plane)
+    _renderer["ax"].set_title("t = %11.3e" % t)
+    fig = _renderer["fig"]
+    fig.canvas.draw()
+    if _renderer["save"]:
+        fig.savefig(os.path.join(_renderer["save"], "_tmp%05d.png" % islice))
+    rgba = np.asarray(fig.canvas.buffer_rgba())
+
+    return rgba.shape[1], rgba.shape[0], rgba[..., :3].tobytes()
@@ -49,6 +49,99 @@ def neat_short_tricks() -> None:
     assert_equal(sim.get_varlist(pos="last10"), [])
 
 
+@test
+def sim_catalog() -> None:
+    """Index simulations on disk and refresh only changed ones."""
+    import shutil
+    import tempfile
+    import pencil as pc
+    from pencil.util import MARKER_FILES
+
+    param_file = os.path.realpath(
+        os.path.join(
+            __file__,
+            *[os.path.pardir] * 3,
+            "samples",
+            "backwards-compatible",
+            "data",
+            "param.nml",
+        )  # ../../samples/backwards-compatible/data/param.nml
+    )
+    with open(param_file) as f:
+        params = f.read()
+
+    def make_sim(path, ip):
+        for marker in MARKER_FILES:
+            os.makedirs(os.path.dirname(os.path.join(path, marker)), exist_ok=True)
+            open(os.path.join(path, marker), "w").close()
+        if ip is not None:
+            os.makedirs(os.path.join(path, "data"), exist_ok=True)
+            with open(os.path.join(path, "data", "param.nml"), "w") as f:
+                f.write(params.replace("IP=         14", "IP= {}".format(ip)))
+
+    with tempfile.TemporaryDirectory() as root:
+        for name, ip in (("run2", 20), ("run10", 7), ("run1", 20), ("new", None)):
+            make_sim(os.path.join(root, name), ip)
+        os.makedirs(os.path.join(root, "notes"))
+        cat = pc.sim.catalog(root, n_proc=2, quiet=True)
+        names = [os.path.basename(path) for path in cat.paths()]
+        assert_equal(names, ["new", "run1", "run2", "run10"])
+        assert_equal(cat.value(os.path.join(root, "run10"), "ip"), 7)
+        assert_equal(cat.value(os.path.join(root, "run10"), "lxyz")[0], 6.283185)
+        names = [os.path.basename(path) for path in cat.filter("ip", 10, op=">")]
+        assert_equal(sorted(names), ["run1", "run2"])
+        names = [os.path.basename(path) for path in cat.sort("ip", reverse=True)]
+        assert_equal(names[-1], "run10")
+        groups = cat.group("ip")
+        assert_equal(list(groups.keys()), ["7", "20"])
+        assert_equal(len(groups["20"]), 2)
+        for value, op in ((10, "~"), ("a", "<")):
+            try:
+                cat.filter("ip", value, op=op)
+                raised = False
+            except ValueError:
+                raised = True
+            assert_equal(raised, True)
+        cat.close()
+
+        cat = pc.sim.catalog(root, refresh=False)
+        assert_equal(cat.refresh(), [])
+        make_sim(os.path.join(root, "run1"), 3)
+        changed_file = os.path.join(root, "run1", "data", "param.nml")
+        os.utime(changed_file, (1e9, 1e9))
+        shutil.rmtree(os.path.join(root, "run2"))
+        assert_equal(cat.refresh(), [os.path.join(os.path.abspath(root), "run1")])
+        assert_equal(cat.filter("ip", 20), [])
+        assert_equal(len(cat.paths()), 3)
+        cat.close()
+
+
+@test
+def shared_array() -> None:
+    """Pickle a shared array, attach to it and release it."""
+    import pickle
+    import numpy as np
+    from pencil.util import SharedArray
+
+    field = SharedArray((2, 3), dtype=np.float32, fill=1.5)
+    attached = pickle.loads(pickle.dumps(field))
+    assert_equal(attached.shape, (2, 3))
+    assert_equal(attached.dtype, np.float32)
+    assert_equal(attached.array.sum(), 9.0)
+    attached.array[1, 2] = -3.0
+    attached.close()
+    assert_equal(field.array[1, 2], -3.0)
+
+    state = pickle.dumps(field)
+    field.unlink()
+    try:
+        pickle.loads(state)
+        released = False
+    except FileNotFoundError:
+        released = True
+    assert_equal(released, True)
+
+
 def _assert_sim_parameter(
     sim: __Simulation__, parameter: str, expected: Any
 ) -> None:
@@ -10,6 +10,7 @@ import pencil as pc
 from test_utils import (
     test,
     _assert_close_arr,
+    assert_equal,
 )
 from numpy import exp, sin, cos, sqrt, pi
 
@@ -107,6 +108,69 @@ def derivatives_vector() -> None:
     check_arr_close_coarse(del6_v, pcd.del6(v,dx,dy,dz))
 
 
+@test
+def derivatives_stencil() -> None:
+    """Operators on a non-cubic grid, with output buffers and threads"""
+    x = np.linspace(0, 1, 16)
+    y = np.linspace(0, 1.2, 20)
+    z = np.linspace(0, 0.9, 18)
+    z, y, x = np.meshgrid(z, y, x, indexing="ij")
+    dx = x[0, 0, 1] - x[0, 0, 0]
+    dy = y[0, 1, 0] - y[0, 0, 0]
+    dz = z[1, 0, 0] - z[0, 0, 0]
+
+    f = sin(x) * exp(y) * cos(z)
+    Lap_f = -exp(y) * sin(x) * cos(z)
+    check_arr_close(Lap_f, pcd.del2(f, dx, dy, dz))
+
+    v = np.stack([f, sin(x + y + z), exp(x) * cos(y + z)], axis=0)
+    curl_v = pcd.curl(v, dx, dy, dz)
+    out = np.empty_like(v)
+    assert pcd.curl(v, dx, dy, dz, out=out, workers=2) is out
+    check_arr_close(curl_v, out)
+    # curl(curl(v)) = grad(div(v)) - del2(v), the nested derivatives are
+    # only accurate 2*nghost points away from the boundaries.
+    curl2_v = np.stack(
+        [
+            -sin(x + y + z) - exp(x) * sin(y + z),
+            exp(y) * cos(x) * cos(z) + 2 * sin(x + y + z) - exp(x) * cos(y + z),
+            -exp(y) * cos(x) * sin(z) - sin(x + y + z),
+        ]
+    )
+    check_arr_close(trim(curl2_v), trim(pcd.curl2(v, dx, dy, dz, workers=2)))
+
+
+@test
+def derivatives_stencil_compiled() -> None:
+    """Numba kernel of the stencil operators against the NumPy slabs"""
+    try:
+        import numba
+    except ImportError:
+        return
+    from pencil.math.derivatives.stencil import del2_terms, curl_terms
+
+    x = np.linspace(1, 2, 16) ** 2
+    y = np.linspace(0.5, 2.5, 20)
+    z = np.linspace(0, 0.9, 18)
+    zz, yy, xx = np.meshgrid(z, y, x, indexing="ij")
+    dx_1 = tuple(1 / np.gradient(q) for q in (z, y, x))
+    dx_tilde = tuple(-np.gradient(q, 2) / np.gradient(q) ** 2 for q in (z, y, x))
+    f = sin(xx) * exp(yy) * cos(zz)
+    v = np.stack([f, sin(xx + yy + zz), exp(xx) * cos(yy + zz)], axis=0)
+
+    threads = numba.get_num_threads()
+    terms = [del2_terms(f, x, y, "spherical")] + curl_terms(v, x, y, "spherical")
+    for term in terms:
+        expected = pcd.apply_stencil(
+            np.empty_like(f), term, dx_1, dx_tilde, compiled=False
+        )
+        actual = pcd.apply_stencil(
+            np.empty_like(f), term, dx_1, dx_tilde, workers=1, compiled=True
+        )
+        _assert_close_arr(expected, actual, "apply_stencil")
+    assert_equal(numba.get_num_threads(), threads)
+
+
 @test
 def derivatives_cylindrical() -> None:
     """Derivatives in cylindrical coordinates"""
@@ -302,6 +366,461 @@ def derivatives_spherical() -> None:
     check_arr_close(df_ana, df_num)
 
 
+@test
+def poisson_solvers() -> None:
+    """Poisson solvers with transforms and conjugate gradients"""
+    x = np.linspace(0, 2 * pi, 16, endpoint=False)
+    z, y, x = np.meshgrid(x, x, x, indexing="ij")
+    dx = x[0, 0, 1] - x[0, 0, 0]
+    u = sin(x) * cos(2 * y) * sin(z)
+    _assert_close_arr(u, pc.math.poisson_fft(-6 * u, dx, dx, dx, spectral=True), "u")
+
+    # Harmonic function with the boundary values given.
+    z, theta, r = generate_cylindrical_grid()
+    r_1d, theta_1d, z_1d = r[0, 0], theta[0, :, 0], z[:, 0, 0]
+    u = r * cos(theta) + z
+    bc = u.copy()
+    bc[1:-1, 1:-1, 1:-1] = 0
+    u_num, residuals = pc.math.poisson_cg(
+        np.zeros_like(u), bc, r_1d, theta_1d, z_1d, "cylindrical", tol=1e-10
+    )
+    assert residuals[-1] < 1e-10
+    _assert_close_arr(u, u_num, "u", eps=1e-3)
+    # The Cartesian solvers agree on the discretized equation.
+    dr = r_1d[1] - r_1d[0]
+    u_fft = pc.math.poisson_fft(np.ones_like(u), dr, dr, dr, bc=bc)
+    u_cg = pc.math.poisson_cg(np.ones_like(u), bc, r_1d, r_1d, r_1d, tol=1e-12)[0]
+    _assert_close_arr(u_fft, u_cg, "u")
+
+    # Cartesian unit vector in spherical components.
+    phi, theta, r = generate_spherical_grid()
+    v = np.stack([cos(theta), -sin(theta), np.zeros_like(r)], axis=0)
+    bc = v.copy()
+    bc[:, 1:-1, 1:-1, 1:-1] = 0
+    v_num, _ = pc.math.poisson_vector_cg(
+        np.zeros_like(v), bc, r[0, 0], theta[0, :, 0], phi[:, 0, 0], "spherical"
+    )
+    _assert_close_arr(v, v_num, "v")
+
+    # The Jacobi iterations and the tol paths are periodic in theta and z.
+    r = np.linspace(1, 2, 8)
+    theta = np.linspace(0, 2 * pi, 12, endpoint=False)
+    z = np.linspace(0, 1, 10, endpoint=False)
+    zz, tt, rr = np.meshgrid(z, theta, r, indexing="ij")
+    h = sin(tt) * cos(2 * pi * zz) * (rr - 1) * (2 - rr)
+    bc = np.zeros_like(h)
+    u_jacobi = pc.math.poisson_scalar_cylindrical(bc.copy(), r, theta, z, h, niter=2000)
+    u_cg = pc.math.poisson_scalar_cylindrical(bc.copy(), r, theta, z, h, tol=1e-12)
+    _assert_close_arr(u_jacobi, u_cg, "u")
+    v_cg = pc.math.poisson_vector_cylindrical(
+        bc.copy(), bc.copy(), bc.copy(), r, theta, z, h, h, h, tol=1e-12
+    )
+    _assert_close_arr(u_cg, v_cg[2], "uz")
+
+    # x = r*sin(theta)*cos(phi), with no boundary values in phi.
+    theta = np.linspace(0.5, pi - 0.5, 10)
+    phi = np.linspace(0, 2 * pi, 12, endpoint=False)
+    pp, tt, rr = np.meshgrid(phi, theta, r, indexing="ij")
+    u = rr * sin(tt) * cos(pp)
+    bc = u.copy()
+    bc[:, 1:-1, 1:-1] = 0
+    u_cg = pc.math.laplace_scalar_spherical(bc, r, theta, phi, tol=1e-12)
+    _assert_close_arr(u, u_cg, "u", eps=1e-2)
+
+
+@test
+def structure_functions() -> None:
+    """Structure functions from correlations and from explicit differences"""
+    rng = np.random.default_rng(1)
+    arr = rng.normal(size=(6, 7, 8))
+    arr[2, 3, 4] = np.nan
+    lperi = (True, False, True)
+    for Dorder in (2, 3):
+        D, N = pc.math.stats.struct_lags(arr, (3, 4), Dorder, (1, 2), lperi)
+        D_direct, N_direct = pc.math.stats.struct_lags(
+            arr, (3, 4), Dorder, (1, 2), lperi, method="direct"
+        )
+        _assert_close_arr(D, D_direct, "D")
+        _assert_close_arr(N, N_direct, "N")
+        # Lag (2, 3) by explicit shifts, not wrapped along y.
+        diff = np.roll(arr, -3, axis=2)[:, 2:] - arr[:, :-2]
+        _assert_close_arr(D[2, 3], np.nanmean(diff ** Dorder), "D")
+        _assert_close_arr(N[2, 3], np.isfinite(diff).mean(), "N")
+
+
+@test
+def interpolation_batched() -> None:
+    """Interpolation at many points at once"""
+    grid = pc.read.grids.Grid()
+    grid.x = np.linspace(0, 1, 9, endpoint=False)
+    grid.y = np.linspace(0, 1, 12) ** 2
+    grid.Lx = 1
+    grid.z = np.linspace(-1, 1, 7)
+    z, y, x = np.meshgrid(grid.z, grid.y, grid.x, indexing="ij")
+    field = np.array([x ** 3 + y ** 2 * z, x * y * z ** 3])
+    xyz = np.random.default_rng(1).uniform([0, 0, -1], [0.875, 1, 1], (20, 3))
+    x, y, z = xyz.T
+    _assert_close_arr(
+        pc.math.vec_int_batch(xyz, field, grid=grid, interpolation="tricubic"),
+        np.stack([x ** 3 + y ** 2 * z, x * y * z ** 3], axis=1),
+        "tricubic",
+    )
+    _assert_close_arr(
+        pc.math.vec_int_batch(xyz, field[1], grid=grid),
+        pc.math.vec_int_batch(xyz + [3, 0, 0], field[1], grid=grid, periodic=True),
+        "periodic",
+    )
+
+
+@test
+def streamlines_batched() -> None:
+    """Streamlines of many seeds traced at once"""
+    x = np.linspace(-1, 1, 21)
+    z, y, x = np.meshgrid(x, x, x, indexing="ij")
+    field = np.array([y, -x, np.full_like(z, 0.5)])
+    params = pc.diag.TracersParameterClass()
+    params.dx = params.dy = params.dz = 0.1
+    params.Ox = params.Oy = params.Oz = -1
+    params.nx = params.ny = params.nz = 21
+    params.Lx = params.Ly = params.Lz = 2
+    xx = np.array([[0.5, 0, -1], [0, -0.3, -1], [0.2, 0.2, -1]])
+    time = np.linspace(0, 3, 31)
+    for method in ("RK45", "RK4"):
+        streams = pc.calc.Streams(field, params, xx=xx, time=time, method=method)
+        # Helical lines, leaving the box through the top at t = 4.
+        x0, y0, t = xx[:, 0:1], xx[:, 1:2], time
+        rotated = np.stack(
+            [
+                x0 * cos(t) + y0 * sin(t),
+                y0 * cos(t) - x0 * sin(t),
+                -1 + 0.5 * t + 0 * x0,
+            ],
+            axis=-1,
+        )
+        _assert_close_arr(streams.tracers, rotated, "tracers", eps=1e-4)
+        chords = sqrt(np.sum(np.diff(rotated, axis=1) ** 2, axis=2))
+        _assert_close_arr(streams.total_l, np.sum(chords, axis=1), "l", eps=1e-4)
+    streams = pc.calc.Streams(field, params, xx=xx, time=np.linspace(0, 6, 31))
+    assert np.all(streams.n_points == 22)
+    _assert_close_arr(streams.line(0)[-1, 2], 1.0, "z")
+
+
+@test
+def particle_deposition() -> None:
+    """NGP, CIC and TSC deposition of particles onto a grid"""
+    rng = np.random.default_rng(3)
+    xp, yp, zp = rng.uniform(-1, 1, (3, 5000))
+    quantity = rng.random(5000)
+    extent = [[-1, 1], [-1, 1], [-1, 1]]
+    hist, edges = np.histogramdd(
+        np.array([xp, yp, zp]).T, bins=[8, 6, 4], range=extent, weights=quantity
+    )
+    arr = pc.calc.deposit(
+        [xp, yp, zp], extent, [8, 6, 4], weights=quantity, chunk_size=700
+    )
+    _assert_close_arr(arr, hist, "ngp")
+    for kernel in ("cic", "tsc"):
+        for periodic in (True, False):
+            arr = pc.calc.deposit(
+                [xp, yp, zp],
+                extent,
+                [8, 6, 4],
+                weights=quantity,
+                kernel=kernel,
+                periodic=periodic,
+                chunk_size=700,
+            )
+            _assert_close_arr(np.sum(arr), np.sum(quantity), kernel)
+    # Two processes add their chunks to the shared grid.
+    arr_proc = pc.calc.deposit(
+        [xp, yp, zp],
+        extent,
+        [8, 6, 4],
+        weights=quantity,
+        kernel="tsc",
+        chunk_size=700,
+        n_proc=2,
+    )
+    _assert_close_arr(arr_proc, arr, "n_proc=2")
+    # A particle in the first cell, wrapping around the periodic boundary.
+    arr = pc.calc.deposit([[-0.95]], [[-1, 1]], [8], kernel="cic", periodic=True)
+    _assert_close_arr(arr[[-1, 0]], [0.3, 0.7], "cic")
+    arr = pc.calc.deposit([[-0.875]], [[-1, 1]], [8], kernel="tsc", periodic=True)
+    _assert_close_arr(arr[[-1, 0, 1]], [0.125, 0.75, 0.125], "tsc")
+    arr, xgrid, ygrid = pc.calc.part_to_grid(
+        xp, yp, quantity=quantity, Nbins=[8, 6], extent=extent
+    )
+    hist, edges = np.histogramdd(
+        np.array([xp, yp]).T, bins=[8, 6], range=extent[:2], weights=quantity
+    )
+    count, edges = np.histogramdd(np.array([xp, yp]).T, bins=[8, 6], range=extent[:2])
+    _assert_close_arr(arr, hist / count, "part_to_grid")
+    _assert_close_arr(xgrid, np.linspace(-0.875, 0.875, 8), "xgrid")
+
+
+@test
+def particle_gather() -> None:
+    """NGP, CIC and TSC interpolation of a field to particles"""
+    rng = np.random.default_rng(4)
+    x = np.linspace(0, 1, 11)
+    y = np.linspace(0, 2, 21)
+    z = np.array([0.5])
+    z_grid, y_grid, x_grid = np.meshgrid(z, y, x, indexing="ij")
+    field = np.array([2 * x_grid - 3 * y_grid, 0 * x_grid + 1])
+    xp, yp = rng.uniform(0.1, 0.9, (2, 1000))
+    zp = np.full_like(xp, 0.2)
+    # CIC and TSC are exact for linear fields.
+    for kernel in ("cic", "tsc"):
+        arr = pc.calc.grid_to_part(field, xp, yp, zp, x, y, z, kernel=kernel)
+        _assert_close_arr(arr, [2 * xp - 3 * yp, np.ones_like(xp)], kernel)
+    arr = pc.calc.grid_to_part(field, xp, yp, zp, x, y, z, kernel="ngp")
+    _assert_close_arr(
+        arr[0], 2 * np.round(xp * 10) / 10 - 3 * np.round(yp * 10) / 10, "ngp"
+    )
+    # Periodic wrap around between the last and first point.
+    x = np.arange(8) / 8.0
+    field = np.zeros((1, 1, 8))
+    field[0, 0, 0] = 1
+    arr = pc.calc.grid_to_part(
+        field, [0.9375], [0], [0], x, [0], [0], kernel="cic", periodic=True
+    )
+    _assert_close_arr(arr, [0.5], "periodic")
+
+
+@test
+def field_skeleton_nulls() -> None:
+    """Null points, spines and separatrices of a field with two nulls"""
+    x = np.linspace(-1, 1, 33)
+    z, y, x = np.meshgrid(x, x, x, indexing="ij")
+    field = np.array([x ** 2 - 0.2304, y - 0.1, 0.13 - z])
+    grid = pc.read.grids.Grid()
+    grid.x = grid.y = grid.z = x[0, 0]
+    grid.dx = grid.dy = grid.dz = 1 / 16
+    nulls = pc.tool_kit.NullPoint()
+    nulls.find_nullpoints(grid, field)
+    # The linear interpolation of x**2 - 0.48**2 between the grid points.
+    f_0, f_1 = 0.4375 ** 2 - 0.2304, 0.5 ** 2 - 0.2304
+    x_null = 0.4375 - f_0 / (f_1 - f_0) / 16
+    _assert_close_arr(
+        nulls.nulls, [[-x_null, 0.1, 0.13], [x_null, 0.1, 0.13]], "nulls"
+    )
+    _assert_close_arr(nulls.sign_trace, [-1, 1], "sign_trace")
+    _assert_close_arr(abs(nulls.normals), [[0, 1, 0], [0, 0, 1]], "normals")
+    spines = pc.tool_kit.Spine()
+    spines.find_spines(grid, field, nulls, delta=0.05)
+    assert len(spines.spines) == 4
+    # The spine of the second null runs along z towards the boundaries.
+    _assert_close_arr(spines.spines[2][:, :2], [[x_null, 0.1]], "spine")
+    separatrices = pc.tool_kit.Separatrix()
+    separatrices.find_separatrices(grid, field, nulls, delta=0.05, iter_max=10)
+    assert np.all(separatrices.connectivity < len(separatrices.separatrices))
+
+
+@test
+def remesh_interpolation() -> None:
+    """Separable remeshing with linear, cubic, spectral and conservative weights"""
+    remesh = pc.sim.remesh
+
+    def grid(n, nghost=3):
+        return (np.arange(n + 2 * nghost) - nghost + 0.5) * 2 * pi / n
+
+    xsrc, ysrc, zsrc = grid(8), grid(10), grid(6)
+    xdst, ydst, zdst = grid(16), grid(20), grid(12)
+    f = lambda z, y, x: 1 + x - 2 * y + 0.5 * z
+    var = f(*np.meshgrid(zsrc, ysrc, xsrc, indexing="ij"))
+    expected = f(*np.meshgrid(zdst, ydst, xdst, indexing="ij"))
+    _assert_close_arr(
+        remesh.local_remesh(var, xsrc, ysrc, zsrc, xdst, ydst, zdst),
+        expected,
+        "linear",
+    )
+    _assert_close_arr(
+        remesh.local_remesh(var, xsrc, ysrc, zsrc, xdst, ydst, zdst, n_proc=2),
+        expected,
+        "parallel",
+    )
+    operators = remesh.remesh_operators(xsrc, ysrc, zsrc, xdst, ydst, zdst, "cubic")
+    chunks = np.zeros(expected.shape)
+    for iz in np.array_split(np.arange(zdst.size), 3):
+        for ix in np.array_split(np.arange(xdst.size), 2):
+            box = (slice(iz[0], iz[-1] + 1), slice(None), slice(ix[0], ix[-1] + 1))
+            sub_operators, src_box = remesh.remesh_box(operators, box)
+            chunks[box] = remesh.apply_remesh(var[src_box], sub_operators)
+    _assert_close_arr(chunks, expected, "chunks")
+
+    cubic = lambda x: 1 + x - 0.3 * x ** 2 + 0.05 * x ** 3
+    weights = remesh.remesh_operator(xsrc, xdst, "cubic")
+    _assert_close_arr(weights @ cubic(xsrc), cubic(xdst), "cubic")
+    periodic = lambda x: sin(x) + 0.5 * cos(3 * x)
+    for n in (8, 9):
+        weights = remesh.remesh_operator(grid(n), xdst, "spectral", periodic=True)
+        _assert_close_arr(weights @ periodic(grid(n)), periodic(xdst), "spectral")
+    values = np.random.default_rng(5).random(xdst.size)
+    weights = remesh.remesh_operator(xdst, xsrc, "conservative")
+    _assert_close_arr(
+        np.sum((weights @ values)[3:-3]) * (xsrc[1] - xsrc[0]),
+        np.sum(values[3:-3]) * (xdst[1] - xdst[0]),
+        "conservative",
+    )
+
+
+@test
+def chunked_derive_data() -> None:
+    """Derived data of halo padded chunks, serial and in a process pool"""
+    import os
+    import pickle
+    import tempfile
+    import warnings
+    import h5py
+    from types import SimpleNamespace
+
+    nghost, nx, ny, nz = 3, 16, 12, 8
+    mx, my, mz = nx + 2 * nghost, ny + 2 * nghost, nz + 2 * nghost
+    blocks = pc.io.chunk_blocks([mz, my, mx], [4, 3, 2], nghost=nghost)
+    count = np.zeros([mz, my, mx])
+    for block in blocks:
+        count[block.out] += 1
+    assert np.all(count == 1)
+
+    dx = 0.1
+    grid = SimpleNamespace(dx=dx, dy=dx, dz=dx)
+    par = SimpleNamespace(coord_system="cartesian")
+    fields = np.random.default_rng(3).random([6, mz, my, mx])
+    interior = (Ellipsis,) + (slice(nghost, -nghost),) * 3
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        src = h5py.File(os.path.join(tmp_dir, "var.h5"), "w")
+        settings = dict(nx=nx, ny=ny, nz=nz, mx=mx, my=my, mz=mz, mvar=6, maux=0)
+        for key, value in settings.items():
+            src["settings/" + key] = [value]
+        src["time"] = 0.0
+        for field, key in zip(fields, ("ux", "uy", "uz", "ax", "ay", "az")):
+            src["data/" + key] = field
+        window = pc.io.chunked.Window(
+            src["data"], blocks[0], margin=2, periodic=True, nghost=nghost
+        )
+        assert not window.items and "ux" in window
+        _assert_close_arr(
+            window["ux"].images[nghost, nghost, -2:0],
+            fields[0, 3, 3, nx - 2 : nx],
+            "periodic",
+        )
+        assert_equal(window.used, {"ux"})
+        window = pc.io.chunked.Window(src["data"], blocks[-1], nghost=nghost)
+        _assert_close_arr(window["uy"][-1, -2, -3:], fields[1, -1, -2, -3:], "end")
+        # A pickled window reads the datasets not read ahead from the file.
+        src.flush()
+        window = pickle.loads(pickle.dumps(window))
+        assert "uz" not in window.items
+        _assert_close_arr(window["uz"][-1, -2, -3:], fields[2, -1, -2, -3:], "pickled")
+        window = pickle.loads(pickle.dumps(window))
+        window.source = (os.path.join(tmp_dir, "missing.h5"), "/data")
+        try:
+            window["az"]
+            raised = False
+        except pc.io.chunked._NotRead:
+            raised = True
+        assert raised
+        derived = list()
+        for chunksize, n_proc in ((1e9, 1), (1e-9, 1), (1e-9, 2)):
+            dst = h5py.File(os.path.join(tmp_dir, "derived.h5"), "w")
+            with warnings.catch_warnings(record=True) as caught:
+                warnings.simplefilter("always")
+                pc.ism_dyn.derive_data(
+                    tmp_dir,
+                    src,
+                    dst,
+                    magic=["vort", "bb"],
+                    par=par,
+                    gd=grid,
+                    chunksize=chunksize,
+                    nmin=4,
+                    n_proc=n_proc,
+                )
+            # the workers read the datasets themselves
+            assert not [w for w in caught if "chunked_map" in str(w.message)]
+            derived.append(
+                np.array([dst["data"][key][interior] for key in ("vort", "bb")])
+            )
+            dst.close()
+        src.close()
+    _assert_close_arr(derived[1], derived[0], "chunked")
+    _assert_close_arr(derived[2], derived[0], "process pool")
+
+
+@test
+def tracers_fixed_point() -> None:
+    """Field line mapping and fixed point of a field twisted around an O-point"""
+    import os
+    import multiprocessing as mp
+    from pencil.diag.tracers import TracersParameterClass, _sub_tracers
+    from pencil.diag.fixed_points import _sub_fixed
+    from pencil.util import SharedArray, run_processes
+
+    # B = (-(y - yc)/2, (x - xc)/2, 1) maps z = 0 to z = 1 by a rotation about
+    # (xc, yc), which is the only fixed point.
+    center = np.array([0.1, 0.05])
+    x = np.linspace(-1, 1, 5)
+    z = np.linspace(0, 1, 5)
+    params = TracersParameterClass()
+    params.dx = params.dy = x[1] - x[0]
+    params.dz = z[1] - z[0]
+    params.Ox = params.Oy = -1.0
+    params.Lx = params.Ly = 2.0
+    params.Lz = 1.0
+    params.nx = params.ny = params.nz = 5
+    params.rtol = params.atol = 1e-5
+    zz, yy, xx = np.meshgrid(z, x, x, indexing="ij")
+    shared = {"field": SharedArray((3, 5, 5, 5))}
+    shared["field"].array[...] = [
+        -(yy - center[1]) / 2,
+        (xx - center[0]) / 2,
+        np.ones_like(xx),
+    ]
+
+    # Trace from the corners of one cell around the center.
+    seeds = np.array([-0.3, 0.4])
+    x0, y0 = np.meshgrid(seeds, seeds, indexing="ij")
+    shared["seeds"] = SharedArray((2, 2, 3), fill=0)
+    shared["seeds"].array[..., 0] = x0
+    shared["seeds"].array[..., 1] = y0
+    for name in ["x1", "y1", "z1", "l", "q"]:
+        shared[name] = SharedArray((2, 2), fill=0)
+    shared["mapping"] = SharedArray((2, 2, 3), fill=0)
+    shared["lines"] = SharedArray((2, 2, 50, 3))
+    shared["n_points"] = SharedArray((2, 2), dtype=int, fill=0)
+    # Two forked workers share the rows of seeds.
+    run_processes(_sub_tracers, (params, shared, mp.Value("i", 0), 1), 2)
+    angle = 0.5
+    rotation = np.array(
+        [[np.cos(angle), -np.sin(angle)], [np.sin(angle), np.cos(angle)]]
+    )
+    mapped = np.einsum("ij,klj->kli", rotation, np.stack([x0, y0], -1) - center)
+    _assert_close_arr(shared["z1"].array, np.ones((2, 2)), "z1")
+    _assert_close_arr(shared["x1"].array, mapped[..., 0] + center[0], "x1", eps=1e-2)
+    _assert_close_arr(shared["y1"].array, mapped[..., 1] + center[1], "y1", eps=1e-2)
+
+    shared["maps"] = SharedArray((4, 2, 2))
+    shared["maps"].array[...] = [x0, y0, shared["x1"].array, shared["y1"].array]
+    shared["poincare"] = SharedArray((2, 2), fill=0)
+    shared["fixed"] = SharedArray((1, 1, 2), fill=np.nan)
+    shared["sign"] = SharedArray((1, 1), fill=0)
+    with np.errstate(invalid="ignore"):
+        run_processes(_sub_fixed, (params, shared, mp.Value("i", 0), 1), 2)
+    _assert_close_arr(shared["poincare"].array[0, 0], 2 * np.pi, "Poincare index")
+    assert_equal(shared["sign"].array[0, 0], 1.0)
+    _assert_close_arr(shared["fixed"].array[0, 0], center, "fixed point", eps=1e-4)
+    for shared_array in shared.values():
+        shared_array.unlink()
+
+    # A killed worker leaves its results missing.
+    try:
+        run_processes(os._exit, (3,), 2)
+        raised = False
+    except RuntimeError:
+        raised = True
+    assert_equal(raised, True)
+
+
 def check_arr_close(a, b):
     _assert_close_arr(trim(a), trim(b), "max abs difference")
 
@@ -6,6 +6,8 @@
 
 import numpy as np
 import os
+import shutil
+import tempfile
 from typing import Any, Tuple
 
 from test_utils import (
@@ -22,6 +24,11 @@ from pencil.read.dims import dim
 from pencil.read.varfile import var
 from pencil.read.params import param
 from pencil.read.powers import power
+from pencil.read.averages import aver
+from pencil.read.allslices import slice_frames
+from pencil.read.pvarfile import pvar
+from pencil.read.pstalk import pstalk
+from pencil.read.cache import metadata_cache
 
 
 DATA_DIR = os.path.realpath(
@@ -66,6 +73,62 @@ def test_read_time_series() -> None:
     _assert_close(time_series.ecrmax[3], 1.835, "ecrmax[3]")
 
 
+@test
+def test_read_time_series_update() -> None:
+    """Read time series in bulk and append new lines."""
+    slow = ts(data_file("time-series-1.dat"), quiet=True, fast=False)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file_name = os.path.join(tmp_dir, "time_series.dat")
+        shutil.copy(data_file("time-series-1.dat"), file_name)
+        time_series = ts(datadir=tmp_dir, quiet=True)
+        assert_equal(time_series.keys, slow.keys)
+        for key in slow.keys:
+            assert_true(
+                np.array_equal(getattr(time_series, key), getattr(slow, key)),
+                "time_series.{} differs from the line by line parser".format(key),
+            )
+
+        with open(file_name, "a") as ts_file:
+            ts_file.write("   200    1.900  1.00E-02  2.500E-01  1.000E+00")
+        assert_equal(time_series.update(), 0)
+        with open(file_name, "a") as ts_file:
+            ts_file.write("  1.050E+00  1.700E+00\n")
+        assert_equal(time_series.update(), 1)
+        _assert_close(time_series.t[4], 1.9, "t[4]")
+        _assert_close(time_series.ecrmax[4], 1.7, "ecrmax[4]")
+
+
+@test
+def test_get_ts_cache() -> None:
+    """Re-read a stale time series cached by a simulation object."""
+    from pencil.sim import simulation
+    from pencil.util import MARKER_FILES
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for marker in MARKER_FILES:
+            os.makedirs(os.path.dirname(os.path.join(tmp_dir, marker)), exist_ok=True)
+            open(os.path.join(tmp_dir, marker), "w").close()
+        os.makedirs(os.path.join(tmp_dir, "data"))
+        file_name = os.path.join(tmp_dir, "data", "time_series.dat")
+        shutil.copy(data_file("time-series-1.dat"), file_name)
+        sim = simulation(tmp_dir, quiet=True)
+        cached = sim.get_ts()
+        assert_true(sim.get_ts() is cached, "get_ts did not use the cache")
+
+        # a cached object without file offset, e.g. from an old sim.dill
+        del cached._file_name
+        with open(file_name, "a") as ts_file:
+            ts_file.write("   200    1.900  1.00E-02  2.500E-01  1.000E+00")
+            ts_file.write("  1.050E+00  1.700E+00\n")
+        time_series = sim.get_ts()
+        assert_true(time_series is not cached, "stale cache was returned")
+        _assert_close(time_series.t[4], 1.9, "t[4]")
+        assert_true(
+            sim.get_ts(unique_clean=False) is not time_series,
+            "cache ignored unique_clean",
+        )
+
+
 @test
 def test_read_dim() -> None:
     """Read dim.dat file."""
@@ -151,6 +214,591 @@ def test_read_var() -> None:
         test_extracted(getattr(data, key), extract, expect, key, eps)
 
 
+@test
+def test_read_var_lazy() -> None:
+    """Read var.dat (data cube) file through memory maps."""
+    data = var("var.dat", DATA_DIR, proc=0, quiet=True)
+    lazy = var("var.dat", DATA_DIR, proc=0, quiet=True, lazy=True)
+    _assert_equal_tuple(lazy.f.shape, (5, 11, 12, 10))
+    assert_true(np.array_equal(data.f, np.asarray(lazy.f)), "lazy f differs")
+    assert_true(np.array_equal(data.f[3], lazy.f[3]), "lazy f[3] differs")
+    assert_true(
+        np.array_equal(data.f[1:4, 2:9, :, 3:7], lazy.f[1:4, 2:9, :, 3:7]),
+        "lazy sub-box differs",
+    )
+    assert_true(np.array_equal(data.uu, lazy.uu), "lazy uu differs")
+    _assert_close(data.t, lazy.t, "t")
+
+    trimmed = var("var.dat", DATA_DIR, proc=0, quiet=True, lazy=True, trimall=True)
+    _assert_equal_tuple(trimmed.f.shape, (5, 5, 6, 4))
+    assert_true(
+        np.array_equal(data.f[:, 3:8, 3:9, 3:7], trimmed.f[...]),
+        "lazy trimmed f differs",
+    )
+
+
+@test
+def test_metadata_cache() -> None:
+    """Reuse parsed metadata between reads of the same run."""
+    metadata_cache.clear()
+    first = var("var.dat", DATA_DIR, proc=0, quiet=True)
+    info = metadata_cache.info()
+    second = var("var.dat", DATA_DIR, proc=0, quiet=True)
+    # There is no grid.dat in the test input, so only param, index and dim
+    # are cached.
+    for kind in ["param", "index", "dim"]:
+        assert_equal(metadata_cache.info()[kind]["misses"], info[kind]["misses"])
+        assert_true(
+            metadata_cache.info()[kind]["hits"] > info[kind]["hits"],
+            "no cache hits for {}".format(kind),
+        )
+    assert_true(np.array_equal(first.f, second.f), "cached read differs")
+    assert_equal(metadata_cache.param(DATA_DIR).coord_system, "cartesian")
+    assert_equal(metadata_cache.dim(DATA_DIR).mx, 10)
+    metadata_cache.clear()
+
+
+@test
+def test_read_var_workers() -> None:
+    """Read the processors of a run split in z with threads."""
+    with tempfile.TemporaryDirectory() as datadir:
+        for file_name in ["index.pro", "param.nml"]:
+            shutil.copy(data_file(file_name), datadir)
+        # Three processors holding the same data.
+        for ipz in range(3):
+            proc_dir = os.path.join(datadir, "proc{}".format(ipz))
+            os.makedirs(proc_dir)
+            shutil.copy(data_file("proc0/var.dat"), proc_dir)
+            with open(os.path.join(proc_dir, "dim.dat"), "w") as dim_file:
+                dim_file.write("10 12 11 5 0 0\nS\n3 3 3\n0 0 {}\n".format(ipz))
+        with open(os.path.join(datadir, "dim.dat"), "w") as dim_file:
+            dim_file.write("10 12 21 5 0 0\nS\n3 3 3\n1 1 3 1\n")
+
+        serial = var("var.dat", datadir, quiet=True, cache=False)
+        _assert_equal_tuple(serial.f.shape, (5, 21, 12, 10))
+        for workers in [2, 4]:
+            threaded = var("var.dat", datadir, quiet=True, cache=False, workers=workers)
+            assert_true(np.array_equal(serial.f, threaded.f), "threaded f differs")
+            assert_true(np.array_equal(serial.z, threaded.z), "threaded z differs")
+
+
+def _hdf5_run(tmp_dir: str, data: Any) -> str:
+    """Set up a run in tmp_dir with the HDF5 io_strategy holding data."""
+    import h5py
+
+    datadir = os.path.join(tmp_dir, "data")
+    os.makedirs(os.path.join(datadir, "allprocs"))
+    for file_name in ["dim.dat", "index.pro"]:
+        shutil.copy(data_file(file_name), os.path.join(datadir, file_name))
+    with open(data_file("param.nml")) as in_file:
+        param_nml = in_file.read().replace("IO_STRATEGY='dist", "IO_STRATEGY='HDF5")
+    with open(os.path.join(datadir, "param.nml"), "w") as out_file:
+        out_file.write(param_nml)
+
+    procdim = dim(DATA_DIR, 0)
+    with h5py.File(os.path.join(datadir, "grid.h5"), "w") as grid_file:
+        for key in ["mx", "my", "mz", "mvar", "maux", "mglobal", "precision"]:
+            grid_file["settings/" + key] = getattr(procdim, key)
+        for key in ["nx", "ny", "nz", "l1", "l2", "m1", "m2", "n1", "n2"]:
+            grid_file["settings/" + key] = getattr(procdim, key)
+        for key in ["nprocx", "nprocy", "nprocz"]:
+            grid_file["settings/" + key] = getattr(procdim, key)
+        grid_file["settings/nghost"] = procdim.nghostx
+        for coord in "xyz":
+            delta = getattr(data, "d" + coord)
+            grid_file["grid/" + coord] = getattr(data, coord)
+            grid_file["grid/d" + coord + "_1"] = np.ones(getattr(data, coord).size) / delta
+            grid_file["grid/d" + coord + "_tilde"] = np.zeros(getattr(data, coord).size)
+            grid_file["grid/d" + coord] = delta
+            grid_file["grid/L" + coord] = delta * getattr(procdim, "n" + coord)
+    with h5py.File(os.path.join(datadir, "allprocs", "var.h5"), "w") as var_file:
+        for key, ivar in [("ux", 0), ("uy", 1), ("uz", 2), ("lnrho", 3), ("ss", 4)]:
+            var_file["data/" + key] = data.f[ivar]
+        var_file["time"] = data.t
+        for coord in "xyz":
+            var_file["grid/" + coord] = getattr(data, coord)
+            var_file["grid/d" + coord] = getattr(data, "d" + coord)
+
+    return datadir
+
+
+@test
+def test_read_var_region() -> None:
+    """Read variables and a sub-box of an HDF5 snapshot."""
+    data = var("var.dat", DATA_DIR, proc=0, quiet=True)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        datadir = _hdf5_run(tmp_dir, data)
+        full = var(datadir=datadir, quiet=True)
+        assert_true(np.array_equal(full.f, data.f), "HDF5 f differs")
+
+        region = (slice(4, 7), None, slice(2, 8))
+        part = var(datadir=datadir, quiet=True, variables=["lnrho"], region=region)
+        _assert_equal_tuple(part.f.shape, (1, 3, 12, 6))
+        assert_true(np.array_equal(part.lnrho, data.lnrho[4:7, :, 2:8]), "wrong lnrho")
+        assert_true(np.array_equal(part.x, data.x[2:8]), "wrong x")
+        _assert_equal_tuple((part.l1, part.l2, part.n1, part.n2), (1, 5, 0, 3))
+        assert_true(not hasattr(part, "ss"), "ss was read")
+        try:
+            var("var.dat", DATA_DIR, proc=0, quiet=True, variables=["lnrho"])
+            raised = False
+        except ValueError:
+            raised = True
+        assert_true(raised, "variables of a 'dist' snapshot did not raise")
+
+        # The vorticity needs the ghost zones around the region.
+        vort = var(
+            datadir=datadir,
+            quiet=True,
+            variables=["lnrho"],
+            region=region,
+            magic=["vort"],
+            trimall=True,
+        )
+        trimmed = var(datadir=datadir, quiet=True, magic=["vort"], trimall=True)
+        _assert_equal_tuple(vort.f.shape, (4, 3, 6, 4))
+        assert_true(np.allclose(vort.vort, trimmed.vort[:, 1:4, :, :4]), "wrong vort")
+        assert_true(np.array_equal(vort.uu, trimmed.uu[:, 1:4, :, :4]), "wrong uu")
+
+
+def _procdim(ipz: int, nx: int, ny: int, nz: int) -> Any:
+    """Dimensions of processor ipz of a run split in z only."""
+    from types import SimpleNamespace
+
+    return SimpleNamespace(
+        ipx=0, ipy=0, ipz=ipz, nx=nx, ny=ny, nz=nz, mx=nx + 6, my=ny + 6, mz=nz + 6,
+        l1=3, l2=nx + 2, m1=3, m2=ny + 2, n1=3, n2=nz + 2,
+        nghostx=3, nghosty=3, nghostz=3,
+    )
+
+
+@test
+def test_chunk_shape() -> None:
+    """Chunk shapes of the HDF5 access patterns."""
+    from types import SimpleNamespace
+    from pencil.io import chunk_shape
+
+    shape = (70, 38, 30)
+    _assert_equal_tuple(chunk_shape(shape, (100, 8, 8)), (70, 8, 8))
+    _assert_equal_tuple(chunk_shape(shape, "block"), (51, 38, 30))
+    _assert_equal_tuple(chunk_shape(shape, "plane", itemsize=4), (1, 38, 30))
+    _assert_equal_tuple(chunk_shape(shape, "auto"), chunk_shape(shape, "block"))
+
+    # 2 x 4 processors in x and z, chunks of their sub-domains
+    procdim = SimpleNamespace(nx=12, ny=32, nz=16, nghostx=3, nghosty=3, nghostz=3)
+    chunks = chunk_shape(shape, "auto", procdim=procdim, chunk_bytes=8 * 1024)
+    _assert_equal_tuple(chunks, (16, 5, 12))
+
+    # 256^3 on 4 x 4 x 4 processors, the 64^3 sub-domains exceed 1MB
+    procdim = SimpleNamespace(nx=64, ny=64, nz=64, nghostx=3, nghosty=3, nghostz=3)
+    chunks = chunk_shape((262, 262, 262), "proc", procdim=procdim)
+    _assert_equal_tuple(chunks, (32, 64, 64))
+    chunks = chunk_shape((262, 262, 262), "proc", itemsize=4, procdim=procdim)
+    _assert_equal_tuple(chunks, (64, 64, 64))
+
+
+@test
+def test_write_h5_snapshot_compressed() -> None:
+    """Write compressed HDF5 snapshots, whole and per processor."""
+    import h5py
+    from types import SimpleNamespace
+    from pencil.io import write_h5_snapshot
+
+    nx, ny, nz = 12, 6, 8
+    settings = dict(
+        l1=3, l2=nx + 2, m1=3, m2=ny + 2, n1=3, n2=nz + 2, nx=nx, ny=ny, nz=nz,
+        mx=nx + 6, my=ny + 6, mz=nz + 6, nprocx=1, nprocy=1, nprocz=2,
+        maux=0, mglobal=0, mvar=2, precision=b"d", nghost=3, version=np.int32(0),
+    )
+    grid = SimpleNamespace()
+    for coord in "xyz":
+        m = settings["m" + coord]
+        setattr(grid, coord, np.arange(m) * 0.1)
+        setattr(grid, "L" + coord, 1.0)
+        setattr(grid, "d" + coord, 0.1)
+        setattr(grid, "d" + coord + "_1", np.full(m, 10.0))
+        setattr(grid, "d" + coord + "_tilde", np.zeros(m))
+    param = SimpleNamespace(xyz0=[0.0, 0.0, 0.0], unit_system=b"cgs")
+    for key in ["length", "velocity", "density", "magnetic", "time"]:
+        setattr(param, "unit_" + key, 1.0)
+    for key in ["temperature", "flux", "energy", "mass"]:
+        setattr(param, "unit_" + key, 1.0)
+    kwargs = dict(
+        settings=settings,
+        grid=grid,
+        param=param,
+        indx=SimpleNamespace(ux=1, lnrho=2),
+        lghosts=True,
+        compression="gzip",
+    )
+    f = np.random.default_rng(1).random([2, nz + 6, ny + 6, nx + 6])
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        write_h5_snapshot(f, file_name="var.h5", datadir=tmp_dir, **kwargs)
+        for ipz in range(2):
+            write_h5_snapshot(
+                f[:, 4 * ipz : 4 * ipz + 10],
+                file_name="proc.h5",
+                datadir=tmp_dir,
+                proc=ipz,
+                procdim=_procdim(ipz, nx, ny, 4),
+                **kwargs
+            )
+        for file_name, layout in [("var.h5", "block"), ("proc.h5", "proc")]:
+            with h5py.File(os.path.join(tmp_dir, file_name), "r") as var_file:
+                data = var_file["data"]
+                assert_equal(data.attrs["layout"].decode(), layout)
+                _assert_equal_tuple(tuple(data.attrs["chunks"]), data["ux"].chunks)
+                assert_equal(data["ux"].compression, "gzip")
+                for key, ivar in [("ux", 0), ("lnrho", 1)]:
+                    assert_true(
+                        np.array_equal(data[key][()], f[ivar]),
+                        "{} of {} differs".format(key, file_name),
+                    )
+
+
+@test
+def test_read_var_magic() -> None:
+    """Compute magic quantities, on first access if lazy."""
+    import contextlib
+    import io
+    import pickle
+    from pencil.calc import DerivedFields
+    from pencil.math.derivatives import curl, curl2
+
+    data = var("var.dat", DATA_DIR, proc=0, quiet=True)
+    vort = curl(data.uu, dx=data.dx, dy=data.dy, dz=data.dz)
+    ou = np.sum(data.uu * vort, axis=0)[3:-3, 3:-3, 3:-3]
+    kwargs = dict(quiet=True, magic=["vort", "ou", "rho"], trimall=True)
+    magic = var("var.dat", DATA_DIR, proc=0, lazy=True, **kwargs)
+    assert_true("vort" not in magic.__dict__, "vort computed before access")
+    _assert_equal_tuple(magic.ou.shape, (5, 6, 4))
+    assert_true(np.allclose(magic.vort, vort[:, 3:-3, 3:-3, 3:-3]), "wrong vort")
+    assert_true(np.allclose(magic.ou, ou), "wrong ou")
+    assert_true(np.allclose(magic.rho, np.exp(magic.lnrho)), "wrong rho")
+    assert_true(not hasattr(magic, "_derived"), "intermediates not freed")
+
+    # Without lazy the magic quantities are computed when read, a lazy data
+    # cube computes the pending ones when pickled.
+    magic = var("var.dat", DATA_DIR, proc=0, **kwargs)
+    assert_true("ou" in magic.__dict__, "ou not computed")
+    assert_true(not hasattr(magic, "_derived"), "intermediates not freed")
+    magic = var("var.dat", DATA_DIR, proc=0, lazy=True, **kwargs)
+    with contextlib.redirect_stdout(io.StringIO()) as keys:
+        magic.keys()
+    assert_true("vort" in keys.getvalue().split(), "vort not in keys()")
+    magic = pickle.loads(pickle.dumps(magic))
+    assert_true(np.allclose(magic.__dict__["ou"], ou), "wrong pickled ou")
+
+    # bb and jj share the gradient tensor of A.
+    fields = DerivedFields({"aa": data.uu}, dx=data.dx, dy=data.dy, dz=data.dz)
+    fields.require(["bb", "jj"])
+    assert_true(np.allclose(fields["bb"], vort), "wrong bb")
+    jj = curl2(data.uu, dx=data.dx, dy=data.dy, dz=data.dz)
+    assert_true(np.allclose(fields["jj"], jj), "wrong jj")
+    _assert_equal_tuple(tuple(fields.shared), ("aij",))
+
+
+def _averages_run(tmp_dir: str, n_times: int) -> np.ndarray:
+    """Set up a run in tmp_dir with z averages of two variables."""
+    from scipy.io import FortranFile
+
+    datadir = os.path.join(tmp_dir, "data")
+    os.makedirs(os.path.join(datadir, "proc0"))
+    for file_name in ["dim.dat", "param.nml", os.path.join("proc0", "dim.dat")]:
+        shutil.copy(data_file(file_name), os.path.join(datadir, file_name))
+    with open(os.path.join(tmp_dir, "zaver.in"), "w") as in_file:
+        in_file.write("bxmz\n#bymz\nbzmz\n")
+    # nx = 4, ny = 6 in the test input.
+    data = np.arange(n_times * 2 * 6 * 4, dtype=np.float32).reshape(n_times, 2, 6, 4)
+    aver_file = FortranFile(os.path.join(datadir, "proc0", "zaverages.dat"), "w")
+    for it in range(n_times):
+        aver_file.write_record(np.array([0.5 * it], dtype=np.float32))
+        aver_file.write_record(data[it])
+    aver_file.close()
+
+    return data.swapaxes(2, 3)
+
+
+@test
+def test_read_aver_z() -> None:
+    """Read zaverages.dat through memory maps."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        expected = _averages_run(tmp_dir, 5)
+        datadir = os.path.join(tmp_dir, "data")
+        slow = aver(datadir=datadir, simdir=tmp_dir, plane_list="z", fast=False)
+        fast = aver(datadir=datadir, simdir=tmp_dir, plane_list="z")
+        assert_true(np.array_equal(fast.t, slow.t), "aver t differs")
+        assert_true(np.array_equal(fast.z.bzmz, slow.z.bzmz), "aver bzmz differs")
+        assert_true(np.array_equal(fast.z.bxmz, expected[:, 0]), "wrong bxmz")
+
+        part = aver(
+            datadir=datadir,
+            simdir=tmp_dir,
+            plane_list="z",
+            var_index=1,
+            iter_list=[1, 3, 4],
+            time_range=[0.0, 1.6],
+        )
+        assert_true(np.array_equal(part.t, [0.5, 1.5]), "wrong t selected")
+        assert_true(np.array_equal(part.z.bzmz[:, 0], expected[[1, 3], 1]), "wrong bzmz")
+
+
+@test
+def test_read_aver_xy() -> None:
+    """Read xyaverages.dat in bulk."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        _averages_run(tmp_dir, 1)
+        datadir = os.path.join(tmp_dir, "data")
+        with open(os.path.join(tmp_dir, "xyaver.in"), "w") as in_file:
+            in_file.write("bxm\nbym\nbzm\n")
+        # nz = 5 in the test input, so 15 values on two lines per time.
+        data = np.linspace(-1.0, 1.0, 6 * 15).reshape(6, 3, 5)
+        with open(os.path.join(datadir, "xyaverages.dat"), "w") as aver_file:
+            for it in range(6):
+                aver_file.write(" {0:12.5e}\n".format(0.25 * it))
+                values = ["{0:14.6e}".format(value) for value in data[it].flatten()]
+                aver_file.write("".join(values[:8]) + "\n")
+                aver_file.write("".join(values[8:]) + "\n")
+        slow = aver(datadir=datadir, simdir=tmp_dir, plane_list="xy", fast=False)
+        fast = aver(datadir=datadir, simdir=tmp_dir, plane_list="xy")
+        assert_true(np.array_equal(fast.t, slow.t), "aver t differs")
+        for var_name in ["bxm", "bym", "bzm"]:
+            assert_true(
+                np.array_equal(getattr(fast.xy, var_name), getattr(slow.xy, var_name)),
+                "aver {} differs".format(var_name),
+            )
+
+        part = aver(datadir=datadir, simdir=tmp_dir, plane_list="xy", time_range=[0.3, 1.0])
+        assert_true(np.array_equal(part.t, [0.5, 0.75, 1.0]), "wrong t selected")
+        assert_true(np.allclose(part.xy.bym, data[2:5, 1], atol=1e-6), "wrong bym")
+
+
+@test
+def test_read_slice_frames() -> None:
+    """Iterate over the records of a slice file."""
+    from scipy.io import FortranFile
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        os.makedirs(os.path.join(tmp_dir, "proc0"))
+        for file_name in ["dim.dat", "param.nml", os.path.join("proc0", "dim.dat")]:
+            shutil.copy(data_file(file_name), os.path.join(tmp_dir, file_name))
+        # nx = 4, ny = 6 in the test input.
+        data = np.arange(8 * 6 * 4, dtype=np.float32).reshape(8, 6, 4)
+        slice_file = FortranFile(os.path.join(tmp_dir, "slice_uu1.xy"), "w")
+        for it in range(8):
+            slice_file.write_record(np.append(data[it], [0.5 * it, 0.0]).astype(np.float32))
+        slice_file.close()
+
+        frames = list(slice_frames("uu1", "xy", datadir=tmp_dir))
+        assert_equal(len(frames), 8)
+        assert_true(np.array_equal(frames[3][1], data[3]), "wrong slice")
+        frames = list(
+            slice_frames("uu1", "xy", datadir=tmp_dir, tstart=1.0, tend=2.0, downsample=2)
+        )
+        assert_true(
+            np.array_equal([t for t, _ in frames], [1.0, 1.5, 2.0]), "wrong t selected"
+        )
+        assert_true(np.array_equal(frames[0][1], data[2, ::2, ::2]), "wrong downsample")
+
+
+def _write_grid(datadir: str) -> None:
+    """Write an equidistant proc0/grid.dat for the test input."""
+    from scipy.io import FortranFile
+
+    # mx = 10, my = 12, mz = 11 in the test input.
+    grid_file = FortranFile(os.path.join(datadir, "proc0", "grid.dat"), "w")
+    xyz = [np.linspace(-0.25, 1.25, m) for m in (10, 12, 11)]
+    grid_file.write_record(np.concatenate([[0.0]] + xyz).astype(np.float32))
+    grid_file.write_record(np.full(3, 1.5 / 9, dtype=np.float32))
+    grid_file.write_record(np.ones(3, dtype=np.float32))
+    grid_file.write_record(np.ones(33, dtype=np.float32))
+    grid_file.write_record(np.zeros(33, dtype=np.float32))
+    grid_file.close()
+
+
+@test
+def test_make_movie() -> None:
+    """Pipe the rendered slices in order to the encoder."""
+    import sys
+    from scipy.io import FortranFile
+    from pencil.visu import make_movie
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        os.makedirs(os.path.join(tmp_dir, "proc0"))
+        for file_name in ["dim.dat", "param.nml", os.path.join("proc0", "dim.dat")]:
+            shutil.copy(data_file(file_name), os.path.join(tmp_dir, file_name))
+        _write_grid(tmp_dir)
+        slice_file = FortranFile(os.path.join(tmp_dir, "slice_uu1.xy"), "w")
+        for it in range(5):
+            plane = np.full((6, 4), 0.2 * it)
+            slice_file.write_record(np.append(plane, [0.5 * it, 0.0]).astype(np.float32))
+        slice_file.close()
+        # Stand-in for ffmpeg, which writes the raw input to the movie file.
+        encoder = os.path.join(tmp_dir, "encoder")
+        with open(encoder, "w") as f:
+            f.write("#!{0}\n".format(sys.executable))
+            f.write("import sys\n")
+            f.write("open(sys.argv[-1], 'wb').write(sys.stdin.buffer.read())\n")
+        os.chmod(encoder, 0o755)
+
+        movies = []
+        for n_proc in [1, 2]:
+            movie_file = os.path.join(tmp_dir, "movie{0}.raw".format(n_proc))
+            make_movie(
+                datadir=tmp_dir,
+                extension="xy",
+                tmin=0.25,
+                movie_file=movie_file,
+                encoder=encoder,
+                figsize=(2, 2),
+                rc={"text.usetex": False},
+                n_proc=n_proc,
+            )
+            movies.append(np.fromfile(movie_file, dtype=np.uint8))
+        # Four frames of 2x2 inches at 100 dpi.
+        assert_equal(movies[0].size, 4 * 200 * 200 * 3)
+        assert_true(np.array_equal(movies[0], movies[1]), "frames differ")
+        frames = movies[0].reshape(4, 200 * 200 * 3)
+        assert_true(
+            all((frames[i] != frames[i + 1]).any() for i in range(3)), "wrong order"
+        )
+
+        # A failing encoder is reported with its output.
+        with open(encoder, "w") as f:
+            f.write("#!{0}\n".format(sys.executable))
+            f.write("import sys\n")
+            f.write("sys.exit('unknown encoder libx265')\n")
+        try:
+            make_movie(
+                datadir=tmp_dir,
+                extension="xy",
+                movie_file=os.path.join(tmp_dir, "failed.raw"),
+                encoder=encoder,
+                figsize=(2, 2),
+                rc={"text.usetex": False},
+            )
+            message = ""
+        except RuntimeError as e:
+            message = str(e)
+        assert_true("unknown encoder libx265" in message, "encoder error not raised")
+
+
+@test
+def test_var2vtk_xml() -> None:
+    """Write snapshots as VTK XML files with appended raw data."""
+    import re
+    from pencil.export import var2vtk_xml
+
+    def read_vtk_xml(file_name):
+        raw = open(file_name, "rb").read()
+        start = raw.index(b"_", raw.index(b"<AppendedData")) + 1
+        arrays = {}
+        for line in raw[:start].decode().splitlines():
+            match = re.search(r'type="(\w+)" Name="(\w+)".*offset="(\d+)"', line)
+            if match:
+                dtype = {"Float32": "<f4", "Float64": "<f8"}[match.group(1)]
+                offset = start + int(match.group(3))
+                nbytes = int(np.frombuffer(raw[offset : offset + 8], dtype="<u8")[0])
+                arrays[match.group(2)] = np.frombuffer(
+                    raw[offset + 8 : offset + 8 + nbytes], dtype=dtype
+                )
+        return raw[:start].decode(), arrays
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        shutil.copytree(DATA_DIR, tmp_dir, dirs_exist_ok=True)
+        _write_grid(tmp_dir)
+        for it in range(2):
+            shutil.copy(
+                os.path.join(tmp_dir, "proc0", "var.dat"),
+                os.path.join(tmp_dir, "proc0", "VAR{0}".format(it)),
+            )
+        data = var("var.dat", tmp_dir, proc=0, quiet=True, trimall=True)
+        # x varies fastest and vector components are interleaved.
+        uu = np.moveaxis(data.uu, 0, -1).ravel()
+
+        destination = os.path.join(tmp_dir, "work")
+        var2vtk_xml(datadir=tmp_dir, variables=["uu", "ss"], destination=destination)
+        header, arrays = read_vtk_xml(destination + ".vti")
+        assert_true('WholeExtent="0 3 0 5 0 4"' in header, "wrong extent")
+        assert_true(np.allclose(arrays["uu"], uu), "uu differs")
+        assert_true(np.allclose(arrays["ss"], data.ss.ravel()), "ss differs")
+
+        var2vtk_xml(
+            datadir=tmp_dir,
+            variables=["uu", "vort"],
+            destination=destination,
+            ti=0,
+            tf=1,
+            grid_type="rectilinear",
+            chunk_size=50,
+            n_proc=2,
+        )
+        vort = var("var.dat", tmp_dir, proc=0, quiet=True, trimall=True, magic=["vort"])
+        header, arrays = read_vtk_xml(destination + "1.vtr")
+        x = np.linspace(-0.25, 1.25, 10)[3:7]
+        assert_true(np.allclose(arrays["x"], x), "x differs")
+        assert_true(np.allclose(arrays["uu"], uu), "uu differs in slabs")
+        assert_true(
+            np.allclose(arrays["vort"], np.moveaxis(vort.vort, 0, -1).ravel()),
+            "vort differs",
+        )
+        collection = open(destination + ".pvd").read()
+        assert_true('file="work0.vtr"' in collection, "missing file in collection")
+
+
+@test
+def test_read_particles() -> None:
+    """Read PVAR and particles_stalker.dat files."""
+    from scipy.io import FortranFile
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        os.makedirs(os.path.join(tmp_dir, "proc0"))
+        for file_name in ["dim.dat", "param.nml", os.path.join("proc0", "dim.dat")]:
+            shutil.copy(data_file(file_name), os.path.join(tmp_dir, file_name))
+        with open(os.path.join(tmp_dir, "pdim.dat"), "w") as pdim_file:
+            pdim_file.write("  5  4  3  0\n")
+        with open(os.path.join(tmp_dir, "particle_index.pro"), "w") as index_file:
+            index_file.write(" ixp=1\n iyp=2\n izp=3\n iap=4\n")
+        ipar = np.array([4, 2, 5, 1, 3], dtype=np.int32)
+        fp = np.outer(np.arange(1, 5), ipar).astype(np.float32)
+        # t, x(mx), y(my), z(mz), dx, dy, dz with mx, my, mz = 10, 12, 11.
+        grid = np.concatenate(
+            [[0.5], np.arange(10), np.arange(12), np.arange(11), [1.0, 1.0, 1.0]]
+        ).astype(np.float32)
+        pvar_file = FortranFile(os.path.join(tmp_dir, "proc0", "PVAR2"), "w")
+        pvar_file.write_record(np.array([5], dtype=np.int32))
+        pvar_file.write_record(ipar)
+        pvar_file.write_record(fp)
+        pvar_file.write_record(grid)
+        pvar_file.close()
+
+        particles = pvar(varfile=2, datadir=tmp_dir, quiet=True)
+        assert_true(np.array_equal(particles.ipars, [1, 2, 3, 4, 5]), "wrong ipars")
+        assert_true(np.array_equal(particles.zp, [3, 6, 9, 12, 15]), "wrong zp")
+        assert_true(np.array_equal(particles.x, np.arange(3, 7)), "wrong x")
+        _assert_close(particles.t, 0.5, "t")
+        particles = pvar(varfile="PVAR2", datadir=tmp_dir, quiet=True, ipar=[2, 5])
+        assert_true(np.array_equal(particles.ap, [8, 20]), "wrong ap of ipar")
+
+        with open(os.path.join(tmp_dir, "particles_stalker_header.dat"), "w") as header:
+            header.write("xp,yp,zp,")
+        stalk_file = FortranFile(os.path.join(tmp_dir, "proc0", "particles_stalker.dat"), "w")
+        for it in range(4):
+            head = np.zeros(1, dtype=[("t", np.float32), ("n", np.int32)])
+            head["t"], head["n"] = 0.25 * it, 2
+            stalk_file.write_record(head)
+            stalk_file.write_record(np.array([3, 1], dtype=np.int32))
+            stalk_file.write_record(
+                np.array([[3, 30, 300], [1, 10, 100]], dtype=np.float32) * (it + 1)
+            )
+        stalk_file.close()
+
+        stalker = pstalk(datadir=tmp_dir, quiet=True, tmin=1)
+        assert_true(np.array_equal(stalker.t, [0.25, 0.5, 0.75]), "wrong stalker t")
+        _assert_equal_tuple(stalker.yp.shape, (3, 3))
+        assert_true(np.array_equal(stalker.yp[:, 2], [60, 90, 120]), "wrong yp")
+        assert_true(np.array_equal(stalker.yp[:, 1], [0, 0, 0]), "wrong yp")
+
+
 @test
 def test_read_power() -> None:
     """Read power spectra"""